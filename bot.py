@@ -17,6 +17,9 @@ ensure_package("requests")
 import feedparser
 import requests
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "scripts"))
+from lang_detect import deepl_source_lang, needs_translation
+
 # デバッグ用に環境変数を表示（APIキーはマスク）
 print(f"[DEBUG] X_API_KEY={'***' if os.getenv('X_API_KEY') else 'None'}")
 print(f"[DEBUG] DEEPL_API_KEY={'***' if os.getenv('DEEPL_API_KEY') else 'None'}")
@@ -39,11 +42,21 @@ for entry in feed.entries[:5]:
     title = entry.title
     link = entry.link
 
-    # DeepL APIで翻訳
+    # 既に日本語なら翻訳しない
+    needed, lang = needs_translation(title, "ja")
+    if not needed:
+        print(f"- {title}\n  (翻訳不要)\n  {link}")
+        continue
+
+    # DeepL APIで翻訳（原文言語が確定し DeepL が受け付ける時だけ明示。それ以外は自動判定）
+    data = {"auth_key": deepl_api_key, "text": title, "target_lang": "JA"}
+    source = deepl_source_lang(lang)
+    if source:
+        data["source_lang"] = source
     try:
         resp = requests.post(
             "https://api-free.deepl.com/v2/translate",
-            data={"auth_key": deepl_api_key, "text": title, "target_lang": "JA"},
+            data=data,
             timeout=10
         )
         if resp.status_code == 200:
@@ -0,0 +1,337 @@
+import os
+import re
+import sys
+import time
+import asyncio
+import threading
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+from bs4 import BeautifulSoup
+
+import state_store
+from feed_fetch import ACCEPT_ENCODING, FETCH_CONNECT_TIMEOUT, cached_transport
+
+# ===== 設定 =====
+# 要約が空・1行だけの記事はリンク先の本文を取得し、冒頭数文を Summary / 投稿文の要約に使う（任意）。
+# 取得はホスト別の同時接続上限つきで並行。抽出した冒頭文は URL ごとに articles.sqlite3 に保存し（本文全体は
+# 保存しない）、一度抽出した記事は次回以降ダウンロードも解析もしない（ARTICLE_REVALIDATE_DAYS を過ぎたら ETag で再検証）。
+# RETENTION_SEC より前に取得した記録は取り込みの実行ごとに消す。
+ENRICH_SUMMARIES = os.environ.get("ENRICH_SUMMARIES", "0").lower() in {"1", "true", "yes"}
+ENRICH_MIN_CHARS = int(os.environ.get("ENRICH_MIN_CHARS", "80"))  # これより短い要約を補う
+ENRICH_LEAD_CHARS = int(os.environ.get("ENRICH_LEAD_CHARS", "300"))
+ARTICLE_CONCURRENCY = int(os.environ.get("ARTICLE_CONCURRENCY", "16"))
+ARTICLE_PER_HOST = int(os.environ.get("ARTICLE_PER_HOST", "2"))  # 記事ページはフィードより重いので控えめに
+ARTICLE_TIMEOUT = float(os.environ.get("ARTICLE_TIMEOUT", "15"))
+ARTICLE_MAX_BYTES = 2 * 1024 * 1024
+ARTICLE_DB = "articles.sqlite3"
+REVALIDATE_SEC = float(os.environ.get("ARTICLE_REVALIDATE_DAYS", "7")) * 86400
+FAILURE_RETRY_SEC = 6 * 3600  # 取得・抽出に失敗したURLは暫く試さない
+RETENTION_SEC = 60 * 86400
+USER_AGENT = "notion-x-mvp/1.0 (article)"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS extracts (
+    url TEXT PRIMARY KEY,
+    etag TEXT,
+    last_modified TEXT,
+    lead TEXT,
+    error TEXT,
+    fetched_at REAL NOT NULL
+);
+"""
+
+# ===== 本文抽出（readability 風）=====
+# 段落（<p>）の多い要素を本文とみなす。段落の長さ・読点で親要素に加点し、class/id の語で加減点、
+# リンク密度の高い要素（メニュー・関連記事）は減点する。
+DROP_TAGS = ("script", "style", "noscript", "template", "svg", "iframe", "form", "button", "nav", "aside",
+             "header", "footer", "figure", "select", "input")
+NEGATIVE_RE = re.compile(
+    r"comment|sidebar|footer|footnote|masthead|menu|nav|share|social|promo|related|recommend|advert|"
+    r"\bads?\b|sponsor|cookie|consent|subscribe|newsletter|paywall|popup|modal|breadcrumb|byline|caption",
+    re.IGNORECASE,
+)
+POSITIVE_RE = re.compile(r"article|body|content|entry|main|post|story|text|blog|hentry|kiji|honbun", re.IGNORECASE)
+SENTENCE_RE = re.compile(r"(?<=[.!?。！？])\s+|(?<=[。！？])")
+MIN_PARAGRAPH_CHARS = 25
+
+
+class Extracted(NamedTuple):
+    text: str  # 本文（段落を改行で連結）
+    lead: str  # 冒頭の数文（ENRICH_LEAD_CHARS 以内）
+
+
+def _class_weight(tag) -> int:
+    names = " ".join(tag.get("class") or []) + " " + (tag.get("id") or "")
+    weight = 0
+    if NEGATIVE_RE.search(names):
+        weight -= 25
+    if POSITIVE_RE.search(names):
+        weight += 25
+    return weight
+
+
+def _link_density(tag) -> float:
+    text_len = len(tag.get_text(" ", strip=True)) or 1
+    link_len = sum(len(a.get_text(" ", strip=True)) for a in tag.find_all("a"))
+    return min(link_len / text_len, 1.0)
+
+
+def _paragraphs(root) -> List[str]:
+    out = []
+    for p in root.find_all(["p", "li", "blockquote"] if root.name != "body" else ["p"]):
+        text = " ".join(p.get_text(" ", strip=True).split())
+        if len(text) >= MIN_PARAGRAPH_CHARS and _link_density(p) < 0.5:
+            out.append(text)
+    return out
+
+
+def lead_of(text: str, limit: int = ENRICH_LEAD_CHARS) -> str:
+    """冒頭から文単位で limit 文字まで（1文目が長すぎる場合は切って「…」）"""
+    out = ""
+    for sentence in SENTENCE_RE.split(text.replace("\n", " ")):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        candidate = f"{out} {sentence}".strip() if out and sentence[:1].isascii() else out + sentence
+        if len(candidate) > limit:
+            break
+        out = candidate
+    if not out and text:
+        out = text[: limit - 1].rstrip() + "…"
+    return out
+
+
+def extract_text(html, url: str = "") -> Extracted:
+    """記事HTMLから本文と冒頭文を抜き出す（見つからなければ meta description）"""
+    soup = BeautifulSoup(html, "html.parser")
+    meta = ""
+    for attr, name in (("property", "og:description"), ("name", "description"), ("name", "twitter:description")):
+        tag = soup.find("meta", attrs={attr: name})
+        if tag and tag.get("content"):
+            meta = " ".join(tag["content"].split())
+            break
+
+    for tag in soup.find_all(DROP_TAGS):
+        tag.decompose()
+    for tag in soup.find_all(True):
+        if tag.attrs is not None and tag.name not in ("html", "body", "article", "main") and _class_weight(tag) < 0:
+            tag.decompose()
+
+    paragraphs: List[str] = []
+    # 構造化された本文があれば優先
+    for root in soup.select('[itemprop="articleBody"], article, main'):
+        paragraphs = _paragraphs(root)
+        if sum(map(len, paragraphs)) >= 200:
+            break
+    else:
+        paragraphs = []
+
+    if not paragraphs:
+        scores: Dict[int, float] = {}
+        nodes = {}
+        for p in soup.find_all("p"):
+            text = p.get_text(" ", strip=True)
+            if len(text) < MIN_PARAGRAPH_CHARS:
+                continue
+            score = 1 + text.count(",") + text.count("、") + min(len(text) / 100, 3)
+            for parent, share in ((p.parent, 1.0), (p.parent.parent if p.parent else None, 0.5)):
+                if parent is None or parent.name in (None, "[document]"):
+                    continue
+                if id(parent) not in scores:
+                    scores[id(parent)] = _class_weight(parent)
+                    nodes[id(parent)] = parent
+                scores[id(parent)] += score * share
+        if scores:
+            best = max(scores, key=lambda k: scores[k] * (1 - _link_density(nodes[k])))
+            paragraphs = _paragraphs(nodes[best])
+
+    text = "\n".join(paragraphs)
+    return Extracted(text, lead_of(text) if text else lead_of(meta))
+
+
+# ===== キャッシュ =====
+class ExtractCache:
+    """URL → 抽出結果（ETag / Last-Modified 付き）。取得は非同期タスクから呼ぶのでロックで守る"""
+
+    def __init__(self, conn):
+        conn.executescript(SCHEMA)
+        conn.commit()
+        # 以前は本文全体（text 列）も保存していた。使うのは冒頭文だけなので消して詰める（残っている時だけ）
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(extracts)")]
+        if "text" in columns and conn.execute("SELECT 1 FROM extracts WHERE text IS NOT NULL LIMIT 1").fetchone():
+            conn.execute("UPDATE extracts SET text = NULL")
+            conn.commit()
+            conn.execute("VACUUM")
+        self.conn = conn
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, name: str = ARTICLE_DB) -> "ExtractCache":
+        return cls(state_store.connect(name, check_same_thread=False))
+
+    def get(self, url: str) -> Optional[Tuple[Optional[str], Optional[str], str, Optional[str], float]]:
+        """(etag, last_modified, lead, error, fetched_at)"""
+        with self._lock:
+            return self.conn.execute(
+                "SELECT etag, last_modified, COALESCE(lead, ''), error, fetched_at FROM extracts WHERE url = ?", (url,)
+            ).fetchone()
+
+    def put(self, url: str, etag: Optional[str], last_modified: Optional[str], lead: str) -> None:
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO extracts (url, etag, last_modified, lead, error, fetched_at)"
+                " VALUES (?, ?, ?, ?, NULL, ?)",
+                (url, etag, last_modified, lead, time.time()),
+            )
+            self.conn.commit()
+
+    def touch(self, url: str) -> None:
+        """304（変更なし）→ 再検証時刻だけ更新"""
+        with self._lock:
+            self.conn.execute("UPDATE extracts SET fetched_at = ? WHERE url = ?", (time.time(), url))
+            self.conn.commit()
+
+    def fail(self, url: str, error: str) -> None:
+        """失敗を記録（既存の抽出結果は残す）"""
+        with self._lock:
+            self.conn.execute(
+                "INSERT INTO extracts (url, error, fetched_at) VALUES (?, ?, ?)"
+                " ON CONFLICT(url) DO UPDATE SET error = excluded.error, fetched_at = excluded.fetched_at",
+                (url, error[:500], time.time()),
+            )
+            self.conn.commit()
+
+    def purge(self, older_than: float = RETENTION_SEC) -> int:
+        with self._lock:
+            n = self.conn.execute("DELETE FROM extracts WHERE fetched_at < ?", (time.time() - older_than,)).rowcount
+            self.conn.commit()
+        return n
+
+
+# ===== 並行取得 =====
+async def _download(client: httpx.AsyncClient, url: str, headers: Dict[str, str]) -> Optional[tuple]:
+    """(本文, ETag, Last-Modified)。条件付き GET が 304 なら None"""
+    async with client.stream("GET", url, headers=headers) as res:
+        if res.status_code == 304 and headers:
+            return None
+        res.raise_for_status()
+        if "html" not in res.headers.get("content-type", "text/html"):
+            raise ValueError(f"not html: {res.headers.get('content-type')}")
+        chunks, size = [], 0
+        async for chunk in res.aiter_bytes():
+            size += len(chunk)
+            if size > ARTICLE_MAX_BYTES:
+                break  # 本文は先頭側にあるので上限で打ち切って解析する
+            chunks.append(chunk)
+        return b"".join(chunks), res.headers.get("etag"), res.headers.get("last-modified")
+
+
+async def _fetch_lead(client: httpx.AsyncClient, url: str, cache: ExtractCache,
+                      host_limits: Dict[str, asyncio.Semaphore], overall: asyncio.Semaphore) -> str:
+    cached = cache.get(url)
+    headers = {}
+    if cached:
+        etag, last_modified, lead, error, fetched_at = cached
+        age = time.time() - fetched_at
+        if error and age < FAILURE_RETRY_SEC:
+            return lead
+        if not error and age < REVALIDATE_SEC:
+            return lead  # 抽出済み（ダウンロードしない）
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+
+    host = urlsplit(url).hostname or ""
+    sem = host_limits.setdefault(host, asyncio.Semaphore(ARTICLE_PER_HOST))
+    # 1記事の上限時間は同時接続の空き待ちを含めず、枠を取ってから数える（ホストの枠を先に取る）
+    async with sem, overall:
+        downloaded = await asyncio.wait_for(_download(client, url, headers), ARTICLE_TIMEOUT * 2)
+    if downloaded is None:
+        cache.touch(url)
+        return cached[2]
+    body, etag, last_modified = downloaded
+    # 解析は CPU 処理なのでスレッドへ（その間も他の取得は進む）
+    extracted = await asyncio.to_thread(extract_text, body, url)
+    cache.put(url, etag, last_modified, extracted.lead)
+    return extracted.lead
+
+
+async def _fetch_leads(urls: Sequence[str], cache: ExtractCache, total_timeout: Optional[float]) -> Dict[str, str]:
+    timeout = httpx.Timeout(ARTICLE_TIMEOUT, connect=FETCH_CONNECT_TIMEOUT)
+    limits = httpx.Limits(max_connections=ARTICLE_CONCURRENCY, max_keepalive_connections=ARTICLE_CONCURRENCY)
+    headers = {"User-Agent": USER_AGENT, "Accept-Encoding": ACCEPT_ENCODING, "Accept": "text/html,*/*;q=0.5"}
+    host_limits: Dict[str, asyncio.Semaphore] = {}
+    overall = asyncio.Semaphore(ARTICLE_CONCURRENCY)
+
+    async with httpx.AsyncClient(transport=cached_transport(limits), timeout=timeout, headers=headers,
+                                 follow_redirects=True) as client:
+        async def guarded(url):
+            try:
+                return await _fetch_lead(client, url, cache, host_limits, overall)
+            except Exception as e:
+                cache.fail(url, f"{type(e).__name__}: {str(e).splitlines()[0] if str(e) else ''}")
+                raise
+
+        tasks = {url: asyncio.ensure_future(guarded(url)) for url in dict.fromkeys(urls)}
+        if not tasks:
+            return {}
+        done, pending = await asyncio.wait(tasks.values(), timeout=total_timeout)
+        for t in pending:
+            t.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+    return {url: t.result() for url, t in tasks.items() if t in done and not t.exception() and t.result()}
+
+
+def fetch_leads(urls: Sequence[str], cache: Optional[ExtractCache] = None,
+                total_timeout: Optional[float] = None) -> Dict[str, str]:
+    """記事URL → 冒頭文（取得・抽出できたものだけ）。キャッシュ済みはネットワークに出ない"""
+    cache = cache or ExtractCache.open()
+    return asyncio.run(_fetch_leads(urls, cache, total_timeout))
+
+
+def is_thin(summary: str, min_chars: int = ENRICH_MIN_CHARS) -> bool:
+    return len(" ".join((summary or "").split())) < min_chars
+
+
+def enrich_summaries(articles, total_timeout: Optional[float] = None, cache: Optional[ExtractCache] = None):
+    """要約が短い記事だけリンク先の冒頭文で置き換えた Article のリストを返す（失敗時は元のまま）"""
+    thin = [a.url for a in articles if is_thin(a.summary)]
+    if not thin:
+        return list(articles)
+    leads = fetch_leads(thin, cache, total_timeout)
+    return [a.replace(summary=leads[a.url]) if a.url in leads and len(leads[a.url]) > len(a.summary or "") else a
+            for a in articles]
+
+
+if __name__ == "__main__":
+    # 使い方:
+    #   python scripts/article_extract.py extract <URL|HTMLファイル>   # 抽出結果を表示（キャッシュは使わない）
+    #   python scripts/article_extract.py bench <HTMLファイル> [回数]
+    #   python scripts/article_extract.py purge
+    if len(sys.argv) == 3 and sys.argv[1] == "extract":
+        target = sys.argv[2]
+        if os.path.exists(target):
+            with open(target, "rb") as f:
+                html = f.read()
+        else:
+            html = httpx.get(target, headers={"User-Agent": USER_AGENT}, follow_redirects=True,
+                             timeout=ARTICLE_TIMEOUT).content
+        result = extract_text(html, target)
+        print(f"lead: {result.lead}\n---\n{result.text}")
+    elif len(sys.argv) in (3, 4) and sys.argv[1] == "bench":
+        with open(sys.argv[2], "rb") as f:
+            html = f.read()
+        n = int(sys.argv[3]) if len(sys.argv) == 4 else 50
+        start = time.perf_counter()
+        for _ in range(n):
+            extract_text(html)
+        elapsed = time.perf_counter() - start
+        print(f"{n / elapsed:.1f} pages/s ({len(html) / 1024:.0f} KB, {elapsed / n * 1000:.1f} ms/page)")
+    elif len(sys.argv) == 2 and sys.argv[1] == "purge":
+        print(f"purged {ExtractCache.open().purge()} rows")
+    else:
+        print("usage: article_extract.py extract <url|file> | bench <file> [n] | purge", file=sys.stderr)
+        sys.exit(2)
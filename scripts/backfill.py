@@ -0,0 +1,154 @@
+import os
+import sys
+import gzip
+import json
+import time
+from typing import Iterator, List, Optional, Tuple
+
+import state_store
+from entry_versions import EntryVersions
+from near_dup import NearDupIndex
+from notion_insert import ingest_articles, notify_slack, open_budget, open_existing_urls
+from records import Article
+from url_canon import Canonicalizer
+
+# ===== 設定 =====
+# アーカイブ（JSONL、.gz 可）を固定件数のチャンクで流し込む。
+# メモリに載るのは常に1チャンク分だけで、チャンク完了ごとに読み込み位置を保存するため
+# 途中で落ちても同じコマンドで続きから再開できる。
+BACKFILL_CHUNK = int(os.environ.get("BACKFILL_CHUNK", "500"))
+CHECKPOINT_FILE = "backfill_checkpoint.json"
+
+
+def _open(path: str):
+    return gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")
+
+
+def to_article(row: dict, canonicalizer: Canonicalizer) -> Optional[Article]:
+    """アーカイブ1行（EntryRecord 相当の dict。link / url どちらでも可）を Article に"""
+    link = row.get("link") or row.get("url") or ""
+    title = row.get("title") or ""
+    if not title or not link:
+        return None
+    return Article(
+        title=title,
+        url=canonicalizer.canonical(link),
+        link=link,
+        summary=row.get("summary") or "",
+        published=row.get("published") or row.get("updated"),
+        guid=row.get("guid") or "",
+        feed=row.get("feed") or "",
+    )
+
+
+def read_chunks(f, offset: int, size: int, canonicalizer: Canonicalizer) -> Iterator[Tuple[List[Article], int, int]]:
+    """offset（バイト位置）から size 行ずつ読み、(記事, 読んだ行数, 次のoffset) を返す"""
+    f.seek(offset)
+    while True:
+        articles, lines = [], 0
+        while lines < size:
+            line = f.readline()
+            if not line:
+                break
+            lines += 1
+            if not line.strip():
+                continue
+            try:
+                article = to_article(json.loads(line), canonicalizer)
+            except ValueError as e:
+                print(f"[WARN] skip broken line at {f.tell()}: {e}")
+                continue
+            if article:
+                articles.append(article)
+        if not lines:
+            return
+        yield articles, lines, f.tell()
+
+
+def load_checkpoint(archive: str) -> dict:
+    try:
+        with open(state_store.state_path(CHECKPOINT_FILE), encoding="utf-8") as f:
+            cp = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    # 別のアーカイブのチェックポイントは使わない
+    return cp if cp.get("archive") == os.path.abspath(archive) else {}
+
+
+def save_checkpoint(cp: dict) -> None:
+    path = state_store.state_path(CHECKPOINT_FILE)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(cp, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def backfill(archive: str, chunk_size: int = BACKFILL_CHUNK, reset: bool = False) -> dict:
+    cp = {} if reset else load_checkpoint(archive)
+    cp = {
+        "archive": os.path.abspath(archive),
+        "offset": cp.get("offset", 0),
+        "lines": cp.get("lines", 0),
+        "inserted": cp.get("inserted", 0),
+        "duplicates": cp.get("duplicates", 0),
+        "near_duplicates": cp.get("near_duplicates", 0),
+        "filtered": cp.get("filtered", 0),
+        "done": False,
+    }
+    if cp["offset"]:
+        print(f"resume from line {cp['lines']} (offset {cp['offset']})")
+
+    # 既存URLは Notion（または STATE_DIR の Bloom フィルタ）から1回だけ取得。今回登録した分は
+    # NearDupIndex 側（SQLite）でも判定する
+    index, budget = NearDupIndex.open(), open_budget()
+    existing_urls = open_existing_urls(index)
+    versions = EntryVersions.open()
+    canonicalizer = Canonicalizer()
+
+    with _open(archive) as f:
+        for articles, lines, offset in read_chunks(f, cp["offset"], chunk_size, canonicalizer):
+            start = time.perf_counter()
+            result = ingest_articles(articles, existing_urls, index, budget, versions=versions)
+            if result.failed or result.deferred:
+                # チャンクを取りこぼしたまま先へ進めない（登録済み分は再実行時に重複として除外される）
+                raise RuntimeError(
+                    f"chunk at line {cp['lines']} incomplete: failed {result.failed}, deferred {result.deferred}"
+                )
+            cp.update(
+                offset=offset,
+                lines=cp["lines"] + lines,
+                inserted=cp["inserted"] + result.inserted,
+                duplicates=cp["duplicates"] + result.duplicates,
+                near_duplicates=cp["near_duplicates"] + result.near_duplicates,
+                filtered=cp["filtered"] + result.filtered,
+                updated_at=time.time(),
+            )
+            save_checkpoint(cp)
+            print(f"line {cp['lines']}: +{result.inserted} (dup {result.duplicates}, near {result.near_duplicates}, rule {result.filtered})"
+                  f" in {time.perf_counter() - start:.1f}s")
+
+    cp["done"] = True
+    save_checkpoint(cp)
+    if hasattr(existing_urls, "close"):
+        existing_urls.close()
+    notify_slack(
+        f"✅ バックフィル完了: {os.path.basename(archive)} / {cp['lines']} 行 / 新規 {cp['inserted']} 件 / "
+        f"重複 {cp['duplicates']} 件 / 類似 {cp['near_duplicates']} 件 / ルール除外 {cp['filtered']} 件 / {budget.summary_line()}"
+    )
+    return cp
+
+
+if __name__ == "__main__":
+    # 使い方: python scripts/backfill.py <archive.jsonl[.gz]> [--reset]
+    #   1行1エントリ（title, link または url, summary, published, guid, feed）
+    args = [a for a in sys.argv[1:] if a != "--reset"]
+    if len(args) != 1:
+        print("usage: backfill.py <archive.jsonl[.gz]> [--reset]", file=sys.stderr)
+        sys.exit(2)
+    try:
+        backfill(args[0], reset="--reset" in sys.argv)
+    except Exception as e:
+        try:
+            notify_slack(f"❌ バックフィル失敗（再実行で続きから再開）: {e}")
+        finally:
+            raise
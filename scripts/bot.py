@@ -2,6 +2,8 @@
 import feedparser
 import requests
 
+from lang_detect import deepl_source_lang, needs_translation
+
 # 環境変数からキーを取得
 X_API_KEY = os.getenv("X_API_KEY")
 DEEPL_API_KEY = os.getenv("DEEPL_API_KEY")
@@ -14,16 +16,23 @@ print(f"[DEBUG] DEEPL_API_KEY={'***' if DEEPL_API_KEY else 'MISSING'}")
 
 def translate_text(text, target_lang="JA"):
     """
-    DeepL API を使って英語タイトルを日本語に翻訳
+    DeepL API を使ってタイトルを日本語に翻訳（既に翻訳先言語なら原文返却）
     """
+    needed, lang = needs_translation(text, target_lang)
+    if not needed:
+        return text
     url = "https://api-free.deepl.com/v2/translate"
     data = {
         "auth_key": DEEPL_API_KEY,
         "text": text,
         "target_lang": target_lang
     }
+    # 原文言語が確定し DeepL が受け付ける時だけ明示（それ以外は自動判定）
+    source = deepl_source_lang(lang)
+    if source:
+        data["source_lang"] = source
     try:
-        r = requests.post(url, data=data)
+        r = requests.post(url, data=data, timeout=15)
         r.raise_for_status()
         result = r.json()
         return result["translations"][0]["text"]
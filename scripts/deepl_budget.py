@@ -0,0 +1,177 @@
+import os
+import re
+import json
+import html
+import time
+import threading
+from typing import Callable, List, NamedTuple, Optional
+
+import requests
+
+import state_store
+
+# ===== 設定 =====
+USAGE_CACHE = "deepl_usage.json"
+DEEPL_TIMEOUT = float(os.environ.get("DEEPL_TIMEOUT", "15"))
+USAGE_CACHE_TTL = 600  # 同一実行（や直後の再実行）では /v2/usage を叩き直さない
+BUDGET_RESERVE = int(os.environ.get("DEEPL_BUDGET_RESERVE", "0"))  # 月末用に残す文字数
+SUMMARY_MIN_CHARS = int(os.environ.get("DEEPL_SUMMARY_MIN_CHARS", "80"))
+MAX_CONSECUTIVE_FAILURES = 3
+
+TAG_RE = re.compile(r"<[^>]+>")
+SPACE_RE = re.compile(r"\s+")
+SENTENCE_END_RE = re.compile(r"[.!?。！？]")
+
+
+def deepl_api_base(api_key: str) -> str:
+    """Free キー（末尾 :fx）は api-free、それ以外は Pro エンドポイント"""
+    host = "api-free.deepl.com" if api_key.endswith(":fx") else "api.deepl.com"
+    return f"https://{host}/v2"
+
+
+def deepl_translate(api_key: str, texts: List[str], target: str, source: Optional[str] = None,
+                    timeout: float = DEEPL_TIMEOUT) -> List[str]:
+    """DeepL /v2/translate を直接呼ぶ（ライブラリ既定のタイムアウト無し呼び出しを避ける）"""
+    data = [("text", t) for t in texts] + [("target_lang", target.upper())]
+    if source:
+        data.append(("source_lang", source.upper()))
+    res = requests.post(
+        f"{deepl_api_base(api_key)}/translate",
+        headers={"Authorization": f"DeepL-Auth-Key {api_key}"},
+        data=data,
+        timeout=timeout,
+    )
+    res.raise_for_status()
+    return [t["text"] for t in res.json()["translations"]]
+
+
+def plain_summary(text: str) -> str:
+    """要約のHTMLタグを落としてプレーンテキスト化（タグ分の文字数を消費しない）"""
+    text = html.unescape(TAG_RE.sub(" ", text or ""))
+    return SPACE_RE.sub(" ", text).strip()
+
+
+def truncate_text(text: str, limit: int) -> str:
+    """limit 文字以内で、なるべく文末で切る"""
+    if len(text) <= limit:
+        return text
+    head = text[:limit - 1]
+    ends = [m.end() for m in SENTENCE_END_RE.finditer(head)]
+    if ends and ends[-1] >= limit // 2:
+        return head[:ends[-1]]
+    return head + "…"
+
+
+def fetch_usage(api_key: str) -> Optional[dict]:
+    """DeepL /v2/usage（キャッシュ付き）。取得できなければ None"""
+    path = state_store.state_path(USAGE_CACHE)
+    try:
+        with open(path, encoding="utf-8") as f:
+            cached = json.load(f)
+        if time.time() - cached.get("fetched_at", 0) < USAGE_CACHE_TTL:
+            return cached
+    except (OSError, ValueError):
+        pass
+
+    try:
+        res = requests.get(
+            f"{deepl_api_base(api_key)}/usage",
+            headers={"Authorization": f"DeepL-Auth-Key {api_key}"},
+            timeout=15,
+        )
+        res.raise_for_status()
+        data = res.json()
+    except Exception as e:
+        print(f"[WARN] DeepL usage fetch failed: {e}")
+        return None
+
+    usage = {
+        "character_count": int(data.get("character_count", 0)),
+        "character_limit": int(data.get("character_limit", 0)),
+        "fetched_at": time.time(),
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(usage, f)
+    return usage
+
+
+class TranslationPlan(NamedTuple):
+    translate_title: bool
+    summary: str  # 翻訳する（or 原文のまま使う）要約テキスト
+    translate_summary: bool
+
+
+class TranslationBudget:
+    """残り文字数に合わせて タイトル優先 → 要約（切詰め/省略）の順で翻訳量を割り当てる"""
+
+    def __init__(self, remaining: Optional[int]):
+        self.remaining = remaining  # None は残量不明（制限なしとして扱う）
+        self.spent = 0
+        self.failures = 0
+        self.exhausted = remaining is not None and remaining <= 0
+        self._lock = threading.Lock()  # 言語ごとの翻訳スレッドから charge される
+
+    @classmethod
+    def from_api(cls, api_key: str, reserve: int = BUDGET_RESERVE) -> "TranslationBudget":
+        usage = fetch_usage(api_key)
+        if not usage or not usage["character_limit"]:
+            return cls(None)
+        return cls(usage["character_limit"] - usage["character_count"] - reserve)
+
+    def left(self) -> Optional[int]:
+        """未消費の残り文字数（残量不明なら None）"""
+        return None if self.remaining is None else max(self.remaining - self.spent, 0)
+
+    def plan(self, entries, needs: Callable[[str], bool] = bool, limit: Optional[int] = None) -> List[TranslationPlan]:
+        """
+        needs(text) が False のテキスト（既に翻訳先言語など）は翻訳せず予算も使わない。
+        チャンクごとに呼ばれてもよいよう、消費済み分を差し引いた残りで割り当てる。
+        limit を渡すとその文字数までに抑える（複数言語で残りを分け合う場合）
+        """
+        summaries = [plain_summary(e.summary) for e in entries]
+        if self.remaining is None:
+            return [TranslationPlan(needs(e.title), s, bool(s) and needs(s)) for e, s in zip(entries, summaries)]
+
+        left = self.left() if limit is None else min(self.left(), limit)
+        titles = []
+        for e in entries:
+            ok = needs(e.title) and len(e.title) <= left
+            titles.append(ok)
+            if ok:
+                left -= len(e.title)
+
+        # 要約は短いものから均等配分（水位合わせ）。下限未満しか割けないものは原文のまま
+        allot = [0] * len(entries)
+        order = sorted((i for i, s in enumerate(summaries) if s and needs(s)), key=lambda i: len(summaries[i]))
+        for n, i in enumerate(order):
+            share = left // (len(order) - n)
+            allot[i] = min(len(summaries[i]), share)
+            if allot[i] < min(SUMMARY_MIN_CHARS, len(summaries[i])):
+                allot[i] = 0
+            left -= allot[i]
+
+        plans = []
+        for ok, s, a in zip(titles, summaries, allot):
+            if a:
+                plans.append(TranslationPlan(ok, truncate_text(s, a), True))
+            else:
+                plans.append(TranslationPlan(ok, s, False))
+        return plans
+
+    def charge(self, chars: int) -> None:
+        with self._lock:
+            self.spent += chars
+            self.failures = 0
+            if self.remaining is not None and self.spent >= self.remaining:
+                self.exhausted = True
+
+    def record_failure(self) -> None:
+        """連続失敗（クォータ超過など）が続いたら以降の翻訳を止めて原文で登録する"""
+        with self._lock:
+            self.failures += 1
+            if self.failures >= MAX_CONSECUTIVE_FAILURES:
+                self.exhausted = True
+
+    def summary_line(self) -> str:
+        left = "不明" if self.remaining is None else f"{self.remaining - self.spent}"
+        return f"翻訳 {self.spent} 文字 / 残り {left} 文字"
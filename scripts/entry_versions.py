@@ -0,0 +1,172 @@
+import os
+import sys
+import json
+import time
+import hashlib
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+import state_store
+from deepl_budget import plain_summary
+
+# ===== 設定 =====
+# 登録済みエントリの URL → タイトル/要約のハッシュと、言語別の下書きページ（ID と書き込んだ文面）。
+# 同じ URL で見出しや要約が直された時に、変わった項目だけ翻訳し直して既存ページへ PATCH する。
+# ハッシュが同じエントリは DB 1回の一括参照だけで終わる（Notion・DeepL には出ない）。
+# CHANGE_DETECTION を無効にしても、言語別ページの記録（一部の言語だけ登録できた記事の続き）には使う
+CHANGE_DETECTION = os.environ.get("CHANGE_DETECTION", "1").lower() in {"1", "true", "yes"}
+VERSIONS_DB = "entries.sqlite3"
+RETENTION_SEC = 90 * 86400  # これより前から更新の無いエントリは追跡をやめる
+LOOKUP_CHUNK = 500  # SQLite の変数上限に収まるよう IN 句を分ける
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    url TEXT PRIMARY KEY,
+    title_hash TEXT NOT NULL,
+    summary_hash TEXT NOT NULL,
+    revisions INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pages (
+    url TEXT NOT NULL,
+    lang TEXT NOT NULL,
+    page_id TEXT NOT NULL,
+    title TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    PRIMARY KEY (url, lang)
+);
+"""
+
+
+def content_hash(text: str) -> str:
+    """空白・HTMLタグの違いを無視したハッシュ（フィードの整形揺れで更新扱いにしない）"""
+    return hashlib.sha1(plain_summary(text).encode("utf-8")).hexdigest()[:16]
+
+
+class Change(NamedTuple):
+    article: object  # 新しい内容の Article（フィード原文）
+    title: bool  # タイトルが変わった
+    summary: bool  # 要約が変わった
+
+
+class PageVersion(NamedTuple):
+    page_id: str
+    title: str  # ページに書き込んだ（翻訳後の）文面
+    summary: str
+
+
+class EntryVersions:
+    """登録済みエントリの内容ハッシュと下書きページ（SQLite）"""
+
+    def __init__(self, conn):
+        conn.executescript(SCHEMA)
+        conn.commit()
+        self.conn = conn
+
+    @classmethod
+    def open(cls, name: str = VERSIONS_DB) -> "EntryVersions":
+        return cls(state_store.connect(name))
+
+    def _hashes(self, urls: List[str]) -> Dict[str, tuple]:
+        found = {}
+        for start in range(0, len(urls), LOOKUP_CHUNK):
+            chunk = urls[start:start + LOOKUP_CHUNK]
+            found.update((url, (th, sh)) for url, th, sh in self.conn.execute(
+                f"SELECT url, title_hash, summary_hash FROM entries WHERE url IN ({','.join('?' * len(chunk))})",
+                chunk,
+            ))
+        return found
+
+    def split(self, articles: Iterable) -> tuple:
+        """
+        (追跡外の記事, 内容が変わった記事の Change) に分ける。追跡中で変化の無い記事はどちらにも入らない。
+        同じ URL が複数あれば先頭だけ見る
+        """
+        articles = list(articles)
+        known = self._hashes(list({a.url for a in articles if a.url}))
+        rest, changes, seen = [], [], set()
+        for a in articles:
+            if a.url not in known:
+                rest.append(a)
+                continue
+            if a.url in seen:
+                continue
+            seen.add(a.url)
+            title_hash, summary_hash = known[a.url]
+            title_changed = content_hash(a.title) != title_hash
+            summary_changed = content_hash(a.summary) != summary_hash
+            if title_changed or summary_changed:
+                changes.append(Change(a, title_changed, summary_changed))
+        return rest, changes
+
+    def unfinished(self, urls: Iterable[str]) -> set:
+        """ページはあるがエントリとしては未記録（一部の言語しか登録できていない）URL"""
+        urls = list(urls)
+        found = set()
+        for start in range(0, len(urls), LOOKUP_CHUNK):
+            chunk = urls[start:start + LOOKUP_CHUNK]
+            found.update(url for url, in self.conn.execute(
+                "SELECT DISTINCT p.url FROM pages p LEFT JOIN entries e ON e.url = p.url"
+                f" WHERE e.url IS NULL AND p.url IN ({','.join('?' * len(chunk))})",
+                chunk,
+            ))
+        return found
+
+    def pages(self, url: str) -> Dict[str, PageVersion]:
+        """言語 → 下書きページ"""
+        rows = self.conn.execute("SELECT lang, page_id, title, summary FROM pages WHERE url = ?", (url,))
+        return {lang: PageVersion(page_id, title, summary) for lang, page_id, title, summary in rows}
+
+    def record_page(self, url: str, lang: str, page_id: str, title: str, summary: str) -> None:
+        """言語別の下書きページだけ記録する（全言語そろうまでエントリは追跡外のまま＝次回残りの言語を登録する）"""
+        self.conn.execute(
+            "INSERT OR REPLACE INTO pages (url, lang, page_id, title, summary) VALUES (?, ?, ?, ?, ?)",
+            (url, lang, page_id, title, summary),
+        )
+        self.conn.commit()
+
+    def record_entry(self, article) -> None:
+        """フィード原文の article のハッシュを記録する（以後は変更検出の対象）"""
+        now = time.time()
+        self.conn.execute(
+            "INSERT INTO entries (url, title_hash, summary_hash, updated_at) VALUES (?, ?, ?, ?)"
+            " ON CONFLICT(url) DO UPDATE SET title_hash = excluded.title_hash,"
+            " summary_hash = excluded.summary_hash, updated_at = excluded.updated_at,"
+            " revisions = revisions + (entries.title_hash != excluded.title_hash"
+            " OR entries.summary_hash != excluded.summary_hash)",
+            (article.url, content_hash(article.title), content_hash(article.summary), now),
+        )
+        self.conn.commit()
+
+    def record(self, article, lang: str, page_id: str, title: str, summary: str) -> None:
+        """登録・更新したページを記録する（ハッシュはフィード原文の article から）"""
+        self.record_page(article.url, lang, page_id, title, summary)
+        self.record_entry(article)
+
+    def purge(self, older_than: float = RETENTION_SEC) -> int:
+        cutoff = time.time() - older_than
+        self.conn.execute("DELETE FROM pages WHERE url IN (SELECT url FROM entries WHERE updated_at < ?)", (cutoff,))
+        n = self.conn.execute("DELETE FROM entries WHERE updated_at < ?", (cutoff,)).rowcount
+        self.conn.commit()
+        return n
+
+    def stats(self) -> Dict[str, int]:
+        entries, revised = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(revisions > 0), 0) FROM entries"
+        ).fetchone()
+        pages = self.conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+        return {"entries": entries, "revised": revised, "pages": pages}
+
+
+if __name__ == "__main__":
+    # 使い方: python scripts/entry_versions.py stats | show <URL> | purge
+    versions = EntryVersions.open()
+    if len(sys.argv) == 2 and sys.argv[1] == "stats":
+        print(json.dumps(versions.stats()))
+    elif len(sys.argv) == 3 and sys.argv[1] == "show":
+        for lang, page in versions.pages(sys.argv[2]).items():
+            print(json.dumps(dict(page._asdict(), lang=lang), ensure_ascii=False))
+    elif len(sys.argv) == 2 and sys.argv[1] == "purge":
+        print(f"purged {versions.purge()} entries")
+    else:
+        print("usage: entry_versions.py stats | show <url> | purge", file=sys.stderr)
+        sys.exit(2)
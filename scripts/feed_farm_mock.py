@@ -0,0 +1,318 @@
+import os
+import sys
+import gzip
+import json
+import time
+import random
+import resource
+import threading
+import multiprocessing
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from xml.sax.saxutils import escape
+
+# ===== ローカル負荷試験用の合成フィード群（本番では使わない）=====
+# GET /feed/<n> で n 番目のフィード（RSS 2.0 / Atom）を返す。内容は (n, 時刻) から決定的に生成し、
+# FARM_UPDATE_SEC ごとに各フィードへ1件ずつ新着が増える（フィードごとに更新時刻をずらす）。
+# - ETag / Last-Modified を返し、If-None-Match / If-Modified-Since が一致すれば 304
+# - Accept-Encoding: gzip なら圧縮して返す
+# - 一部のフィードに癖を入れる: 重複（他フィードと同じ記事・追跡パラメータ付きURL / 文面だけ同じ）、
+#   文字コード（BOM・Latin-1宣言・宣言と違う cp1252・未定義の HTML 実体参照・CDATA）、
+#   遅い応答、壊れた XML（途中で切れる / & の未エスケープ）
+# - GET /stats でリクエスト数・304・送信バイト数、GET /urls?count=N でフィードURL一覧
+# 負荷試験: python scripts/feed_farm_mock.py bench 100,1000,5000
+#   （ファームを別プロセスで起動し、notion_insert と同じ fetch_all → parse_many → ingest_articles を
+#    ネットワーク無し（Notion/DeepL は呼ばない）で回して feeds/s・entries/s・最大RSS を測る）
+FARM_PORT = int(os.environ.get("FARM_PORT", "8090"))
+# 127.0.0.0/8 はすべてループバックなので、フィードを 127.0.0.<1..FARM_HOSTS> に振り分けて別ホストに見せる
+# （fetch_all のホスト別同時接続数の上限を現実に近い形で効かせる）
+FARM_HOSTS = int(os.environ.get("FARM_HOSTS", "64"))
+# 近似重複判定（MinHash）に全部似た記事と見なされないよう、語彙は音節から数千語作る
+SYLLABLES = ("ka", "to", "ri", "mun", "sel", "ver", "dan", "lo", "pre", "quin", "ast", "bor", "ce", "ny", "gal")
+WORDS = tuple(sorted({a + b + c for a in SYLLABLES for b in SYLLABLES for c in ("", "s", "er", "ion", "ed")}))
+
+
+class FarmConfig(NamedTuple):
+    feeds: int = int(os.environ.get("FARM_FEEDS", "1000"))
+    entries: int = int(os.environ.get("FARM_ENTRIES", "20"))  # 1フィードあたりの件数
+    summary_words: int = int(os.environ.get("FARM_SUMMARY_WORDS", "60"))
+    update_sec: float = float(os.environ.get("FARM_UPDATE_SEC", "600"))
+    dup_ratio: float = float(os.environ.get("FARM_DUP_RATIO", "0.1"))
+    quirk_ratio: float = float(os.environ.get("FARM_QUIRK_RATIO", "0.1"))
+    slow_ratio: float = float(os.environ.get("FARM_SLOW_RATIO", "0.02"))
+    slow_sec: float = float(os.environ.get("FARM_SLOW_SEC", "3"))
+    broken_ratio: float = float(os.environ.get("FARM_BROKEN_RATIO", "0.01"))
+    atom_ratio: float = float(os.environ.get("FARM_ATOM_RATIO", "0.3"))
+    seed: int = int(os.environ.get("FARM_SEED", "0"))
+
+
+QUIRKS = ("bom", "latin1", "cp1252-as-utf8", "html-entities", "cdata")
+
+
+class FeedTraits(NamedTuple):
+    atom: bool
+    quirk: str
+    slow: bool
+    broken: str
+
+
+def traits(cfg: FarmConfig, n: int) -> FeedTraits:
+    rnd = random.Random(f"{cfg.seed}:feed:{n}")
+    return FeedTraits(
+        atom=rnd.random() < cfg.atom_ratio,
+        quirk=rnd.choice(QUIRKS) if rnd.random() < cfg.quirk_ratio else "",
+        slow=rnd.random() < cfg.slow_ratio,
+        broken=rnd.choice(("truncated", "bare-amp")) if rnd.random() < cfg.broken_ratio else "",
+    )
+
+
+def latest_index(cfg: FarmConfig, n: int, now: float) -> int:
+    """フィード n の最新記事番号（フィードごとに更新時刻をずらす）"""
+    return int((now + n * cfg.update_sec / max(cfg.feeds, 1)) // cfg.update_sec)
+
+
+def _item(cfg: FarmConfig, n: int, i: int, quirk: str) -> Tuple[str, str, str, int]:
+    """(タイトル, リンク, 要約, 公開UNIX秒)"""
+    rnd = random.Random(f"{cfg.seed}:item:{n}:{i}")
+    published = int(i * cfg.update_sec)
+    r = rnd.random()
+    if r < cfg.dup_ratio:
+        # 他フィードの記事の再掲。半分は追跡パラメータ付きの同一URL、半分は別URLで文面が同じ
+        src = rnd.randrange(cfg.feeds)
+        title, link, summary, _ = _item(cfg._replace(dup_ratio=0), src, i, "")
+        if r < cfg.dup_ratio / 2:
+            return title, f"{link}?utm_source=feed{n}&utm_medium=rss", summary, published
+        return title, f"https://farm{n}.example.com/reposts/{src}-{i}", summary, published
+    words = [rnd.choice(WORDS) for _ in range(cfg.summary_words)]
+    title = f"{' '.join(words[:6]).capitalize()} ({n}-{i})"
+    summary = " ".join(words)
+    if quirk == "latin1" or quirk == "cp1252-as-utf8":
+        title = f"Café “{title}” — naïve"
+    elif quirk == "html-entities":
+        title = f"{title}&nbsp;&mdash;&nbsp;update"
+    return title, f"https://farm{n}.example.com/posts/{i}", summary, published
+
+
+def render_feed(cfg: FarmConfig, n: int, now: float) -> Tuple[bytes, int, FeedTraits]:
+    """(本文, 最新記事の公開時刻, 癖)"""
+    t = traits(cfg, n)
+    last = latest_index(cfg, n, now)
+    items = [_item(cfg, n, i, t.quirk) for i in range(last, last - cfg.entries, -1)]
+
+    def text(value: str) -> str:
+        return value if t.quirk == "html-entities" else escape(value)
+
+    def body(value: str) -> str:
+        if t.quirk == "cdata":
+            return f"<![CDATA[<p>{value}</p><script>alert(1)</script>]]>"
+        return escape(f"<p>{value}</p>")
+
+    if t.atom:
+        entries = "".join(
+            f"<entry><title>{text(title)}</title><link href=\"{escape(link)}\"/><id>{escape(link)}</id>"
+            f"<updated>{time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(pub))}</updated>"
+            f"<summary type=\"html\">{body(summary)}</summary></entry>"
+            for title, link, summary, pub in items
+        )
+        doc = (f'<feed xmlns="http://www.w3.org/2005/Atom"><title>farm {n}</title>'
+               f'<id>urn:farm:{n}</id>{entries}</feed>')
+    else:
+        entries = "".join(
+            f"<item><title>{text(title)}</title><link>{escape(link)}</link><guid>{escape(link)}</guid>"
+            f"<pubDate>{formatdate(pub, usegmt=True)}</pubDate><description>{body(summary)}</description></item>"
+            for title, link, summary, pub in items
+        )
+        doc = f'<rss version="2.0"><channel><title>farm {n}</title>{entries}</channel></rss>'
+
+    if t.quirk == "latin1":
+        data = ('<?xml version="1.0" encoding="ISO-8859-1"?>' + doc).encode("latin-1", errors="replace")
+    elif t.quirk == "cp1252-as-utf8":
+        data = ('<?xml version="1.0" encoding="utf-8"?>' + doc).encode("cp1252", errors="replace")
+    else:
+        data = ('<?xml version="1.0" encoding="utf-8"?>' + doc).encode("utf-8")
+        if t.quirk == "bom":
+            data = b"\xef\xbb\xbf" + data
+    if t.broken == "truncated":
+        data = data[: len(data) * 2 // 3]
+    elif t.broken == "bare-amp":
+        data = data.replace(b"&amp;", b"&", 3).replace(b"</title>", b" & Co</title>", 1)
+    return data, items[0][3] if items else 0, t
+
+
+# ===== サーバー =====
+class FarmHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive（接続の再利用も含めて測る）
+    config = FarmConfig()
+    stats = {"requests": 0, "ok": 0, "not_modified": 0, "bytes": 0, "slow": 0}
+    cache: Dict[int, Tuple[int, bytes, bytes, str, str, FeedTraits]] = {}  # n → (最新番号, 本文, gzip, ETag, Last-Modified, 癖)
+    lock = threading.Lock()
+
+    def _reply(self, status: int, body: bytes = b"", headers: Optional[Dict[str, str]] = None) -> None:
+        self.send_response(status)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+        with self.lock:
+            self.stats["bytes"] += len(body)
+
+    def _feed(self, n: int):
+        last = latest_index(self.config, n, time.time())
+        with self.lock:
+            hit = self.cache.get(n)
+        if hit and hit[0] == last:
+            return hit
+        data, published, t = render_feed(self.config, n, time.time())
+        entry = (last, data, gzip.compress(data, compresslevel=5), f'"farm-{n}-{last}"',
+                 formatdate(published, usegmt=True), t)
+        with self.lock:
+            self.cache[n] = entry
+        return entry
+
+    def do_GET(self):
+        with self.lock:
+            self.stats["requests"] += 1
+        path, _, query = self.path.partition("?")
+        if path == "/stats":
+            with self.lock:
+                body = json.dumps(self.stats).encode("utf-8")
+            return self._reply(200, body, {"Content-Type": "application/json"})
+        if path == "/urls":
+            count = int(dict(p.split("=", 1) for p in query.split("&") if "=" in p).get("count", self.config.feeds))
+            port = self.server.server_address[1]
+            return self._reply(200, "\n".join(feed_urls_for(count, port)).encode("utf-8"), {"Content-Type": "text/plain"})
+        if not path.startswith("/feed/"):
+            return self._reply(404)
+        try:
+            n = int(path[len("/feed/"):].split(".")[0])
+        except ValueError:
+            return self._reply(404)
+        if not 0 <= n < self.config.feeds:
+            return self._reply(404)
+
+        _, data, zipped, etag, last_modified, t = self._feed(n)
+        if t.slow:
+            with self.lock:
+                self.stats["slow"] += 1
+            time.sleep(self.config.slow_sec)
+        validators = {"ETag": etag, "Last-Modified": last_modified}
+        if self.headers.get("If-None-Match") == etag or self._not_modified_since(last_modified):
+            with self.lock:
+                self.stats["not_modified"] += 1
+            return self._reply(304, b"", validators)
+        headers = dict(validators, **{"Content-Type": "application/atom+xml" if t.atom else "application/rss+xml"})
+        if "gzip" in (self.headers.get("Accept-Encoding") or ""):
+            data = zipped
+            headers["Content-Encoding"] = "gzip"
+        with self.lock:
+            self.stats["ok"] += 1
+        self._reply(200, data, headers)
+
+    def _not_modified_since(self, last_modified: str) -> bool:
+        since = self.headers.get("If-Modified-Since")
+        if not since or self.headers.get("If-None-Match"):
+            return False  # 両方あれば ETag を優先（RFC 9110）
+        try:
+            return parsedate_to_datetime(since) >= parsedate_to_datetime(last_modified)
+        except (TypeError, ValueError):
+            return False
+
+    def log_message(self, format, *args):
+        pass  # 数千リクエストを出すのでアクセスログは出さない
+
+
+def feed_urls_for(count: int, port: int = FARM_PORT) -> List[str]:
+    return [f"http://127.0.0.{1 + n % FARM_HOSTS}:{port}/feed/{n}" for n in range(count)]
+
+
+def serve(port: int = FARM_PORT, config: Optional[FarmConfig] = None) -> None:
+    FarmHandler.config = config or FarmConfig()
+    server = ThreadingHTTPServer(("", port), FarmHandler)
+    server.daemon_threads = True
+    server.request_queue_size = 512
+    server.serve_forever()
+
+
+def start_farm(port: int = FARM_PORT, config: Optional[FarmConfig] = None) -> multiprocessing.Process:
+    """ファームを別プロセスで起動（計測側と GIL を取り合わないように）"""
+    import requests
+    proc = multiprocessing.Process(target=serve, args=(port, config), daemon=True)
+    proc.start()
+    for _ in range(100):
+        try:
+            requests.get(f"http://127.0.0.1:{port}/stats", timeout=1)
+            return proc
+        except requests.RequestException:
+            time.sleep(0.1)
+    proc.terminate()
+    raise RuntimeError(f"feed farm did not start on :{port}")
+
+
+# ===== 負荷試験 =====
+class LoadResult(NamedTuple):
+    feeds: int
+    fetched: int
+    errors: int
+    entries: int
+    inserted: int
+    fetch_sec: float
+    parse_sec: float
+    ingest_sec: float
+    max_rss_mb: float
+
+
+def run_load(feed_count: int, port: int = FARM_PORT) -> LoadResult:
+    """notion_insert.main と同じ段を通す（Notion/DeepL はオフライン。重複判定のステートは毎回新規）"""
+    from feed_fetch import fetch_all
+    from feed_parse import parse_many
+    from fetch_archive import OfflineIngest
+
+    pipeline = OfflineIngest()
+    try:
+        start = time.perf_counter()
+        blobs, errors = fetch_all(feed_urls_for(feed_count, port))
+        fetched = time.perf_counter()
+        parsed = parse_many(blobs)
+        parsed_at = time.perf_counter()
+        entries, result = pipeline(parsed, time.time())
+        done = time.perf_counter()
+    finally:
+        pipeline.close()
+    rss = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return LoadResult(feed_count, len(blobs), len(errors), entries, result.inserted,
+                      fetched - start, parsed_at - fetched, done - parsed_at, rss / 1024)
+
+
+def bench(counts: List[int], port: int = FARM_PORT) -> None:
+    farm = start_farm(port, FarmConfig(feeds=max(counts)))
+    try:
+        print(f"{'feeds':>6} {'ok':>6} {'err':>4} {'entries':>8} {'new':>7} {'fetch':>7} {'parse':>7} {'ingest':>7}"
+              f" {'feeds/s':>8} {'entries/s':>9} {'maxRSS':>8}")
+        for count in counts:
+            r = run_load(count, port)
+            total = r.fetch_sec + r.parse_sec + r.ingest_sec
+            print(f"{r.feeds:>6} {r.fetched:>6} {r.errors:>4} {r.entries:>8} {r.inserted:>7} {r.fetch_sec:>6.1f}s"
+                  f" {r.parse_sec:>6.1f}s {r.ingest_sec:>6.1f}s {r.feeds / total:>8.1f} {r.entries / total:>9.0f}"
+                  f" {r.max_rss_mb:>6.0f}MB")
+    finally:
+        farm.terminate()
+
+
+if __name__ == "__main__":
+    # 使い方:
+    #   python scripts/feed_farm_mock.py                     # ファーム起動（:8090、設定は FARM_* 環境変数）
+    #   python scripts/feed_farm_mock.py urls [件数]          # フィードURL一覧（RSS_URL 用）
+    #   python scripts/feed_farm_mock.py bench [100,1000,...]  # 負荷試験（ファームは自動起動）
+    if len(sys.argv) == 1:
+        print(f"[FEED FARM] {FarmConfig().feeds} feeds on :{FARM_PORT} (e.g. http://127.0.0.1:{FARM_PORT}/feed/0)")
+        serve()
+    elif sys.argv[1] == "urls" and len(sys.argv) <= 3:
+        print("\n".join(feed_urls_for(int(sys.argv[2]) if len(sys.argv) == 3 else FarmConfig().feeds)))
+    elif sys.argv[1] == "bench" and len(sys.argv) <= 3:
+        bench([int(c) for c in (sys.argv[2] if len(sys.argv) == 3 else "100,1000").split(",")])
+    else:
+        print("usage: feed_farm_mock.py | urls [count] | bench [counts]", file=sys.stderr)
+        sys.exit(2)
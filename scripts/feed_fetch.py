@@ -0,0 +1,235 @@
+import os
+import sys
+import time
+import socket
+import asyncio
+import ipaddress
+import threading
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+import httpcore
+
+from feed_parse import USER_AGENT, fetch_feed_bytes
+
+try:
+    import h2  # noqa: F401  httpx の HTTP/2 は h2 がある場合のみ有効
+    HTTP2 = True
+except ImportError:
+    HTTP2 = False
+
+try:
+    import brotli  # noqa: F401  br の展開は brotli がある場合のみ
+    ACCEPT_ENCODING = "gzip, br"
+except ImportError:
+    ACCEPT_ENCODING = "gzip"
+
+# ===== 設定 =====
+FETCH_CONCURRENCY = int(os.environ.get("FETCH_CONCURRENCY", "32"))
+FETCH_PER_HOST = int(os.environ.get("FETCH_PER_HOST", "4"))
+FETCH_TIMEOUT = float(os.environ.get("FETCH_TIMEOUT", "20"))  # 1フィードあたりの上限（接続〜本文受信まで）
+FETCH_CONNECT_TIMEOUT = 5.0
+FEED_MAX_BYTES = int(os.environ.get("FEED_MAX_BYTES", str(5 * 1024 * 1024)))  # 展開後のサイズ上限
+DNS_CACHE_TTL = int(os.environ.get("DNS_CACHE_TTL", "300"))
+
+
+class FeedTooLarge(Exception):
+    pass
+
+
+class Fetched(NamedTuple):
+    body: Optional[bytes]  # None = 304 Not Modified
+    etag: Optional[str]
+    last_modified: Optional[str]
+
+# ===== DNSキャッシュ =====
+class DNSCache:
+    """
+    名前解決結果を TTL 付きで覚える。同一ホストの多数フィード（CDN配下など）で名前解決を1回に抑える。
+    socket.getaddrinfo は差し替えず、cached_transport で作った httpx の接続だけが使う
+    （同じプロセスの Notion / DeepL / X への requests 呼び出しには影響しない）
+    """
+
+    def __init__(self, ttl: int = DNS_CACHE_TTL, resolver=socket.getaddrinfo):
+        self.ttl = ttl
+        self._resolver = resolver
+        self._cache: Dict[Tuple[str, int], Tuple[float, List[str]]] = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, host: str, port: int) -> List[str]:
+        """host → IPアドレスのリスト（解決順・重複なし）。失敗は socket.gaierror のまま上げる"""
+        key = (host, port)
+        now = time.monotonic()
+        with self._lock:
+            hit = self._cache.get(key)
+        if hit and now - hit[0] < self.ttl:
+            return hit[1]
+        infos = self._resolver(host, port, type=socket.SOCK_STREAM)
+        addresses = list(dict.fromkeys(info[4][0] for info in infos))
+        with self._lock:
+            self._cache[key] = (now, addresses)
+        return addresses
+
+
+class _CachedDNSBackend(httpcore.AsyncNetworkBackend):
+    """httpcore の接続先ホストを DNSCache で解決してから繋ぐ（TLS の SNI / 証明書検証は元のホスト名のまま）"""
+
+    def __init__(self, dns: DNSCache):
+        self._dns = dns
+        self._inner = httpcore.AnyIOBackend()
+
+    async def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        try:
+            ipaddress.ip_address(host)
+            addresses = [host]
+        except ValueError:
+            try:
+                addresses = await asyncio.to_thread(self._dns.resolve, host, port)
+            except OSError as e:
+                raise httpcore.ConnectError(str(e)) from e
+        last: Optional[Exception] = None
+        for address in addresses:  # IPv6 / IPv4 の片方だけ繋がらないホスト向けに順に試す
+            try:
+                return await self._inner.connect_tcp(address, port, timeout=timeout, local_address=local_address,
+                                                     socket_options=socket_options)
+            except (httpcore.ConnectError, httpcore.ConnectTimeout) as e:
+                last = e
+        raise last or httpcore.ConnectError(f"no address for {host}")
+
+    async def connect_unix_socket(self, path, timeout=None, socket_options=None):
+        return await self._inner.connect_unix_socket(path, timeout=timeout, socket_options=socket_options)
+
+    async def sleep(self, seconds: float) -> None:
+        await self._inner.sleep(seconds)
+
+
+class _CachedDNSTransport(httpx.AsyncHTTPTransport):
+    def __init__(self, dns: DNSCache, http2: bool, limits: httpx.Limits):
+        super().__init__(http2=http2, limits=limits)
+        self._pool = httpcore.AsyncConnectionPool(
+            ssl_context=httpx.create_ssl_context(),
+            max_connections=limits.max_connections,
+            max_keepalive_connections=limits.max_keepalive_connections,
+            keepalive_expiry=limits.keepalive_expiry,
+            http2=http2,
+            network_backend=_CachedDNSBackend(dns),
+        )
+
+
+def cached_transport(limits: httpx.Limits, dns: Optional[DNSCache] = None,
+                     http2: bool = HTTP2) -> httpx.AsyncHTTPTransport:
+    """名前解決を DNSCache 経由にした httpx.AsyncClient 用トランスポート（AsyncClient(transport=...) に渡す）"""
+    return _CachedDNSTransport(dns or DNSCache(), http2, limits)
+
+# ===== 取得 =====
+async def _get(client: httpx.AsyncClient, url: str, headers: Dict[str, str], validators: tuple,
+               max_bytes: int) -> Fetched:
+    etag, last_modified = validators
+    async with client.stream("GET", url, headers=headers) as res:
+        if res.status_code == 304 and headers:
+            return Fetched(None, res.headers.get("etag") or etag, res.headers.get("last-modified") or last_modified)
+        res.raise_for_status()
+        length = res.headers.get("content-length")
+        if length and length.isdigit() and int(length) > max_bytes:
+            raise FeedTooLarge(f"content-length {length} > {max_bytes}")
+        chunks, size = [], 0
+        async for chunk in res.aiter_bytes():
+            size += len(chunk)
+            if size > max_bytes:
+                raise FeedTooLarge(f"body exceeds {max_bytes} bytes")
+            chunks.append(chunk)
+        return Fetched(b"".join(chunks), res.headers.get("etag"), res.headers.get("last-modified"))
+
+
+async def _fetch_one(client: httpx.AsyncClient, url: str, host_limits: Dict[str, asyncio.Semaphore],
+                     overall: asyncio.Semaphore, max_bytes: int, validators: Optional[tuple] = None) -> Fetched:
+    """
+    1フィード取得。FETCH_TIMEOUT（遅い応答を少しずつ送り続けるサーバー対策の1フィード上限）は
+    同時接続の空き待ちを含めず、枠を取ってから数える
+    """
+    parts = urlsplit(url)
+    if parts.scheme in ("", "file"):
+        body = await asyncio.wait_for(asyncio.to_thread(fetch_feed_bytes, url), FETCH_TIMEOUT)
+        return Fetched(body, None, None)
+
+    # 前回の ETag / Last-Modified があれば条件付き GET（変化なしなら 304 で本文を受け取らない）
+    headers = {}
+    etag, last_modified = validators or (None, None)
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    host = parts.hostname or ""
+    sem = host_limits.setdefault(host, asyncio.Semaphore(FETCH_PER_HOST))
+    # ホストの枠を先に取る（同じホストの順番待ちで全体の枠を塞がない）
+    async with sem, overall:
+        return await asyncio.wait_for(_get(client, url, headers, (etag, last_modified), max_bytes), FETCH_TIMEOUT)
+
+
+async def _fetch_all(urls: Sequence[str], total_timeout: Optional[float], max_bytes: int,
+                     validators: Optional[Dict[str, tuple]] = None):
+    timeout = httpx.Timeout(FETCH_TIMEOUT, connect=FETCH_CONNECT_TIMEOUT)
+    limits = httpx.Limits(max_connections=FETCH_CONCURRENCY, max_keepalive_connections=FETCH_CONCURRENCY)
+    headers = {"User-Agent": USER_AGENT, "Accept-Encoding": ACCEPT_ENCODING}
+    host_limits: Dict[str, asyncio.Semaphore] = {}
+    overall = asyncio.Semaphore(FETCH_CONCURRENCY)
+
+    async with httpx.AsyncClient(transport=cached_transport(limits), timeout=timeout, headers=headers,
+                                 follow_redirects=True) as client:
+        tasks = {url: asyncio.ensure_future(_fetch_one(client, url, host_limits, overall, max_bytes,
+                                                       (validators or {}).get(url)))
+                 for url in dict.fromkeys(urls)}
+        done, pending = await asyncio.wait(tasks.values(), timeout=total_timeout)
+        for t in pending:
+            t.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    results, errors = {}, {}
+    for url, task in tasks.items():
+        if task in pending:
+            errors[url] = "deadline"
+        elif task.exception():
+            exc = task.exception()
+            detail = str(exc).splitlines()[0] if str(exc) else ""
+            errors[url] = f"{type(exc).__name__}: {detail}" if detail else type(exc).__name__
+        else:
+            results[url] = task.result()
+    return results, errors
+
+
+def fetch_all(urls: Sequence[str], total_timeout: Optional[float] = None,
+              max_bytes: int = FEED_MAX_BYTES) -> Tuple[List[Tuple[str, bytes]], Dict[str, str]]:
+    """
+    複数フィードを並行取得（HTTP/2 多重化・gzip/br・ホスト単位の同時接続上限・DNSキャッシュ）。
+    戻り値: ([(URL, 本文), ...], {失敗URL: 理由})。本文はそのまま parse_many に渡せる
+    """
+    if not urls:
+        return [], {}
+    results, errors = asyncio.run(_fetch_all(urls, total_timeout, max_bytes))
+    return [(url, r.body) for url, r in results.items()], errors
+
+
+def fetch_conditional(urls: Sequence[str], validators: Dict[str, tuple], total_timeout: Optional[float] = None,
+                      max_bytes: int = FEED_MAX_BYTES) -> Tuple[Dict[str, Fetched], Dict[str, str]]:
+    """
+    fetch_all の条件付き GET 版。validators は {URL: (ETag, Last-Modified)}（前回の応答ヘッダ）。
+    戻り値: ({URL: Fetched}, {失敗URL: 理由})。304 のフィードは body が None
+    """
+    if not urls:
+        return {}, {}
+    return asyncio.run(_fetch_all(urls, total_timeout, max_bytes, validators))
+
+
+if __name__ == "__main__":
+    # 使い方: python scripts/feed_fetch.py <feed_url> [...]
+    if len(sys.argv) < 2:
+        print("usage: feed_fetch.py <feed_url> [...]", file=sys.stderr)
+        sys.exit(2)
+    start = time.perf_counter()
+    blobs, errors = fetch_all(sys.argv[1:])
+    for url, data in blobs:
+        print(f"OK   {len(data):>9,} bytes  {url}")
+    for url, reason in errors.items():
+        print(f"NG   {reason}  {url}")
+    print(f"{len(blobs)}/{len(blobs) + len(errors)} feeds in {time.perf_counter() - start:.2f}s (http2={HTTP2}, {ACCEPT_ENCODING})")
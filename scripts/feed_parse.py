@@ -0,0 +1,110 @@
+import os
+import re
+import sys
+import time
+import calendar
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+from urllib.request import url2pathname
+
+import requests
+import feedparser
+
+# ===== 設定 =====
+PARSE_WORKERS = int(os.environ.get("PARSE_WORKERS", "0")) or os.cpu_count() or 1
+PARSE_POOL_MIN_FEEDS = 4  # これ未満のフィード数ならプロセス起動コストの方が高いので同一プロセスで解析
+USER_AGENT = "notion-x-mvp/1.0 (feed)"
+FEED_SPLIT_RE = re.compile(r"[\s,]+")
+
+
+class EntryRecord(NamedTuple):
+    """後段で使う項目だけを持つ軽量なエントリ（FeedParserDict は持ち回らない）"""
+    title: str
+    link: str
+    summary: str
+    published: Optional[int]  # UNIX秒（UTC）
+    updated: Optional[int]
+    guid: str
+
+
+def feed_urls(value: str) -> List[str]:
+    """RSS_URL は1件でも、空白/カンマ区切りの複数件でもよい"""
+    return [u for u in FEED_SPLIT_RE.split(value or "") if u]
+
+
+def fetch_feed_bytes(url: str, timeout: int = 30) -> bytes:
+    """フィード本文を取得（file:// やローカルパスも可）"""
+    parts = urlsplit(url)
+    if parts.scheme in ("", "file"):
+        with open(url2pathname(parts.path) if parts.scheme else url, "rb") as f:
+            return f.read()
+    res = requests.get(url, headers={"User-Agent": USER_AGENT}, timeout=timeout)
+    res.raise_for_status()
+    return res.content
+
+
+def _epoch(parsed) -> Optional[int]:
+    return calendar.timegm(parsed) if parsed else None
+
+
+def parse_feed_bytes(data: bytes, base_url: str = "") -> List[EntryRecord]:
+    """フィード本文を解析して EntryRecord のリストを返す（ワーカープロセスで実行される）"""
+    feed = feedparser.parse(data, response_headers={"content-location": base_url} if base_url else None)
+    records = []
+    for entry in getattr(feed, "entries", []):
+        records.append(EntryRecord(
+            title=entry.get("title", "") or "",
+            link=entry.get("link", "") or "",
+            summary=entry.get("summary", "") or "",
+            published=_epoch(entry.get("published_parsed")),
+            updated=_epoch(entry.get("updated_parsed")),
+            guid=entry.get("id", "") or "",
+        ))
+    return records
+
+
+def _parse_job(job: Tuple[str, bytes]) -> List[EntryRecord]:
+    url, data = job
+    return parse_feed_bytes(data, url)
+
+
+def parse_many(blobs: Sequence[Tuple[str, bytes]], workers: int = PARSE_WORKERS) -> Dict[str, List[EntryRecord]]:
+    """複数フィードをプロセスプールで並列解析。戻り値は {フィードURL: [EntryRecord, ...]}"""
+    if workers <= 1 or len(blobs) < PARSE_POOL_MIN_FEEDS:
+        return {url: parse_feed_bytes(data, url) for url, data in blobs}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = pool.map(_parse_job, blobs, chunksize=max(1, len(blobs) // (workers * 4)))
+        return {url: records for (url, _), records in zip(blobs, results)}
+
+# ===== ベンチ（CLI）=====
+def synthetic_feed(n_entries: int, seed: int = 0) -> bytes:
+    items = "".join(
+        f"<item><title>Story {seed}-{i} &amp; more</title><link>https://example.com/{seed}/{i}</link>"
+        f"<guid>https://example.com/{seed}/{i}</guid><pubDate>Mon, 06 Jan 2025 10:{i % 60:02d}:00 GMT</pubDate>"
+        f"<description>&lt;p&gt;Summary for story {i} with &lt;b&gt;markup&lt;/b&gt; to sanitize.&lt;/p&gt;</description></item>"
+        for i in range(n_entries)
+    )
+    return f'<?xml version="1.0" encoding="utf-8"?><rss version="2.0"><channel><title>s{seed}</title>{items}</channel></rss>'.encode()
+
+
+def bench(feeds: int = 64, entries: int = 100, worker_counts: Iterable[int] = ()) -> None:
+    blobs = [(f"https://example.com/feed/{i}", synthetic_feed(entries, i)) for i in range(feeds)]
+    base = None
+    for w in worker_counts or sorted({1, 2, 4, os.cpu_count() or 1}):
+        start = time.perf_counter()
+        result = parse_many(blobs, workers=w)
+        elapsed = time.perf_counter() - start
+        total = sum(len(r) for r in result.values())
+        base = base or elapsed
+        print(f"workers={w}: {total / elapsed:,.0f} entries/s ({feeds / elapsed:,.1f} feeds/s, speedup x{base / elapsed:.2f})")
+
+
+if __name__ == "__main__":
+    # 使い方: python scripts/feed_parse.py bench [フィード数] [1フィードあたり件数]
+    if len(sys.argv) > 1 and sys.argv[1] == "bench":
+        args = [int(a) for a in sys.argv[2:4]]
+        bench(*args)
+    else:
+        print("usage: feed_parse.py bench [feeds] [entries]", file=sys.stderr)
+        sys.exit(2)
@@ -0,0 +1,359 @@
+import os
+import sys
+import gzip
+import json
+import time
+import base64
+import shutil
+import tempfile
+import threading
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import state_store
+from feed_parse import EntryRecord, parse_many
+
+try:
+    import zstandard  # 無ければ gzip で保存する
+    CODEC = "zst"
+except ImportError:
+    zstandard = None
+    CODEC = "gz"
+
+# ===== 設定 =====
+# 取得したフィード本文と解析済みエントリを STATE_DIR/archive/ に追記専用で保存し、
+# 後から同じ入力で取り込み処理（重複除外・ルール・翻訳計画など）を再実行できるようにする。
+# - セグメント: 1回の取り込み（実行 / WebSub の受信バッチ）= 1ファイル。レコードごとに独立した
+#   zstd フレーム（gzip メンバー）として連結するので、索引の offset から1件だけ読み出せる
+# - 索引: archive.sqlite3（セグメント一覧と各レコードの位置・フィード・取得時刻）
+# - 保持: FETCH_ARCHIVE_DAYS 日 / 合計 FETCH_ARCHIVE_MAX_BYTES を超えた古いセグメントから削除
+# CI では STATE_DIR ごと actions/cache で毎回復元・保存するため既定は無効。調査時に有効にし、
+# 上限も数MB に抑えている（長く残す場合は別の STATE_DIR を指定した実行で使う）
+FETCH_ARCHIVE = os.environ.get("FETCH_ARCHIVE", "0").lower() in {"1", "true", "yes"}
+ARCHIVE_DIR = "archive"
+ARCHIVE_DB = "archive.sqlite3"
+ARCHIVE_DAYS = int(os.environ.get("FETCH_ARCHIVE_DAYS", "14"))
+ARCHIVE_MAX_BYTES = int(os.environ.get("FETCH_ARCHIVE_MAX_BYTES", str(8 * 1024 * 1024)))
+ZSTD_LEVEL = int(os.environ.get("FETCH_ARCHIVE_ZSTD_LEVEL", "6"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS segments (
+    name TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    closed_at REAL,
+    records INTEGER NOT NULL DEFAULT 0,
+    bytes INTEGER NOT NULL DEFAULT 0,
+    raw_bytes INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS records (
+    id INTEGER PRIMARY KEY,
+    segment TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    feed TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    entries INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS records_segment ON records (segment, offset);
+CREATE INDEX IF NOT EXISTS records_feed ON records (feed, fetched_at);
+"""
+
+
+class ArchivedFetch(NamedTuple):
+    segment: str
+    feed: str
+    fetched_at: float
+    body: bytes
+    entries: List[EntryRecord]
+
+
+def _compress(data: bytes, codec: str) -> bytes:
+    if codec == "zst":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return gzip.compress(data, compresslevel=6, mtime=0)
+
+
+def _decompress(data: bytes, codec: str) -> bytes:
+    if codec == "zst":
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read .zst segments")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+def _codec_of(segment: str) -> str:
+    return segment.rsplit(".", 1)[-1]
+
+
+def encode_record(feed: str, body: bytes, entries: Sequence[EntryRecord], fetched_at: float) -> bytes:
+    record = {"feed": feed, "ts": round(fetched_at, 3), "entries": [list(e) for e in entries]}
+    try:
+        record["body"] = body.decode("utf-8")
+    except UnicodeDecodeError:
+        record["body_b64"] = base64.b64encode(body).decode("ascii")  # UTF-8 以外はそのまま残す
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def decode_record(segment: str, data: bytes) -> ArchivedFetch:
+    r = json.loads(data)
+    body = r["body"].encode("utf-8") if "body" in r else base64.b64decode(r["body_b64"])
+    return ArchivedFetch(segment, r["feed"], r["ts"], body, [EntryRecord(*e) for e in r["entries"]])
+
+
+class FetchArchive:
+    """取得結果の追記専用アーカイブ（書き込みはスレッドセーフ）"""
+
+    def __init__(self, conn, root: str, codec: str = CODEC):
+        conn.executescript(SCHEMA)
+        conn.commit()
+        self.conn = conn
+        self.root = root
+        self.codec = codec
+        self._segment: Optional[str] = None
+        self._f = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, name: str = ARCHIVE_DB) -> "FetchArchive":
+        root = state_store.state_path(ARCHIVE_DIR)
+        os.makedirs(root, exist_ok=True)
+        return cls(state_store.connect(name, check_same_thread=False), root)
+
+    # ----- 書き込み -----
+    def _new_segment(self) -> None:
+        now = time.time()
+        stamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime(now))
+        self._segment = f"{stamp}-{os.getpid()}-{int(now * 1000) % 1000:03d}.jsonl.{self.codec}"
+        self._f = open(os.path.join(self.root, self._segment), "ab")
+        self.conn.execute("INSERT INTO segments (name, created_at) VALUES (?, ?)", (self._segment, now))
+        self.conn.commit()
+
+    def append(self, feed: str, body: bytes, entries: Sequence[EntryRecord], fetched_at: Optional[float] = None) -> None:
+        fetched_at = fetched_at or time.time()
+        raw = encode_record(feed, body, entries, fetched_at)
+        frame = _compress(raw, self.codec)
+        with self._lock:
+            if self._f is None:
+                self._new_segment()
+            offset = self._f.tell()
+            self._f.write(frame)
+            self._f.flush()
+            # 本体を書いてから索引に載せる（途中で落ちても索引は読めるレコードだけを指す）
+            self.conn.execute(
+                "INSERT INTO records (segment, offset, length, feed, fetched_at, entries) VALUES (?, ?, ?, ?, ?, ?)",
+                (self._segment, offset, len(frame), feed, fetched_at, len(entries)),
+            )
+            self.conn.execute(
+                "UPDATE segments SET records = records + 1, bytes = bytes + ?, raw_bytes = raw_bytes + ? WHERE name = ?",
+                (len(frame), len(raw), self._segment),
+            )
+            self.conn.commit()
+
+    def append_run(self, blobs: Sequence[Tuple[str, bytes]], parsed: Dict[str, List[EntryRecord]],
+                   fetched_at: Optional[float] = None) -> None:
+        """1回分の取得結果（fetch_all の blobs と parse_many の結果）を1セグメントに保存"""
+        for feed, body in blobs:
+            self.append(feed, body, parsed.get(feed, []), fetched_at)
+        self.seal()
+
+    def seal(self) -> None:
+        """書き込み中のセグメントを閉じる（次の append で新しいセグメントを作る）"""
+        with self._lock:
+            if self._f is None:
+                return
+            self._f.close()
+            self._f = None
+            self.conn.execute("UPDATE segments SET closed_at = ? WHERE name = ?", (time.time(), self._segment))
+            self.conn.commit()
+            self._segment = None
+
+    def close(self) -> None:
+        self.seal()
+        self.enforce_retention()
+        self.conn.close()
+
+    # ----- 保持期間 -----
+    def enforce_retention(self, days: int = ARCHIVE_DAYS, max_bytes: int = ARCHIVE_MAX_BYTES) -> int:
+        """期限切れ・容量超過の古いセグメントを削除（閉じたものだけが対象）。削除数を返す"""
+        rows = self.conn.execute(
+            "SELECT name, created_at, bytes FROM segments WHERE closed_at IS NOT NULL ORDER BY created_at"
+        ).fetchall()
+        total = self.conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM segments").fetchone()[0]
+        cutoff = time.time() - days * 86400
+        removed = 0
+        for name, created_at, size in rows:
+            if created_at >= cutoff and total <= max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.root, name))
+            except FileNotFoundError:
+                pass
+            self.conn.execute("DELETE FROM records WHERE segment = ?", (name,))
+            self.conn.execute("DELETE FROM segments WHERE name = ?", (name,))
+            total -= size
+            removed += 1
+        self.conn.commit()
+        return removed
+
+    # ----- 読み出し -----
+    def segments(self, since: Optional[float] = None, until: Optional[float] = None) -> List[str]:
+        return [name for (name,) in self.conn.execute(
+            "SELECT name FROM segments WHERE closed_at IS NOT NULL AND created_at >= ? AND created_at < ?"
+            " ORDER BY created_at",
+            (since or 0, until or float("inf")),
+        )]
+
+    def read_segment(self, segment: str) -> Iterator[ArchivedFetch]:
+        """セグメントを先頭から順に読む（フレームの境界は索引から取る）"""
+        codec = _codec_of(segment)
+        rows = self.conn.execute(
+            "SELECT offset, length FROM records WHERE segment = ? ORDER BY offset", (segment,)
+        ).fetchall()
+        with open(os.path.join(self.root, segment), "rb") as f:
+            for offset, length in rows:
+                f.seek(offset)
+                yield decode_record(segment, _decompress(f.read(length), codec))
+
+    def history(self, feed: str, limit: int = 10) -> Iterator[ArchivedFetch]:
+        """あるフィードの直近の取得結果（新しい順）"""
+        rows = self.conn.execute(
+            "SELECT segment, offset, length FROM records WHERE feed = ? ORDER BY fetched_at DESC LIMIT ?",
+            (feed, limit),
+        ).fetchall()
+        for segment, offset, length in rows:
+            with open(os.path.join(self.root, segment), "rb") as f:
+                f.seek(offset)
+                yield decode_record(segment, _decompress(f.read(length), _codec_of(segment)))
+
+    def stats(self) -> Dict[str, float]:
+        segments, records, size, raw = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(records), 0), COALESCE(SUM(bytes), 0), COALESCE(SUM(raw_bytes), 0)"
+            " FROM segments"
+        ).fetchone()
+        return {"segments": segments, "records": records, "bytes": size, "raw_bytes": raw,
+                "ratio": raw / size if size else 0.0}
+
+
+# ===== リプレイ =====
+class OfflineIngest:
+    """
+    ネットワーク無しで to_articles → ingest_articles を回す（Notion 登録は件数だけ数え、翻訳は原文のまま）。
+    重複判定・キューは state_dir（既定は一時ディレクトリ）に作るので本番のステートは汚さない。
+    リプレイと負荷試験（feed_farm_mock.py）で使う
+    """
+
+    def __init__(self, state_dir: Optional[str] = None, translate: bool = False):
+        for key in ("NOTION_API_KEY", "NOTION_DATABASE_ID", "SLACK_WEBHOOK_URL"):
+            os.environ.setdefault(key, "offline")
+        self.scratch = state_dir or tempfile.mkdtemp(prefix="offline-")
+        self._owns_scratch = state_dir is None
+        state_store.STATE_DIR = self.scratch
+        # notion_insert は環境変数を import 時に読むのでここで読み込む
+        from deepl_budget import TranslationBudget
+        from near_dup import NearDupIndex
+        from notion_insert import ingest_articles, open_budget, to_articles, translate_articles
+        from url_canon import Canonicalizer
+
+        self._ingest, self._to_articles = ingest_articles, to_articles
+        self.index, self.canonicalizer = NearDupIndex.open(), Canonicalizer()
+        self.budget = open_budget() if translate else TranslationBudget(None)
+        self.translate = translate_articles if translate else (lambda entries, plans, target, budget: list(entries))
+        self.inserted = 0
+
+    def _insert(self, article, lang):
+        self.inserted += 1
+        return f"offline-{self.inserted}"
+
+    def __call__(self, parsed: Dict[str, List[EntryRecord]], fetched_at: Optional[float] = None):
+        """1回分の解析結果を流す。戻り値は (記事数, IngestResult)"""
+        from resilience import Deadline
+        articles = self._to_articles(parsed, self.canonicalizer, fetched_at)
+        result = self._ingest(articles, set(), self.index, self.budget, deadline=Deadline(None),
+                              insert=self._insert, translate=self.translate, enrich=False)
+        return len(articles), result
+
+    def close(self) -> None:
+        if self._owns_scratch:
+            shutil.rmtree(self.scratch, ignore_errors=True)
+
+
+def replay(archive: FetchArchive, since: Optional[float] = None, until: Optional[float] = None,
+           reparse: bool = False, translate: bool = False, state_dir: Optional[str] = None) -> Dict[str, float]:
+    """
+    アーカイブから取り込み処理を再実行する（ネットワーク無し・待ち無し）。
+    セグメント（=当時の1回分）ごとに流す。reparse=True なら保存済みエントリではなく本文を解析し直す（パーサ変更の確認用）
+    """
+    pipeline = OfflineIngest(state_dir, translate)
+    totals = {"segments": 0, "feeds": 0, "entries": 0, "inserted": 0, "duplicates": 0,
+              "near_duplicates": 0, "filtered": 0}
+    start = time.perf_counter()
+    try:
+        for segment in archive.segments(since, until):
+            fetches = list(archive.read_segment(segment))
+            if not fetches:
+                continue
+            if reparse:
+                parsed = parse_many([(f.feed, f.body) for f in fetches])
+            else:
+                parsed = {}
+                for f in fetches:
+                    parsed.setdefault(f.feed, []).extend(f.entries)
+            n, result = pipeline(parsed, fetches[0].fetched_at)
+            totals["segments"] += 1
+            totals["feeds"] += len(fetches)
+            totals["entries"] += n
+            for key in ("inserted", "duplicates", "near_duplicates", "filtered"):
+                totals[key] += getattr(result, key)
+    finally:
+        pipeline.close()
+    elapsed = time.perf_counter() - start
+    totals["elapsed"] = elapsed
+    totals["entries_per_sec"] = totals["entries"] / elapsed if elapsed else 0.0
+    return totals
+
+
+def _since(value: str) -> float:
+    """"3"（日前）または "2025-01-06"（UTC）"""
+    try:
+        return time.time() - float(value) * 86400
+    except ValueError:
+        return time.mktime(time.strptime(value, "%Y-%m-%d")) - time.timezone
+
+
+if __name__ == "__main__":
+    # 使い方:
+    #   python scripts/fetch_archive.py stats
+    #   python scripts/fetch_archive.py replay [--since 3|2025-01-06] [--until ...] [--reparse] [--translate] [--state DIR]
+    #   python scripts/fetch_archive.py history <フィードURL> [件数]
+    #   python scripts/fetch_archive.py prune
+    args = sys.argv[1:]
+    if args[:1] == ["stats"]:
+        archive = FetchArchive.open()
+        s = archive.stats()
+        print(f"{s['segments']} segments / {s['records']} fetches / {s['bytes'] / 1e6:.1f} MB"
+              f" (raw {s['raw_bytes'] / 1e6:.1f} MB, x{s['ratio']:.1f}, write codec {CODEC})")
+    elif args[:1] == ["replay"]:
+        opts = {"since": None, "until": None, "state": None}
+        for flag in ("--since", "--until", "--state"):
+            if flag in args:
+                i = args.index(flag)
+                opts[flag[2:]] = args[i + 1]
+        archive = FetchArchive.open()
+        totals = replay(
+            archive,
+            since=_since(opts["since"]) if opts["since"] else None,
+            until=_since(opts["until"]) if opts["until"] else None,
+            reparse="--reparse" in args,
+            translate="--translate" in args,
+            state_dir=opts["state"],
+        )
+        print(", ".join(f"{k}={v:.1f}" if isinstance(v, float) else f"{k}={v}" for k, v in totals.items()))
+    elif args[:1] == ["history"] and len(args) in (2, 3):
+        for f in FetchArchive.open().history(args[1], int(args[2]) if len(args) == 3 else 10):
+            print(f"{time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(f.fetched_at))}Z  {len(f.body):>8} bytes"
+                  f"  {len(f.entries):>4} entries  {f.segment}")
+    elif args[:1] == ["prune"]:
+        print(f"removed {FetchArchive.open().enforce_retention()} segments")
+    else:
+        print("usage: fetch_archive.py stats | replay [--since D] [--until D] [--reparse] [--translate] [--state DIR]"
+              " | history <feed> [n] | prune", file=sys.stderr)
+        sys.exit(2)
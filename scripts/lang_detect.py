@@ -0,0 +1,153 @@
+import re
+import sys
+import time
+from typing import Optional, Tuple
+
+# ===== 文字種（Unicodeブロック）判定 =====
+# 非ラテン文字は文字種の比率でほぼ確定できる。ラテン文字のみ機能語/文字n-gramで判定する。
+KANA_RE = re.compile(r"[぀-ヿㇰ-ㇿｦ-ﾟ]")
+HANGUL_RE = re.compile(r"[가-힯ᄀ-ᇿ㄰-㆏]")
+HAN_RE = re.compile(r"[㐀-䶿一-鿿豈-﫿]")
+CYRILLIC_RE = re.compile(r"[Ѐ-ӿ]")
+GREEK_RE = re.compile(r"[Ͱ-Ͽ]")
+ARABIC_RE = re.compile(r"[؀-ۿ]")
+THAI_RE = re.compile(r"[฀-๿]")
+NON_LATIN_RE = re.compile(r"[Ͱ-ϿЀ-ӿ؀-ۿ฀-๿ᄀ-ᇿ぀-ヿ㄰-㆏ㇰ-ㇿ㐀-䶿一-鿿가-힯豈-﫿ｦ-ﾟ]")
+LATIN_RE = re.compile(r"[A-Za-zÀ-ɏ]")
+WORD_RE = re.compile(r"[^\W\d_]+")
+SCRIPTS = (("ko", HANGUL_RE), ("zh", HAN_RE), ("ru", CYRILLIC_RE), ("el", GREEK_RE), ("ar", ARABIC_RE), ("th", THAI_RE))
+
+# ===== ラテン文字用の小さなモデル（機能語 unigram ＋ 特徴的な文字 n-gram）=====
+FUNCTION_WORDS = {
+    "en": {"the", "and", "of", "to", "in", "is", "for", "on", "with", "as", "at", "by", "from", "after", "over", "new", "says", "are", "was", "be"},
+    "fr": {"le", "la", "les", "des", "et", "est", "une", "du", "pour", "dans", "sur", "au", "aux", "qui", "que", "pas", "avec", "un", "se"},
+    "de": {"der", "die", "das", "und", "ist", "nicht", "mit", "für", "den", "ein", "eine", "im", "auf", "von", "zu", "dem", "sich", "bei", "nach"},
+    "es": {"el", "la", "los", "las", "de", "y", "que", "en", "por", "con", "una", "para", "del", "se", "al", "más", "tras", "sobre", "es"},
+    "it": {"il", "lo", "gli", "della", "di", "che", "per", "non", "con", "una", "del", "alla", "sono", "nel", "dopo", "è", "le", "dei"},
+    "pt": {"o", "os", "as", "do", "da", "dos", "das", "em", "que", "para", "com", "um", "uma", "não", "no", "na", "ao", "é", "por"},
+    "nl": {"de", "het", "een", "en", "van", "is", "niet", "op", "dat", "voor", "met", "zijn", "bij", "na", "ook", "wordt", "naar"},
+}
+CHAR_NGRAMS = {
+    "en": ("th", "wh", "ing", "ght", "ould"),
+    "fr": ("é", "è", "ê", "ç", "eau", "oux", "ait"),
+    "de": ("ß", "ä", "ö", "ü", "sch", "cht", "ung"),
+    "es": ("ñ", "ción", "¿", "¡", "ía", "ó"),
+    "it": ("zione", "gli", "cch", "ò", "ù"),
+    "pt": ("ão", "õe", "ç", "ção", "nh", "lh"),
+    "nl": ("ij", "aa", "oo", "uu", "sch", "ee"),
+}
+# 全言語の n-gram を1本の正規表現にまとめ、1パスで集計する
+NGRAM_LANGS = {}
+for _lang, _grams in CHAR_NGRAMS.items():
+    for _g in _grams:
+        NGRAM_LANGS.setdefault(_g, []).append(_lang)
+NGRAM_RE = re.compile("|".join(re.escape(g) for g in sorted(NGRAM_LANGS, key=len, reverse=True)))
+
+
+# DeepL の source_lang に渡せる言語のうち、この判定器が返しうるもの（ko/ar/th は自動判定に任せる）
+DEEPL_SOURCE_LANGS = {"ja", "zh", "ru", "el", "en", "fr", "de", "es", "it", "pt", "nl"}
+MIN_FUNCTION_WORDS = 2  # 機能語の一致がこれ未満なら確定しない
+MIN_LATIN_SHARE = 0.9  # 文字のうちラテン文字がこれ未満なら（他の文字種が混じる）確定しない
+
+
+def _detect_latin(text: str) -> Tuple[Optional[str], bool]:
+    lower = text.lower()
+    words = set(WORD_RE.findall(lower))
+    best, best_score, tie = None, 0, False
+    for lang, vocab in FUNCTION_WORDS.items():
+        score = len(words & vocab)
+        if score > best_score:
+            best, best_score, tie = lang, score, False
+        elif score and score == best_score:
+            tie = True
+    if best and not tie:
+        sure = best_score >= MIN_FUNCTION_WORDS
+        if sure and not text.isascii():
+            letters = sum(len(w) for w in words)
+            sure = len(LATIN_RE.findall(" ".join(words))) >= letters * MIN_LATIN_SHARE
+        return best, sure
+
+    # 機能語で決まらない短い見出しは文字n-gramで推定（英語の見出しが nl になる等、確定には使わない）
+    scores = {}
+    for g in NGRAM_RE.findall(lower):
+        for lang in NGRAM_LANGS[g]:
+            scores[lang] = scores.get(lang, 0) + 1
+    return (max(scores, key=scores.get) if scores else None), False
+
+
+def detect(text: str) -> Tuple[Optional[str], bool]:
+    """
+    (言語コード, 確定したか)。言語コードは DeepL の小文字コード相当（ja/zh/ko/ru/el/ar/th/en/fr/de/es/it/pt/nl）、
+    判定できない場合は None。確定扱いは仮名・文字種の比率・機能語の複数一致で決まった時だけで、
+    文字n-gram の推定、仮名の無い漢字のみの文（和文の可能性がある）、他の文字種が混じるラテン文字判定は推定止まり
+    """
+    if not text:
+        return None, False
+    m = None if text.isascii() else NON_LATIN_RE.search(text)
+    if not m:
+        return _detect_latin(text)
+    if KANA_RE.search(text, m.start()):
+        return "ja", True
+
+    # 最初に現れた非ラテン文字の文字種が、ラテン文字に対して一定比率以上なら確定
+    latin = len(LATIN_RE.findall(text))
+    for lang, pattern in SCRIPTS:
+        if pattern.match(text, m.start()):
+            count = len(pattern.findall(text, m.start()))
+            if count / (count + latin) > 0.3:
+                return lang, lang != "zh"
+            break
+    return _detect_latin(text)[0], False
+
+
+def detect_language(text: str) -> Optional[str]:
+    """推定した言語コード（確定かどうかは問わない。判定できない場合は None）"""
+    return detect(text)[0]
+
+
+def needs_translation(text: str, target: str) -> Tuple[bool, Optional[str]]:
+    """
+    (翻訳要否, 原文言語)。確定判定で原文が既に翻訳先言語の時だけ翻訳不要（EN-US 等は地域を無視）。
+    原文言語は確定した時だけ返し、推定止まりなら None（source_lang を付けず DeepL の自動判定に任せる）
+    """
+    lang, sure = detect(text)
+    if not sure:
+        return True, None
+    return lang != target.lower().split("-")[0], lang
+
+
+def deepl_source_lang(lang: Optional[str]) -> Optional[str]:
+    """needs_translation の原文言語 → DeepL の source_lang（付けない場合は None）"""
+    return lang.upper() if lang in DEEPL_SOURCE_LANGS else None
+
+
+def bench(n: int = 200_000) -> float:
+    """見出し相当の文字列で 1秒あたり判定件数を計測"""
+    samples = [
+        "Earthquake hits northern Japan, thousands evacuated",
+        "北海道で地震、数千人が避難",
+        "Le gouvernement annonce une réforme des retraites",
+        "Bundesregierung plant neue Regeln für Mieter",
+        "서울에서 대규모 집회 열려",
+        "中国经济增长放缓",
+        "Elecciones en México: lo que hay que saber",
+        "Россия и Украина обменялись пленными",
+    ]
+    data = (samples * (n // len(samples) + 1))[:n]
+    start = time.perf_counter()
+    for s in data:
+        detect_language(s)
+    return n / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    # 使い方:
+    #   python scripts/lang_detect.py bench
+    #   python scripts/lang_detect.py "判定したい文字列"
+    if len(sys.argv) > 1 and sys.argv[1] == "bench":
+        print(f"{bench():,.0f} strings/s")
+    elif len(sys.argv) > 1:
+        print(detect_language(" ".join(sys.argv[1:])))
+    else:
+        print("usage: lang_detect.py bench | <text>", file=sys.stderr)
+        sys.exit(2)
@@ -0,0 +1,180 @@
+import os
+import sys
+import glob
+import json
+import time
+import uuid
+import threading
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+import state_store
+
+# ===== 設定 =====
+# 記事ごとに trace id を振り、フィード公開 → 取得 → 翻訳 → Notion登録 → 承認 → 投稿 の時刻を
+# STATE_DIR/spans.jsonl に1行1イベントで追記する（{"t": id, "s": 段階, "ts": UNIX秒, ...}）。
+# trace id・公開時刻・取得元フィードは Notion の TraceID / Published / Feed にも保存し（STORE_TRACE=1）、
+# 投稿側はそこから承認・投稿を記録する。
+# 集計は python scripts/lineage.py report（フィード別の p50/p95）。
+SPAN_LOG = "spans.jsonl"
+STAGES = ("published", "fetched", "translated", "inserted", "approved", "posted")
+TRACE_RETENTION_DAYS = int(os.environ.get("TRACE_RETENTION_DAYS", "30"))
+TRACE_MAX_BYTES = int(os.environ.get("TRACE_MAX_BYTES", str(16 * 1024 * 1024)))
+
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+class SpanLog:
+    """追記専用のスパンログ（スレッドセーフ。ファイルは最初の記録時に開く）"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._f = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, name: str = SPAN_LOG) -> "SpanLog":
+        log = cls(state_store.state_path(name))
+        if os.path.exists(log.path) and os.path.getsize(log.path) > TRACE_MAX_BYTES:
+            log.prune(TRACE_RETENTION_DAYS)
+        return log
+
+    def record(self, trace_id: str, stage: str, ts: Optional[float] = None, **attrs) -> None:
+        if not trace_id:
+            return
+        span = {"t": trace_id, "s": stage, "ts": round(ts if ts is not None else time.time(), 3)}
+        span.update({k: v for k, v in attrs.items() if v not in (None, "")})
+        line = json.dumps(span, ensure_ascii=False, separators=(",", ":")) + "\n"
+        with self._lock:
+            if self._f is None:
+                self._f = open(self.path, "a", encoding="utf-8")
+            self._f.write(line)
+            self._f.flush()
+
+    def prune(self, days: int) -> int:
+        """days 日より古いスパンを捨てて書き直す（残した行数を返す）"""
+        cutoff = time.time() - days * 86400
+        kept = [s for s in read_spans([self.path]) if s.get("ts", 0) >= cutoff]
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for s in kept:
+                f.write(json.dumps(s, ensure_ascii=False, separators=(",", ":")) + "\n")
+        with self._lock:
+            if self._f is not None:
+                self._f.close()
+                self._f = None
+            os.replace(tmp, self.path)
+        return len(kept)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._f is not None:
+                self._f.close()
+                self._f = None
+
+
+# ===== 集計 =====
+def span_files(root: str = state_store.STATE_DIR) -> List[str]:
+    """STATE_DIR 配下（シャードのサブディレクトリ含む）のスパンログ"""
+    return sorted(glob.glob(os.path.join(root, "**", SPAN_LOG), recursive=True))
+
+
+def read_spans(paths: Iterable[str]) -> Iterable[dict]:
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue  # 書きかけの行
+
+
+class Trace(NamedTuple):
+    feed: str
+    stages: Dict[str, float]  # 段階 → 最初に記録された時刻
+
+
+def collect(spans: Iterable[dict]) -> Dict[str, Trace]:
+    """trace id ごとに段階の時刻をまとめる（取り込み側・投稿側・各シャードのログを横断して結合）"""
+    traces: Dict[str, Trace] = {}
+    for s in spans:
+        tr = traces.get(s["t"])
+        if tr is None:
+            tr = traces[s["t"]] = Trace(s.get("feed", ""), {})
+        elif not tr.feed and s.get("feed"):
+            tr = traces[s["t"]] = tr._replace(feed=s["feed"])
+        for stage, ts in ((s["s"], s["ts"]), ("published", s.get("published"))):
+            if ts is not None and (stage not in tr.stages or ts < tr.stages[stage]):
+                tr.stages[stage] = ts
+    return traces
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """最近傍順位法のパーセンタイル（q は 0〜100）"""
+    if not values:
+        return None
+    values = sorted(values)
+    rank = max(1, -(-len(values) * q // 100))
+    return values[int(rank) - 1]
+
+
+def _duration(sec: Optional[float]) -> str:
+    if sec is None:
+        return "-"
+    if sec < 3600:
+        return f"{sec / 60:.0f}m"
+    if sec < 86400:
+        return f"{sec / 3600:.1f}h"
+    return f"{sec / 86400:.1f}d"
+
+
+GAPS = (("published", "fetched"), ("fetched", "inserted"), ("inserted", "approved"), ("approved", "posted"))
+
+
+def report(traces: Dict[str, Trace], since: Optional[float] = None) -> List[str]:
+    """フィード別の公開→投稿（end-to-end）と段階間の p50/p95"""
+    by_feed: Dict[str, List[Trace]] = {}
+    for tr in traces.values():
+        if since is not None and tr.stages.get("fetched", tr.stages.get("inserted", 0)) < since:
+            continue
+        by_feed.setdefault(tr.feed or "(unknown)", []).append(tr)
+    by_feed["ALL"] = [tr for trs in by_feed.values() for tr in trs]
+
+    head = ["feed", "items", "posted", "e2e p50", "e2e p95"] + [f"{a[:3]}→{b[:3]} p50/p95" for a, b in GAPS]
+    rows = [head]
+    for feed, trs in sorted(by_feed.items(), key=lambda kv: (kv[0] == "ALL", kv[0])):
+        def gap(a, b):
+            return [tr.stages[b] - tr.stages[a] for tr in trs if a in tr.stages and b in tr.stages]
+        e2e = gap("published", "posted")
+        rows.append([feed, str(len(trs)), str(sum("posted" in tr.stages for tr in trs)),
+                     _duration(percentile(e2e, 50)), _duration(percentile(e2e, 95))]
+                    + [f"{_duration(percentile(g, 50))}/{_duration(percentile(g, 95))}" for g in (gap(a, b) for a, b in GAPS)])
+    widths = [max(len(r[i]) for r in rows) for i in range(len(head))]
+    return ["  ".join(c.ljust(w) for c, w in zip(r, widths)) for r in rows]
+
+
+if __name__ == "__main__":
+    # 使い方:
+    #   python scripts/lineage.py report [日数] [spans.jsonl ...]   # 既定は直近7日・STATE_DIR 配下すべて
+    #   python scripts/lineage.py prune [日数]
+    #   python scripts/lineage.py show <trace_id>
+    if len(sys.argv) >= 2 and sys.argv[1] == "report":
+        days = float(sys.argv[2]) if len(sys.argv) > 2 else 7
+        paths = sys.argv[3:] or span_files()
+        print("\n".join(report(collect(read_spans(paths)), since=time.time() - days * 86400)))
+    elif len(sys.argv) in (2, 3) and sys.argv[1] == "prune":
+        days = int(sys.argv[2]) if len(sys.argv) == 3 else TRACE_RETENTION_DAYS
+        print(f"kept {SpanLog.open().prune(days)} spans")
+    elif len(sys.argv) == 3 and sys.argv[1] == "show":
+        tr = collect(s for s in read_spans(span_files()) if s["t"] == sys.argv[2]).get(sys.argv[2])
+        if tr is None:
+            print("not found", file=sys.stderr)
+            sys.exit(1)
+        print(f"feed: {tr.feed}")
+        for stage in STAGES:
+            if stage in tr.stages:
+                print(f"{stage:<10} {time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(tr.stages[stage]))}Z")
+    else:
+        print("usage: lineage.py report [days] [files...] | prune [days] | show <trace_id>", file=sys.stderr)
+        sys.exit(2)
@@ -0,0 +1,225 @@
+import os
+import time
+import hashlib
+import tempfile
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Optional
+from urllib.parse import urljoin
+
+import requests
+from bs4 import BeautifulSoup
+from PIL import Image
+
+import state_store
+
+# ===== 設定 =====
+MEDIA_DB = "media.sqlite3"
+MEDIA_DIR = "media"
+USER_AGENT = "notion-x-mvp/1.0 (media)"
+PREFETCH_WORKERS = int(os.environ.get("IMAGE_PREFETCH_WORKERS", "4"))
+RESIZE_CONCURRENCY = int(os.environ.get("IMAGE_RESIZE_CONCURRENCY", "2"))  # 同時デコード数＝メモリ上限
+MAX_HTML_BYTES = 1_000_000
+MAX_SOURCE_BYTES = 15_000_000
+MAX_DIMENSION = 2048
+MAX_UPLOAD_BYTES = 5_000_000  # X の画像上限
+MAX_PIXELS = 50_000_000
+OG_CACHE_TTL = 7 * 24 * 3600
+# 縮小済み画像（STATE_DIR/media）は作成から MEDIA_RETENTION_DAYS 日で消し、合計が MEDIA_MAX_BYTES を超えたら古い順に消す
+MEDIA_RETENTION_SEC = float(os.environ.get("MEDIA_RETENTION_DAYS", "14")) * 86400
+MEDIA_MAX_BYTES = int(os.environ.get("MEDIA_MAX_BYTES", str(500_000_000)))
+ORPHAN_GRACE_SEC = 3600  # DB に無いファイル（書き込み途中・中断の残り）はこれより古いものだけ消す
+
+Image.MAX_IMAGE_PIXELS = MAX_PIXELS
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS og (page_url TEXT PRIMARY KEY, image_url TEXT, fetched_at REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS images (image_url TEXT PRIMARY KEY, sha256 TEXT NOT NULL, created_at REAL NOT NULL);
+"""
+
+
+def _read_limited(res: requests.Response, limit: int, sink) -> int:
+    """レスポンスを上限バイトまでストリームで書き出す（超過時は例外）"""
+    total = 0
+    for chunk in res.iter_content(64 * 1024):
+        total += len(chunk)
+        if total > limit:
+            raise ValueError(f"response too large (> {limit} bytes)")
+        sink.write(chunk)
+    return total
+
+
+def find_og_image(session: requests.Session, page_url: str) -> Optional[str]:
+    """記事ページの og:image（無ければ twitter:image）の絶対URL"""
+    with session.get(page_url, timeout=15, stream=True) as res:
+        res.raise_for_status()
+        buf = tempfile.SpooledTemporaryFile(max_size=MAX_HTML_BYTES)
+        _read_limited(res, MAX_HTML_BYTES, buf)
+    buf.seek(0)
+    soup = BeautifulSoup(buf.read(), "html.parser")
+    for attr, name in (("property", "og:image"), ("name", "twitter:image"), ("property", "twitter:image")):
+        tag = soup.find("meta", attrs={attr: name})
+        if tag and tag.get("content"):
+            return urljoin(page_url, tag["content"].strip())
+    return None
+
+
+def shrink_image(src, dst_path: str) -> None:
+    """長辺 MAX_DIMENSION 以内・MAX_UPLOAD_BYTES 以下の JPEG に縮小・再圧縮"""
+    with Image.open(src) as img:
+        # JPEG は draft でデコード時点から縮小してメモリを抑える
+        img.draft("RGB", (MAX_DIMENSION, MAX_DIMENSION))
+        img = img.convert("RGB")
+        img.thumbnail((MAX_DIMENSION, MAX_DIMENSION))
+        for quality in (85, 75, 65, 50):
+            img.save(dst_path, "JPEG", quality=quality, optimize=True)
+            if os.path.getsize(dst_path) <= MAX_UPLOAD_BYTES:
+                return
+    raise ValueError("image too large after recompression")
+
+
+class MediaCache:
+    """og:image の解決結果と縮小済み画像（内容アドレス）を保持"""
+
+    def __init__(self, conn):
+        conn.executescript(SCHEMA)
+        self.conn = conn
+        self.lock = threading.Lock()
+        self.dir = state_store.state_path(MEDIA_DIR)
+        os.makedirs(self.dir, exist_ok=True)
+
+    @classmethod
+    def open(cls, name: str = MEDIA_DB) -> "MediaCache":
+        return cls(state_store.connect(name, check_same_thread=False))
+
+    def path_for(self, sha256: str) -> str:
+        return os.path.join(self.dir, f"{sha256}.jpg")
+
+    def get_og(self, page_url: str):
+        with self.lock:
+            row = self.conn.execute("SELECT image_url, fetched_at FROM og WHERE page_url = ?", (page_url,)).fetchone()
+        if row and time.time() - row[1] < OG_CACHE_TTL:
+            return row
+        return None
+
+    def put_og(self, page_url: str, image_url: Optional[str]) -> None:
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO og VALUES (?, ?, ?)", (page_url, image_url, time.time()))
+            self.conn.commit()
+
+    def get_image(self, image_url: str) -> Optional[str]:
+        with self.lock:
+            row = self.conn.execute("SELECT sha256 FROM images WHERE image_url = ?", (image_url,)).fetchone()
+        if row and os.path.exists(self.path_for(row[0])):
+            return self.path_for(row[0])
+        return None
+
+    def put_image(self, image_url: str, sha256: str) -> None:
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO images VALUES (?, ?, ?)", (image_url, sha256, time.time()))
+            self.conn.commit()
+
+    def purge(self, older_than: float = MEDIA_RETENTION_SEC, max_bytes: int = MEDIA_MAX_BYTES) -> int:
+        """期限切れ・容量超過の画像と、どの行からも参照されないファイルを消す。消したファイル数を返す"""
+        now = time.time()
+        with self.lock:
+            self.conn.execute("DELETE FROM og WHERE fetched_at < ?", (now - OG_CACHE_TTL,))
+            self.conn.execute("DELETE FROM images WHERE created_at < ?", (now - older_than,))
+            # 新しい順に max_bytes まで残す（同じ画像を複数の URL が指していれば1つと数える）
+            keep, total = set(), 0
+            for sha256, _ in self.conn.execute(
+                "SELECT sha256, MAX(created_at) AS at FROM images GROUP BY sha256 ORDER BY at DESC"
+            ).fetchall():
+                path = self.path_for(sha256)
+                size = os.path.getsize(path) if os.path.exists(path) else 0
+                if total + size > max_bytes:
+                    self.conn.execute("DELETE FROM images WHERE sha256 = ?", (sha256,))
+                    continue
+                total += size
+                keep.add(sha256)
+            self.conn.commit()
+
+        removed = 0
+        for name in os.listdir(self.dir):
+            path = os.path.join(self.dir, name)
+            if os.path.splitext(name)[0] in keep:
+                continue
+            try:
+                if now - os.path.getmtime(path) < ORPHAN_GRACE_SEC:
+                    continue
+                os.remove(path)
+                removed += 1
+            except OSError:
+                pass
+        return removed
+
+
+class ImagePrefetcher:
+    """投稿より先に記事画像を並列で取得・縮小しておく"""
+
+    def __init__(self, cache: Optional[MediaCache] = None, workers: int = PREFETCH_WORKERS):
+        self.cache = cache or MediaCache.open()
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.resize_slots = threading.BoundedSemaphore(RESIZE_CONCURRENCY)
+        self.futures: Dict[str, Future] = {}
+        self._lock = threading.Lock()  # futures は POST_WORKERS の各スレッドから触る
+        self.local = threading.local()
+
+    def _session(self) -> requests.Session:
+        if not hasattr(self.local, "session"):
+            self.local.session = requests.Session()
+            self.local.session.headers["User-Agent"] = USER_AGENT
+        return self.local.session
+
+    def submit(self, page_url: str) -> Optional[Future]:
+        if not page_url:
+            return None
+        with self._lock:
+            if page_url not in self.futures:
+                self.futures[page_url] = self.pool.submit(self._prepare, page_url)
+            return self.futures[page_url]
+
+    def result(self, page_url: str, timeout: float = 60) -> Optional[str]:
+        """縮小済み画像のパス（画像無し・失敗時は None）"""
+        future = self.submit(page_url)
+        if future is None:
+            return None
+        try:
+            return future.result(timeout=timeout)
+        except Exception as e:
+            print(f"[WARN] image prefetch failed: {page_url} ({e})")
+            return None
+
+    def _prepare(self, page_url: str) -> Optional[str]:
+        session = self._session()
+        cached = self.cache.get_og(page_url)
+        image_url = cached[0] if cached else find_og_image(session, page_url)
+        if not cached:
+            self.cache.put_og(page_url, image_url)
+        if not image_url:
+            return None
+
+        path = self.cache.get_image(image_url)
+        if path:
+            return path
+
+        with tempfile.SpooledTemporaryFile(max_size=1_000_000) as src:
+            with session.get(image_url, timeout=20, stream=True) as res:
+                res.raise_for_status()
+                _read_limited(res, MAX_SOURCE_BYTES, src)
+            src.seek(0)
+            tmp_path = os.path.join(self.cache.dir, f".tmp-{threading.get_ident()}.jpg")
+            with self.resize_slots:
+                shrink_image(src, tmp_path)
+
+        digest = hashlib.sha256()
+        with open(tmp_path, "rb") as f:
+            for chunk in iter(lambda: f.read(64 * 1024), b""):
+                digest.update(chunk)
+        sha256 = digest.hexdigest()
+        os.replace(tmp_path, self.cache.path_for(sha256))
+        self.cache.put_image(image_url, sha256)
+        return self.cache.path_for(sha256)
+
+    def close(self) -> None:
+        self.pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,284 @@
+import os
+import re
+import sys
+import json
+import time
+import html
+import random
+import struct
+import hashlib
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import state_store
+
+# ===== 設定 =====
+# MinHash（64パーミュテーション）を 4行×16バンドの LSH で索引する。
+# バンド一致で候補を引き、推定Jaccardがしきい値以上なら近似重複とみなす。
+NEAR_DUP_THRESHOLD = float(os.environ.get("NEAR_DUP_THRESHOLD", "0.7"))
+NEAR_DUP_DB = "near_dup.sqlite3"
+# これより前に登録した記事はインデックスから消す（取り込みの実行ごと。URL の重複は Notion 側でも判定する）
+NEAR_DUP_RETENTION_SEC = float(os.environ.get("NEAR_DUP_RETENTION_DAYS", "30")) * 86400
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+
+_rnd = random.Random(20240601)  # 実行間で同じ関数族を使うため固定シード
+PERMUTATIONS = [(_rnd.randrange(1, MERSENNE_PRIME), _rnd.randrange(0, MERSENNE_PRIME)) for _ in range(NUM_PERM)]
+SIG_STRUCT = struct.Struct(f"<{NUM_PERM}I")
+EMPTY_SIG = tuple([MAX_HASH] * NUM_PERM)  # 比べる語が無い記事（どれも同じ値になるので近似判定に使わない）
+
+TAG_RE = re.compile(r"<[^>]+>")
+WORD_RE = re.compile(r"\w+")
+STOPWORDS = {
+    "a", "an", "the", "of", "to", "in", "on", "for", "and", "or", "is", "are",
+    "was", "were", "be", "by", "at", "as", "with", "from", "that", "this", "it",
+    "its", "has", "have", "after", "says", "said",
+}
+
+# ===== 正規化・シグネチャ =====
+def normalize_text(text: str) -> str:
+    """HTMLタグ除去・実体参照展開・NFKC・小文字化"""
+    text = TAG_RE.sub(" ", text or "")
+    text = html.unescape(text)
+    return unicodedata.normalize("NFKC", text).lower()
+
+
+def shingles(title: str, summary: str = "") -> set:
+    """英数字は単語単位、CJKなど空白の無い文字列は文字bigramに分割"""
+    tokens = set()
+    for run in WORD_RE.findall(normalize_text(f"{title} {summary}")):
+        if run.isascii():
+            if run not in STOPWORDS:
+                tokens.add(run)
+        elif len(run) == 1:
+            tokens.add(run)
+        else:
+            tokens.update(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def minhash(title: str, summary: str = "") -> Tuple[int, ...]:
+    """タイトル＋要約の MinHash シグネチャ（32bit × NUM_PERM）"""
+    hashes = [
+        int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "little")
+        for s in shingles(title, summary)
+    ]
+    if not hashes:
+        return EMPTY_SIG
+    return tuple(
+        min(((a * h + b) % MERSENNE_PRIME) & MAX_HASH for h in hashes)
+        for a, b in PERMUTATIONS
+    )
+
+
+def similarity(sig_a: Sequence[int], sig_b: Sequence[int]) -> float:
+    """シグネチャ一致率＝推定Jaccard"""
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / NUM_PERM
+
+
+def band_keys(sig: Sequence[int]) -> List[int]:
+    """バンドごとのバケットキー（SQLiteの符号付き64bitに収まる63bit）"""
+    keys = []
+    for i in range(BANDS):
+        raw = struct.pack(f"<B{ROWS}I", i, *sig[i * ROWS:(i + 1) * ROWS])
+        keys.append(int.from_bytes(hashlib.blake2b(raw, digest_size=8).digest(), "little") >> 1)
+    return keys
+
+# ===== 永続インデックス =====
+class NearDupIndex:
+    """MinHash-LSH の永続インデックス（SQLite）"""
+
+    def __init__(self, conn, threshold: float = NEAR_DUP_THRESHOLD):
+        self.conn = conn
+        self.threshold = threshold
+        self._batch: List[Tuple[Tuple[int, ...], str]] = []
+        self._batch_buckets: Dict[int, List[int]] = {}  # バンドキー → _batch の添字（今回バッチ分の LSH）
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS minhash ("
+            " id INTEGER PRIMARY KEY, url TEXT NOT NULL, sig BLOB NOT NULL, created_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE TABLE IF NOT EXISTS lsh (key INTEGER NOT NULL, doc_id INTEGER NOT NULL)")
+        conn.execute("CREATE INDEX IF NOT EXISTS lsh_key ON lsh (key)")
+        conn.execute("CREATE INDEX IF NOT EXISTS minhash_url ON minhash (url)")
+        conn.execute("CREATE INDEX IF NOT EXISTS lsh_doc ON lsh (doc_id)")
+        conn.commit()
+
+    @classmethod
+    def open(cls, name: str = NEAR_DUP_DB) -> "NearDupIndex":
+        return cls(state_store.connect(name))
+
+    def find(self, sig: Sequence[int]) -> Optional[str]:
+        """しきい値以上に似た既存記事があればそのURLを返す（今回バッチ分も含む）"""
+        if tuple(sig) == EMPTY_SIG:
+            return None
+        keys = band_keys(sig)
+        # 今回バッチ分も LSH で候補を絞る（全件と比べるとバッチ件数の2乗になる）
+        for i in sorted({i for k in keys for i in self._batch_buckets.get(k, ())}):
+            other, url = self._batch[i]
+            if similarity(sig, other) >= self.threshold:
+                return url
+        rows = self.conn.execute(
+            "SELECT url, sig FROM minhash WHERE id IN"
+            f" (SELECT doc_id FROM lsh WHERE key IN ({','.join('?' * BANDS)}))",
+            keys,
+        )
+        for url, blob in rows:
+            if similarity(sig, SIG_STRUCT.unpack(blob)) >= self.threshold:
+                return url
+        return None
+
+    def reserve(self, sig: Sequence[int], url: str) -> None:
+        """今回の実行内での重複判定用に保持（永続化はしない）"""
+        if tuple(sig) == EMPTY_SIG:
+            return
+        for k in band_keys(sig):
+            self._batch_buckets.setdefault(k, []).append(len(self._batch))
+        self._batch.append((tuple(sig), url))
+
+    def clear_batch(self) -> None:
+        """バッチ単位の保持分を捨てる（登録済みのものは add 済みなので永続側で引ける）"""
+        self._batch.clear()
+        self._batch_buckets.clear()
+
+    def has_url(self, url: str) -> bool:
+        """登録済みURLか（バックフィルで過去チャンク分をメモリに持たずに判定する）"""
+        return self.conn.execute("SELECT 1 FROM minhash WHERE url = ? LIMIT 1", (url,)).fetchone() is not None
+
+    def add(self, sig: Sequence[int], url: str) -> None:
+        cur = self.conn.execute(
+            "INSERT INTO minhash (url, sig, created_at) VALUES (?, ?, ?)",
+            (url, SIG_STRUCT.pack(*sig), time.time()),
+        )
+        if tuple(sig) != EMPTY_SIG:
+            # 空シグネチャは URL だけ残す（同じバケットに溜まるだけで引かれることは無い）
+            self.conn.executemany(
+                "INSERT INTO lsh (key, doc_id) VALUES (?, ?)",
+                [(k, cur.lastrowid) for k in band_keys(sig)],
+            )
+        self.conn.commit()
+
+    def count(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM minhash").fetchone()[0]
+
+    def purge(self, older_than: float = NEAR_DUP_RETENTION_SEC) -> int:
+        """older_than 秒より前に登録した記事のシグネチャとバケットを消す"""
+        cutoff = time.time() - older_than
+        self.conn.execute("DELETE FROM lsh WHERE doc_id IN (SELECT id FROM minhash WHERE created_at < ?)", (cutoff,))
+        n = self.conn.execute("DELETE FROM minhash WHERE created_at < ?", (cutoff,)).rowcount
+        self.conn.commit()
+        return n
+
+
+def drop_near_duplicates(articles, index: NearDupIndex):
+    """
+    翻訳前の記事から近似重複を除外する。タイトル・要約に語が無い記事は判定せず残す。
+    戻り値: ([(残す記事, シグネチャ), ...], [(除外記事, 重複元URL), ...])
+    シグネチャは登録成功後に index.add する
+    """
+    index.clear_batch()
+    kept, dropped = [], []
+    for a in articles:
+        sig = minhash(a.title, a.summary)
+        dup_of = index.find(sig)
+        if dup_of:
+            dropped.append((a, dup_of))
+            continue
+        index.reserve(sig, a.url)
+        kept.append((a, sig))
+    return kept, dropped
+
+# ===== 評価・ベンチ（CLI）=====
+def evaluate(pairs: Iterable[dict], thresholds=(0.5, 0.6, 0.7, 0.8, 0.9)) -> Dict[float, Dict[str, float]]:
+    """
+    ラベル付きペア {"a": {...}, "b": {...}, "duplicate": bool} で
+    しきい値ごとの precision / recall を計算
+    """
+    scored = []
+    for p in pairs:
+        a, b = p["a"], p["b"]
+        s = similarity(minhash(a.get("title", ""), a.get("summary", "")),
+                       minhash(b.get("title", ""), b.get("summary", "")))
+        scored.append((s, bool(p["duplicate"])))
+
+    report = {}
+    for t in thresholds:
+        tp = sum(1 for s, y in scored if s >= t and y)
+        fp = sum(1 for s, y in scored if s >= t and not y)
+        fn = sum(1 for s, y in scored if s < t and y)
+        report[t] = {
+            "precision": tp / (tp + fp) if tp + fp else 1.0,
+            "recall": tp / (tp + fn) if tp + fn else 1.0,
+            "pairs": len(scored),
+        }
+    return report
+
+
+def _bench_text(rnd: random.Random, vocab: List[str], words: int = 24) -> List[str]:
+    return [rnd.choice(vocab) for _ in range(words)]
+
+
+def bench(n: int = 100_000, lookups: int = 10_000, edits: int = 2) -> Dict[str, float]:
+    """
+    n件の合成記事（語彙からランダムに選んだ見出し＋要約）を入れた一時インデックスで検索を計測する。
+    検索の半分は既存記事の語を edits 語だけ差し替えた近似重複（検出率）、残り半分は新しい記事（誤検出率）
+    """
+    import sqlite3
+    conn = sqlite3.connect(":memory:")
+    index = NearDupIndex(conn)
+    rnd = random.Random(0)
+    vocab = [f"w{i}" for i in range(20_000)]
+    texts, docs, lsh = [], [], []
+    for i in range(n):
+        words = _bench_text(rnd, vocab)
+        sig = minhash(" ".join(words[:8]), " ".join(words[8:]))
+        texts.append(words)
+        docs.append((i + 1, f"https://example.com/{i}", SIG_STRUCT.pack(*sig), 0.0))
+        lsh.extend((k, i + 1) for k in band_keys(sig))
+    conn.executemany("INSERT INTO minhash (id, url, sig, created_at) VALUES (?, ?, ?, ?)", docs)
+    conn.executemany("INSERT INTO lsh (key, doc_id) VALUES (?, ?)", lsh)
+    conn.commit()
+
+    probes = []
+    for j in range(lookups):
+        if j % 2 == 0:
+            words = list(texts[rnd.randrange(n)])
+            for _ in range(edits):
+                words[rnd.randrange(len(words))] = rnd.choice(vocab)
+        else:
+            words = _bench_text(rnd, vocab)
+        probes.append((minhash(" ".join(words[:8]), " ".join(words[8:])), j % 2 == 0))
+    hits = false_hits = 0
+    start = time.perf_counter()
+    for sig, duplicate in probes:
+        found = index.find(sig) is not None
+        hits += found and duplicate
+        false_hits += found and not duplicate
+    elapsed = time.perf_counter() - start
+    dups = (lookups + 1) // 2
+    return {
+        "signatures": n,
+        "lookups": lookups,
+        "avg_ms": elapsed / lookups * 1000,
+        "recall": hits / dups if dups else 0.0,
+        "false_positive_rate": false_hits / (lookups - dups) if lookups > dups else 0.0,
+    }
+
+
+if __name__ == "__main__":
+    # 使い方:
+    #   python scripts/near_dup.py eval labeled.jsonl
+    #   python scripts/near_dup.py bench [件数]
+    cmd = sys.argv[1] if len(sys.argv) > 1 else ""
+    if cmd == "eval" and len(sys.argv) > 2:
+        with open(sys.argv[2], encoding="utf-8") as f:
+            result = evaluate(json.loads(line) for line in f if line.strip())
+        for t, r in result.items():
+            print(f"threshold>={t:.1f}: precision={r['precision']:.3f} recall={r['recall']:.3f} (pairs={r['pairs']})")
+    elif cmd == "bench":
+        print(bench(int(sys.argv[2]) if len(sys.argv) > 2 else 100_000))
+    else:
+        print("usage: near_dup.py eval <labeled.jsonl> | bench [n]", file=sys.stderr)
+        sys.exit(2)
@@ -1,30 +1,86 @@
 import os
-import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import NamedTuple
+from urllib.parse import urlsplit
+
 import requests
-import feedparser
-from deep_translator import DeeplTranslator
+
+from deepl_budget import TranslationBudget
+from entry_versions import CHANGE_DETECTION, EntryVersions
+from feed_fetch import fetch_all, fetch_conditional
+from fetch_archive import FETCH_ARCHIVE, FetchArchive
+from feed_parse import feed_urls, parse_many
+from article_extract import ENRICH_SUMMARIES, ExtractCache, enrich_summaries
+from lang_detect import deepl_source_lang, needs_translation
+from lineage import SpanLog, new_trace_id
+from near_dup import NearDupIndex, drop_near_duplicates
+from poll_schedule import ADAPTIVE_POLLING, PollSchedule
+from records import Article
+from resilience import CircuitOpenError, Deadline, DeadlineExceeded, breaker
+from rules import RuleEngine, apply_rules
+from seen_filter import SEEN_FILTER, SeenUrls
+from translate_router import TranslateRouter
+from tweet_compose import compose_tweet
+from url_canon import Canonicalizer, canonicalize_url
+from websub import SubscriptionStore
 
 # ===== 環境変数（Secrets） =====
 NOTION_API_KEY = os.environ["NOTION_API_KEY"]
 NOTION_DATABASE_ID = os.environ["NOTION_DATABASE_ID"]
-RSS_URL = os.environ["RSS_URL"]
+RSS_URL = os.environ.get("RSS_URL", "")  # バックフィル時は不要
 SLACK_WEBHOOK_URL = os.environ["SLACK_WEBHOOK_URL"]
 DEEPL_API_KEY = os.environ.get("DEEPL_API_KEY", "")
 
-SRC_LANG = "en"
-TGT_LANG = "ja"
+# 翻訳先（カンマ区切りで複数可。取得〜重複除外は1回で、言語ごとに下書きを作る）
+TGT_LANGS = [l.strip() for l in os.environ.get("TGT_LANGS", "ja").split(",") if l.strip()]
+TGT_LANG = TGT_LANGS[0]
+# 下書きに言語（Lang）を保存する（既定は無効）。複数言語で投稿側が POST_LANG で絞り込むなら必須。
+# 存在しないプロパティを送ると Notion は 400 を返すので、先に下書きDBへ列を追加すること:
+#   Lang = セレクト（選択肢は TGT_LANGS の各言語。未登録の値は Notion が自動で追加する）
+STORE_LANG = os.environ.get("STORE_LANG", "0").lower() in {"1", "true", "yes"}
+DEEPL_BATCH_SIZE = 50  # /v2/translate の1リクエストあたり text 上限
+INSERT_CHUNK = DEEPL_BATCH_SIZE  # 翻訳してから Notion へ登録する単位（締切で止まっても訳し損が出ない）
 NOTION_VERSION = "2022-06-28"
+# 投稿文（TweetText / TweetLength / ContentHash）を下書きに保存する（既定は無効）。
+# 存在しないプロパティを送ると Notion は 400 を返すので、有効にする前に下書きDBへ次の列を追加すること:
+#   TweetText = テキスト, TweetLength = 数値, ContentHash = テキスト
+# ContentHash は「組み立て元（Title/Summary/URL）のハッシュ:本文のハッシュ」。投稿側はこれで TweetText の手直しと、
+# 取り込み後の Title/Summary の修正（TweetText は古いまま）を見分ける
+# 追加後に STORE_TWEET_DRAFT=1 を設定する。既存ページは空のままで、投稿側はその場で投稿文を組み立てる
+STORE_TWEET_DRAFT = os.environ.get("STORE_TWEET_DRAFT", "0").lower() in {"1", "true", "yes"}
+# 鮮度計測用の TraceID / Published / Feed を下書きに保存する（既定は無効）。同様に先に列を追加すること:
+#   TraceID = テキスト, Published = 日付, Feed = テキスト（取得元フィード。投稿側の集計をフィード別にする）
+STORE_TRACE = os.environ.get("STORE_TRACE", "0").lower() in {"1", "true", "yes"}
+# 一致したルール名（rules.py の tag / include）を下書きに保存する（既定は無効）。同様に先に列を追加すること:
+#   Rules = マルチセレクト（編集者の絞り込み用。投稿側は Topic が無ければ先頭のルール名をトピックに使う）
+STORE_RULES = os.environ.get("STORE_RULES", "0").lower() in {"1", "true", "yes"}
+FETCH_STAGE_SHARE = 0.3  # 持ち時間のうちフィード取得に使う割合（残りを翻訳・登録に回す）
+SEEN_SYNC_SKEW_SEC = 600  # 既存URLの差分同期で遡る秒数
+ENRICH_STAGE_SHARE = 0.2  # 残り時間のうち本文取得（ENRICH_SUMMARIES）に使う割合
+RESOLVE_STAGE_SHARE = 0.2  # 残り時間のうちリダイレクト解決（RESOLVE_REDIRECTS）に使う割合
+
+# 実行全体の締切（RUN_DEADLINE_SEC）とサービスごとのブレーカー
+DEADLINE = Deadline.from_env()
+RULES = RuleEngine.load()  # RULES_FILE が無ければ None（全件対象）
+NOTION = breaker("notion")
+# DeepL が遅い・落ちている時は副プロバイダ（TRANSLATE_SECONDARY）へヘッジ・切り替え
+ROUTER = TranslateRouter.open(DEEPL_API_KEY) if DEEPL_API_KEY else None
 
 # ===== 関数 =====
-def get_existing_urls():
-    """Notionの下書きDBから既存URL一覧を取得（重複登録防止用）"""
-    url = f"https://api.notion.com/v1/databases/{NOTION_DATABASE_ID}/query"
-    headers = {
+def notion_headers():
+    return {
         "Authorization": f"Bearer {NOTION_API_KEY}",
         "Content-Type": "application/json",
         "Notion-Version": NOTION_VERSION,
     }
-    existing_urls = set()
+
+
+def iter_existing_urls(since=None):
+    """Notionの下書きDBのURLを順に返す（正規化URL）。since（epoch秒）を渡すとそれ以降に作られたページだけ"""
+    url = f"https://api.notion.com/v1/databases/{NOTION_DATABASE_ID}/query"
+    headers = notion_headers()
     has_more = True
     next_cursor = None
 
@@ -32,57 +88,220 @@ def get_existing_urls():
         payload = {}
         if next_cursor:
             payload["start_cursor"] = next_cursor
+        if since:
+            # 時計ずれ・登録の反映遅れの分だけ遡る（重複して足しても Bloom フィルタは変わらない）
+            after = datetime.fromtimestamp(since - SEEN_SYNC_SKEW_SEC, timezone.utc).isoformat()
+            payload["filter"] = {"timestamp": "created_time", "created_time": {"on_or_after": after}}
 
-        res = requests.post(url, headers=headers, json=payload, timeout=30)
-        res.raise_for_status()
+        res = NOTION.request(requests.post, url, headers=headers, json=payload, timeout=DEADLINE.timeout(30))
         data = res.json()
 
         for page in data.get("results", []):
             props = page.get("properties", {})
             url_prop = props.get("URL", {}).get("url")
             if url_prop:
-                existing_urls.add(url_prop)
+                yield canonicalize_url(url_prop)
 
         has_more = data.get("has_more", False)
         next_cursor = data.get("next_cursor")
 
-    return existing_urls
+
+def get_existing_urls():
+    """Notionの下書きDBから既存URL一覧を取得（重複登録防止用、正規化URLで保持）"""
+    return set(iter_existing_urls())
+
+
+def notion_has_url(page_url):
+    """
+    URL プロパティを正規化すると page_url（正規化URL）になるページがあるか（Bloom フィルタがヒットした時の厳密確認）。
+    URL プロパティは元のリンクなので、ホスト＋パスの部分一致で引いてから正規化して比べる
+    """
+    url = f"https://api.notion.com/v1/databases/{NOTION_DATABASE_ID}/query"
+    parts = urlsplit(page_url)
+    needle = parts.netloc + (parts.path if parts.path != "/" else "")
+    payload = {"filter": {"property": "URL", "url": {"contains": needle}}, "page_size": 100}
+    while True:
+        res = NOTION.request(requests.post, url, headers=notion_headers(), json=payload, timeout=DEADLINE.timeout(30))
+        data = res.json()
+        for page in data.get("results", []):
+            if canonicalize_url(page.get("properties", {}).get("URL", {}).get("url")) == page_url:
+                return True
+        if not data.get("has_more"):
+            return False
+        payload["start_cursor"] = data.get("next_cursor")
+
+
+def open_existing_urls(index=None):
+    """
+    filter_new_articles に渡す既存URL集合。SEEN_FILTER 有効時は STATE_DIR の Bloom フィルタ（前回以降の
+    新規ページだけ Notion から追加）で、ヒットした URL だけ近似重複インデックス → Notion の順に確かめる
+    """
+    if not SEEN_FILTER:
+        return get_existing_urls()
+
+    def exact(page_url):
+        if index is not None and index.has_url(page_url):
+            return True
+        try:
+            return notion_has_url(page_url)
+        except Exception as e:
+            # 確かめられない時は登録済み扱い（二重登録より見送りを選ぶ。次回また確認する）
+            print(f"[WARN] Notion URL lookup failed: {page_url} ({e})")
+            return True
+
+    return SeenUrls.open(exact, iter_existing_urls, iter_existing_urls)
 
 
 def filter_new_articles(articles, existing_urls):
-    """既存URLと突き合わせて新規だけ抽出"""
-    return [a for a in articles if a.get("url") and a["url"] not in existing_urls]
+    """既存URLと突き合わせて新規だけ抽出（同一実行内の重複URLも除外）"""
+    seen = set()
+    new_articles = []
+    for a in articles:
+        url = a.url
+        if url and url not in existing_urls and url not in seen:
+            seen.add(url)
+            new_articles.append(a)
+    return new_articles
+
+
+def needs_lang(target):
+    return lambda text: needs_translation(text, target)[0]
+
+
+def translate_batch(texts, target, source, on_primary=None):
+    """同じ原文言語のテキストをまとめて1リクエストで翻訳（translate_router.Routed を返す）"""
+    return ROUTER.translate(texts, target, source, timeout=DEADLINE.timeout(30), on_primary=on_primary)
 
 
-def translate_text(text):
-    """DeepLで翻訳（APIキーが無ければ原文返却）"""
-    if not text:
-        return ""
-    if not DEEPL_API_KEY:
-        return text
-    translator = DeeplTranslator(api_key=DEEPL_API_KEY, source=SRC_LANG, target=TGT_LANG)
-    return translator.translate(text)
+def translate_articles(entries, plans, target, budget):
+    """
+    計画どおりにタイトル/要約を target へ翻訳した Article のリストを返す。
+    原文言語ごとに DEEPL_BATCH_SIZE 件ずつまとめて送る。訳したプロバイダは translated_by に残す。
+    既に翻訳先言語・予算切れ・失敗時は原文のまま（実行は止めない）
+    """
+    fields = [{"title": e.title, "summary": p.summary} for e, p in zip(entries, plans)]
+    providers = [set() for _ in entries]
+    groups = {}
+    if DEEPL_API_KEY:
+        for i, plan in enumerate(plans):
+            for name, wanted in (("title", plan.translate_title), ("summary", plan.translate_summary)):
+                text = fields[i][name]
+                if not wanted or not text:
+                    continue
+                needed, lang = needs_translation(text, target)
+                if needed:
+                    # 原文言語が確定しない時は source_lang を付けず DeepL の自動判定に任せる（None のグループ）
+                    groups.setdefault(deepl_source_lang(lang), []).append((i, name))
 
+    for source, slots in groups.items():
+        for start in range(0, len(slots), DEEPL_BATCH_SIZE):
+            if budget.exhausted:
+                break
+            chunk = slots[start:start + DEEPL_BATCH_SIZE]
+            texts = [fields[i][name] for i, name in chunk]
+            chars = sum(len(t) for t in texts)
 
-def add_to_notion(article):
-    """Notionの下書きDBに登録（Select = draft, Summary 追加）"""
+            def on_primary(ok, chars=chars):
+                # DeepL が訳し終えた分は残量から引く（副が先に返り、DeepL が後から終わった分も含む）。
+                # 副で訳せても DeepL の失敗（クォータ超過など）は連続失敗に数える
+                if ok:
+                    budget.charge(chars)
+                else:
+                    budget.record_failure()
+
+            try:
+                routed = translate_batch(texts, target, source, on_primary)
+            except (CircuitOpenError, DeadlineExceeded):
+                # 遮断中・締切切れは予算の失敗回数に数えず原文で続ける
+                break
+            except Exception as e:
+                # DeepL の失敗は on_primary で数え済み（まだ終わっていなければ終わった時に数える）
+                print(f"[WARN] Translation failed ({target}), using original: {e}")
+                continue
+            for (i, name), text in zip(chunk, routed.texts):
+                fields[i][name] = text
+                providers[i].add(routed.provider)
+
+    return [e.replace(translated_by="+".join(sorted(p)), **f) for e, f, p in zip(entries, fields, providers)]
+
+
+def add_to_notion(article, lang=TGT_LANG):
+    """
+    Notionの下書きDBに登録（Select = draft, Summary 追加）し、作成ページIDを返す。
+    投稿文もここで組み立てて保存し、編集者は実際に投稿される文面を確認できる
+    """
     url = "https://api.notion.com/v1/pages"
-    headers = {
-        "Authorization": f"Bearer {NOTION_API_KEY}",
-        "Content-Type": "application/json",
-        "Notion-Version": NOTION_VERSION,
-    }
+    headers = notion_headers()
     payload = {
         "parent": {"database_id": NOTION_DATABASE_ID},
         "properties": {
-            "Title": {"title": [{"text": {"content": article["title"]}}]},
-            "URL": {"url": article["url"]},
-            "Summary": {"rich_text": [{"text": {"content": article.get("summary", "")}}]},
+            "Title": {"title": [{"text": {"content": article.title}}]},
+            "URL": {"url": article.link or article.url},
+            "Summary": {"rich_text": [{"text": {"content": article.summary}}]},
             "Select": {"select": {"name": "draft"}},
         },
     }
-    res = requests.post(url, headers=headers, json=payload, timeout=30)
-    res.raise_for_status()
+    if STORE_RULES and article.tags:
+        # 一致したルール名（編集者の絞り込み用）
+        payload["properties"]["Rules"] = {"multi_select": [{"name": t} for t in article.tags]}
+    if STORE_TRACE and article.trace_id:
+        payload["properties"]["TraceID"] = {"rich_text": [{"text": {"content": article.trace_id}}]}
+        if article.feed:
+            payload["properties"]["Feed"] = {"rich_text": [{"text": {"content": article.feed}}]}
+        if article.published:
+            published = datetime.fromtimestamp(article.published, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+            payload["properties"]["Published"] = {"date": {"start": published}}
+    if STORE_LANG:
+        # 言語別の下書き（投稿側は POST_LANG で絞り込む）
+        payload["properties"]["Lang"] = {"select": {"name": lang}}
+    if STORE_TWEET_DRAFT:
+        tweet = compose_tweet(article.title, article.summary, article.link or article.url)
+        payload["properties"].update({
+            "TweetText": {"rich_text": [{"text": {"content": tweet.text}}]},
+            "TweetLength": {"number": tweet.length},
+            "ContentHash": {"rich_text": [{"text": {"content": tweet.draft_hash}}]},
+        })
+    res = NOTION.request(requests.post, url, headers=headers, json=payload, timeout=DEADLINE.timeout(30))
+    return res.json().get("id")
+
+
+def update_notion_page(page_id, article, title=True, summary=True):
+    """既存の下書きページのうち変わった項目（と投稿文）だけ PATCH する"""
+    url = f"https://api.notion.com/v1/pages/{page_id}"
+    properties = {}
+    if title:
+        properties["Title"] = {"title": [{"text": {"content": article.title}}]}
+    if summary:
+        properties["Summary"] = {"rich_text": [{"text": {"content": article.summary}}]}
+    if STORE_TWEET_DRAFT:
+        tweet = compose_tweet(article.title, article.summary, article.link or article.url)
+        properties.update({
+            "TweetText": {"rich_text": [{"text": {"content": tweet.text}}]},
+            "TweetLength": {"number": tweet.length},
+            "ContentHash": {"rich_text": [{"text": {"content": tweet.draft_hash}}]},
+        })
+    NOTION.request(requests.patch, url, headers=notion_headers(), json={"properties": properties},
+                   timeout=DEADLINE.timeout(30))
+
+
+class PageState(NamedTuple):
+    status: str  # Select（draft / approved ...）
+    posted: bool
+    title: str  # ページ上の現在の文面（編集者が直していればその文面）
+    summary: str
+
+
+def get_notion_page(page_id):
+    """下書きページの現在の状態（変更を反映する前に、承認・投稿済みか・編集者が書き換えたかを確かめる）"""
+    res = NOTION.request(requests.get, f"https://api.notion.com/v1/pages/{page_id}", headers=notion_headers(),
+                         timeout=DEADLINE.timeout(30))
+    props = res.json().get("properties", {})
+    return PageState(
+        status=((props.get("Select") or {}).get("select") or {}).get("name", ""),
+        posted=bool((props.get("Posted") or {}).get("checkbox")),
+        title="".join(t.get("plain_text", "") for t in (props.get("Title") or {}).get("title", [])),
+        summary="".join(t.get("plain_text", "") for t in (props.get("Summary") or {}).get("rich_text", [])),
+    )
 
 
 def notify_slack(message):
@@ -92,36 +311,292 @@ def notify_slack(message):
     res.raise_for_status()
 
 
-def main():
-    try:
-        # RSS取得
-        feed = feedparser.parse(RSS_URL)
-        articles = []
-        for entry in getattr(feed, "entries", []):
-            title_raw = getattr(entry, "title", "") or ""
-            link = getattr(entry, "link", "") or ""
-            summary_raw = getattr(entry, "summary", "") if hasattr(entry, "summary") else ""
-
-            if not title_raw or not link:
+def to_articles(parsed, canonicalizer, fetched_at=None):
+    """解析結果 {フィードURL: [EntryRecord]} を Article に変換（タイトル/リンク無しは捨てる）"""
+    fetched_at = fetched_at or time.time()
+    articles = []
+    for feed_url, records in parsed.items():
+        for r in records:
+            if not r.title or not r.link:
+                continue
+            # 重複判定キーは正規化URL、NotionのURLプロパティには元のリンクを保存する
+            articles.append(Article(
+                title=r.title,
+                url=canonicalizer.canonical(r.link),
+                link=r.link,
+                summary=r.summary,
+                published=r.published or r.updated,
+                guid=r.guid,
+                feed=feed_url,
+                fetched_at=fetched_at,
+            ))
+    return articles
+
+
+class IngestResult(NamedTuple):
+    inserted: int
+    duplicates: int  # URL重複
+    near_duplicates: int
+    failed: int  # Notion登録失敗
+    deferred: int  # 締切・遮断で今回は見送り（次回再取得）
+    filtered: int  # ルールで除外（翻訳・登録しない）
+    updated: int = 0  # 登録済みエントリの見出し・要約の変更を下書きへ反映
+
+
+def update_changed(changes, versions, budget, deadline=DEADLINE, translate=translate_articles,
+                   patch=update_notion_page, enrich=ENRICH_SUMMARIES, read_page=get_notion_page):
+    """
+    内容が変わった登録済みエントリ（entry_versions.Change）の、変わった項目だけ翻訳し直して下書きへ PATCH する。
+    下書きのまま（未承認・未投稿）のページで、前回書き込んだ文面から編集者が直していない項目だけが対象。
+    それ以外の項目は前回の文面を残す（翻訳も予算も使わない）。反映できたエントリ数を返す
+    """
+    # ページの現状を確かめて、言語ごとの更新対象（項目）を決める
+    targets = []  # (エントリ番号, 言語, PageVersion, PageState, タイトル更新, 要約更新)
+    for n, change in enumerate(changes):
+        for lang, page in versions.pages(change.article.url).items():
+            if lang not in TGT_LANGS:
+                continue
+            if not deadline.can_start() or NOTION.state == "open":
+                break
+            try:
+                state = read_page(page.page_id)
+            except (CircuitOpenError, DeadlineExceeded):
+                break
+            except Exception as e:
+                print(f"[WARN] Notion page read failed ({lang}): {change.article.url} ({e})")
                 continue
+            title = change.title and state.title == page.title
+            summary = change.summary and state.summary == page.summary
+            if state.posted or state.status != "draft" or not (title or summary):
+                # 承認・投稿に進んだ / 編集者が直した項目は触らない。ハッシュだけ進めて次回以降は検出しない
+                # （文面は前回書き込んだものを残すので、編集済みの項目は以後も上書き対象にならない）
+                versions.record(change.article, lang, page.page_id, page.title, page.summary)
+                continue
+            targets.append((n, lang, page, state, title, summary))
+    if not targets:
+        return 0
+
+    entries = [c.article for c in changes]
+    if enrich:
+        thin = [entries[n] for n in sorted({t[0] for t in targets if t[5]})]
+        try:
+            limit = deadline.stage(ENRICH_STAGE_SHARE).limit()
+            enriched = {e.url: e.summary for e in enrich_summaries(thin, total_timeout=limit)}
+        except Exception as e:
+            print(f"[WARN] summary enrichment failed: {e}")
+            enriched = {}
+        entries = [e.replace(summary=enriched.get(e.url, e.summary)) for e in entries]
+    # 更新しない項目は空にして計画・翻訳の対象から外す
+    translated = {}
+    for lang in TGT_LANGS:
+        wanted = {n: (title, summary) for n, l, _, _, title, summary in targets if l == lang}
+        if not wanted:
+            continue
+        picked = sorted(wanted)
+        subset = [entries[n].replace(title=entries[n].title if wanted[n][0] else "",
+                                     summary=entries[n].summary if wanted[n][1] else "") for n in picked]
+        plans = budget.plan(subset, needs=needs_lang(lang))
+        translated[lang] = dict(zip(picked, translate(subset, plans, lang, budget)))
+
+    updated = set()
+    for n, lang, page, state, title, summary in targets:
+        if not deadline.can_start() or NOTION.state == "open":
+            break
+        fresh = translated[lang][n]
+        # 更新しない項目はページ上の現在の文面（投稿文の組み立て用）
+        article = fresh.replace(title=fresh.title if title else state.title,
+                                summary=fresh.summary if summary else state.summary)
+        try:
+            patch(page.page_id, article, title, summary)
+        except (CircuitOpenError, DeadlineExceeded):
+            break
+        except Exception as e:
+            print(f"[WARN] Notion update failed ({lang}): {changes[n].article.url} ({e})")
+            continue
+        versions.record(changes[n].article, lang, page.page_id, article.title if title else page.title,
+                        article.summary if summary else page.summary)
+        updated.add(n)
+    return len(updated)
+
+
+def ingest_articles(articles, existing_urls, index, budget, deadline=DEADLINE, rules=RULES, spans=None,
+                    insert=add_to_notion, translate=translate_articles, enrich=ENRICH_SUMMARIES, versions=None,
+                    patch=update_notion_page, read_page=get_notion_page, detect_changes=CHANGE_DETECTION):
+    """
+    重複除外 → ルール判定 →（要約が短い記事の本文取得）→ 翻訳 → Notion登録。
+    投稿側は Notion の承認差分だけを見て自分の post キューへ積む（取り込み側はキューを持たない）。
+    翻訳は INSERT_CHUNK 件ずつ登録の直前に行い、締切・遮断で見送る記事の分は DeepL の残量を使わない。
+    spans（SpanLog）を渡すと記事ごとに trace id を振って各段階の時刻を記録する（バックフィルでは渡さない）。
+    versions（EntryVersions）には言語別の作成ページを記録し、一部の言語しか登録できなかった記事は既存扱いにせず
+    次回残りの言語だけ登録する。detect_changes なら登録済み URL の見出し・要約の変更を検出し、新規登録の後で
+    既存ページへ反映する（下書きのままで編集者が直していない項目だけ）。
+    insert / translate はアーカイブのリプレイ（fetch_archive.py）でネットワーク無しに差し替える
+    """
+    # 追跡中の URL は内容ハッシュだけで判定（変化なしは既存URLの照会もしない）
+    changes = []
+    if versions is not None and detect_changes:
+        untracked, changes = versions.split(articles)
+    else:
+        untracked = articles
+    # URL完全一致 → ルール（キーワード/正規表現）→ 近似重複（MinHash-LSH）の順に除外してから翻訳
+    # 一部の言語だけ登録済みの URL は Notion にページがあるので、既存URLとは照合せず残りの言語を登録する
+    resume = versions.unfinished({a.url for a in untracked if a.url}) if versions is not None else set()
+    new_articles = filter_new_articles([a for a in untracked if a.url in resume], set()) + [
+        a for a in filter_new_articles([a for a in untracked if a.url not in resume], existing_urls)
+        if not index.has_url(a.url)]
+    relevant, filtered = apply_rules(new_articles, rules)
+    unique, near_dups = drop_near_duplicates(relevant, index)
+
+    def result(deferred, updated=0):
+        return IngestResult(inserted, len(articles) - len(new_articles) - len(changes), len(near_dups), failed,
+                            deferred, len(filtered), updated)
 
-            translated_title = translate_text(title_raw)
-            translated_summary = translate_text(summary_raw) if summary_raw else ""
+    # DeepL残量からタイトル優先で翻訳量を割り当てる（言語間で等分。足りない分は原文）
+    entries = [a for a, _ in unique]
+    if enrich and entries:
+        # 要約が空・短い記事はリンク先の冒頭文で補う（失敗しても元の要約のまま続行）
+        try:
+            entries = enrich_summaries(entries, total_timeout=deadline.stage(ENRICH_STAGE_SHARE).limit())
+        except Exception as e:
+            print(f"[WARN] summary enrichment failed: {e}")
+    if spans is not None:
+        entries = [e.replace(trace_id=e.trace_id or new_trace_id()) for e in entries]
+        for e in entries:
+            spans.record(e.trace_id, "fetched", e.fetched_at, feed=e.feed, published=e.published)
+    left = budget.left()
+    share = left // len(TGT_LANGS) if left is not None else None
+    plans = {lang: budget.plan(entries, needs=needs_lang(lang), limit=share) for lang in TGT_LANGS}
+
+    inserted = failed = 0
+    with ThreadPoolExecutor(max_workers=len(TGT_LANGS)) as pool:
+        for start in range(0, len(unique), INSERT_CHUNK):
+            # 締切間際・Notion遮断中は新しい記事に着手しない（残りは次回の実行で拾う。翻訳もしない）
+            if not deadline.can_start() or NOTION.state == "open":
+                return result(len(unique) - start)
+            chunk = range(start, min(start + INSERT_CHUNK, len(unique)))
+            # 前回一部の言語だけ登録できた記事は、作成済みの言語を翻訳・登録しない
+            done = {n: versions.pages(entries[n].url) if versions is not None else {} for n in chunk}
+            # 言語ごとの翻訳（バッチ）を並行実行。追加言語のコストは翻訳呼び出し分だけ
+            todo = {lang: [n for n in chunk if lang not in done[n]] for lang in TGT_LANGS}
+            futures = {lang: pool.submit(translate, [entries[n] for n in todo[lang]],
+                                         [plans[lang][n] for n in todo[lang]], lang, budget)
+                       for lang in TGT_LANGS}
+            translated = {lang: dict(zip(todo[lang], f.result())) for lang, f in futures.items()}
+            if spans is not None:
+                translated_at = time.time()
+                for n in chunk:
+                    by = ",".join(sorted({t[n].translated_by for t in translated.values() if n in t} - {""}))
+                    spans.record(entries[n].trace_id, "translated", translated_at, provider=by)
+
+            for n in chunk:
+                if not deadline.can_start() or NOTION.state == "open":
+                    return result(len(unique) - n)
+                entry, sig = unique[n]
+                created = len(done[n])
+                for lang in TGT_LANGS:
+                    if lang in done[n]:
+                        continue
+                    article = translated[lang][n]
+                    try:
+                        page_id = insert(article, lang)
+                    except (CircuitOpenError, DeadlineExceeded):
+                        # 作成済みの言語は versions に残り、次回は残りの言語だけ登録する
+                        return result(len(unique) - n)
+                    except Exception as e:
+                        print(f"[WARN] Notion insert failed ({lang}): {entry.url} ({e})")
+                        continue
+                    created += 1
+                    if spans is not None:
+                        spans.record(article.trace_id, "inserted", page=page_id,
+                                     lang=lang if len(TGT_LANGS) > 1 else None)
+                    if versions is not None:
+                        versions.record_page(entry.url, lang, page_id, article.title, article.summary)
+                if created < len(TGT_LANGS):
+                    # 全言語そろうまで既存URL・近似重複インデックスに入れない（次回また取り込み対象になる）
+                    failed += 1
+                    continue
+                if versions is not None:
+                    versions.record_entry(entry)
+                index.add(sig, entry.url)
+                existing_urls.add(entry.url)
+                inserted += 1
+
+    if changes:
+        return result(0, update_changed(changes, versions, budget, deadline, translate, patch, enrich, read_page))
+    return result(0)
 
-            articles.append({
-                "title": translated_title,
-                "url": link,
-                "summary": translated_summary,
-            })
 
-        existing_urls = get_existing_urls()
-        new_articles = filter_new_articles(articles, existing_urls)
+def open_budget():
+    return TranslationBudget.from_api(DEEPL_API_KEY) if DEEPL_API_KEY else TranslationBudget(None)
+
+
+def main():
+    if len(TGT_LANGS) > 1 and not STORE_LANG:
+        print("[WARN] TGT_LANGS has several languages but STORE_LANG is off: drafts carry no Lang "
+              "(POST_LANG cannot tell them apart)")
+    try:
+        # RSS取得（RSS_URL は複数可）→ 非同期で並行取得 → プロセスプールで解析
+        # WebSub で購読中（プッシュで受信している）フィードはポーリングしない
+        pushed = SubscriptionStore.open().active_feeds()
+        urls = [u for u in feed_urls(RSS_URL) if u not in pushed]
+        limit = DEADLINE.stage(FETCH_STAGE_SHARE).limit()
+        schedule = PollSchedule.open() if ADAPTIVE_POLLING else None
+        if schedule is not None:
+            # 更新間隔を学習したスケジュールで今回取るべきフィードだけ、条件付き GET で取得
+            schedule.forget(feed_urls(RSS_URL))
+            due = schedule.due(urls)
+            fetched, errors = fetch_conditional(due, schedule.validators(due), total_timeout=limit)
+            blobs = [(u, f.body) for u, f in fetched.items() if f.body is not None]
+            poll_line = (f" / フィード 取得 {len(blobs)} 件・未更新(304) {len(fetched) - len(blobs)} 件"
+                         f"・見送り {len(urls) - len(due)} 件")
+        else:
+            blobs, errors = fetch_all(urls, total_timeout=limit)
+            poll_line = ""
+        fetched_at = time.time()
+        for feed_url, reason in errors.items():
+            print(f"[WARN] Feed fetch failed: {feed_url} ({reason})")
+        parsed = parse_many(blobs)
+        entry_times = {url: [r.published or r.updated for r in records] for url, records in parsed.items()}
+        if FETCH_ARCHIVE:
+            # 取得本文と解析結果を保存（fetch_archive.py replay で同じ入力から再実行できる）
+            archive = FetchArchive.open()
+            archive.append_run(blobs, parsed, fetched_at)
+            archive.close()
+        canonicalizer = Canonicalizer(deadline=DEADLINE.stage(RESOLVE_STAGE_SHARE))
+        articles = to_articles(parsed, canonicalizer, fetched_at)
+        if canonicalizer.skipped:
+            print(f"[WARN] redirect resolution stopped at the deadline: {canonicalizer.skipped} urls unresolved")
+        del blobs, parsed
 
-        for article in new_articles:
-            add_to_notion(article)
+        budget = open_budget()
+        index = NearDupIndex.open()
+        existing_urls = open_existing_urls(index)
+        versions = EntryVersions.open()
+        result = ingest_articles(articles, existing_urls, index, budget, spans=SpanLog.open(), versions=versions)
+        if schedule is not None:
+            # 取得状況（ETag・最新エントリ時刻）は取り込みの後で保存する。見送り・失敗があれば本文を受け取った
+            # フィードは進めず、次回も本文を取り直す（304 の裏に未登録のエントリを残さない）
+            schedule.observe_run(fetched, entry_times, errors, now=fetched_at,
+                                 ingested=not (result.failed or result.deferred))
+        versions.purge()
+        index.purge()
+        if ROUTER is not None:
+            ROUTER.purge()
+        if ENRICH_SUMMARIES:
+            ExtractCache.open().purge()
+        if isinstance(existing_urls, SeenUrls):
+            existing_urls.close()
+            if existing_urls.checked:
+                print(f"[INFO] seen filter: {existing_urls.checked} exact lookups, "
+                      f"{existing_urls.false_positives} false positives")
 
         notify_slack(
-            f"✅ Notion登録（本番）成功: 新規 {len(new_articles)} 件 / 取得 {len(articles)} 件 / 重複 {len(articles) - len(new_articles)} 件"
+            f"✅ Notion登録（本番）成功: 新規 {result.inserted} 件 / 取得 {len(articles)} 件 / 重複 {result.duplicates} 件 / 類似 {result.near_duplicates} 件 / ルール除外 {result.filtered} 件 / {budget.summary_line()}"
+            + (f" / 言語 {','.join(TGT_LANGS)}" if len(TGT_LANGS) > 1 else "")
+            + (f" / 更新 {result.updated} 件" if result.updated else "")
+            + poll_line
+            + (f" / {ROUTER.summary_line()}" if ROUTER is not None and ROUTER.calls else "")
+            + (f"\n⚠️ 登録失敗 {result.failed} 件 / 締切・遮断で見送り {result.deferred} 件" if result.failed or result.deferred else "")
         )
 
     except Exception as e:
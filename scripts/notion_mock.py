@@ -1,9 +1,11 @@
 import os
 import requests
 import feedparser
-from deep_translator import DeeplTranslator
 import tweepy
 
+from deepl_budget import deepl_translate
+from lang_detect import deepl_source_lang, needs_translation
+
 # ===== 設定（Secrets をそのまま参照。任意は .get()）=====
 NOTION_API_KEY = os.environ["NOTION_API_KEY"]
 NOTION_DATABASE_ID = os.environ["NOTION_DATABASE_ID"]
@@ -16,8 +18,6 @@ X_API_KEY = os.environ["X_API_KEY"]
 X_API_SECRET = os.environ["X_API_SECRET"]
 X_ACCESS_TOKEN = os.environ["X_ACCESS_TOKEN"]
 X_ACCESS_SECRET = os.environ["X_ACCESS_SECRET"]
-# deep_translator の仕様に合わせ言語コードは小文字固定
-SRC_LANG = "en"
 TGT_LANG = "ja"
 
 NOTION_VERSION = "2022-06-28"
@@ -66,13 +66,16 @@ def filter_new_articles(articles, existing_urls):
 
 
 def translate_text(text):
-    """DeepLで日本語に翻訳（DEEPL_API_KEY が未設定なら原文返却）"""
+    """DeepLで日本語に翻訳（DEEPL_API_KEY が未設定・既に日本語なら原文返却）"""
     if not text:
         return ""
     if not DEEPL_API_KEY:
         return text
-    translator = DeeplTranslator(api_key=DEEPL_API_KEY, source=SRC_LANG, target=TGT_LANG)
-    return translator.translate(text)
+    needed, lang = needs_translation(text, TGT_LANG)
+    if not needed:
+        return text
+    # 原文言語が確定しない時は source_lang を付けない（DeepL の自動判定）
+    return deepl_translate(DEEPL_API_KEY, [text], TGT_LANG, deepl_source_lang(lang))[0]
 
 
 def add_to_notion(article):
@@ -0,0 +1,347 @@
+import os
+import sys
+import json
+import math
+import time
+import random
+import hashlib
+import sqlite3
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence
+
+import state_store
+
+# ===== 設定 =====
+# フィードごとの更新間隔（エントリの公開時刻の間隔の EWMA）を覚えて、実行ごとに「取りに行くべきフィード」だけ取得する。
+# よく更新されるフィード（推定更新間隔 POLL_ACTIVE_INTERVAL_SEC 以下）は毎回取り、固定間隔で全件取るのと同じ鮮度を保つ。
+# それより遅いフィードは更新間隔に応じて間引き、週1回しか更新されないフィードは数時間〜1日おきになる。
+# 取得は ETag / Last-Modified の条件付き GET（304 なら本文を受け取らない）。全体の取得数は POLL_BUDGET_PER_HOUR で抑える
+ADAPTIVE_POLLING = os.environ.get("ADAPTIVE_POLLING", "1").lower() in {"1", "true", "yes"}
+POLL_DB = "polls.sqlite3"
+POLL_MIN_INTERVAL = float(os.environ.get("POLL_MIN_INTERVAL_SEC", "900"))
+POLL_MAX_INTERVAL = float(os.environ.get("POLL_MAX_INTERVAL_SEC", "86400"))
+POLL_ACTIVE_INTERVAL = float(os.environ.get("POLL_ACTIVE_INTERVAL_SEC", "10800"))
+POLL_BUDGET_PER_HOUR = float(os.environ.get("POLL_BUDGET_PER_HOUR", "0"))  # 0 = 上限なし
+POLL_FRACTION = 0.5  # 推定更新間隔の何割ごとに見に行くか（小さいほど鮮度優先）
+EWMA_ALPHA = 0.3
+# 最新エントリから推定更新間隔のこの倍数より長く空いたら更新が止まったとみなし、空いた時間に応じて間隔を伸ばす
+# （ポアソン的に更新されるフィードの偶然の空白では伸ばさない）
+QUIET_FACTOR = 6
+NOT_MODIFIED_BACKOFF = 1.2  # 公開時刻の無いフィードで、新着なしが続くごとに間隔を伸ばす倍率（最大 MAX_BACKOFF 倍）
+MAX_BACKOFF = 4.0
+BACKOFF_GRACE = 2  # 見に行く頻度が更新より高いので、この回数までの新着なしは想定内
+JITTER = 0.1  # 同じ間隔のフィードが同じ回に集中しないよう最大10%早める（遅らせると次の実行を逃す）
+DEFAULT_INTERVAL = 3600.0  # 公開時刻が無い・初回のフィードの推定更新間隔
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS feeds (
+    url TEXT PRIMARY KEY,
+    etag TEXT,
+    last_modified TEXT,
+    body_hash TEXT,
+    interval REAL NOT NULL,           -- 推定更新間隔（秒、EWMA）
+    last_entry_at REAL,               -- 見えている最新エントリの公開時刻
+    last_polled REAL,
+    next_due REAL NOT NULL,
+    streak INTEGER NOT NULL DEFAULT 0,  -- 連続で新着なし（304 含む）の回数
+    errors INTEGER NOT NULL DEFAULT 0,  -- 連続失敗回数
+    polls INTEGER NOT NULL DEFAULT 0,
+    not_modified INTEGER NOT NULL DEFAULT 0,
+    changed INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+
+class FeedState(NamedTuple):
+    url: str
+    interval: float
+    last_entry_at: Optional[float]
+    last_polled: Optional[float]
+    next_due: float
+    streak: int
+    errors: int
+
+
+def _clamp(value: float) -> float:
+    return min(max(value, POLL_MIN_INTERVAL), POLL_MAX_INTERVAL)
+
+
+def poll_interval(interval: float, last_entry_at: Optional[float], streak: int, now: float) -> float:
+    """
+    次に見に行くまでの秒数。推定更新間隔が POLL_ACTIVE_INTERVAL 以下なら最短（毎回）、それ以外は
+    POLL_FRACTION 倍を基本に、最新エントリから推定間隔の QUIET_FACTOR 倍以上空いた（更新が止まった）フィードは
+    空いた時間に応じて伸ばす。公開時刻の無いフィードは新着なし（304 含む）の連続回数で伸ばす
+    """
+    estimate, backoff = interval, 1.0
+    if last_entry_at is None:
+        backoff = min(NOT_MODIFIED_BACKOFF ** max(streak - BACKOFF_GRACE, 0), MAX_BACKOFF)
+    elif now - last_entry_at > interval * QUIET_FACTOR:
+        estimate = (now - last_entry_at) / 2
+    if estimate <= POLL_ACTIVE_INTERVAL:
+        return POLL_MIN_INTERVAL
+    return _clamp(estimate * POLL_FRACTION * backoff)
+
+
+class PollSchedule:
+    """フィードごとの取得予定（SQLite）。due() で今回取るフィードを選び、observe() で結果を学習する"""
+
+    def __init__(self, conn, budget_per_hour: float = POLL_BUDGET_PER_HOUR, seed: Optional[int] = None):
+        conn.executescript(SCHEMA)
+        conn.commit()
+        self.conn = conn
+        self.budget_per_hour = budget_per_hour
+        self._rnd = random.Random(seed)
+
+    @classmethod
+    def open(cls, name: str = POLL_DB, **kwargs) -> "PollSchedule":
+        return cls(state_store.connect(name), **kwargs)
+
+    def _states(self, urls: Sequence[str]) -> Dict[str, FeedState]:
+        found = {}
+        for start in range(0, len(urls), 500):
+            chunk = urls[start:start + 500]
+            rows = self.conn.execute(
+                "SELECT url, interval, last_entry_at, last_polled, next_due, streak, errors FROM feeds"
+                f" WHERE url IN ({','.join('?' * len(chunk))})",
+                chunk,
+            )
+            found.update((row[0], FeedState(*row)) for row in rows)
+        return found
+
+    def _take_tokens(self, wanted: int, now: float) -> int:
+        """全体の取得予算（トークンバケット。1時間分まで貯まる）から wanted 件分を取り出し、取れた件数を返す"""
+        if self.budget_per_hour <= 0:
+            return wanted
+        row = self.conn.execute("SELECT value FROM meta WHERE name = 'bucket'").fetchone()
+        tokens, at = json.loads(row[0]) if row else (self.budget_per_hour, now)
+        tokens = min(tokens + (now - at) / 3600 * self.budget_per_hour, self.budget_per_hour)
+        granted = min(wanted, int(tokens))
+        self.conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('bucket', ?)",
+                          (json.dumps([tokens - granted, now]),))
+        self.conn.commit()
+        return granted
+
+    def due(self, urls: Sequence[str], now: Optional[float] = None) -> List[str]:
+        """
+        今回取得するフィード（初めてのフィードと予定時刻を過ぎたもの）。予算を超える場合は
+        前回からの経過で見込める新着数（経過時間 / 推定更新間隔）の多い順に選ぶ
+        """
+        now = now or time.time()
+        urls = list(dict.fromkeys(urls))
+        states = self._states(urls)
+        candidates = []
+        for url in urls:
+            state = states.get(url)
+            if state is None:
+                candidates.append((math.inf, url))
+            elif state.next_due <= now:
+                expected = (now - (state.last_polled or 0)) / max(state.interval, 1)
+                candidates.append((expected, url))
+        candidates.sort(key=lambda c: -c[0])
+        granted = self._take_tokens(len(candidates), now)
+        return [url for _, url in candidates[:granted]]
+
+    def validators(self, urls: Iterable[str]) -> Dict[str, tuple]:
+        """{URL: (ETag, Last-Modified)}（条件付き GET 用。持っていないフィードは含めない）"""
+        urls = list(urls)
+        found = {}
+        for start in range(0, len(urls), 500):
+            chunk = urls[start:start + 500]
+            found.update((url, (etag, lm)) for url, etag, lm in self.conn.execute(
+                f"SELECT url, etag, last_modified FROM feeds WHERE url IN ({','.join('?' * len(chunk))})"
+                " AND (etag IS NOT NULL OR last_modified IS NOT NULL)",
+                chunk,
+            ))
+        return found
+
+    def _counters(self, url: str):
+        row = self.conn.execute(
+            "SELECT interval, last_entry_at, body_hash, streak, polls, not_modified, changed FROM feeds WHERE url = ?",
+            (url,),
+        ).fetchone()
+        return row or (DEFAULT_INTERVAL, None, None, 0, 0, 0, 0)
+
+    def _schedule(self, url: str, interval: float, last_entry_at: Optional[float], streak: int, now: float,
+                  **columns) -> float:
+        wait = poll_interval(interval, last_entry_at, streak, now)
+        next_due = now + wait * (1 - self._rnd.uniform(0, JITTER))
+        names = ["interval", "last_entry_at", "last_polled", "next_due", "streak", "errors"] + list(columns)
+        values = [interval, last_entry_at, now, next_due, streak, 0] + list(columns.values())
+        self.conn.execute(
+            f"INSERT INTO feeds (url, {', '.join(names)}) VALUES (?, {', '.join('?' * len(names))})"
+            f" ON CONFLICT(url) DO UPDATE SET {', '.join(f'{n} = excluded.{n}' for n in names)}",
+            [url] + values,
+        )
+        self.conn.commit()
+        return next_due
+
+    def observe(self, url: str, body: Optional[bytes], entry_times: Sequence[Optional[float]] = (),
+                etag: Optional[str] = None, last_modified: Optional[str] = None,
+                now: Optional[float] = None) -> float:
+        """
+        取得結果を学習する。body=None は 304。entry_times はエントリの公開（更新）時刻。
+        前回見えていた最新より新しいエントリ同士・直前との間隔で EWMA を更新する。次の予定時刻を返す
+        """
+        now = now or time.time()
+        known = self.conn.execute("SELECT 1 FROM feeds WHERE url = ?", (url,)).fetchone() is not None
+        interval, last_entry_at, body_hash, streak, polls, not_modified, changed = self._counters(url)
+        if body is None:
+            return self._schedule(url, interval, last_entry_at, streak + 1, now,
+                                  polls=polls + 1, not_modified=not_modified + 1)
+
+        digest = hashlib.sha1(body).hexdigest()
+        times = sorted(t for t in entry_times if t and t <= now + 300)  # 未来日付は無視
+        fresh = [t for t in times if last_entry_at is None or t > last_entry_at]
+        if fresh:
+            # 初回はフィード内のエントリ同士の間隔、以降は前回の最新からの間隔も使う
+            previous = last_entry_at
+            for t in fresh:
+                if previous is not None:
+                    gap = min(max(t - previous, 60), POLL_MAX_INTERVAL * 4)
+                    interval = EWMA_ALPHA * gap + (1 - EWMA_ALPHA) * interval
+                previous = t
+            last_entry_at = fresh[-1]
+            streak = 0
+        elif not times and known and digest != body_hash:
+            # 公開時刻を出さないフィードは本文の変化で判断（変化 = 新着ありとみなして間隔を縮める）
+            interval = max(interval * 0.75, POLL_MIN_INTERVAL)
+            streak = 0
+        else:
+            streak += 1
+        return self._schedule(url, interval, last_entry_at, streak, now, etag=etag, last_modified=last_modified,
+                              body_hash=digest, polls=polls + 1, changed=changed + (streak == 0))
+
+    def observe_run(self, fetched: Dict[str, object], entry_times: Dict[str, list], errors: Dict[str, str],
+                    now: Optional[float] = None, ingested: bool = True) -> None:
+        """
+        1回分の取得結果（feed_fetch.fetch_conditional の {URL: Fetched} と失敗）と、フィードごとのエントリの
+        公開時刻（entry_times）をまとめて学習する。取り込みの後で呼ぶこと。
+        ingested=False（締切・失敗で取り込めなかったエントリがある）の時は本文を受け取ったフィードの
+        ETag・最新エントリ時刻を進めない（次回も予定どおり取り、304 で取りこぼさないよう本文を取り直す）。
+        持ち時間切れで取れなかったフィードも予定を変えない（次回すぐ取る）
+        """
+        now = now or time.time()
+        for url, result in fetched.items():
+            if result.body is not None and not ingested:
+                continue
+            self.observe(url, result.body, entry_times.get(url, ()), result.etag, result.last_modified, now=now)
+        for url, reason in errors.items():
+            if reason != "deadline":
+                self.observe_error(url, now=now)
+
+    def observe_error(self, url: str, now: Optional[float] = None) -> float:
+        """失敗は最短間隔から倍々で待つ（推定更新間隔は変えない）"""
+        now = now or time.time()
+        row = self.conn.execute("SELECT errors FROM feeds WHERE url = ?", (url,)).fetchone()
+        errors = (row[0] if row else 0) + 1
+        next_due = now + min(POLL_MIN_INTERVAL * 2 ** (errors - 1), POLL_MAX_INTERVAL)
+        self.conn.execute(
+            "INSERT INTO feeds (url, interval, last_polled, next_due, errors) VALUES (?, ?, ?, ?, ?)"
+            " ON CONFLICT(url) DO UPDATE SET last_polled = excluded.last_polled, next_due = excluded.next_due,"
+            " errors = excluded.errors",
+            (url, DEFAULT_INTERVAL, now, next_due, errors),
+        )
+        self.conn.commit()
+        return next_due
+
+    def forget(self, keep: Iterable[str]) -> int:
+        """RSS_URL から外れたフィードの記録を消す"""
+        keep = set(keep)
+        gone = [url for (url,) in self.conn.execute("SELECT url FROM feeds") if url not in keep]
+        self.conn.executemany("DELETE FROM feeds WHERE url = ?", [(u,) for u in gone])
+        self.conn.commit()
+        return len(gone)
+
+    def report(self, now: Optional[float] = None) -> List[Dict]:
+        now = now or time.time()
+        rows = self.conn.execute(
+            "SELECT url, interval, last_entry_at, next_due, streak, errors, polls, not_modified, changed"
+            " FROM feeds ORDER BY interval"
+        ).fetchall()
+        return [{
+            "url": url,
+            "interval_min": round(interval / 60, 1),
+            "silent_h": round((now - last_entry_at) / 3600, 1) if last_entry_at else None,
+            "due_in_min": round((next_due - now) / 60, 1),
+            "streak": streak,
+            "errors": errors,
+            "polls": polls,
+            "not_modified": not_modified,
+            "changed": changed,
+        } for url, interval, last_entry_at, next_due, streak, errors, polls, not_modified, changed in rows]
+
+
+def simulate(feeds: int = 200, hours: int = 72, run_every: float = 900, seed: int = 1) -> Dict[str, float]:
+    """
+    公開間隔の違うフィード（5分〜3日）をポアソン過程で作り、固定間隔で全件取得する場合と
+    適応ポーリングの取得数・新着を取得するまでの遅れ（平均。active は1時間に1件以上のフィード）を比べる
+    """
+    import tempfile
+    rnd = random.Random(seed)
+    rates = [rnd.choice([300, 1800, 3600, 6 * 3600, 86400, 3 * 86400]) for _ in range(feeds)]
+    start = 1_700_000_000.0
+    posts = []
+    for rate in rates:
+        t, times = start - rate, []
+        while t < start + hours * 3600:
+            t += rnd.expovariate(1 / rate)
+            times.append(t)
+        posts.append(times)
+
+    def run(adaptive: bool):
+        with tempfile.TemporaryDirectory() as tmp:
+            schedule = PollSchedule(sqlite3.connect(os.path.join(tmp, "sim.sqlite3")), seed=seed)
+            urls = [f"feed-{i}" for i in range(feeds)]
+            fetches = 0
+            delay, seen = [0.0, 0.0], [0, 0]  # [全体, active]
+            last_seen = [start] * feeds
+            now = start
+            while now < start + hours * 3600:
+                targets = schedule.due(urls, now) if adaptive else urls
+                for url in targets:
+                    i = int(url.split("-")[1])
+                    visible = [t for t in posts[i] if t <= now]
+                    new = [t for t in visible if t > last_seen[i]]
+                    for k in (0, 1) if rates[i] <= 3600 else (0,):
+                        delay[k] += sum(now - t for t in new)
+                        seen[k] += len(new)
+                    last_seen[i] = max(visible[-20:] or [last_seen[i]])
+                    fetches += 1
+                    if new:
+                        schedule.observe(url, repr(visible[-20:]).encode(), visible[-20:], now=now)
+                    else:
+                        schedule.observe(url, None, now=now)
+                now += run_every
+            return fetches, [round(d / max(n, 1) / 60, 1) for d, n in zip(delay, seen)]
+
+    fixed_fetches, fixed_delay = run(False)
+    adaptive_fetches, adaptive_delay = run(True)
+    return {
+        "fixed_fetches": fixed_fetches,
+        "adaptive_fetches": adaptive_fetches,
+        "saved": round(1 - adaptive_fetches / fixed_fetches, 3),
+        "fixed_delay_min": fixed_delay[0],
+        "adaptive_delay_min": adaptive_delay[0],
+        "fixed_active_delay_min": fixed_delay[1],
+        "adaptive_active_delay_min": adaptive_delay[1],
+    }
+
+
+if __name__ == "__main__":
+    # 使い方:
+    #   python scripts/poll_schedule.py report
+    #   python scripts/poll_schedule.py simulate [フィード数] [時間]
+    #   python scripts/poll_schedule.py reset <feed_url>   # 次回必ず取得する
+    if len(sys.argv) == 2 and sys.argv[1] == "report":
+        for row in PollSchedule.open().report():
+            print(json.dumps(row, ensure_ascii=False))
+    elif len(sys.argv) in (2, 3, 4) and sys.argv[1] == "simulate":
+        print(json.dumps(simulate(*(int(a) for a in sys.argv[2:]))))
+    elif len(sys.argv) == 3 and sys.argv[1] == "reset":
+        schedule = PollSchedule.open()
+        schedule.conn.execute("UPDATE feeds SET next_due = 0 WHERE url = ?", (sys.argv[2],))
+        schedule.conn.commit()
+        print("ok")
+    else:
+        print("usage: poll_schedule.py report | simulate [feeds] [hours] | reset <feed_url>", file=sys.stderr)
+        sys.exit(2)
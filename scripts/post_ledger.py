@@ -0,0 +1,149 @@
+import sys
+import time
+import hashlib
+import threading
+from typing import List, NamedTuple, Optional
+
+import state_store
+from work_queue import WorkQueue
+
+# ===== 設定 =====
+LEDGER_DB = "post_ledger.sqlite3"
+
+# status: posting（create_tweet 呼出し前に記録）→ posted（tweet_id 取得）→ synced（Notion反映済み）
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ledger (
+    page_id TEXT PRIMARY KEY,
+    content_hash TEXT NOT NULL,
+    status TEXT NOT NULL,
+    tweet_id TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ledger_hash ON ledger (content_hash);
+CREATE INDEX IF NOT EXISTS ledger_status ON ledger (status);
+"""
+
+
+class Entry(NamedTuple):
+    page_id: str
+    content_hash: str
+    status: str
+    tweet_id: Optional[str]
+    updated_at: float
+
+
+def content_hash(text: str) -> str:
+    """投稿本文のハッシュ（同一本文の二重投稿検知用）"""
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+
+class PostLedger:
+    """投稿の冪等性台帳。1ページにつき create_tweet を1回しか呼ばないための記録"""
+
+    def __init__(self, conn):
+        conn.isolation_level = None
+        conn.executescript(SCHEMA)
+        self.conn = conn
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, name: str = LEDGER_DB) -> "PostLedger":
+        return cls(state_store.connect(name, check_same_thread=False))
+
+    def _tx(self, fn):
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(self.conn)
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+            return result
+
+    def begin(self, page_id: str, text_hash: str) -> Optional[Entry]:
+        """
+        投稿前に posting を記録する。同じページの記録、または同じ本文を別ページで投稿中・投稿済みの記録が
+        既にあれば記録せずその Entry を返す（＝投稿しない）。
+        呼び出し側は status で扱いを分ける: posted / synced は投稿済み（完了にしてよい）、
+        posting は結果不明（別ページでも、確認して解除されるまで保留する）
+        """
+        def _do(conn):
+            row = conn.execute(
+                "SELECT page_id, content_hash, status, tweet_id, updated_at FROM ledger WHERE page_id = ?",
+                (page_id,),
+            ).fetchone() or conn.execute(
+                # 同じ本文は投稿済みを優先して返す（結果不明の記録しか無ければそれを返す）
+                "SELECT page_id, content_hash, status, tweet_id, updated_at FROM ledger"
+                " WHERE content_hash = ? ORDER BY status = 'posting' LIMIT 1",
+                (text_hash,),
+            ).fetchone()
+            if row:
+                return Entry(*row)
+            conn.execute(
+                "INSERT INTO ledger (page_id, content_hash, status, updated_at) VALUES (?, ?, 'posting', ?)",
+                (page_id, text_hash, time.time()),
+            )
+            return None
+
+        return self._tx(_do)
+
+    def record_posted(self, page_id: str, tweet_id: str) -> None:
+        self._tx(lambda conn: conn.execute(
+            "UPDATE ledger SET status = 'posted', tweet_id = ?, updated_at = ? WHERE page_id = ?",
+            (tweet_id, time.time(), page_id),
+        ))
+
+    def record_synced(self, page_id: str) -> None:
+        self._tx(lambda conn: conn.execute(
+            "UPDATE ledger SET status = 'synced', updated_at = ? WHERE page_id = ?",
+            (time.time(), page_id),
+        ))
+
+    def abort(self, page_id: str) -> None:
+        """create_tweet が明確に失敗した場合のみ記録を消して再試行可能にする"""
+        self._tx(lambda conn: conn.execute(
+            "DELETE FROM ledger WHERE page_id = ? AND status = 'posting'", (page_id,)
+        ))
+
+    def release(self, page_id: str) -> None:
+        """手動確認後に in-doubt（posting のまま）の記録を解除する"""
+        self._tx(lambda conn: conn.execute("DELETE FROM ledger WHERE page_id = ?", (page_id,)))
+
+    def _by_status(self, status: str) -> List[Entry]:
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT page_id, content_hash, status, tweet_id, updated_at FROM ledger WHERE status = ?",
+                (status,),
+            ).fetchall()
+        return [Entry(*row) for row in rows]
+
+    def pending_writebacks(self) -> List[Entry]:
+        """投稿済みだが Notion へ未反映の記録"""
+        return self._by_status("posted")
+
+    def in_doubt(self) -> List[Entry]:
+        """create_tweet の結果が不明（呼出し中に中断）な記録"""
+        return self._by_status("posting")
+
+
+if __name__ == "__main__":
+    # 使い方:
+    #   python scripts/post_ledger.py list
+    #   python scripts/post_ledger.py release <page_id>   # 投稿されていないことを確認した上で解除
+    #                                                      （保留中の投稿キュー項目も戻し、次回の実行で投稿する）
+    # Actions のキャッシュにある台帳は、Post to X ワークフローを release_page_id（シャード運用時は
+    # release_shard も）を指定して手動実行すると、投稿処理の前に解除される
+    cmd = sys.argv[1] if len(sys.argv) > 1 else ""
+    ledger = PostLedger.open()
+    if cmd == "list":
+        for e in ledger.in_doubt() + ledger.pending_writebacks():
+            print(f"{e.status}\t{e.page_id}\t{e.tweet_id or '-'}")
+    elif cmd == "release" and len(sys.argv) > 2:
+        ledger.release(sys.argv[2])
+        print(f"released {sys.argv[2]}")
+        if WorkQueue.open().release_held("post", sys.argv[2]):
+            print(f"requeued {sys.argv[2]}")
+    else:
+        print("usage: post_ledger.py list | release <page_id>", file=sys.stderr)
+        sys.exit(2)
@@ -0,0 +1,293 @@
+import os
+import sys
+import math
+import time
+import heapq
+import itertools
+import threading
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import state_store
+
+# ===== 設定 =====
+# 承認済みページを「鮮度 × 編集者の優先度 × トピック間隔」で採点し、X の投稿枠に良いものから割り当てる。
+# 鮮度は半減期 POST_FRESHNESS_HALF_LIFE_H の指数減衰なので、全件が同じ割合で古くなり順位は時間で
+# 入れ替わらない。そこでヒープのキーは log2(優先度) + 公開時刻/半減期 で固定し、承認・優先度変更時だけ
+# push し直す（古いエントリは version 不一致で取り出し時に捨てる遅延削除。更新は O(log n)）。
+# 採点の入力はSQLiteに持ち、起動時にヒープを組み直す（heapify で O(n)）。
+SCHEDULER_DB = "scheduler.sqlite3"
+HALF_LIFE_SEC = float(os.environ.get("POST_FRESHNESS_HALF_LIFE_H", "6")) * 3600
+# X の投稿上限（X_POST_LIMIT 件 / X_POST_WINDOW_H 時間）。0 なら枠で絞らず順番だけ決める
+X_POST_LIMIT = int(os.environ.get("X_POST_LIMIT", "0"))
+X_POST_WINDOW_SEC = float(os.environ.get("X_POST_WINDOW_H", "24")) * 3600
+# 1回の実行で受け持つ枠（次の実行までに来る枠は今回前倒しで使う）
+SLOT_LOOKAHEAD_SEC = float(os.environ.get("POST_SLOT_LOOKAHEAD_SEC", "3600"))
+# 同じトピックを続けて投稿しない間隔と、その間隔内に入る場合のスコア倍率
+TOPIC_SPACING_SEC = float(os.environ.get("POST_TOPIC_SPACING_MIN", "30")) * 60
+TOPIC_PENALTY = float(os.environ.get("POST_TOPIC_PENALTY", "0.25"))
+# Notion の Priority（セレクト名 or 数値）→ 倍率
+PRIORITY_WEIGHTS = {"urgent": 4.0, "high": 2.0, "normal": 1.0, "low": 0.5}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    published REAL NOT NULL,
+    priority REAL NOT NULL,
+    topic TEXT NOT NULL DEFAULT '',
+    version INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS history (
+    key TEXT NOT NULL,
+    topic TEXT NOT NULL DEFAULT '',
+    posted_at REAL NOT NULL,
+    slot_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS history_posted ON history (posted_at);
+"""
+
+
+class Entry(NamedTuple):
+    key: str
+    published: float
+    priority: float
+    topic: str
+    version: int
+
+
+def priority_weight(value) -> float:
+    """Priority プロパティの値（"high" などのセレクト名 / 数値 / 未設定）→ 倍率"""
+    if value is None or value == "":
+        return 1.0
+    if isinstance(value, (int, float)):
+        return max(float(value), 0.01)
+    return PRIORITY_WEIGHTS.get(str(value).strip().lower(), 1.0)
+
+
+def static_key(published: float, priority: float) -> float:
+    """時刻に依らない順位キー（大きいほど優先）。score(now) = 2 ** (key - now / 半減期)"""
+    return math.log2(priority) + published / HALF_LIFE_SEC
+
+
+class PostScheduler:
+    """承認済みページの優先度付きスケジューラ（スレッドセーフ）"""
+
+    def __init__(self, conn, limit: int = X_POST_LIMIT, window: float = X_POST_WINDOW_SEC,
+                 lookahead: float = SLOT_LOOKAHEAD_SEC, spacing: float = TOPIC_SPACING_SEC):
+        conn.executescript(SCHEMA)
+        conn.commit()
+        self.conn = conn
+        self.limit = limit
+        self.window = window
+        self.lookahead = lookahead
+        self.spacing = spacing
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        self._entries: Dict[str, Entry] = {}
+        self._heap: List[Tuple[float, int, str, int]] = []  # (-キー, 連番, key, version)
+        self._assigned: Dict[str, float] = {}  # next_due で渡したキー → 枠の時刻
+        for row in conn.execute("SELECT key, published, priority, topic, version FROM entries"):
+            e = Entry(*row)
+            self._entries[e.key] = e
+            self._heap.append((-static_key(e.published, e.priority), next(self._seq), e.key, e.version))
+        heapq.heapify(self._heap)
+        self._last_topic: Dict[str, float] = dict(conn.execute(
+            "SELECT topic, MAX(slot_at) FROM history WHERE topic != '' GROUP BY topic"
+        ).fetchall())
+
+    @classmethod
+    def open(cls, name: str = SCHEDULER_DB, **kwargs) -> "PostScheduler":
+        return cls(state_store.connect(name, check_same_thread=False), **kwargs)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # ----- 登録・更新（O(log n)）-----
+    def upsert(self, key: str, published: Optional[float], priority: float = 1.0, topic: str = "") -> bool:
+        """
+        承認・再編集時に登録/採点し直す。入力が変わらなければ何もしない（変わったら True）。
+        published が不明なら初回登録時刻で固定する（再登録のたびに新しく見えないように）
+        """
+        with self._lock:
+            old = self._entries.get(key)
+            if published is None:
+                published = old.published if old else time.time()
+            if old and (old.published, old.priority, old.topic) == (published, priority, topic):
+                return False
+            e = Entry(key, published, priority, topic, old.version + 1 if old else 0)
+            self.conn.execute(
+                "INSERT OR REPLACE INTO entries (key, published, priority, topic, version, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, published, priority, topic, e.version, time.time()),
+            )
+            self.conn.commit()
+            self._entries[key] = e
+            heapq.heappush(self._heap, (-static_key(published, priority), next(self._seq), key, e.version))
+            return True
+
+    def release(self, key: str) -> None:
+        """next_due で渡したが投稿しなかった（枠を返す。キーは次回の起動までヒープに戻らない）"""
+        with self._lock:
+            self._assigned.pop(key, None)
+
+    def remove(self, key: str) -> None:
+        """承認取り消し・投稿済みなど（ヒープ上のエントリは取り出し時に捨てる）"""
+        with self._lock:
+            self._assigned.pop(key, None)
+            if self._entries.pop(key, None) is not None:
+                self.conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self.conn.commit()
+
+    def record_posted(self, key: str, now: Optional[float] = None) -> None:
+        """
+        投稿済みにする。枠の間隔・トピック間隔は実際の投稿時刻ではなく割り当てた枠の時刻で数える
+        （先読みで前倒しした投稿が次の枠を押し出さないように）
+        """
+        now = now or time.time()
+        with self._lock:
+            e = self._entries.pop(key, None)
+            topic = e.topic if e else ""
+            slot = self._assigned.pop(key, now)
+            self.conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self.conn.execute(
+                "INSERT INTO history (key, topic, posted_at, slot_at) VALUES (?, ?, ?, ?)", (key, topic, now, slot)
+            )
+            self.conn.execute("DELETE FROM history WHERE posted_at < ?", (now - max(self.window, self.spacing) * 2,))
+            self.conn.commit()
+            if topic:
+                self._last_topic[topic] = slot
+
+    # ----- 投稿枠 -----
+    def slots(self, now: Optional[float] = None) -> List[float]:
+        """今回の実行で使える枠の時刻（上限内で window / limit 間隔に並べ、先読み範囲内のもの）"""
+        now = now or time.time()
+        if self.limit <= 0:
+            return [now] * len(self._entries)
+        with self._lock:
+            used, last = self.conn.execute(
+                "SELECT COUNT(*), MAX(slot_at) FROM history WHERE posted_at > ?", (now - self.window,)
+            ).fetchone()
+            # 渡したが未記録の分（投稿中）も枠を使っている
+            used += len(self._assigned)
+            last = max([last or 0] + list(self._assigned.values()))
+        interval = self.window / self.limit
+        first = max(now, (last or 0) + interval)
+        slots = [first + k * interval for k in range(max(self.limit - used, 0))]
+        return [t for t in slots if t <= now + self.lookahead]
+
+    # ----- 取り出し -----
+    def _effective(self, e: Entry, at: float, last_topic: Dict[str, float]) -> float:
+        key = static_key(e.published, e.priority)
+        if e.topic and at - last_topic.get(e.topic, -math.inf) < self.spacing:
+            key += math.log2(TOPIC_PENALTY)
+        return key
+
+    def _pick(self, at: float, last_topic: Dict[str, float]) -> Optional[Entry]:
+        """
+        枠 at に入れる1件をヒープから取り出す。トピック間隔の減点は下げる方向にしか働かないので、
+        減点前のキーが暫定1位の実効キーを下回った時点で打ち切れる（見送った分は戻す）
+        """
+        best: Optional[Entry] = None
+        best_key = -math.inf
+        popped: List[Tuple[float, int, str, int]] = []
+        while self._heap and -self._heap[0][0] > best_key:
+            item = heapq.heappop(self._heap)
+            _, _, key, version = item
+            e = self._entries.get(key)
+            if e is None or e.version != version:
+                continue  # 遅延削除
+            popped.append(item)
+            eff = self._effective(e, at, last_topic)
+            if eff > best_key:
+                best, best_key = e, eff
+        for item in popped:
+            if best is None or item[2] != best.key:
+                heapq.heappush(self._heap, item)
+        return best
+
+    def next_due(self, now: Optional[float] = None) -> Optional[str]:
+        """
+        今回の枠が残っていれば最も価値の高いキーを返す（返したキーは本実行中は再度返さない）。
+        投稿したら record_posted、投稿できなかったものは次回の起動で再びヒープに載る
+        """
+        now = now or time.time()
+        slots = self.slots(now)
+        if not slots:
+            return None
+        with self._lock:
+            e = self._pick(slots[0], self._last_topic)
+            if e is None:
+                return None
+            self._assigned[e.key] = slots[0]
+            return e.key
+
+    def plan(self, now: Optional[float] = None, limit: int = 100) -> List[Tuple[float, str]]:
+        """今回の枠への割り当て予定（先頭 limit 件。ヒープは消費しない）"""
+        now = now or time.time()
+        slots = self.slots(now)[:limit]
+        with self._lock:
+            saved = list(self._heap)
+            last_topic = dict(self._last_topic)
+            plan = []
+            try:
+                for at in slots:
+                    e = self._pick(at, last_topic)
+                    if e is None:
+                        break
+                    plan.append((at, e.key))
+                    if e.topic:
+                        last_topic[e.topic] = at
+            finally:
+                self._heap = saved
+        return plan
+
+    def score(self, key: str, now: Optional[float] = None) -> Optional[float]:
+        """現在のスコア（優先度 × 鮮度。1.0 = 今公開された通常優先度の記事）"""
+        e = self._entries.get(key)
+        if e is None:
+            return None
+        return 2 ** (static_key(e.published, e.priority) - (now or time.time()) / HALF_LIFE_SEC)
+
+
+def format_plan(scheduler: PostScheduler, plan: List[Tuple[float, str]], now: Optional[float] = None) -> str:
+    now = now or time.time()
+    head = f"スケジュール: 待ち {len(scheduler)}件 / 今回の枠 {len(plan)}件"
+    if scheduler.limit > 0:
+        head += f"（上限 {scheduler.limit}件/{scheduler.window / 3600:.0f}h）"
+    lines = [f"- {time.strftime('%H:%M', time.gmtime(at))}Z {key} score={scheduler.score(key, now):.2f}"
+             for at, key in plan[:10]]
+    return "\n".join([head] + lines)
+
+
+if __name__ == "__main__":
+    # 使い方:
+    #   python scripts/post_scheduler.py plan     # 今回の枠への割り当て予定
+    #   python scripts/post_scheduler.py bench [件数]
+    if sys.argv[1:2] == ["plan"]:
+        s = PostScheduler.open()
+        print(format_plan(s, s.plan()))
+    elif sys.argv[1:2] == ["bench"]:
+        import random
+        import sqlite3
+        n = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+        rnd = random.Random(0)
+        s = PostScheduler(sqlite3.connect(":memory:", check_same_thread=False), limit=0)
+        now = time.time()
+        start = time.perf_counter()
+        for i in range(n):
+            s.upsert(f"k{i}", now - rnd.random() * 86400 * 3, rnd.choice([0.5, 1, 1, 2]), f"t{rnd.randrange(50)}")
+        built = time.perf_counter() - start
+        start = time.perf_counter()
+        for i in range(0, n, 10):
+            s.upsert(f"k{i}", now - rnd.random() * 3600, 2.0, f"t{rnd.randrange(50)}")  # 再採点
+        rescored = time.perf_counter() - start
+        start = time.perf_counter()
+        for _ in range(1000):
+            key = s.next_due(now)
+            s.record_posted(key, now)
+            now += 60
+        picked = time.perf_counter() - start
+        print(f"{n} upserts {built:.2f}s / {n // 10} rescores {rescored:.2f}s / 1000 picks {picked:.2f}s")
+    else:
+        print("usage: post_scheduler.py plan | bench [n]", file=sys.stderr)
+        sys.exit(2)
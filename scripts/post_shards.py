@@ -0,0 +1,162 @@
+import os
+import sys
+import json
+import time
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Set
+
+import requests
+
+import state_store
+from resilience import Deadline
+
+# ===== 設定 =====
+# SHARDS_CONFIG（JSON）で Notion DB と X アカウントの組（シャード）を定義し、
+# シャードごとに post_to_x.py を別プロセスで並行実行する。
+# 各シャードは STATE_DIR/shards/<name> に専用のキュー・台帳・カーソルを持ち、失敗は他へ波及しない。
+#
+# 例:
+# [
+#   {"name": "brand-a", "database_id_env": "SHARD_A_NOTION_DATABASE_ID", "lang": "ja",
+#    "x": {"X_API_KEY": "SHARD_A_X_API_KEY", "X_API_SECRET": "SHARD_A_X_API_SECRET",
+#          "X_ACCESS_TOKEN": "SHARD_A_X_ACCESS_TOKEN", "X_ACCESS_SECRET": "SHARD_A_X_ACCESS_SECRET"}},
+#   {"name": "brand-b", "database_id": "xxxxxxxx", "x": {...}, "workers": 2}
+# ]
+# 値は環境変数名（Secrets を直接書かない）。Actions ではワークフローの env にシャードの Secrets を1つずつ列挙する
+# （Secrets 全体は渡さない）。各シャードのプロセスには自分の分だけ渡し、他シャードの認証は取り除く。
+SHARDS_CONFIG = os.environ.get("SHARDS_CONFIG", "shards.json")
+SHARD_CONCURRENCY = int(os.environ.get("SHARD_CONCURRENCY", "0"))  # 0 はシャード数ぶん同時実行
+SLACK_WEBHOOK_URL = os.environ.get("SLACK_WEBHOOK_URL", "")
+X_CREDENTIALS = ("X_API_KEY", "X_API_SECRET", "X_ACCESS_TOKEN", "X_ACCESS_SECRET", "X_BEARER_TOKEN")
+POST_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "post_to_x.py")
+OUTPUT_TAIL_LINES = 20
+# シャードには残りの持ち時間を RUN_DEADLINE_SEC として渡し、それを SHARD_KILL_GRACE_SEC 過ぎても
+# 終わらないプロセスは止めて失敗扱いにする（1シャードが固まってもジョブ全体を待たせない）
+SHARD_KILL_GRACE_SEC = float(os.environ.get("SHARD_KILL_GRACE_SEC", "60"))
+TIMEOUT_RETURNCODE = 124
+
+# 実行全体の締切（RUN_DEADLINE_SEC）
+DEADLINE = Deadline.from_env()
+
+
+class ShardResult(NamedTuple):
+    name: str
+    returncode: int
+    elapsed: float
+    output: str
+    timed_out: bool = False
+
+
+def _lookup(name: str) -> Optional[str]:
+    return os.environ.get(name) or None
+
+
+def _referenced(shards: List[dict]) -> Set[str]:
+    """シャード定義が参照する環境変数名（他シャードのプロセスには渡さない）"""
+    names = set()
+    for shard in shards:
+        names.update(shard.get("x", {}).values())
+        names.update(shard.get(k) for k in ("database_id_env", "notion_api_key_env") if shard.get(k))
+    return names
+
+
+def load_shards(path: str = SHARDS_CONFIG) -> List[dict]:
+    with open(path, encoding="utf-8") as f:
+        shards = json.load(f)
+    names = [s.get("name") for s in shards]
+    if not all(names) or len(set(names)) != len(names):
+        raise ValueError("each shard needs a unique name")
+    return shards
+
+
+def shard_env(shard: dict, hidden: Set[str] = frozenset()) -> Dict[str, str]:
+    """
+    シャード用の環境変数（共通の Notion/Slack キーは引き継ぎ、DB・X認証・STATE_DIR を差し替える）。
+    hidden（シャード定義が参照する名前）は引き継がない
+    """
+    env = {k: v for k, v in os.environ.items() if k not in X_CREDENTIALS and k not in hidden}
+    database_id = shard.get("database_id") or _lookup(shard.get("database_id_env", ""))
+    if not database_id:
+        raise ValueError(f"{shard['name']}: Notion database id is not set")
+    env["NOTION_DATABASE_ID"] = database_id
+    for key, var in shard.get("x", {}).items():
+        if key not in X_CREDENTIALS:
+            raise ValueError(f"{shard['name']}: unknown credential {key}")
+        value = _lookup(var)
+        if value:
+            env[key] = value
+    missing = [k for k in X_CREDENTIALS[:4] if not env.get(k)]
+    if missing:
+        raise ValueError(f"{shard['name']}: missing {', '.join(missing)}")
+    if shard.get("notion_api_key_env"):
+        env["NOTION_API_KEY"] = _lookup(shard["notion_api_key_env"]) or ""
+    env["STATE_DIR"] = os.path.join(state_store.STATE_DIR, "shards", shard["name"])
+    env["SHARD_NAME"] = shard["name"]
+    env["POST_LANG"] = shard.get("lang", "")
+    env["POST_WORKERS"] = str(shard.get("workers", env.get("POST_WORKERS", "1")))
+    return env
+
+
+def _text(output) -> str:
+    # TimeoutExpired の出力は text=True でも bytes のことがある
+    if isinstance(output, bytes):
+        return output.decode("utf-8", "replace")
+    return output or ""
+
+
+def run_shard(shard: dict, hidden: Set[str] = frozenset(), deadline: Deadline = DEADLINE) -> ShardResult:
+    start = time.monotonic()
+    try:
+        env = shard_env(shard, hidden)
+    except ValueError as e:
+        return ShardResult(shard.get("name", "?"), 2, 0.0, str(e))
+    timeout = None
+    left = deadline.limit()
+    if left is not None:
+        # 同時実行数の都合で後から始まるシャードも、全体の締切に合わせて持ち時間を詰める
+        env["RUN_DEADLINE_SEC"] = str(max(int(left), 1))
+        timeout = left + SHARD_KILL_GRACE_SEC
+    try:
+        proc = subprocess.run([sys.executable, POST_SCRIPT], env=env, capture_output=True, text=True,
+                              timeout=timeout)
+    except subprocess.TimeoutExpired as e:
+        output = _text(e.stdout) + _text(e.stderr)
+        return ShardResult(shard["name"], TIMEOUT_RETURNCODE, time.monotonic() - start,
+                           output + f"\n[ERROR] killed after {timeout:.0f}s (run deadline exceeded)", True)
+    return ShardResult(shard["name"], proc.returncode, time.monotonic() - start, proc.stdout + proc.stderr)
+
+
+def run_all(shards: List[dict]) -> List[ShardResult]:
+    """全シャードを並行実行（所要時間は最も遅いシャード分）"""
+    hidden = _referenced(shards)
+    with ThreadPoolExecutor(max_workers=SHARD_CONCURRENCY or len(shards) or 1) as pool:
+        return list(pool.map(lambda s: run_shard(s, hidden), shards))
+
+
+def notify_slack(message: str) -> None:
+    if not SLACK_WEBHOOK_URL:
+        return
+    try:
+        requests.post(SLACK_WEBHOOK_URL, json={"text": message}, timeout=15).raise_for_status()
+    except Exception as e:
+        print(f"Slack通知失敗: {e} :: {message}")
+
+
+def main() -> None:
+    start = time.monotonic()
+    results = run_all(load_shards())
+    for r in results:
+        print(f"===== [{r.name}] exit={r.returncode} {r.elapsed:.1f}s =====")
+        print("\n".join(r.output.rstrip().splitlines()[-OUTPUT_TAIL_LINES:]))
+    failed = [r for r in results if r.returncode != 0]
+    lines = [f"{'✅' if r.returncode == 0 else '❌'} {r.name}: {r.elapsed:.0f}s" + (" （締切超過で停止）" if r.timed_out else "")
+             for r in results]
+    notify_slack(f"シャード投稿 {len(results) - len(failed)}/{len(results)} 成功（{time.monotonic() - start:.0f}s）\n" + "\n".join(lines))
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    # 使い方: SHARDS_CONFIG=shards.json python scripts/post_shards.py
+    main()
@@ -1,10 +1,21 @@
 import os
-import re
-from datetime import datetime, timezone
-from typing import List, Dict
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import List, Dict, Optional, Tuple
 import requests
 import tweepy
 
+from lineage import SpanLog
+from media import ImagePrefetcher
+from post_ledger import PostLedger, content_hash
+from post_scheduler import PostScheduler, format_plan, priority_weight
+from records import Page
+from resilience import CircuitOpenError, Deadline, breaker
+from tweet_compose import MAX_TWEET_LENGTH, compose_tweet, source_hash, split_draft_hash, twitter_length
+from work_queue import WorkQueue, format_stats
+
 # ===== Secrets（Actionsから注入）=====
 NOTION_API_KEY = os.environ["NOTION_API_KEY"]
 NOTION_DATABASE_ID = os.environ["NOTION_DATABASE_ID"]
@@ -14,14 +25,37 @@ X_API_SECRET = os.environ["X_API_SECRET"]
 X_ACCESS_TOKEN = os.environ["X_ACCESS_TOKEN"]
 X_ACCESS_SECRET = os.environ["X_ACCESS_SECRET"]
 X_BEARER_TOKEN = os.environ.get("X_BEARER_TOKEN")  # 任意
+SHARD_NAME = os.environ.get("SHARD_NAME", "")  # post_shards.py から起動された場合のシャード名
 
 # ===== 定数 =====
 NOTION_VERSION = "2022-06-28"
 USER_AGENT = "notion-x-mvp/1.0 (prod)"
-TCO_URL_LENGTH = 23
+POST_WORKERS = int(os.environ.get("POST_WORKERS", "1"))
+ATTACH_IMAGES = os.environ.get("ATTACH_IMAGES", "").lower() in {"1", "true", "yes"}
+APPROVAL_CURSOR = "approval_cursor"
+SYNC_STAGE_SHARE = 0.3  # 持ち時間のうち承認差分の取り込みに使う割合
+CURSOR_OVERLAP_SEC = 120  # last_edited_time は分単位のため少し重ねて取りにいく
+RATE_LIMIT_WAIT_SEC = 15 * 60  # 429 に解除時刻（x-rate-limit-reset）が無い場合の待ち
+# 多言語の下書きDBでこのアカウントが投稿する言語。取り込み側で STORE_LANG=1（Lang 列）にしておくこと
+POST_LANG = os.environ.get("POST_LANG", "")
+APPROVED_UNPOSTED_FILTER = {
+    "and": [
+        {"property": "Select", "select": {"equals": "approved"}},
+        {"property": "Posted", "checkbox": {"equals": False}},
+    ] + ([{"property": "Lang", "select": {"equals": POST_LANG}}] if POST_LANG else [])
+}
+
+# 実行全体の締切（RUN_DEADLINE_SEC）とサービスごとのブレーカー
+# X のレート制限（429）は tweepy に待たせず、解除時刻が締切に間に合う時だけ待つ（RateLimit）
+DEADLINE = Deadline.from_env()
+NOTION = breaker("notion")
+X = breaker("x")
+SPANS = SpanLog.open()  # 鮮度計測（TraceID のあるページのみ。集計は lineage.py report）
 
 # ===== 共通 =====
 def notify_slack(message: str) -> None:
+    if SHARD_NAME:
+        message = f"[{SHARD_NAME}] {message}"
     try:
         res = requests.post(SLACK_WEBHOOK_URL, json={"text": message}, timeout=15)
         res.raise_for_status()
@@ -37,8 +71,20 @@ def plain_title(prop) -> str:
 def plain_text(prop) -> str:
     return "".join([(t or {}).get("plain_text", "") for t in (prop or {}).get("rich_text", [])])
 
+def select_name(prop) -> str:
+    return (_np(prop, "select") or {}).get("name", "")
+
+def iso_ts(value: Optional[str]) -> Optional[float]:
+    """Notion の ISO8601 日時 → UNIX秒"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
 # ===== Notion =====
-def notion_query_approved_unposted() -> List[Dict[str, str]]:
+def notion_query_pages(filter_: Dict, deadline: Deadline = DEADLINE) -> List[Dict]:
     url = f"https://api.notion.com/v1/databases/{NOTION_DATABASE_ID}/query"
     headers = {
         "Authorization": f"Bearer {NOTION_API_KEY}",
@@ -46,14 +92,7 @@ def notion_query_approved_unposted() -> List[Dict[str, str]]:
         "Content-Type": "application/json",
         "User-Agent": USER_AGENT,
     }
-    payload = {
-        "filter": {
-            "and": [
-                {"property": "Select", "select": {"equals": "approved"}},
-                {"property": "Posted", "checkbox": {"equals": False}},
-            ]
-        }
-    }
+    payload = {"filter": filter_}
     results = []
     has_more = True
     next_cursor = None
@@ -61,23 +100,44 @@ def notion_query_approved_unposted() -> List[Dict[str, str]]:
         body = dict(payload)
         if next_cursor:
             body["start_cursor"] = next_cursor
-        res = requests.post(url, headers=headers, json=body, timeout=30)
-        res.raise_for_status()
+        res = NOTION.request(requests.post, url, headers=headers, json=body, timeout=deadline.timeout(30))
         data = res.json()
         results.extend(data.get("results", []))
         has_more = data.get("has_more", False)
         next_cursor = data.get("next_cursor")
+    return results
+
+def page_record(page) -> Page:
+    props = page.get("properties", {})
+    return Page(
+        id=page.get("id"),
+        title=plain_title(props.get("Title")),
+        summary=plain_text(props.get("Summary")),
+        url=_np(props.get("URL"), "url", "") or "",
+        tweet=plain_text(props.get("TweetText")),
+        tweet_length=int(_np(props.get("TweetLength"), "number") or 0),
+        content_hash=plain_text(props.get("ContentHash")),
+        trace_id=plain_text(props.get("TraceID")),
+        feed=plain_text(props.get("Feed")),
+        published=int(iso_ts((_np(props.get("Published"), "date") or {}).get("start")) or 0) or None,
+        inserted_at=iso_ts(page.get("created_time")),
+        # 承認差分の取り込み時点では承認操作が最後の編集
+        approved_at=iso_ts(page.get("last_edited_time")),
+        # Priority はセレクト（urgent/high/normal/low）か数値。Topic が無ければ一致したルール名の先頭
+        priority=priority_weight(_np(props.get("Priority"), "number") or select_name(props.get("Priority"))),
+        topic=select_name(props.get("Topic")) or next(
+            (o.get("name", "") for o in _np(props.get("Rules"), "multi_select") or []), ""),
+    )
 
-    pages: List[Dict[str, str]] = []
-    for page in results:
-        props = page.get("properties", {})
-        pages.append({
-            "id": page.get("id"),
-            "title": plain_title(props.get("Title")),
-            "summary": plain_text(props.get("Summary")),
-            "url": _np(props.get("URL"), "url", ""),
-        })
-    return pages
+def notion_query_approved_unposted() -> List[Page]:
+    return [page_record(page) for page in notion_query_pages(APPROVED_UNPOSTED_FILTER)]
+
+def is_approved_unposted(page) -> bool:
+    props = page.get("properties", {})
+    select = _np(props.get("Select"), "select") or {}
+    if POST_LANG and (_np(props.get("Lang"), "select") or {}).get("name") != POST_LANG:
+        return False
+    return select.get("name") == "approved" and not _np(props.get("Posted"), "checkbox", False)
 
 def notion_mark_posted(page_id: str, tweet_id: str) -> None:
     url = f"https://api.notion.com/v1/pages/{page_id}"
@@ -95,42 +155,64 @@ def notion_mark_posted(page_id: str, tweet_id: str) -> None:
             "PostedAt": {"date": {"start": now_utc}},
         }
     }
-    res = requests.patch(url, headers=headers, json=payload, timeout=30)
-    res.raise_for_status()
+    NOTION.request(requests.patch, url, headers=headers, json=payload, timeout=DEADLINE.timeout(30))
 
-# ===== ツイート整形 =====
-URL_RE = re.compile(r"https?://\S+")
+# ===== ツイート本文 =====
+def tweet_for(p: Page) -> Tuple[str, str]:
+    """
+    取り込み時に作成・検証済みの TweetText をそのまま使う（本文, ハッシュ）。
+    編集者が TweetText を書き換えていれば（本文ハッシュ不一致）長さだけ確認してそのまま使う。
+    書き換えておらず Title/Summary/URL の方が直されていれば（組み立て元ハッシュ不一致）組み立て直す。
+    未作成の旧ページはここで組み立てる
+    """
+    if not p.tweet:
+        composed = compose_tweet(p.title, p.summary, p.url)
+        return composed.text, composed.content_hash
+    stored_source, stored_text = split_draft_hash(p.content_hash)
+    text_hash = content_hash(p.tweet)
+    if text_hash != stored_text:
+        length = twitter_length(p.tweet)
+        if length > MAX_TWEET_LENGTH:
+            raise ValueError(f"TweetText too long ({length} > {MAX_TWEET_LENGTH})")
+        return p.tweet, text_hash
+    if stored_source and stored_source != source_hash(p.title, p.summary, p.url):
+        composed = compose_tweet(p.title, p.summary, p.url)
+        return composed.text, composed.content_hash
+    return p.tweet, text_hash
 
-def twitter_length(text: str) -> int:
-    return len(URL_RE.sub("x" * TCO_URL_LENGTH, text))
+# ===== X(v2) =====
+class RateLimited(RuntimeError):
+    """create_tweet が 429 で断られた（投稿されていない）"""
 
-def build_tweet(title: str, summary: str, url: str) -> str:
-    title = (title or "").strip()
-    summary = (summary or "").strip()
-    url = (url or "").strip()
+    def __init__(self, message: str, reset_at: float):
+        super().__init__(message)
+        self.reset_at = reset_at
 
-    base = f"{title}\n{url}" if title else url
-    if twitter_length(base) <= 280 and summary:
-        candidate = f"{title}\n{summary}\n{url}" if title else f"{summary}\n{url}"
-        if twitter_length(candidate) <= 280:
-            return candidate
 
-    remain = 280 - twitter_length((f"{title}\n\n{url}" if title else f"\n{url}")) - 1
-    remain = max(remain, 0)
-    trimmed = summary if len(summary) <= remain else (summary[: max(remain - 1, 0)] + ("…" if remain > 0 else ""))
+class RateLimit:
+    """429 で分かった解除時刻（全ワーカーで共有）。締切までに解除されない場合は今回の投稿を打ち切る"""
 
-    candidate = f"{title}\n{trimmed}\n{url}" if title else f"{trimmed}\n{url}"
-    if twitter_length(candidate) <= 280:
-        return candidate
+    def __init__(self):
+        self.reset_at = 0.0
+        self._lock = threading.Lock()
 
-    if title:
-        max_title_len = 280 - TCO_URL_LENGTH - 1
-        if len(title) > max_title_len:
-            title = title[: max_title_len - 1] + "…"
-        return f"{title}\n{url}"
-    return url
+    def hit(self, reset_at: float) -> None:
+        with self._lock:
+            self.reset_at = max(self.reset_at, reset_at)
+
+    def wait(self, deadline: Deadline) -> bool:
+        """解除まで待って True。締切（マージン込み）までに解除されないなら待たずに False"""
+        wait = self.reset_at - time.time()
+        if wait <= 0:
+            return True
+        if not deadline.can_start(wait):
+            return False
+        time.sleep(wait)
+        return True
+
+
+X_RATE = RateLimit()
 
-# ===== X(v2) =====
 def get_twitter_client() -> tweepy.Client:
     return tweepy.Client(
         bearer_token=X_BEARER_TOKEN,
@@ -138,9 +220,14 @@ def get_twitter_client() -> tweepy.Client:
         consumer_secret=X_API_SECRET,
         access_token=X_ACCESS_TOKEN,
         access_token_secret=X_ACCESS_SECRET,
-        wait_on_rate_limit=True,
+        wait_on_rate_limit=False,
     )
 
+def get_media_api() -> tweepy.API:
+    """画像アップロードは v1.1 media/upload（OAuth1 ユーザー認証）"""
+    auth = tweepy.OAuth1UserHandler(X_API_KEY, X_API_SECRET, X_ACCESS_TOKEN, X_ACCESS_SECRET)
+    return tweepy.API(auth, wait_on_rate_limit=False)
+
 def _extract_error_detail(resp) -> str:
     try:
         return resp.json()
@@ -164,14 +251,23 @@ def verify_x_credentials(client: tweepy.Client) -> None:
             raise RuntimeError(f"X認証失敗 status={detail.status_code}, body={body}") from e
         raise
 
-def post_to_x_v2(client: tweepy.Client, status_text: str) -> str:
+def upload_media(api: tweepy.API, path: str) -> str:
+    media = api.media_upload(filename=path)
+    return str(media.media_id_string)
+
+def post_to_x_v2(client: tweepy.Client, status_text: str, media_ids: Optional[List[str]] = None) -> str:
     try:
-        resp = client.create_tweet(text=status_text, user_auth=True)
+        resp = X.call(client.create_tweet, text=status_text, media_ids=media_ids, user_auth=True)
         data = getattr(resp, "data", None) or {}
         tweet_id = str(data.get("id") or "")
         if not tweet_id:
             raise RuntimeError(f"Unexpected response: {data}")
         return tweet_id
+    except tweepy.TooManyRequests as e:
+        reset = (getattr(e.response, "headers", None) or {}).get("x-rate-limit-reset")
+        reset_at = float(reset) if reset and reset.isdigit() else time.time() + RATE_LIMIT_WAIT_SEC
+        X_RATE.hit(reset_at)
+        raise RateLimited(f"X投稿失敗 status=429 (reset in {max(reset_at - time.time(), 0):.0f}s)", reset_at) from e
     except tweepy.TweepyException as e:
         detail = getattr(e, "response", None)
         if detail is not None:
@@ -179,35 +275,243 @@ def post_to_x_v2(client: tweepy.Client, status_text: str) -> str:
             raise RuntimeError(f"X投稿失敗 status={detail.status_code}, body={body}") from e
         raise
 
+def rejected_before_post(e: Exception) -> bool:
+    """create_tweet が投稿されずに終わったことが確実な失敗か（4xx 応答・ブレーカー遮断で未送信）"""
+    if isinstance(e, (CircuitOpenError, RateLimited)):
+        return True
+    cause = e if isinstance(e, tweepy.HTTPException) else e.__cause__
+    if not isinstance(cause, tweepy.HTTPException):
+        return False
+    return 400 <= getattr(cause.response, "status_code", 0) < 500
+
+# ===== キュー =====
+def schedule(scheduler: PostScheduler, p: Page) -> None:
+    """公開時刻（無ければ下書き作成時刻）と優先度・トピックで採点し直す"""
+    scheduler.upsert(p.id, p.published or p.inserted_at, p.priority, p.topic)
+
+def sync_approvals(queue: WorkQueue, deadline: Deadline = DEADLINE, scheduler: Optional[PostScheduler] = None) -> int:
+    """
+    前回以降に編集されたページ（承認状態の差分）だけを取り込み post キューへ投入（キューは投稿側の STATE_DIR にあり、
+    取り込み側とは共有しない。投稿対象は Notion の差分からだけ積む）。
+    scheduler があれば承認・優先度変更をその場で採点し直す
+    """
+    started = datetime.now(timezone.utc)
+    cursor = queue.get_meta(APPROVAL_CURSOR)
+    if cursor:
+        pages = notion_query_pages({"timestamp": "last_edited_time", "last_edited_time": {"on_or_after": cursor}}, deadline)
+    else:
+        # 初回（ステート無し）は従来どおり approved & Posted=false を全件取得
+        pages = notion_query_pages(APPROVED_UNPOSTED_FILTER, deadline)
+
+    enqueued = 0
+    for page in pages:
+        record = page_record(page)
+        if is_approved_unposted(page):
+            enqueued += queue.enqueue("post", record.id, record.to_dict())
+            if scheduler is not None:
+                schedule(scheduler, record)
+        else:
+            # 承認取り消し等は未処理なら取り下げる
+            queue.remove("post", record.id)
+            if scheduler is not None and queue.status("post", record.id) is None:
+                scheduler.remove(record.id)
+
+    next_cursor = started - timedelta(seconds=CURSOR_OVERLAP_SEC)
+    queue.set_meta(APPROVAL_CURSOR, next_cursor.strftime("%Y-%m-%dT%H:%M:%SZ"))
+    return enqueued
+
+def reconcile_ledger(ledger: PostLedger, queue: WorkQueue) -> None:
+    """前回までに投稿済みで Notion 未反映のものを書き戻す（再投稿はしない）"""
+    for e in ledger.pending_writebacks():
+        try:
+            notion_mark_posted(e.page_id, e.tweet_id)
+            ledger.record_synced(e.page_id)
+            queue.complete("post", e.page_id)
+            notify_slack(f"♻️ Notion書き戻し再試行成功: page={e.page_id} → {e.tweet_id}")
+        except Exception as ex:
+            notify_slack(f"❌ Notion書き戻し再試行失敗: page={e.page_id} | error={ex}")
+    doubtful = ledger.in_doubt()
+    if doubtful:
+        # 投稿されたか不明なものは自動で再投稿しない（確認後 post_ledger.py release で解除）
+        notify_slack("⚠️ 投稿結果不明のため保留中: " + ", ".join(e.page_id for e in doubtful[:10])
+                     + "（未投稿を確認後、Post to X を release_page_id に指定して実行すると解除して投稿）")
+
+def prepare_media_ids(prefetcher: Optional[ImagePrefetcher], media_api: Optional[tweepy.API], url: str) -> Optional[List[str]]:
+    """先読み済み画像をアップロード（画像無し・失敗時はテキストのみで投稿）"""
+    if not prefetcher or not media_api:
+        return None
+    path = prefetcher.result(url)
+    if not path:
+        return None
+    try:
+        return [upload_media(media_api, path)]
+    except Exception as e:
+        print(f"[WARN] media upload failed: {url} ({e})")
+        return None
+
+def process_item(client: tweepy.Client, queue: WorkQueue, ledger: PostLedger, item, previews: List[str],
+                 prefetcher: Optional[ImagePrefetcher] = None, media_api: Optional[tweepy.API] = None) -> bool:
+    p = Page.from_dict(item.payload)
+    try:
+        tweet, text_hash = tweet_for(p)
+    except ValueError as e:
+        # 編集で上限超過 → 修正されれば承認差分の取り込みで payload が更新される
+        queue.retry(item, str(e))
+        previews.append(f"- NG {p.id}: {e}")
+        notify_slack(f"❌ 投稿文エラー: page={p.id} | {e}")
+        return False
+    existing = ledger.begin(p.id, text_hash)
+    if existing:
+        if existing.status == "posting":
+            # 投稿されたか不明（このページ、または同じ本文の別ページ）→ 完了にせず保留
+            # （確認後 post_ledger.py release で台帳とあわせて戻す）
+            other = "" if existing.page_id == p.id else f" (same text as {existing.page_id})"
+            queue.hold(item, f"ledger in doubt{other}")
+            previews.append(f"- HOLD {p.id}: ledger=posting{other}")
+            return False
+        # 台帳に投稿済みの記録（このページ/同一本文）→ create_tweet は呼ばない
+        queue.ack(item)
+        previews.append(f"- SKIP {p.id}: ledger={existing.status}")
+        return False
+
+    try:
+        media_ids = prepare_media_ids(prefetcher, media_api, p.url)
+        tweet_id = post_to_x_v2(client, tweet, media_ids)
+    except Exception as e:
+        if not rejected_before_post(e):
+            # タイムアウト・5xx 等は投稿された可能性がある → 台帳は posting のまま残し再投稿しない
+            queue.hold(item, str(e))
+            previews.append(f"- HOLD {p.id}: {str(e)}")
+            notify_slack(f"⚠️ 投稿結果不明のため保留: page={p.id} | url={p.url} | error={e}"
+                         f"（未投稿を確認後、Post to X を release_page_id={p.id} で実行）")
+            return False
+        ledger.abort(p.id)
+        if isinstance(e, RateLimited):
+            # レート制限は試行回数に数えず、解除時刻まで差し戻す
+            queue.release(item, delay=e.reset_at - time.time())
+            previews.append(f"- WAIT {p.id}: {str(e)}")
+            return False
+        queue.retry(item, str(e))
+        previews.append(f"- NG {p.id}: {str(e)}")
+        notify_slack(f"❌ 投稿失敗: page={p.id} | url={p.url} | error={e}")
+        return False
+
+    ledger.record_posted(p.id, tweet_id)
+    queue.ack(item)
+    trace_posted(p)
+    previews.append(f"- OK {p.id} → {tweet_id}")
+    try:
+        notion_mark_posted(p.id, tweet_id)
+        ledger.record_synced(p.id)
+        notify_slack(f"✅ 投稿成功: id={tweet_id} | title={p.title}")
+    except Exception as e:
+        # 次回 reconcile_ledger で書き戻す
+        notify_slack(f"⚠️ 投稿成功・Notion反映失敗（次回再試行）: id={tweet_id} | page={p.id} | error={e}")
+    return True
+
+def trace_posted(p: Page) -> None:
+    """取り込み側と別の STATE_DIR でも集計できるよう、ページ上の時刻もあわせて記録する"""
+    if not p.trace_id:
+        return
+    for stage, ts in (("inserted", p.inserted_at), ("approved", p.approved_at)):
+        if ts:
+            SPANS.record(p.trace_id, stage, ts)
+    SPANS.record(p.trace_id, "posted", time.time(), published=p.published, page=p.id, feed=p.feed)
+
+def next_item(queue: WorkQueue, scheduler: Optional[PostScheduler]):
+    """次に投稿する項目を借りる。scheduler があれば今回の枠に入る最も価値の高いものから"""
+    if scheduler is None:
+        items = queue.lease("post")
+        return items[0] if items else None
+    while True:
+        key = scheduler.next_due()
+        if key is None:
+            return None
+        item = queue.lease_key("post", key)
+        if item is not None:
+            return item
+        if queue.status("post", key) in (None, "done", "dead", "held"):
+            scheduler.remove(key)
+        else:
+            # バックオフ中・他ワーカーが処理中のものは今回は見送る（次回の起動でヒープに戻る）
+            scheduler.release(key)
+
+def run_worker(client: tweepy.Client, queue: WorkQueue, ledger: PostLedger, previews: List[str],
+               prefetcher: Optional[ImagePrefetcher] = None, media_api: Optional[tweepy.API] = None,
+               scheduler: Optional[PostScheduler] = None) -> int:
+    """
+    今回の枠（無ければキュー）が尽きるまで1件ずつ借りて投稿する（締切間際・X遮断中・
+    締切までに解除されないレート制限中は新規に借りない）
+    """
+    posted = 0
+    while DEADLINE.can_start() and X.state != "open" and X_RATE.wait(DEADLINE):
+        item = next_item(queue, scheduler)
+        if item is None:
+            return posted
+        ok = process_item(client, queue, ledger, item, previews, prefetcher, media_api)
+        posted += ok
+        if scheduler is not None:
+            if ok:
+                scheduler.record_posted(item.key)
+            elif queue.status("post", item.key) in ("done", "dead", "held"):
+                scheduler.remove(item.key)  # 台帳で投稿済み判定・試行回数超過・結果不明で保留
+            else:
+                scheduler.release(item.key)
+    return posted
+
 # ===== メイン =====
 def main() -> None:
     notify_slack("=== X投稿処理開始（v2）===")
     try:
-        pages = notion_query_approved_unposted()
-        if not pages:
+        queue = WorkQueue.open()
+        ledger = PostLedger.open()
+        reconcile_ledger(ledger, queue)
+        scheduler = PostScheduler.open()
+        sync_approvals(queue, DEADLINE.stage(SYNC_STAGE_SHARE), scheduler)
+        # スケジューラ導入前からキューにある分・前回取りこぼした分を載せる（変化が無ければ何もしない）
+        for payload in queue.peek("post", limit=10000):
+            schedule(scheduler, Page.from_dict(payload))
+        stats = queue.stats("post")
+        notify_slack(format_stats(stats))
+        if not stats["ready"] and not stats["leased"]:
             notify_slack("新規投稿対象（approved & Posted=false）はありません。")
             return
 
         client = get_twitter_client()
         verify_x_credentials(client)
 
-        posted = 0
-        previews = []
-        for p in pages:
-            tweet = build_tweet(p["title"], p["summary"], p["url"])
-            try:
-                tweet_id = post_to_x_v2(client, tweet)
-                notion_mark_posted(p["id"], tweet_id)
-                posted += 1
-                previews.append(f"- OK {p['id']} → {tweet_id}")
-                notify_slack(f"✅ 投稿成功: id={tweet_id} | title={p['title']}")
-            except Exception as e:
-                previews.append(f"- NG {p['id']}: {str(e)}")
-                notify_slack(f"❌ 投稿失敗: page={p['id']} | url={p['url']} | error={e}")
-
-        notify_slack(f"X投稿完了: {posted}件 / 対象 {len(pages)}件\n" +
+        prefetcher, media_api = None, None
+        if ATTACH_IMAGES:
+            # 投稿ループと並行して全対象の画像を先読み・縮小しておく
+            prefetcher, media_api = ImagePrefetcher(), get_media_api()
+            # 古い縮小済み画像を先に片付ける（先読みを始める前なので書き込み中のファイルは無い）
+            removed = prefetcher.cache.purge()
+            if removed:
+                print(f"[INFO] media cache: removed {removed} files")
+            # 今回の枠に入る予定のものから
+            urls = {p["id"]: p.get("url", "") for p in queue.peek("post", limit=10000)}
+            for _, key in scheduler.plan():
+                if urls.get(key):
+                    prefetcher.submit(urls[key])
+
+        notify_slack(format_plan(scheduler, scheduler.plan()))
+        previews: List[str] = []
+        try:
+            with ThreadPoolExecutor(max_workers=POST_WORKERS) as pool:
+                futures = [pool.submit(run_worker, client, queue, ledger, previews, prefetcher, media_api, scheduler)
+                           for _ in range(POST_WORKERS)]
+                posted = sum(f.result() for f in futures)
+        finally:
+            if prefetcher:
+                prefetcher.close()
+
+        notify_slack(f"X投稿完了: {posted}件 / 対象 {len(previews)}件\n" +
                      "\n".join(previews[:10]) +
                      ("" if len(previews) <= 10 else "\n…"))
+        if not DEADLINE.can_start() or X.state == "open" or X_RATE.reset_at > time.time():
+            notify_slack("⏱ 締切間際・X遮断中またはレート制限中のため残りは次回に持ち越します")
+        notify_slack(format_stats(queue.stats("post")))
+        queue.purge_done()
     except Exception as e:
         notify_slack(f"❌ X投稿処理エラー: {e}")
         raise
@@ -0,0 +1,63 @@
+from dataclasses import asdict, dataclass, fields, replace
+from typing import Any, Dict, Optional, Tuple
+
+# ===== 記事/ページの軽量レコード =====
+# dict より省メモリ（__slots__）で、途中で書き換えられないよう immutable にしている。
+# キューなど JSON で持ち回る箇所は to_dict / from_dict で変換する。
+
+
+@dataclass(frozen=True, slots=True)
+class Article:
+    """取り込み側で扱う記事（フィード由来。翻訳後は replace で差し替える）"""
+    title: str
+    url: str
+    summary: str = ""
+    published: Optional[int] = None  # UNIX秒（UTC）
+    guid: str = ""
+    feed: str = ""
+    tags: Tuple[str, ...] = ()  # 一致したルール名（rules.py）
+    trace_id: str = ""  # 鮮度計測用（lineage.py）
+    fetched_at: Optional[float] = None  # 取得（受信）時刻 UNIX秒
+    translated_by: str = ""  # 翻訳したプロバイダ（translate_router.py。複数なら "+" 区切り）
+    link: str = ""  # フィードの元のリンク（Notion の URL プロパティ。url は重複判定用の正規化URL）
+
+    def replace(self, **changes) -> "Article":
+        return replace(self, **changes)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Article":
+        values = {f.name: data[f.name] for f in fields(cls) if f.name in data}
+        if "tags" in values:
+            values["tags"] = tuple(values["tags"])  # JSON では配列になる
+        return cls(**values)
+
+
+@dataclass(frozen=True, slots=True)
+class Page:
+    """投稿側で扱う Notion ページ（tweet 以下は取り込み時に作成した投稿文。旧ページは空）"""
+    id: str
+    title: str
+    summary: str
+    url: str
+    tweet: str = ""
+    tweet_length: int = 0
+    content_hash: str = ""
+    # 鮮度計測用（lineage.py）。時刻は UNIX秒
+    trace_id: str = ""
+    feed: str = ""  # 取得元フィード（取り込み側の Feed プロパティ）
+    published: Optional[int] = None
+    inserted_at: Optional[float] = None
+    approved_at: Optional[float] = None
+    # 投稿順の採点用（post_scheduler.py）
+    priority: float = 1.0
+    topic: str = ""
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Page":
+        return cls(**{f.name: data[f.name] for f in fields(cls) if f.name in data})
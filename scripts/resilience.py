@@ -0,0 +1,146 @@
+import os
+import time
+import threading
+from typing import Callable, Dict, Optional, TypeVar
+
+T = TypeVar("T")
+
+# ===== 設定 =====
+# 連続失敗（または遅延）が BREAKER_FAILURES 回続いたサービスは BREAKER_RESET_SEC の間すぐ失敗させる。
+# RUN_DEADLINE_SEC は実行全体の持ち時間（0 は無制限）。締切 DEADLINE_MARGIN_SEC 前からは新しい処理を始めない。
+BREAKER_FAILURES = int(os.environ.get("BREAKER_FAILURES", "5"))
+BREAKER_SLOW_SEC = float(os.environ.get("BREAKER_SLOW_SEC", "10"))
+BREAKER_RESET_SEC = float(os.environ.get("BREAKER_RESET_SEC", "60"))
+RUN_DEADLINE_SEC = float(os.environ.get("RUN_DEADLINE_SEC", "0"))
+DEADLINE_MARGIN_SEC = float(os.environ.get("DEADLINE_MARGIN_SEC", "30"))
+MIN_TIMEOUT_SEC = 1.0
+
+
+class CircuitOpenError(RuntimeError):
+    """遮断中のサービスを呼ぼうとした"""
+
+
+class DeadlineExceeded(RuntimeError):
+    """実行全体の締切を過ぎた"""
+
+
+class CircuitBreaker:
+    """
+    closed → （連続失敗/遅延が閾値に達する）→ open → （reset_timeout 経過）→ half-open で1回だけ試行。
+    試行が成功すれば closed、失敗すれば再び open
+    """
+
+    def __init__(self, name: str, failure_threshold: int = BREAKER_FAILURES,
+                 slow_call_sec: float = BREAKER_SLOW_SEC, reset_timeout: float = BREAKER_RESET_SEC):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.slow_call_sec = slow_call_sec
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self.opened_at >= self.reset_timeout else "open"
+
+    def _before(self) -> None:
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return
+            if state == "half-open" and not self._probing:
+                self._probing = True
+                return
+            raise CircuitOpenError(f"{self.name}: circuit open ({self.failures} consecutive failures)")
+
+    def _record(self, ok: bool) -> None:
+        with self._lock:
+            self._probing = False
+            if ok:
+                self.failures = 0
+                self.opened_at = None
+                return
+            self.failures += 1
+            if self.failures >= self.failure_threshold or self.opened_at is not None:
+                self.opened_at = time.monotonic()
+
+    def call(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        """fn を実行。例外は失敗として数えて送出、閾値超えの遅延は結果を返しつつ失敗として数える"""
+        self._before()
+        start = time.monotonic()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception:
+            self._record(False)
+            raise
+        self._record(time.monotonic() - start < self.slow_call_sec)
+        return result
+
+    def request(self, method: Callable[..., T], url: str, **kwargs) -> T:
+        """
+        HTTP 呼び出し（requests.get など）。429・5xx は失敗として数えて HTTPError を送出する。
+        それ以外の 4xx は送出するがサービスの失敗には数えない（リクエスト側の誤り）
+        """
+        def send():
+            res = method(url, **kwargs)
+            if res.status_code == 429 or res.status_code >= 500:
+                res.raise_for_status()
+            return res
+
+        res = self.call(send)
+        res.raise_for_status()
+        return res
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker(name: str, **kwargs) -> CircuitBreaker:
+    """サービス名ごとに1つのブレーカーを共有する（初回呼び出し時の設定で作成）"""
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name, **kwargs)
+        return _breakers[name]
+
+
+class Deadline:
+    """実行全体（または段階ごと）の締切。HTTPタイムアウトを残り時間で頭打ちにする"""
+
+    def __init__(self, seconds: Optional[float], margin: float = DEADLINE_MARGIN_SEC):
+        self.end = time.monotonic() + seconds if seconds else None
+        self.margin = margin
+
+    @classmethod
+    def from_env(cls) -> "Deadline":
+        return cls(RUN_DEADLINE_SEC)
+
+    def remaining(self) -> float:
+        return float("inf") if self.end is None else self.end - time.monotonic()
+
+    def limit(self) -> Optional[float]:
+        """残り秒数（無制限なら None）。asyncio.wait などの timeout 引数向け"""
+        return None if self.end is None else max(self.remaining(), 0)
+
+    def can_start(self, estimate: float = 0) -> bool:
+        """締切（マージン込み）までに estimate 秒の処理を始めてよいか"""
+        return self.remaining() - self.margin > estimate
+
+    def timeout(self, default: float) -> float:
+        """default 秒と残り時間の短い方。締切を過ぎていれば DeadlineExceeded"""
+        left = self.remaining()
+        if left <= 0:
+            raise DeadlineExceeded("run deadline exceeded")
+        return max(min(default, left), MIN_TIMEOUT_SEC)
+
+    def stage(self, share: float) -> "Deadline":
+        """残り時間（マージン除く）のうち share の割合を持ち時間とする段階用の締切"""
+        if self.end is None:
+            return Deadline(None, self.margin)
+        child = Deadline(None, 0)
+        child.end = time.monotonic() + max(self.remaining() - self.margin, 0) * share
+        return child
@@ -0,0 +1,204 @@
+import os
+import re
+import sys
+import json
+import time
+import random
+from collections import deque
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from near_dup import normalize_text
+
+# ===== 設定 =====
+# RULES_FILE が無ければ従来どおり全件を翻訳・登録する。一致したルール名を下書きの Rules 列に残すには
+# 列を追加してから STORE_RULES=1 を設定する（notion_insert.py）。
+# {
+#   "rules": [
+#     {"name": "ai", "action": "include", "keywords": ["openai", "生成AI"], "regex": ["\\bgpt-\\d"]},
+#     {"name": "ads", "action": "exclude", "keywords": ["sponsored", "PR"]},
+#     {"name": "jp-politics", "action": "tag", "keywords": ["首相"], "feeds": ["https://example.com/rss"]}
+#   ]
+# }
+# action: include（いずれかに一致した記事だけ残す）/ exclude（一致したら捨てる・最優先）/ tag（タグ付けのみ）
+# feeds を指定したルールはそのフィードの記事にだけ適用。fields は既定で title と summary。
+RULES_FILE = os.environ.get("RULES_FILE", "rules.json")
+ACTIONS = ("include", "exclude", "tag")
+ASCII_WORD_RE = re.compile(r"[a-z0-9]")
+
+
+class Rule(NamedTuple):
+    name: str
+    action: str
+    feeds: Tuple[str, ...]
+    fields: Tuple[str, ...]
+    regexes: Tuple["re.Pattern", ...]
+
+
+class Verdict(NamedTuple):
+    keep: bool
+    tags: Tuple[str, ...]  # 一致した include / tag ルール名
+    reason: str  # 捨てた理由（exclude ルール名 or "no-include"）
+
+
+# ===== Aho-Corasick =====
+class Automaton:
+    """多パターン同時照合。キーワード数に依らず本文1パスで全一致を列挙する"""
+
+    def __init__(self, patterns: Sequence[str]):
+        self.patterns = list(patterns)
+        goto: List[Dict[str, int]] = [{}]
+        out: List[List[int]] = [[]]
+        for pid, pattern in enumerate(self.patterns):
+            state = 0
+            for ch in pattern:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][ch] = nxt
+                    goto.append({})
+                    out.append([])
+                state = nxt
+            out[state].append(pid)
+
+        fail = [0] * len(goto)
+        q = deque(goto[0].values())
+        while q:
+            state = q.popleft()
+            for ch, nxt in goto[state].items():
+                q.append(nxt)
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0)
+                out[nxt] = out[nxt] + out[fail[nxt]]
+        self.goto, self.fail, self.out = goto, fail, [tuple(o) for o in out]
+        # 英数字で始まる/終わるキーワードは単語境界で一致させる（"ai" が "said" に当たらないように）
+        self.bounded = [(bool(ASCII_WORD_RE.match(p[:1])), bool(ASCII_WORD_RE.match(p[-1:]))) for p in self.patterns]
+
+    def iter_matches(self, text: str) -> Iterator[int]:
+        goto, fail, out = self.goto, self.fail, self.out
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for pid in out[state]:
+                head, tail = self.bounded[pid]
+                start = i - len(self.patterns[pid]) + 1
+                if head and start > 0 and ASCII_WORD_RE.match(text[start - 1]):
+                    continue
+                if tail and i + 1 < len(text) and ASCII_WORD_RE.match(text[i + 1]):
+                    continue
+                yield pid
+
+# ===== ルールエンジン =====
+class RuleEngine:
+    def __init__(self, config: dict):
+        self.rules: List[Rule] = []
+        keywords: Dict[str, List[int]] = {}  # 正規化キーワード → ルール番号
+        for spec in config.get("rules", []):
+            action = spec.get("action", "tag")
+            if action not in ACTIONS:
+                raise ValueError(f"rule {spec.get('name')}: unknown action {action}")
+            rid = len(self.rules)
+            self.rules.append(Rule(
+                name=spec["name"],
+                action=action,
+                feeds=tuple(spec.get("feeds", ())),
+                fields=tuple(spec.get("fields", ("title", "summary"))),
+                regexes=tuple(re.compile(r, re.IGNORECASE) for r in spec.get("regex", ())),
+            ))
+            for kw in spec.get("keywords", ()):
+                norm = normalize_text(kw).strip()
+                if norm:
+                    keywords.setdefault(norm, []).append(rid)
+        self.keyword_rules = list(keywords.values())
+        self.automaton = Automaton(list(keywords))
+        self.regex_rules = [rid for rid, r in enumerate(self.rules) if r.regexes]
+
+    @classmethod
+    def load(cls, path: str = RULES_FILE) -> Optional["RuleEngine"]:
+        """ルールファイルが無ければ None（フィルタしない）"""
+        try:
+            with open(path, encoding="utf-8") as f:
+                return cls(json.load(f))
+        except FileNotFoundError:
+            return None
+
+    def _applies(self, rule: Rule, feed: str) -> bool:
+        return not rule.feeds or feed in rule.feeds
+
+    def matches(self, title: str, summary: str = "", feed: str = "") -> List[int]:
+        """一致したルール番号（フィード外のルールは除く）"""
+        texts = {"title": normalize_text(title), "summary": normalize_text(summary)}
+        hit = set()
+        for name, text in texts.items():
+            if not text:
+                continue
+            for pid in self.automaton.iter_matches(text):
+                for rid in self.keyword_rules[pid]:
+                    if name in self.rules[rid].fields:
+                        hit.add(rid)
+        for rid in self.regex_rules:
+            rule = self.rules[rid]
+            if rid not in hit and any(p.search(texts[f]) for f in rule.fields if f in texts for p in rule.regexes):
+                hit.add(rid)
+        return sorted(rid for rid in hit if self._applies(self.rules[rid], feed))
+
+    def evaluate(self, title: str, summary: str = "", feed: str = "") -> Verdict:
+        hit = [self.rules[rid] for rid in self.matches(title, summary, feed)]
+        for rule in hit:
+            if rule.action == "exclude":
+                return Verdict(False, (), rule.name)
+        tags = tuple(r.name for r in hit)
+        # include ルールがこのフィードに1つでもあれば、どれかに一致した記事だけ残す
+        if not any(r.action == "include" for r in hit) and any(
+            r.action == "include" and self._applies(r, feed) for r in self.rules
+        ):
+            return Verdict(False, (), "no-include")
+        return Verdict(True, tags, "")
+
+
+def apply_rules(articles, engine: Optional[RuleEngine]):
+    """
+    翻訳前の記事にルールを適用。
+    戻り値: (残す記事（tags 付与済み）, [(除外記事, 理由), ...])
+    """
+    if engine is None:
+        return list(articles), []
+    kept, dropped = [], []
+    for a in articles:
+        verdict = engine.evaluate(a.title, a.summary, a.feed)
+        if verdict.keep:
+            kept.append(a.replace(tags=verdict.tags) if verdict.tags else a)
+        else:
+            dropped.append((a, verdict.reason))
+    return kept, dropped
+
+# ===== ベンチ（CLI）=====
+def bench(n_keywords: int = 5000, n_entries: int = 2000) -> None:
+    rnd = random.Random(0)
+    words = ["".join(rnd.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rnd.randint(4, 10))) for _ in range(n_keywords)]
+    config = {"rules": [{"name": f"r{i}", "action": "tag", "keywords": words[i::50]} for i in range(50)]}
+    start = time.perf_counter()
+    engine = RuleEngine(config)
+    built = time.perf_counter() - start
+    entries = [(" ".join(rnd.choice(words) if rnd.random() < 0.05 else "lorem" for _ in range(12)),
+                " ".join("ipsum dolor sit amet" for _ in range(20))) for _ in range(n_entries)]
+    start = time.perf_counter()
+    tagged = sum(1 for t, s in entries if engine.evaluate(t, s).tags)
+    elapsed = time.perf_counter() - start
+    print(f"{n_keywords} keywords: build {built * 1000:.0f} ms, {n_entries / elapsed:,.0f} entries/s ({tagged} tagged)")
+
+
+if __name__ == "__main__":
+    # 使い方:
+    #   python scripts/rules.py bench [キーワード数] [記事数]
+    #   python scripts/rules.py check <rules.json> <タイトル> [要約] [フィードURL]
+    if len(sys.argv) > 1 and sys.argv[1] == "bench":
+        bench(*[int(a) for a in sys.argv[2:4]])
+    elif len(sys.argv) >= 4 and sys.argv[1] == "check":
+        print(RuleEngine.load(sys.argv[2]).evaluate(*sys.argv[3:6]))
+    else:
+        print("usage: rules.py bench [keywords] [entries] | check <rules.json> <title> [summary] [feed]", file=sys.stderr)
+        sys.exit(2)
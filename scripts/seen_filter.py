@@ -0,0 +1,246 @@
+import os
+import sys
+import math
+import mmap
+import time
+import struct
+import hashlib
+from typing import Callable, Iterable, Optional
+
+import state_store
+
+# ===== 設定 =====
+# 既存URL（Notion 登録済み）の集合を Bloom フィルタで持つ。ファイルを mmap するだけで使えるので
+# 起動時に DB 全件を読み直したり、URL 文字列の set を作ったりしない（200万件・誤検知1%で約2.3MB）。
+# 「確実に未登録」はその場で判定でき、「登録済みかも」だけ呼び出し側の厳密確認（Notion への URL 指定クエリ等）に回す。
+SEEN_FILTER = os.environ.get("SEEN_FILTER", "1").lower() in {"1", "true", "yes"}
+SEEN_FILTER_FILE = "seen_urls.bloom"
+SEEN_FILTER_CAPACITY = int(os.environ.get("SEEN_FILTER_CAPACITY", "2000000"))
+SEEN_FILTER_FP_RATE = float(os.environ.get("SEEN_FILTER_FP_RATE", "0.01"))
+
+# ヘッダ: magic, ビット数 m, ハッシュ数 k, 登録数, 想定件数, 同期済み時刻（epoch 秒）
+MAGIC = b"SEENBLM1"
+HEADER = struct.Struct("<8sQIQQd")
+HEADER_SIZE = 64
+
+
+def _hashes(key: str):
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+    return int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+
+
+class BloomFilter:
+    """mmap したファイル上の Bloom フィルタ（二重ハッシュ法）。ビット列は逆シリアライズせずそのまま参照する"""
+
+    def __init__(self, path: str, fh, mm: mmap.mmap):
+        self.path = path
+        self._fh = fh
+        self._mm = mm
+        if len(mm) < HEADER_SIZE:
+            raise ValueError(f"broken seen filter: {path}")
+        magic, self.m, self.k, self.count, self.capacity, self.synced_at = HEADER.unpack_from(mm, 0)
+        if magic != MAGIC or len(mm) < HEADER_SIZE + (self.m + 7) // 8:
+            raise ValueError(f"broken seen filter: {path}")
+
+    @staticmethod
+    def sizing(capacity: int, fp_rate: float):
+        """想定件数と誤検知率から (ビット数, ハッシュ数)"""
+        m = max(int(-capacity * math.log(fp_rate) / (math.log(2) ** 2)), 64)
+        k = max(round(m / capacity * math.log(2)), 1)
+        return m, k
+
+    @classmethod
+    def create(cls, path: str, capacity: int = SEEN_FILTER_CAPACITY,
+               fp_rate: float = SEEN_FILTER_FP_RATE) -> "BloomFilter":
+        """空のフィルタを作る（一時ファイルに書いてから差し替えるので、読み手が壊れたファイルを見ることはない）"""
+        m, k = cls.sizing(capacity, fp_rate)
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(HEADER.pack(MAGIC, m, k, 0, capacity, 0.0).ljust(HEADER_SIZE, b"\0"))
+            f.truncate(HEADER_SIZE + (m + 7) // 8)
+        os.replace(tmp, path)
+        return cls.load(path)
+
+    @classmethod
+    def load(cls, path: str) -> "BloomFilter":
+        fh = open(path, "r+b")
+        try:
+            mm = mmap.mmap(fh.fileno(), 0)
+        except Exception:
+            fh.close()
+            raise
+        try:
+            return cls(path, fh, mm)
+        except Exception:
+            mm.close()
+            fh.close()
+            raise
+
+    def _positions(self, key: str):
+        h1, h2 = _hashes(key)
+        m = self.m
+        return [(h1 + i * h2) % m for i in range(self.k)]
+
+    def __contains__(self, key: str) -> bool:
+        mm = self._mm
+        for pos in self._positions(key):
+            if not mm[HEADER_SIZE + (pos >> 3)] & (1 << (pos & 7)):
+                return False
+        return True
+
+    def add(self, key: str) -> bool:
+        """追加。新しく立ったビットがあれば（＝未登録だった）True"""
+        mm = self._mm
+        added = False
+        for pos in self._positions(key):
+            i = HEADER_SIZE + (pos >> 3)
+            bit = 1 << (pos & 7)
+            if not mm[i] & bit:
+                mm[i] |= bit
+                added = True
+        if added:
+            self.count += 1
+        return added
+
+    @property
+    def saturated(self) -> bool:
+        return self.count > self.capacity
+
+    def estimated_fp_rate(self) -> float:
+        return (1 - math.exp(-self.k * self.count / self.m)) ** self.k
+
+    def flush(self, synced_at: Optional[float] = None) -> None:
+        if synced_at is not None:
+            self.synced_at = synced_at
+        HEADER.pack_into(self._mm, 0, MAGIC, self.m, self.k, self.count, self.capacity, self.synced_at)
+        self._mm.flush()
+
+    def close(self) -> None:
+        if self._mm.closed:
+            return
+        self.flush()
+        self._mm.close()
+        self._fh.close()
+
+
+class SeenUrls:
+    """
+    filter_new_articles に渡す「既存URL集合」。`url in seen` は Bloom フィルタで判定し、
+    ヒット（登録済みかも）の時だけ exact(url) で確かめる。add() は登録直後に呼ぶ（次回以降の判定に効く）
+    """
+
+    def __init__(self, bloom: BloomFilter, exact: Callable[[str], bool]):
+        self.bloom = bloom
+        self.exact = exact
+        self.checked = 0  # 厳密確認に回った件数（誤検知率の目安）
+        self.false_positives = 0
+
+    @classmethod
+    def open(cls, exact: Callable[[str], bool], full_scan: Callable[[], Iterable[str]],
+             incremental: Callable[[float], Iterable[str]], name: str = SEEN_FILTER_FILE) -> "SeenUrls":
+        """
+        ファイルがあれば mmap して incremental(前回同期時刻) の分だけ足す。無い・壊れている・想定件数を超えた
+        場合は full_scan() の全URLで作り直す（URL は流し込むだけで集合としては持たない）
+        """
+        path = state_store.state_path(name)
+        bloom = None
+        if os.path.exists(path):
+            try:
+                bloom = BloomFilter.load(path)
+            except (OSError, ValueError) as e:
+                print(f"[WARN] seen filter unreadable, rebuilding: {e}")
+        if bloom is not None and bloom.saturated:
+            capacity = max(bloom.capacity * 2, SEEN_FILTER_CAPACITY)
+            print(f"[INFO] seen filter over capacity ({bloom.count}/{bloom.capacity}), rebuilding at {capacity}")
+            bloom.close()
+            bloom = None
+        else:
+            capacity = SEEN_FILTER_CAPACITY
+
+        started = time.time()
+        if bloom is None:
+            bloom = BloomFilter.create(path, capacity)
+            urls = full_scan()
+        else:
+            urls = incremental(bloom.synced_at)
+        for url in urls:
+            bloom.add(url)
+        bloom.flush(synced_at=started)
+        return cls(bloom, exact)
+
+    def __contains__(self, url: str) -> bool:
+        if url not in self.bloom:
+            return False
+        self.checked += 1
+        if self.exact(url):
+            return True
+        self.false_positives += 1
+        return False
+
+    def add(self, url: str) -> None:
+        self.bloom.add(url)
+
+    def flush(self) -> None:
+        """常駐プロセス（WebSub）用。追加分をファイルへ書き出す"""
+        self.bloom.flush()
+
+    def close(self) -> None:
+        self.bloom.close()
+
+
+def bench(n: int = 1_000_000, lookups: int = 100_000):
+    """n 件登録したフィルタのサイズ・登録/判定速度・実測誤検知率（一時ファイル上）"""
+    import tempfile
+    with tempfile.TemporaryDirectory() as tmp:
+        bloom = BloomFilter.create(os.path.join(tmp, "bench.bloom"), capacity=n)
+        start = time.perf_counter()
+        for i in range(n):
+            bloom.add(f"https://example.com/articles/{i}")
+        added = time.perf_counter() - start
+        bloom.close()
+        start = time.perf_counter()
+        bloom = BloomFilter.load(os.path.join(tmp, "bench.bloom"))
+        loaded = time.perf_counter() - start
+        start = time.perf_counter()
+        hits = sum(f"https://example.com/other/{i}" in bloom for i in range(lookups))
+        looked = time.perf_counter() - start
+        size = os.path.getsize(bloom.path)
+        bloom.close()
+    return {
+        "bytes": size,
+        "bytes_per_url": round(size / n, 2),
+        "add_per_sec": round(n / added),
+        "lookup_per_sec": round(lookups / looked),
+        "load_ms": round(loaded * 1000, 2),
+        "fp_rate": hits / lookups,
+    }
+
+
+if __name__ == "__main__":
+    # 使い方:
+    #   python scripts/seen_filter.py stats
+    #   python scripts/seen_filter.py check <URL>
+    #   python scripts/seen_filter.py reset            # 次回の実行で Notion から作り直す
+    #   python scripts/seen_filter.py bench [件数]
+    path = state_store.state_path(SEEN_FILTER_FILE)
+    if len(sys.argv) == 2 and sys.argv[1] == "stats":
+        if not os.path.exists(path):
+            print("no seen filter (built on next run)")
+            sys.exit(0)
+        bloom = BloomFilter.load(path)
+        print(f"urls={bloom.count} capacity={bloom.capacity} bits={bloom.m} k={bloom.k} "
+              f"bytes={os.path.getsize(path)} est_fp={bloom.estimated_fp_rate():.4f} "
+              f"synced_at={time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(bloom.synced_at))}")
+    elif len(sys.argv) == 3 and sys.argv[1] == "check":
+        from url_canon import canonicalize_url
+        url = canonicalize_url(sys.argv[2])
+        print(f"{url}: {'maybe seen' if url in BloomFilter.load(path) else 'new'}")
+    elif len(sys.argv) == 2 and sys.argv[1] == "reset":
+        if os.path.exists(path):
+            os.remove(path)
+        print("removed")
+    elif len(sys.argv) in (2, 3) and sys.argv[1] == "bench":
+        print(bench(int(sys.argv[2])) if len(sys.argv) == 3 else bench())
+    else:
+        print("usage: seen_filter.py stats | check <url> | reset | bench [n]", file=sys.stderr)
+        sys.exit(2)
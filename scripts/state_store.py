@@ -0,0 +1,20 @@
+import os
+import sqlite3
+
+# ===== 永続ステート置き場 =====
+# Actions 上では actions/cache で STATE_DIR を実行間に引き継ぐ
+STATE_DIR = os.environ.get("STATE_DIR", ".state")
+
+
+def state_path(name: str) -> str:
+    """STATE_DIR 配下のパスを返す（ディレクトリは必要なら作成）"""
+    os.makedirs(STATE_DIR, exist_ok=True)
+    return os.path.join(STATE_DIR, name)
+
+
+def connect(name: str, **kwargs) -> sqlite3.Connection:
+    """STATE_DIR 配下の SQLite を WAL モードで開く"""
+    conn = sqlite3.connect(state_path(name), timeout=30, **kwargs)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
@@ -0,0 +1,305 @@
+import os
+import sys
+import json
+import time
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+import requests
+
+import state_store
+from deepl_budget import DEEPL_TIMEOUT, deepl_translate
+from resilience import CircuitOpenError, breaker
+
+# ===== 設定 =====
+# 翻訳は DeepL（主）を呼び、主がいつもの p95 を超えて返ってこない時だけ副プロバイダにも同じ依頼を出して
+# 先に返った方を使う（ヘッジ）。主が失敗・遮断中なら副へ切り替える。ヘッジは呼び出しの HEDGE_MAX_RATE 割までに抑える。
+# 副: google（GoogleTranslator と同じモバイル版ページ。キー不要）/ deepl（DEEPL_SECONDARY_API_KEY の別アカウント）/ none
+TRANSLATE_SECONDARY = os.environ.get("TRANSLATE_SECONDARY", "google").lower()
+DEEPL_SECONDARY_API_KEY = os.environ.get("DEEPL_SECONDARY_API_KEY", "")
+HEDGE_MAX_RATE = float(os.environ.get("HEDGE_MAX_RATE", "0.1"))
+HEDGE_PERCENTILE = 0.95
+HEDGE_MIN_SAMPLES = 20  # これ未満の間は HEDGE_DEFAULT_DELAY 待ってからヘッジ
+HEDGE_DEFAULT_DELAY = float(os.environ.get("HEDGE_DEFAULT_DELAY", "4"))
+LATENCY_WINDOW = 200  # p95 を取る直近の呼び出し数（成功のみ）
+ROUTER_DB = "translate_router.sqlite3"
+GOOGLE_URL = "https://translate.google.com/m"
+CALL_RETENTION = 30 * 86400
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS calls (
+    id INTEGER PRIMARY KEY,
+    provider TEXT NOT NULL,
+    at REAL NOT NULL,
+    seconds REAL NOT NULL,
+    ok INTEGER NOT NULL,
+    hedge INTEGER NOT NULL,   -- ヘッジ・切り替えで出した副の呼び出し
+    won INTEGER NOT NULL,     -- この呼び出しの結果を使った
+    texts INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS calls_provider ON calls (provider, at);
+"""
+
+
+class Provider(NamedTuple):
+    name: str
+    translate: Callable[..., List[str]]  # (texts, target, source, timeout) -> 訳文
+
+
+class Routed(NamedTuple):
+    texts: List[str]
+    provider: str  # 結果を使ったプロバイダ
+    primary_ok: Optional[bool]  # 主（DeepL）の応答: True 成功 / False 失敗 / None 呼んでいない（遮断中）・未応答
+    hedged: bool
+
+
+def google_code(lang: Optional[str]) -> str:
+    """DeepL の言語コード（EN-US / PT-BR / ZH）を Google の表記へ"""
+    if not lang:
+        return "auto"
+    base = lang.lower().split("-")[0]
+    return {"zh": "zh-CN", "he": "iw"}.get(base, base)
+
+
+def google_provider() -> Provider:
+    from bs4 import BeautifulSoup
+
+    def translate(texts, target, source, timeout):
+        # deep_translator の GoogleTranslator と同じページを1件ずつ要求する。GoogleTranslator はタイムアウトを
+        # 渡せない（router が待ち切った後も残りを訳し続ける）ので直接呼び、残り時間を各リクエストに渡す
+        until = time.monotonic() + timeout
+        params = {"tl": google_code(target), "sl": google_code(source)}
+        out = []
+        for t in texts:
+            if not t.strip():
+                out.append(t)
+                continue
+            left = until - time.monotonic()
+            if left <= 0:
+                raise TimeoutError(f"google translation timed out after {timeout:.0f}s")
+            res = requests.get(GOOGLE_URL, params=dict(params, q=t.strip()), timeout=left)
+            res.raise_for_status()
+            soup = BeautifulSoup(res.text, "html.parser")
+            element = soup.find("div", {"class": "t0"}) or soup.find("div", {"class": "result-container"})
+            if element is None:
+                raise ValueError(f"google translation not found: {t[:40]}")
+            out.append(element.get_text(strip=True))
+        return out
+
+    return Provider("google", translate)
+
+
+def deepl_provider(api_key: str, name: str = "deepl") -> Provider:
+    return Provider(name, lambda texts, target, source, timeout: deepl_translate(api_key, texts, target, source,
+                                                                                  timeout=timeout))
+
+
+def _spawn(fn, *args) -> Future:
+    """
+    デーモンスレッドで fn を実行する Future（応答しない副プロバイダが終了処理を止めないように）。
+    完了時刻を future.finished_at に残す（待ち側が気づいた時刻ではなく実際の所要時間を記録するため）
+    """
+    future: Future = Future()
+
+    def run():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            result = fn(*args)
+        except BaseException as e:
+            future.finished_at = time.monotonic()
+            future.set_exception(e)
+        else:
+            future.finished_at = time.monotonic()
+            future.set_result(result)
+
+    threading.Thread(target=run, daemon=True).start()
+    return future
+
+
+class TranslateRouter:
+    """主プロバイダの遅延分布（直近の成功の p95）を覚えておき、超えたら副へヘッジする"""
+
+    def __init__(self, primary: Provider, secondary: Optional[Provider], conn=None,
+                 max_hedge_rate: float = HEDGE_MAX_RATE):
+        self.primary = primary
+        self.secondary = secondary
+        self.max_hedge_rate = max_hedge_rate
+        self.conn = conn
+        self._lock = threading.Lock()
+        self._latency: Dict[str, deque] = {}
+        self.calls = self.hedges = 0
+        self.served: Dict[str, int] = {}  # プロバイダ → 訳したテキスト数（今回の実行）
+        if conn is not None:
+            conn.executescript(SCHEMA)
+            conn.commit()
+            for provider, seconds in conn.execute(
+                "SELECT provider, seconds FROM (SELECT provider, seconds, at FROM calls WHERE ok = 1"
+                " ORDER BY at DESC LIMIT ?) ORDER BY at", (LATENCY_WINDOW * 4,)
+            ):
+                self._samples(provider).append(seconds)
+
+    @classmethod
+    def open(cls, api_key: str, name: str = ROUTER_DB) -> "TranslateRouter":
+        """DeepL を主に、TRANSLATE_SECONDARY を副にしたルーター（遅延の記録は STATE_DIR に残す）"""
+        secondary = None
+        if TRANSLATE_SECONDARY == "google":
+            secondary = google_provider()
+        elif TRANSLATE_SECONDARY == "deepl" and DEEPL_SECONDARY_API_KEY:
+            secondary = deepl_provider(DEEPL_SECONDARY_API_KEY, "deepl-secondary")
+        return cls(deepl_provider(api_key), secondary, state_store.connect(name, check_same_thread=False))
+
+    def _samples(self, provider: str) -> deque:
+        return self._latency.setdefault(provider, deque(maxlen=LATENCY_WINDOW))
+
+    def hedge_delay(self) -> float:
+        """主の直近の成功の p95（サンプルが少ない間は既定値）"""
+        with self._lock:
+            samples = sorted(self._samples(self.primary.name))
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return HEDGE_DEFAULT_DELAY
+        return samples[min(int(len(samples) * HEDGE_PERCENTILE), len(samples) - 1)]
+
+    def _may_hedge(self) -> bool:
+        with self._lock:
+            # 最初の1回は許し、以降は呼び出し数 × 上限割合まで
+            return self.hedges < max(1.0, self.calls * self.max_hedge_rate)
+
+    def _record(self, provider: Provider, seconds: float, ok: bool, hedge: bool, won: bool, texts: int) -> None:
+        with self._lock:
+            if ok:
+                self._samples(provider.name).append(seconds)
+            if self.conn is not None:
+                self.conn.execute(
+                    "INSERT INTO calls (provider, at, seconds, ok, hedge, won, texts) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (provider.name, time.time(), seconds, int(ok), int(hedge), int(won), texts),
+                )
+                self.conn.commit()
+
+    def _start(self, provider: Provider, texts, target, source, timeout, hedge: bool) -> Future:
+        future = _spawn(breaker(provider.name).call, provider.translate, texts, target, source, timeout)
+        future.route = (provider, time.monotonic(), hedge, len(texts))
+        return future
+
+    def _finish(self, future: Future, won: bool) -> None:
+        """完了した呼び出しを記録（負けた呼び出しも遅延分布に入れる。遮断で呼ばなかった分は入れない）"""
+        provider, started, hedge, texts = future.route
+        error = future.exception()
+        if isinstance(error, CircuitOpenError):
+            return
+        self._record(provider, future.finished_at - started, error is None, hedge, won, texts)
+
+    def translate(self, texts: List[str], target: str, source: Optional[str] = None,
+                  timeout: float = DEEPL_TIMEOUT, on_primary: Optional[Callable[[bool], None]] = None) -> Routed:
+        """
+        主へ依頼し、p95 を過ぎても返らなければ（ヘッジ上限の範囲で）副にも依頼して先に成功した方を返す。
+        主が失敗・遮断中なら副へ切り替える。両方失敗したら主の例外を送出。
+        on_primary は主の呼び出しが実際に終わった時に成否を渡して1回だけ呼ぶ（遮断で呼ばなかった時は呼ばない）。
+        副が先に返っても主は DeepL 側で処理されるので、遅れて終わった分もここで残量に数えられる
+        """
+        with self._lock:
+            self.calls += 1
+        deadline = time.monotonic() + timeout
+        primary = self._start(self.primary, texts, target, source, timeout, False)
+        if on_primary is not None:
+            # 既に終わっていればこの場で（戻る前に）、まだなら終わった時にワーカースレッドで呼ばれる
+            def report(f: Future) -> None:
+                if not isinstance(f.exception(), CircuitOpenError):
+                    on_primary(f.exception() is None)
+        secondary = None
+        hedged = False
+        done, _ = wait([primary], timeout=min(self.hedge_delay(), timeout))
+        if not done and self.secondary is not None and self._may_hedge():
+            with self._lock:
+                self.hedges += 1
+            hedged = True
+            secondary = self._start(self.secondary, texts, target, source, timeout, True)
+
+        pending = [f for f in (primary, secondary) if f is not None]
+        winner = None
+        while pending and winner is None:
+            done, rest = wait(pending, timeout=max(deadline - time.monotonic(), 0), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            winner = next((f for f in done if f.exception() is None), None)
+            pending = list(rest)
+            if winner is None and not pending and secondary is None and self.secondary is not None:
+                # 主が失敗・遮断中 → 副へ切り替え（ヘッジ枠は使わない）
+                secondary = self._start(self.secondary, texts, target, source,
+                                        max(deadline - time.monotonic(), 1), True)
+                pending = [secondary]
+
+        for f in (primary, secondary):
+            if f is None:
+                continue
+            if f.done():
+                self._finish(f, f is winner)
+            else:
+                # 遅れて返った分も遅延として記録する（結果は捨てる）
+                f.add_done_callback(lambda late: self._finish(late, False))
+        if on_primary is not None:
+            primary.add_done_callback(report)
+        primary_ok = None
+        if primary.done() and not isinstance(primary.exception(), CircuitOpenError):
+            primary_ok = primary.exception() is None
+        if winner is None:
+            if primary.done() and primary.exception() is not None:
+                raise primary.exception()
+            raise TimeoutError(f"translation timed out after {timeout:.0f}s")
+        name = winner.route[0].name
+        with self._lock:
+            self.served[name] = self.served.get(name, 0) + len(texts)
+        return Routed(winner.result(), name, primary_ok, hedged)
+
+    def summary_line(self) -> str:
+        with self._lock:
+            served = " ".join(f"{k}={v}" for k, v in sorted(self.served.items()))
+            return f"翻訳担当 {served or 'なし'} / ヘッジ {self.hedges}/{self.calls}"
+
+    def purge(self, older_than: float = CALL_RETENTION) -> int:
+        with self._lock:
+            n = self.conn.execute("DELETE FROM calls WHERE at < ?", (time.time() - older_than,)).rowcount
+            self.conn.commit()
+        return n
+
+    def stats(self, days: float = 7) -> List[Dict]:
+        """プロバイダ別の呼び出し数・成功率・p50/p95・ヘッジ数・勝ち数"""
+        since = time.time() - days * 86400
+        out = []
+        with self._lock:
+            providers = [p for (p,) in self.conn.execute("SELECT DISTINCT provider FROM calls WHERE at >= ?", (since,))]
+            for provider in providers:
+                rows = self.conn.execute(
+                    "SELECT seconds, ok, hedge, won FROM calls WHERE provider = ? AND at >= ?", (provider, since)
+                ).fetchall()
+                ok = sorted(s for s, good, _, _ in rows if good)
+                out.append({
+                    "provider": provider,
+                    "calls": len(rows),
+                    "ok_rate": round(len(ok) / len(rows), 3),
+                    "p50": round(ok[len(ok) // 2], 3) if ok else None,
+                    "p95": round(ok[min(int(len(ok) * 0.95), len(ok) - 1)], 3) if ok else None,
+                    "hedge_calls": sum(h for _, _, h, _ in rows),
+                    "won": sum(w for _, _, _, w in rows),
+                })
+        return out
+
+
+if __name__ == "__main__":
+    # 使い方:
+    #   python scripts/translate_router.py stats [日数]
+    #   python scripts/translate_router.py translate <target> <text ...>   # DEEPL_API_KEY が必要
+    if len(sys.argv) in (2, 3) and sys.argv[1] == "stats":
+        router = TranslateRouter(deepl_provider(""), None, state_store.connect(ROUTER_DB))
+        for row in router.stats(float(sys.argv[2]) if len(sys.argv) == 3 else 7):
+            print(json.dumps(row))
+    elif len(sys.argv) >= 4 and sys.argv[1] == "translate":
+        router = TranslateRouter.open(os.environ["DEEPL_API_KEY"])
+        result = router.translate(sys.argv[3:], sys.argv[2])
+        print(json.dumps(result._asdict(), ensure_ascii=False))
+        print(router.summary_line())
+    else:
+        print("usage: translate_router.py stats [days] | translate <target> <text ...>", file=sys.stderr)
+        sys.exit(2)
@@ -0,0 +1,103 @@
+import re
+import unicodedata
+from typing import NamedTuple
+
+from post_ledger import content_hash
+
+# ===== X の文字数カウント（twitter-text v3 相当）=====
+# URL は t.co 短縮後の 23 文字、下記範囲（ラテン文字・一般句読点など）は 1、
+# それ以外（CJK・絵文字など）は 2 として数え、合計 280 以内。
+MAX_TWEET_LENGTH = 280
+TCO_URL_LENGTH = 23
+URL_RE = re.compile(r"https?://\S+")
+LIGHT_RANGES = ((0, 4351), (8192, 8205), (8208, 8223), (8242, 8247))
+
+
+def char_weight(ch: str) -> int:
+    cp = ord(ch)
+    for lo, hi in LIGHT_RANGES:
+        if lo <= cp <= hi:
+            return 1
+    return 2
+
+
+def text_length(text: str) -> int:
+    """URL を含まない文字列の重み付き文字数"""
+    return sum(char_weight(ch) for ch in text)
+
+
+def twitter_length(text: str) -> int:
+    text = unicodedata.normalize("NFC", text)
+    total, pos = 0, 0
+    for m in URL_RE.finditer(text):
+        total += text_length(text[pos:m.start()]) + TCO_URL_LENGTH
+        pos = m.end()
+    return total + text_length(text[pos:])
+
+
+def truncate_weighted(text: str, limit: int) -> str:
+    """重み付き文字数が limit 以内になるよう末尾を「…」で切る"""
+    if text_length(text) <= limit:
+        return text
+    if limit <= 0:
+        return ""
+    out, used = [], char_weight("…")  # 「…」の分（U+2026 は重み 2）
+    for ch in text:
+        w = char_weight(ch)
+        if used + w > limit:
+            break
+        out.append(ch)
+        used += w
+    return "".join(out) + "…"
+
+
+def build_tweet(title: str, summary: str, url: str) -> str:
+    title = (title or "").strip()
+    summary = (summary or "").strip()
+    url = (url or "").strip()
+
+    base = f"{title}\n{url}" if title else url
+    if twitter_length(base) <= MAX_TWEET_LENGTH and summary:
+        candidate = f"{title}\n{summary}\n{url}" if title else f"{summary}\n{url}"
+        if twitter_length(candidate) <= MAX_TWEET_LENGTH:
+            return candidate
+
+    remain = MAX_TWEET_LENGTH - twitter_length((f"{title}\n\n{url}" if title else f"\n{url}")) - 1
+    trimmed = truncate_weighted(summary, max(remain, 0))
+
+    candidate = f"{title}\n{trimmed}\n{url}" if title else f"{trimmed}\n{url}"
+    if twitter_length(candidate) <= MAX_TWEET_LENGTH:
+        return candidate
+
+    if title:
+        title = truncate_weighted(title, MAX_TWEET_LENGTH - TCO_URL_LENGTH - 1)
+        return f"{title}\n{url}"
+    return url
+
+
+def source_hash(title: str, summary: str, url: str) -> str:
+    """投稿文の組み立て元（タイトル・要約・URL）のハッシュ（取り込み後に直されたかの判定用）"""
+    return content_hash("\0".join((v or "").strip() for v in (title, summary, url)))[:16]
+
+
+class ComposedTweet(NamedTuple):
+    text: str
+    length: int  # 重み付き文字数
+    content_hash: str  # 投稿台帳と同じ SHA-256（TweetText が編集されたかの判定にも使う）
+    source_hash: str  # 組み立て元のハッシュ
+
+    @property
+    def draft_hash(self) -> str:
+        """下書きの ContentHash に保存する値（"組み立て元:本文"）"""
+        return f"{self.source_hash}:{self.content_hash}"
+
+
+def split_draft_hash(value: str):
+    """ContentHash → (組み立て元のハッシュ, 本文のハッシュ)。組み立て元を持たない旧形式は ("", 本文)"""
+    source, _, text = (value or "").rpartition(":")
+    return source, text
+
+
+def compose_tweet(title: str, summary: str, url: str) -> ComposedTweet:
+    text = build_tweet(title, summary, url)
+    return ComposedTweet(text, twitter_length(text), content_hash(text), source_hash(title, summary, url))
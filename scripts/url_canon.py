@@ -0,0 +1,144 @@
+import os
+import time
+from typing import Optional
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+
+import requests
+
+import state_store
+from resilience import Deadline, DeadlineExceeded
+
+# ===== 設定 =====
+# RESOLVE_REDIRECTS=1 でフィードプロキシ等のリダイレクトを HEAD で解決する
+RESOLVE_REDIRECTS = os.environ.get("RESOLVE_REDIRECTS", "").lower() in {"1", "true", "yes"}
+REDIRECT_CACHE_TTL = int(os.environ.get("REDIRECT_CACHE_TTL", str(7 * 24 * 3600)))
+REDIRECT_DB = "redirects.sqlite3"
+MAX_HOPS = 5
+HOP_TIMEOUT = 10  # 1ホップあたりの秒数（締切があれば残り時間で頭打ち）
+USER_AGENT = "notion-x-mvp/1.0 (url-canon)"
+
+# 除去するトラッキング系クエリ（広告・解析サービスのクリックIDなど既知のものだけ。
+# feed / rss / ref 等はサイトによって記事の指定に使われるので残す）
+TRACKING_PREFIXES = ("utm_",)
+TRACKING_PARAMS = {
+    "fbclid", "gclid", "gbraid", "wbraid", "dclid", "msclkid", "yclid", "igshid", "twclid", "ttclid",
+    "mc_cid", "mc_eid", "_hsenc", "_hsmi", "mkt_tok", "_ga", "_gl",
+}
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def canonicalize_url(url: str) -> str:
+    """
+    重複判定キー用の正規化URL（キーとしてだけ使い、Notion にはフィードの元のリンクを保存する）
+    - http → https、ホスト小文字化、既定ポート除去
+    - トラッキングパラメータ除去・残りのクエリはキー順に整列
+    - フラグメント除去、末尾スラッシュ除去（ルートは残す）
+    """
+    url = (url or "").strip()
+    if not url:
+        return ""
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    if scheme not in DEFAULT_PORTS:
+        return url
+    host = (parts.hostname or "").lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+
+    path = parts.path or "/"
+    if len(path) > 1:
+        path = path.rstrip("/") or "/"
+
+    query = [
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith(TRACKING_PREFIXES) and k.lower() not in TRACKING_PARAMS
+    ]
+    query.sort()
+    return urlunsplit(("https", host, path, urlencode(query), ""))
+
+
+class RedirectCache:
+    """リダイレクト1ホップごとの解決結果を TTL 付きで保持（SQLite）"""
+
+    def __init__(self, conn, ttl: int = REDIRECT_CACHE_TTL):
+        self.conn = conn
+        self.ttl = ttl
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS redirects ("
+            " url TEXT PRIMARY KEY, target TEXT NOT NULL, resolved_at REAL NOT NULL)"
+        )
+        conn.commit()
+
+    @classmethod
+    def open(cls, name: str = REDIRECT_DB) -> "RedirectCache":
+        return cls(state_store.connect(name))
+
+    def get(self, url: str) -> Optional[str]:
+        row = self.conn.execute(
+            "SELECT target, resolved_at FROM redirects WHERE url = ?", (url,)
+        ).fetchone()
+        if row and time.time() - row[1] < self.ttl:
+            return row[0]
+        return None
+
+    def put(self, url: str, target: str) -> None:
+        self.conn.execute(
+            "INSERT OR REPLACE INTO redirects (url, target, resolved_at) VALUES (?, ?, ?)",
+            (url, target, time.time()),
+        )
+        self.conn.commit()
+
+
+def _next_hop(session: requests.Session, url: str, timeout: float = HOP_TIMEOUT) -> str:
+    """1ホップだけ辿る（HEAD非対応ならGETをストリームで開いて即close）"""
+    res = session.head(url, allow_redirects=False, timeout=timeout)
+    if res.status_code in (405, 501):
+        res = session.get(url, allow_redirects=False, timeout=timeout, stream=True)
+        res.close()
+    location = res.headers.get("Location")
+    if res.is_redirect and location:
+        return urljoin(url, location)
+    return url
+
+
+class Canonicalizer:
+    """
+    正規化＋（任意で）リダイレクト解決。各ホップはキャッシュにより1度だけ解決する。
+    deadline（resilience.Deadline）を渡すと各ホップのタイムアウトを残り時間で頭打ちにし、
+    締切を過ぎたらキャッシュに無いホップは問い合わせずにそこまでの URL を返す
+    """
+
+    def __init__(self, resolve: bool = RESOLVE_REDIRECTS, cache: Optional[RedirectCache] = None,
+                 deadline: Optional[Deadline] = None):
+        self.resolve = resolve
+        self.cache = cache if cache is not None else (RedirectCache.open() if resolve else None)
+        self.deadline = deadline
+        self.skipped = 0  # 締切で解決を打ち切った件数
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = USER_AGENT
+
+    def canonical(self, url: str) -> str:
+        key = canonicalize_url(url)
+        if not self.resolve or not key:
+            return key
+        raw = url.strip()  # 最初のホップは元のスキームのまま問い合わせる
+        for _ in range(MAX_HOPS):
+            target = self.cache.get(key)
+            if target is None:
+                if self.deadline is not None and not self.deadline.can_start():
+                    self.skipped += 1
+                    return key
+                try:
+                    timeout = self.deadline.timeout(HOP_TIMEOUT) if self.deadline is not None else HOP_TIMEOUT
+                    raw = _next_hop(self.session, raw, timeout)
+                except (requests.RequestException, DeadlineExceeded) as e:
+                    print(f"[WARN] redirect resolve failed: {key} ({e})")
+                    return key
+                target = canonicalize_url(raw)
+                self.cache.put(key, target)
+            else:
+                raw = target
+            if target == key:
+                return key
+            key = target
+        return key
@@ -0,0 +1,387 @@
+import os
+import sys
+import hmac
+import time
+import queue
+import hashlib
+import secrets
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, NamedTuple, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+import feedparser
+import requests
+
+import state_store
+from feed_fetch import FEED_MAX_BYTES
+from feed_parse import USER_AGENT, feed_urls, fetch_feed_bytes, parse_feed_bytes
+
+# ===== 設定 =====
+# ハブを公開しているフィードはプッシュ（WebSub）で受け取り、それ以外は従来どおり毎時ポーリングする。
+# WEBSUB_CALLBACK_BASE はハブから到達できる公開URL（例: https://bot.example.com）
+WEBSUB_DB = "websub.sqlite3"
+WEBSUB_PORT = int(os.environ.get("WEBSUB_PORT", "8080"))
+WEBSUB_CALLBACK_BASE = os.environ.get("WEBSUB_CALLBACK_BASE", "").rstrip("/")
+WEBSUB_LEASE_SECONDS = int(os.environ.get("WEBSUB_LEASE_SECONDS", str(10 * 24 * 3600)))
+RENEW_BEFORE_SEC = 24 * 3600  # 期限の1日前に更新
+RENEW_CHECK_SEC = 3600
+PUSH_BATCH_WAIT_SEC = 2.0  # 連続プッシュをまとめて1回の登録処理にする
+PUSH_RETRY_DELAY_SEC = 300  # 登録失敗・見送りのあったプッシュを取り込み直すまでの待ち
+PUSH_MAX_RETRIES = 5  # これだけ取り込み直しても残るプッシュは破棄（次のポーリング・プッシュに任せる）
+
+# state: pending（購読要求済み・確認待ち）→ verified / denied、unsubscribing（解除要求済み）
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS subscriptions (
+    id TEXT PRIMARY KEY,
+    topic TEXT NOT NULL UNIQUE,
+    feed TEXT NOT NULL,
+    hub TEXT NOT NULL,
+    secret TEXT NOT NULL,
+    state TEXT NOT NULL,
+    lease_expires REAL,
+    last_push_at REAL,
+    updated_at REAL NOT NULL
+);
+"""
+
+
+class Subscription(NamedTuple):
+    id: str
+    topic: str
+    feed: str  # RSS_URL 側のURL（rel="self" のトピックURLと異なることがある）
+    hub: str
+    secret: str
+    state: str
+    lease_expires: Optional[float]
+    last_push_at: Optional[float]
+
+
+def subscription_id(topic: str) -> str:
+    return hashlib.sha256(topic.encode("utf-8")).hexdigest()[:16]
+
+
+class SubscriptionStore:
+    """購読状態（トピック・ハブ・HMAC用シークレット・リース期限）"""
+
+    def __init__(self, conn):
+        conn.isolation_level = None
+        conn.executescript(SCHEMA)
+        self.conn = conn
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, name: str = WEBSUB_DB) -> "SubscriptionStore":
+        return cls(state_store.connect(name, check_same_thread=False))
+
+    def _tx(self, fn):
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(self.conn)
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+            return result
+
+    def _select(self, where: str, args: tuple) -> List[Subscription]:
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT id, topic, feed, hub, secret, state, lease_expires, last_push_at FROM subscriptions " + where, args
+            ).fetchall()
+        return [Subscription(*r) for r in rows]
+
+    def get(self, sub_id: str) -> Optional[Subscription]:
+        rows = self._select("WHERE id = ?", (sub_id,))
+        return rows[0] if rows else None
+
+    def all(self) -> List[Subscription]:
+        return self._select("ORDER BY topic", ())
+
+    def pending(self, topic: str, hub: str, feed: str) -> Subscription:
+        """購読要求前に pending で登録（シークレットは再購読でも使い回す）"""
+        sub_id = subscription_id(topic)
+        existing = self.get(sub_id)
+        secret = existing.secret if existing else secrets.token_hex(32)
+        self._tx(lambda conn: conn.execute(
+            "INSERT INTO subscriptions (id, topic, feed, hub, secret, state, updated_at)"
+            " VALUES (?, ?, ?, ?, ?, 'pending', ?)"
+            " ON CONFLICT(id) DO UPDATE SET hub = excluded.hub, feed = excluded.feed,"
+            " state = CASE WHEN state = 'verified' THEN state ELSE 'pending' END, updated_at = excluded.updated_at",
+            (sub_id, topic, feed, hub, secret, time.time()),
+        ))
+        return self.get(sub_id)
+
+    def set_state(self, sub_id: str, state: str, lease_seconds: Optional[int] = None) -> None:
+        now = time.time()
+        self._tx(lambda conn: conn.execute(
+            "UPDATE subscriptions SET state = ?, lease_expires = COALESCE(?, lease_expires), updated_at = ? WHERE id = ?",
+            (state, now + lease_seconds if lease_seconds else None, now, sub_id),
+        ))
+
+    def touch(self, sub_id: str) -> None:
+        self._tx(lambda conn: conn.execute(
+            "UPDATE subscriptions SET last_push_at = ? WHERE id = ?", (time.time(), sub_id)
+        ))
+
+    def delete(self, sub_id: str) -> None:
+        self._tx(lambda conn: conn.execute("DELETE FROM subscriptions WHERE id = ?", (sub_id,)))
+
+    def active_feeds(self) -> set:
+        """確認済みかつリース期限内の購読元フィード（ポーリング対象から外す）"""
+        rows = self._select("WHERE state = 'verified' AND lease_expires > ?", (time.time(),))
+        return {s.feed for s in rows} | {s.topic for s in rows}
+
+
+def signature_valid(secret: str, body: bytes, header: str) -> bool:
+    """X-Hub-Signature（sha1= / sha256= / sha512=）を検証"""
+    algo, _, digest = (header or "").partition("=")
+    if algo not in ("sha1", "sha256", "sha384", "sha512") or not digest:
+        return False
+    expected = hmac.new(secret.encode("utf-8"), body, algo).hexdigest()
+    return hmac.compare_digest(expected, digest.strip().lower())
+
+# ===== ハブ検出・購読 =====
+def discover_hub(data: bytes, url: str) -> Tuple[Optional[str], str]:
+    """フィード本文の <link rel="hub"> / rel="self" から (ハブURL, トピックURL) を返す"""
+    parsed = feedparser.parse(data, response_headers={"content-location": url})
+    hub, topic = None, url
+    for link in parsed.feed.get("links", []):
+        if link.get("rel") == "hub" and not hub:
+            hub = link.get("href")
+        elif link.get("rel") == "self" and link.get("href"):
+            topic = link["href"]
+    return hub, topic
+
+
+def request_subscription(store: SubscriptionStore, hub: str, topic: str, feed: str, mode: str = "subscribe") -> None:
+    """ハブへ購読/解除を要求（結果は確認リクエスト（GET）で確定する）"""
+    if not WEBSUB_CALLBACK_BASE:
+        raise RuntimeError("WEBSUB_CALLBACK_BASE is not set")
+    sub = store.pending(topic, hub, feed)
+    if mode == "unsubscribe":
+        store.set_state(sub.id, "unsubscribing")
+    res = requests.post(hub, data={
+        "hub.mode": mode,
+        "hub.topic": topic,
+        "hub.callback": f"{WEBSUB_CALLBACK_BASE}/websub/{sub.id}",
+        "hub.secret": sub.secret,
+        "hub.lease_seconds": str(WEBSUB_LEASE_SECONDS),
+    }, headers={"User-Agent": USER_AGENT}, timeout=15)
+    if res.status_code not in (202, 204):
+        raise RuntimeError(f"hub rejected {mode}: {res.status_code} {res.text[:200]}")
+
+
+def subscribe_feeds(store: SubscriptionStore, urls: List[str]) -> None:
+    """ハブのあるフィードを購読（未購読・期限間近のみ）。ハブが無いものはポーリングに任せる"""
+    known = {s.topic: s for s in store.all()}
+    for url in urls:
+        try:
+            hub, topic = discover_hub(fetch_feed_bytes(url), url)
+        except Exception as e:
+            print(f"[WARN] WebSub discovery failed: {url} ({e})")
+            continue
+        if not hub:
+            print(f"[INFO] no hub, keep polling: {url}")
+            continue
+        sub = known.get(topic)
+        if sub and sub.state == "verified" and (sub.lease_expires or 0) - time.time() > RENEW_BEFORE_SEC:
+            continue
+        try:
+            request_subscription(store, hub, topic, url)
+            print(f"[INFO] subscribe requested: {topic} via {hub}")
+        except Exception as e:
+            print(f"[WARN] WebSub subscribe failed: {topic} ({e})")
+
+# ===== 受信サーバー =====
+class CallbackHandler(BaseHTTPRequestHandler):
+    server: "SubscriberServer"
+
+    def _sub(self) -> Tuple[Optional[Subscription], dict]:
+        parts = urlsplit(self.path)
+        segments = parts.path.strip("/").split("/")
+        params = dict(parse_qsl(parts.query))
+        if len(segments) != 2 or segments[0] != "websub":
+            return None, params
+        return self.server.store.get(segments[1]), params
+
+    def _reply(self, status: int, body: bytes = b"") -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        """購読/解除の意思確認。自分が要求したトピックなら hub.challenge をそのまま返す"""
+        sub, params = self._sub()
+        mode = params.get("hub.mode")
+        if not sub or params.get("hub.topic") != sub.topic:
+            return self._reply(404)
+        if mode == "subscribe" and sub.state in ("pending", "verified"):
+            lease = params.get("hub.lease_seconds", "")
+            self.server.store.set_state(sub.id, "verified", int(lease) if lease.isdigit() else WEBSUB_LEASE_SECONDS)
+        elif mode == "unsubscribe" and sub.state == "unsubscribing":
+            self.server.store.delete(sub.id)
+        elif mode == "denied":
+            self.server.store.set_state(sub.id, "denied")
+            return self._reply(200)
+        else:
+            return self._reply(404)
+        self._reply(200, params.get("hub.challenge", "").encode("utf-8"))
+
+    def do_POST(self):
+        """コンテンツ配信。署名が合わないものは（仕様どおり 2xx を返しつつ）破棄する"""
+        sub, _ = self._sub()
+        if not sub or sub.state != "verified":
+            return self._reply(410)  # 購読していない → ハブに配信停止を促す
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > FEED_MAX_BYTES:
+            return self._reply(413)
+        body = self.rfile.read(length)
+        if not signature_valid(sub.secret, body, self.headers.get("X-Hub-Signature", "")):
+            print(f"[WARN] WebSub signature mismatch, ignored: {sub.topic}")
+            return self._reply(202)
+        self.server.store.touch(sub.id)
+        self.server.pushes.put((sub.feed, body))
+        self._reply(202)
+
+    def log_message(self, format, *args):
+        print(f"[websub] {self.address_string()} {format % args}")
+
+
+class SubscriberServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, store: SubscriptionStore):
+        super().__init__(address, CallbackHandler)
+        self.store = store
+        self.pushes: "queue.Queue[Tuple[str, bytes]]" = queue.Queue()
+
+
+def ingest_pushes(pushes: "queue.Queue[Tuple[str, bytes]]", stop: threading.Event) -> None:
+    """
+    受信した差分エントリを既存の 重複除外 → 翻訳 → add_to_notion 経路へ流す（単一スレッド）。
+    notion_insert はポーリング時にこのモジュールを参照するため、循環を避けてここで import する
+    """
+    from entry_versions import EntryVersions
+    from fetch_archive import FETCH_ARCHIVE, FetchArchive
+    from lineage import SpanLog
+    from near_dup import NearDupIndex
+    from notion_insert import ingest_articles, notify_slack, open_budget, open_existing_urls, to_articles
+    from resilience import Deadline
+    from url_canon import Canonicalizer
+
+    index, canonicalizer = NearDupIndex.open(), Canonicalizer()
+    spans = SpanLog.open()
+    archive = FetchArchive.open() if FETCH_ARCHIVE else None
+    versions = EntryVersions.open()
+    existing_urls = open_existing_urls(index)
+    carry, retry_at = [], 0.0  # 登録失敗・見送りのあったプッシュ（(フィード, 本文, 取り込み直した回数)）
+    while not stop.is_set():
+        try:
+            batch = [pushes.get(timeout=1) + (0,)]
+        except queue.Empty:
+            if not carry or time.time() < retry_at:
+                continue
+            batch = []
+        time.sleep(PUSH_BATCH_WAIT_SEC)
+        while not pushes.empty():
+            batch.append(pushes.get_nowait() + (0,))
+        if carry and time.time() >= retry_at:
+            # 登録済みの分は重複として除外されるので、プッシュ単位でそのまま流し直す
+            batch, carry = carry + batch, []
+
+        parsed = {}
+        for feed, body, tries in batch:
+            entries = parse_feed_bytes(body, feed)
+            parsed.setdefault(feed, []).extend(entries)
+            if archive is not None and not tries:
+                archive.append(feed, body, entries)
+        if archive is not None:
+            archive.seal()  # 受信バッチ = 1セグメント（リプレイ時も同じ単位で流す）
+        articles = to_articles(parsed, canonicalizer)
+
+        def keep():
+            """バッチを次回へ持ち越す。(持ち越し件数, 破棄件数)"""
+            nonlocal retry_at
+            kept = [(feed, body, tries + 1) for feed, body, tries in batch if tries + 1 < PUSH_MAX_RETRIES]
+            carry.extend(kept)
+            retry_at = time.time() + PUSH_RETRY_DELAY_SEC
+            return len(kept), len(batch) - len(kept)
+
+        try:
+            budget = open_budget()
+            result = ingest_articles(articles, existing_urls, index, budget, deadline=Deadline(None), spans=spans,
+                                     versions=versions)
+        except Exception as e:
+            kept, dropped = keep()
+            notify_slack(f"❌ Notion登録（WebSub）失敗: {e} / 再処理待ち プッシュ {kept} 件"
+                         + (f" / 破棄 {dropped} 件" if dropped else ""))
+            continue
+        incomplete = result.failed or result.deferred
+        if result.inserted or result.updated or incomplete:
+            if hasattr(existing_urls, "flush"):
+                existing_urls.flush()
+            line = ""
+            if incomplete:
+                kept, dropped = keep()
+                line = (f"\n⚠️ 登録失敗 {result.failed} 件 / 遮断で見送り {result.deferred} 件"
+                        f" / 再処理待ち プッシュ {kept} 件" + (f" / 破棄 {dropped} 件" if dropped else ""))
+            notify_slack(
+                ("⚠️ Notion登録（WebSub）一部未登録" if incomplete else "✅ Notion登録（WebSub）成功")
+                + f": 新規 {result.inserted} 件 / 受信 {len(articles)} 件 / "
+                f"重複 {result.duplicates} 件 / 類似 {result.near_duplicates} 件 / ルール除外 {result.filtered} 件 / {budget.summary_line()}"
+                + (f" / 更新 {result.updated} 件" if result.updated else "")
+                + line
+            )
+
+
+def renew_loop(store: SubscriptionStore, urls: List[str], stop: threading.Event) -> None:
+    while not stop.wait(RENEW_CHECK_SEC):
+        subscribe_feeds(store, urls)
+
+
+def serve(port: int = WEBSUB_PORT) -> None:
+    store = SubscriptionStore.open()
+    server = SubscriberServer(("", port), store)
+    stop = threading.Event()
+    urls = feed_urls(os.environ.get("RSS_URL", ""))
+    threading.Thread(target=ingest_pushes, args=(server.pushes, stop), daemon=True).start()
+    threading.Thread(target=renew_loop, args=(store, urls, stop), daemon=True).start()
+    # 確認リクエストを受けられるようサーバー起動後に購読要求を出す
+    threading.Thread(target=subscribe_feeds, args=(store, urls), daemon=True).start()
+    print(f"[INFO] WebSub subscriber listening on :{port} (callback {WEBSUB_CALLBACK_BASE}/websub/<id>)")
+    try:
+        server.serve_forever()
+    finally:
+        stop.set()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    # 使い方:
+    #   python scripts/websub.py serve              # 受信サーバー（RSS_URL のハブ付きフィードを購読）
+    #   python scripts/websub.py discover <feed_url>
+    #   python scripts/websub.py status
+    #   python scripts/websub.py unsubscribe <topic>
+    cmd = sys.argv[1] if len(sys.argv) > 1 else ""
+    if cmd == "serve":
+        serve()
+    elif cmd == "discover" and len(sys.argv) == 3:
+        print(discover_hub(fetch_feed_bytes(sys.argv[2]), sys.argv[2]))
+    elif cmd == "status":
+        for s in SubscriptionStore.open().all():
+            left = f"{(s.lease_expires - time.time()) / 3600:.0f}h" if s.lease_expires else "-"
+            print(f"{s.state:<13} lease={left:<6} {s.topic} via {s.hub}")
+    elif cmd == "unsubscribe" and len(sys.argv) == 3:
+        store = SubscriptionStore.open()
+        sub = store.get(subscription_id(sys.argv[2]))
+        if not sub:
+            print("not subscribed", file=sys.stderr)
+            sys.exit(1)
+        request_subscription(store, sub.hub, sub.topic, sub.feed, mode="unsubscribe")
+    else:
+        print("usage: websub.py serve | discover <feed_url> | status | unsubscribe <topic>", file=sys.stderr)
+        sys.exit(2)
@@ -0,0 +1,117 @@
+import os
+import sys
+import hmac
+import threading
+import secrets
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Tuple
+from urllib.parse import parse_qsl
+
+import requests
+
+# ===== ローカル確認用の WebSub ハブ（本番では使わない）=====
+# - POST hub.mode=subscribe/unsubscribe: 202 を返した後、コールバックへ意思確認（challenge）を送る
+# - POST hub.mode=publish&hub.url=<topic>: トピックを取得し、購読者へ HMAC 署名付きで配信する
+# - GET /feed.xml: rel="hub" 付きのサンプルフィード（MOCK_FEED_FILE があればその内容）
+HUB_PORT = int(os.environ.get("WEBSUB_HUB_PORT", "8081"))
+MOCK_FEED_FILE = os.environ.get("MOCK_FEED_FILE", "")
+
+subscribers: Dict[Tuple[str, str], str] = {}  # (topic, callback) → secret
+lock = threading.Lock()
+
+
+def sample_feed(hub_url: str, self_url: str) -> bytes:
+    if MOCK_FEED_FILE:
+        with open(MOCK_FEED_FILE, "rb") as f:
+            return f.read()
+    return (
+        '<?xml version="1.0" encoding="utf-8"?>'
+        '<feed xmlns="http://www.w3.org/2005/Atom"><title>mock</title>'
+        f'<link rel="hub" href="{hub_url}"/><link rel="self" href="{self_url}"/>'
+        '<entry><title>Mock hub story</title><link href="https://example.com/websub/1"/>'
+        '<id>https://example.com/websub/1</id><updated>2025-01-06T10:00:00Z</updated>'
+        '<summary>Pushed through the local WebSub hub.</summary></entry></feed>'
+    ).encode("utf-8")
+
+
+def verify_intent(mode: str, topic: str, callback: str, secret: str, lease: str) -> None:
+    challenge = secrets.token_hex(16)
+    try:
+        res = requests.get(callback, params={
+            "hub.mode": mode, "hub.topic": topic, "hub.challenge": challenge, "hub.lease_seconds": lease,
+        }, timeout=10)
+    except Exception as e:
+        print(f"[MOCK HUB] verify failed: {callback} ({e})")
+        return
+    if res.status_code != 200 or res.text != challenge:
+        print(f"[MOCK HUB] intent not confirmed: {callback} ({res.status_code})")
+        return
+    with lock:
+        if mode == "subscribe":
+            subscribers[(topic, callback)] = secret
+        else:
+            subscribers.pop((topic, callback), None)
+    print(f"[MOCK HUB] {mode} verified: {topic} → {callback}")
+
+
+def distribute(topic: str) -> int:
+    body = requests.get(topic, timeout=10).content
+    sent = 0
+    with lock:
+        targets = [(cb, secret) for (t, cb), secret in subscribers.items() if t == topic]
+    for callback, secret in targets:
+        headers = {"Content-Type": "application/atom+xml"}
+        if secret:
+            headers["X-Hub-Signature"] = "sha256=" + hmac.new(secret.encode("utf-8"), body, "sha256").hexdigest()
+        res = requests.post(callback, data=body, headers=headers, timeout=10)
+        print(f"[MOCK HUB] delivered {len(body)} bytes → {callback} ({res.status_code})")
+        sent += 1
+    return sent
+
+
+class HubHandler(BaseHTTPRequestHandler):
+    def _reply(self, status: int, body: bytes = b"", ctype: str = "text/plain") -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        host = f"http://{self.headers.get('Host', f'localhost:{HUB_PORT}')}"
+        if self.path.split("?")[0] == "/feed.xml":
+            return self._reply(200, sample_feed(f"{host}/", f"{host}/feed.xml"), "application/atom+xml")
+        self._reply(404)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        form = dict(parse_qsl(self.rfile.read(length).decode("utf-8")))
+        mode = form.get("hub.mode")
+        if mode in ("subscribe", "unsubscribe") and form.get("hub.topic") and form.get("hub.callback"):
+            threading.Thread(target=verify_intent, args=(
+                mode, form["hub.topic"], form["hub.callback"], form.get("hub.secret", ""),
+                form.get("hub.lease_seconds", "86400"),
+            ), daemon=True).start()
+            return self._reply(202)
+        if mode == "publish" and form.get("hub.url"):
+            sent = distribute(form["hub.url"])
+            return self._reply(200, f"delivered to {sent}".encode("utf-8"))
+        self._reply(400, b"bad request")
+
+    def log_message(self, format, *args):
+        print(f"[MOCK HUB] {format % args}")
+
+
+if __name__ == "__main__":
+    # 使い方:
+    #   python scripts/websub_hub_mock.py                      # ハブ起動（:8081、/feed.xml がトピック）
+    #   python scripts/websub_hub_mock.py publish <hub> <topic>  # 配信トリガー
+    if len(sys.argv) == 4 and sys.argv[1] == "publish":
+        res = requests.post(sys.argv[2], data={"hub.mode": "publish", "hub.url": sys.argv[3]}, timeout=30)
+        print(res.status_code, res.text)
+    elif len(sys.argv) == 1:
+        print(f"[MOCK HUB] listening on :{HUB_PORT} (topic http://localhost:{HUB_PORT}/feed.xml)")
+        ThreadingHTTPServer(("", HUB_PORT), HubHandler).serve_forever()
+    else:
+        print("usage: websub_hub_mock.py | publish <hub_url> <topic_url>", file=sys.stderr)
+        sys.exit(2)
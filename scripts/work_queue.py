@@ -0,0 +1,284 @@
+import os
+import sys
+import json
+import time
+import uuid
+import threading
+from typing import Any, Dict, List, NamedTuple, Optional
+
+import state_store
+
+# ===== 設定 =====
+QUEUE_DB = "queue.sqlite3"
+VISIBILITY_TIMEOUT = int(os.environ.get("QUEUE_VISIBILITY_TIMEOUT", "300"))
+MAX_ATTEMPTS = int(os.environ.get("QUEUE_MAX_ATTEMPTS", "5"))
+RETRY_BACKOFF = int(os.environ.get("QUEUE_RETRY_BACKOFF", "60"))
+DONE_RETENTION = 30 * 24 * 3600
+
+# status: ready → leased → done / ready（retry）/ dead（試行回数超過）/ held（人手の確認待ち。release_held で ready へ）
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY,
+    queue TEXT NOT NULL,
+    key TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'ready',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    available_at REAL NOT NULL,
+    lease_until REAL,
+    lease_token TEXT,
+    last_error TEXT,
+    enqueued_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    UNIQUE (queue, key)
+);
+CREATE INDEX IF NOT EXISTS items_ready ON items (queue, status, available_at);
+CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+
+class Item(NamedTuple):
+    id: int
+    queue: str
+    key: str
+    payload: Dict[str, Any]
+    attempts: int
+    lease_token: str
+
+
+class WorkQueue:
+    """SQLite(WAL) 上の永続キュー。enqueue / lease / ack / retry と可視性タイムアウトを持つ"""
+
+    def __init__(self, conn, visibility_timeout: int = VISIBILITY_TIMEOUT, max_attempts: int = MAX_ATTEMPTS):
+        conn.isolation_level = None  # トランザクションは明示的に張る
+        conn.executescript(SCHEMA)
+        self.conn = conn
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, name: str = QUEUE_DB, **kwargs) -> "WorkQueue":
+        return cls(state_store.connect(name, check_same_thread=False), **kwargs)
+
+    def _tx(self, fn):
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(self.conn)
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+            return result
+
+    def enqueue(self, queue: str, key: str, payload: Dict[str, Any], delay: float = 0) -> bool:
+        """
+        投入（同一キーは1件のみ）。未処理(ready)のまま再投入された場合は payload を更新する。
+        失敗(dead)の項目は payload が変わっていれば（記事・ページが直された）試行回数を戻して ready に戻す。
+        新規投入なら True
+        """
+        now = time.time()
+        body = json.dumps(payload, ensure_ascii=False)
+
+        def _do(conn):
+            cur = conn.execute(
+                "INSERT OR IGNORE INTO items (queue, key, payload, available_at, enqueued_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (queue, key, body, now + delay, now, now),
+            )
+            if cur.rowcount:
+                return True
+            conn.execute(
+                "UPDATE items SET payload = ?, updated_at = ? WHERE queue = ? AND key = ? AND status = 'ready'",
+                (body, now, queue, key),
+            )
+            conn.execute(
+                "UPDATE items SET payload = ?, status = 'ready', attempts = 0, last_error = NULL,"
+                " available_at = ?, updated_at = ? WHERE queue = ? AND key = ? AND status = 'dead' AND payload != ?",
+                (body, now + delay, now, queue, key, body),
+            )
+            return False
+
+        return self._tx(_do)
+
+    def lease(self, queue: str, limit: int = 1, visibility_timeout: Optional[int] = None) -> List[Item]:
+        """取り出し可能な項目を借りる。期限切れの貸出中項目も再度取り出せる"""
+        now = time.time()
+        until = now + (visibility_timeout or self.visibility_timeout)
+
+        def _do(conn):
+            rows = conn.execute(
+                "SELECT id, key, payload, attempts FROM items WHERE queue = ? AND ("
+                " (status = 'ready' AND available_at <= ?) OR (status = 'leased' AND lease_until < ?))"
+                " ORDER BY available_at, id LIMIT ?",
+                (queue, now, now, limit),
+            ).fetchall()
+            items = []
+            for item_id, key, payload, attempts in rows:
+                token = uuid.uuid4().hex
+                conn.execute(
+                    "UPDATE items SET status = 'leased', lease_until = ?, lease_token = ?,"
+                    " attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                    (until, token, now, item_id),
+                )
+                items.append(Item(item_id, queue, key, json.loads(payload), attempts + 1, token))
+            return items
+
+        return self._tx(_do)
+
+    def lease_key(self, queue: str, key: str, visibility_timeout: Optional[int] = None) -> Optional[Item]:
+        """キー指定で借りる（優先度順に取り出す post_scheduler 用）。取り出せない状態なら None"""
+        now = time.time()
+        until = now + (visibility_timeout or self.visibility_timeout)
+
+        def _do(conn):
+            row = conn.execute(
+                "SELECT id, payload, attempts FROM items WHERE queue = ? AND key = ? AND ("
+                " (status = 'ready' AND available_at <= ?) OR (status = 'leased' AND lease_until < ?))",
+                (queue, key, now, now),
+            ).fetchone()
+            if row is None:
+                return None
+            item_id, payload, attempts = row
+            token = uuid.uuid4().hex
+            conn.execute(
+                "UPDATE items SET status = 'leased', lease_until = ?, lease_token = ?,"
+                " attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                (until, token, now, item_id),
+            )
+            return Item(item_id, queue, key, json.loads(payload), attempts + 1, token)
+
+        return self._tx(_do)
+
+    def status(self, queue: str, key: str) -> Optional[str]:
+        with self._lock:
+            row = self.conn.execute("SELECT status FROM items WHERE queue = ? AND key = ?", (queue, key)).fetchone()
+        return row[0] if row else None
+
+    def peek(self, queue: str, limit: int = 100) -> List[Dict[str, Any]]:
+        """取り出し可能な項目の payload を借りずに覗く（先読み用）"""
+        now = time.time()
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT payload FROM items WHERE queue = ? AND ("
+                " (status = 'ready' AND available_at <= ?) OR (status = 'leased' AND lease_until < ?))"
+                " ORDER BY available_at, id LIMIT ?",
+                (queue, now, now, limit),
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def ack(self, item: Item) -> bool:
+        """処理完了。貸出が失効して他者に渡っていた場合は False"""
+        def _do(conn):
+            cur = conn.execute(
+                "UPDATE items SET status = 'done', lease_until = NULL, updated_at = ?"
+                " WHERE id = ? AND lease_token = ?",
+                (time.time(), item.id, item.lease_token),
+            )
+            return cur.rowcount == 1
+
+        return self._tx(_do)
+
+    def retry(self, item: Item, error: str = "", backoff: int = RETRY_BACKOFF) -> None:
+        """失敗時の差し戻し（指数バックオフ）。試行回数を超えたら dead"""
+        now = time.time()
+        status = "dead" if item.attempts >= self.max_attempts else "ready"
+        delay = backoff * (2 ** (item.attempts - 1))
+        self._tx(lambda conn: conn.execute(
+            "UPDATE items SET status = ?, available_at = ?, lease_until = NULL, last_error = ?, updated_at = ?"
+            " WHERE id = ? AND lease_token = ?",
+            (status, now + delay, error[:1000], now, item.id, item.lease_token),
+        ))
+
+    def release(self, item: Item, delay: float = 0) -> None:
+        """処理せずに返す（レート制限待ち等。試行回数に数えない）"""
+        now = time.time()
+        self._tx(lambda conn: conn.execute(
+            "UPDATE items SET status = 'ready', attempts = MAX(attempts - 1, 0), available_at = ?,"
+            " lease_until = NULL, updated_at = ? WHERE id = ? AND lease_token = ?",
+            (now + max(delay, 0), now, item.id, item.lease_token),
+        ))
+
+    def hold(self, item: Item, reason: str = "") -> None:
+        """人手の確認が済むまで保留する（取り出し対象外。試行回数も増えない）"""
+        now = time.time()
+        self._tx(lambda conn: conn.execute(
+            "UPDATE items SET status = 'held', lease_until = NULL, last_error = ?, updated_at = ?"
+            " WHERE id = ? AND lease_token = ?",
+            (reason[:1000], now, item.id, item.lease_token),
+        ))
+
+    def release_held(self, queue: str, key: str) -> bool:
+        """保留を解いて試行回数を戻し、すぐ取り出せるようにする。保留中だったら True"""
+        now = time.time()
+        return self._tx(lambda conn: conn.execute(
+            "UPDATE items SET status = 'ready', attempts = 0, available_at = ?, updated_at = ?"
+            " WHERE queue = ? AND key = ? AND status = 'held'",
+            (now, now, queue, key),
+        ).rowcount == 1)
+
+    def complete(self, queue: str, key: str) -> None:
+        """キー指定で完了扱いにする（別キューへ移した項目など）"""
+        self._tx(lambda conn: conn.execute(
+            "UPDATE items SET status = 'done', lease_until = NULL, updated_at = ?"
+            " WHERE queue = ? AND key = ? AND status != 'done'",
+            (time.time(), queue, key),
+        ))
+
+    def remove(self, queue: str, key: str) -> None:
+        """未処理の項目を取り下げる"""
+        self._tx(lambda conn: conn.execute(
+            "DELETE FROM items WHERE queue = ? AND key = ? AND status = 'ready'", (queue, key)
+        ))
+
+    def purge_done(self, older_than: int = DONE_RETENTION) -> int:
+        cutoff = time.time() - older_than
+        return self._tx(lambda conn: conn.execute(
+            "DELETE FROM items WHERE status = 'done' AND updated_at < ?", (cutoff,)
+        ).rowcount)
+
+    def get_meta(self, name: str) -> Optional[str]:
+        with self._lock:
+            row = self.conn.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, name: str, value: str) -> None:
+        self._tx(lambda conn: conn.execute(
+            "INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)", (name, value)
+        ))
+
+    def stats(self, queue: str) -> Dict[str, Any]:
+        """キュー深さ（状態別件数）と未完了項目の最古経過秒"""
+        with self._lock:
+            counts = dict(self.conn.execute(
+                "SELECT status, COUNT(*) FROM items WHERE queue = ? GROUP BY status", (queue,)
+            ).fetchall())
+            oldest = self.conn.execute(
+                "SELECT MIN(enqueued_at) FROM items WHERE queue = ? AND status IN ('ready', 'leased')", (queue,)
+            ).fetchone()[0]
+        return {
+            "queue": queue,
+            "ready": counts.get("ready", 0),
+            "leased": counts.get("leased", 0),
+            "dead": counts.get("dead", 0),
+            "held": counts.get("held", 0),
+            "done": counts.get("done", 0),
+            "oldest_age_sec": int(time.time() - oldest) if oldest else 0,
+        }
+
+
+def format_stats(stats: Dict[str, Any]) -> str:
+    return (f"キュー[{stats['queue']}]: 待ち {stats['ready']}件 / 処理中 {stats['leased']}件 / "
+            f"失敗 {stats['dead']}件 / " + (f"保留 {stats['held']}件 / " if stats.get("held") else "") +
+            f"最古 {stats['oldest_age_sec'] // 60}分")
+
+
+if __name__ == "__main__":
+    # 使い方: python scripts/work_queue.py stats [queue ...]
+    if len(sys.argv) < 2 or sys.argv[1] != "stats":
+        print("usage: work_queue.py stats [queue ...]", file=sys.stderr)
+        sys.exit(2)
+    q = WorkQueue.open()
+    for name in sys.argv[2:] or ["post"]:
+        print(json.dumps(q.stats(name), ensure_ascii=False))
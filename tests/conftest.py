@@ -0,0 +1,24 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# スクリプトは scripts/ 直下で互いを import し合うので、テストからも同じように import できるようにする
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "scripts"))
+
+# notion_insert / post_to_x は import 時に Secrets を読む。ダミー値を入れておく（テストから外部へは出ない）
+for _name in ("NOTION_API_KEY", "NOTION_DATABASE_ID", "SLACK_WEBHOOK_URL",
+              "X_API_KEY", "X_API_SECRET", "X_ACCESS_TOKEN", "X_ACCESS_SECRET"):
+    os.environ.setdefault(_name, "test")
+# import 時に開くステート（SpanLog など）も作業ツリーの .state に書かない
+os.environ.setdefault("STATE_DIR", tempfile.mkdtemp(prefix="test-state-"))
+
+import state_store  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def state_dir(tmp_path, monkeypatch):
+    """STATE_DIR をテストごとの一時ディレクトリにする"""
+    monkeypatch.setattr(state_store, "STATE_DIR", str(tmp_path))
+    return tmp_path
@@ -0,0 +1,94 @@
+import sqlite3
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+import state_store
+from article_extract import ExtractCache, enrich_summaries, extract_text, fetch_leads, lead_of
+from records import Article
+
+BODY = " ".join(f"Paragraph {i} of the story explains what happened, and why it matters to readers." for i in range(3))
+PAGE = f"""<html><head><meta name="description" content="Meta description text"></head><body>
+<nav><p>Home, World, Business, Technology, Sports, Opinion and more links</p></nav>
+<div class="sidebar related"><p>Related: another story that should not be picked up at all.</p></div>
+<article><p>{BODY}</p><p>Second paragraph with more details about the event and its impact.</p></article>
+<footer><p>Copyright notice and a long list of legal links for the site.</p></footer>
+</body></html>"""
+
+
+def test_extract_prefers_the_article_body():
+    result = extract_text(PAGE)
+    assert result.text.startswith("Paragraph 0 of the story")
+    assert "Related" not in result.text and "Copyright" not in result.text
+    assert result.lead.startswith("Paragraph 0") and len(result.lead) <= 300
+
+
+def test_extract_falls_back_to_meta_description():
+    assert extract_text("<html><head><meta property='og:description' content='Only  meta'></head></html>").lead \
+        == "Only meta"
+
+
+def test_lead_cuts_at_sentence_boundaries():
+    assert lead_of("First sentence. Second sentence. Third.", 33) == "First sentence. Second sentence."
+    assert lead_of("一文目です。二文目です。", 7) == "一文目です。"
+    assert lead_of("x" * 50, 10) == "x" * 9 + "…"
+
+
+@pytest.fixture
+def server():
+    hits = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            hits.append(self.path)
+            body = PAGE.encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("ETag", '"v1"')
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    httpd = HTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_port}", hits
+    httpd.shutdown()
+
+
+def test_leads_are_cached_and_only_the_lead_is_stored(server):
+    base, hits = server
+    url = f"{base}/story"
+    assert fetch_leads([url])[url].startswith("Paragraph 0")
+    assert fetch_leads([url])[url].startswith("Paragraph 0")
+    assert hits == ["/story"]  # 2回目はキャッシュ（ダウンロードしない）
+    columns = [row[1] for row in ExtractCache.open().conn.execute("PRAGMA table_info(extracts)")]
+    assert "text" not in columns
+
+
+def test_enrich_only_replaces_thin_summaries(server):
+    base, hits = server
+    articles = [Article(title="a", url=f"{base}/thin", summary="Short."),
+                Article(title="b", url=f"{base}/full", summary="A summary that is already long enough " * 3)]
+    thin, full = enrich_summaries(articles)
+    assert thin.summary.startswith("Paragraph 0")
+    assert full.summary == articles[1].summary
+    assert hits == ["/thin"]
+
+
+def test_purge_and_legacy_text_column_cleanup():
+    conn = sqlite3.connect(state_store.state_path("articles.sqlite3"))
+    conn.execute("CREATE TABLE extracts (url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, lead TEXT,"
+                 " text TEXT, error TEXT, fetched_at REAL NOT NULL)")
+    conn.execute("INSERT INTO extracts VALUES ('old', NULL, NULL, 'lead', 'full body', NULL, ?)", (time.time() - 1000,))
+    conn.execute("INSERT INTO extracts VALUES ('new', NULL, NULL, 'lead', 'full body', NULL, ?)", (time.time(),))
+    conn.commit()
+    conn.close()
+    cache = ExtractCache.open()
+    assert cache.conn.execute("SELECT COUNT(*) FROM extracts WHERE text IS NOT NULL").fetchone()[0] == 0
+    assert cache.purge(older_than=500) == 1
+    assert cache.get("new")[2] == "lead" and cache.get("old") is None
@@ -0,0 +1,83 @@
+import gzip
+import json
+
+import pytest
+
+import backfill
+from notion_insert import IngestResult
+
+
+def write_archive(path, n, broken_at=None):
+    lines = []
+    for i in range(n):
+        if i == broken_at:
+            lines.append("{not json")
+            continue
+        lines.append(json.dumps({"title": f"Story {i}", "link": f"https://example.com/{i}?utm_source=rss",
+                                 "summary": "s", "published": 1700000000 + i, "feed": "https://example.com/rss"}))
+    data = ("\n".join(lines) + "\n").encode()
+    if str(path).endswith(".gz"):
+        data = gzip.compress(data)
+    path.write_bytes(data)
+    return str(path)
+
+
+@pytest.fixture
+def ingested(monkeypatch):
+    """取り込み（Notion登録）と Slack 通知を差し替え、チャンクごとの URL を記録する"""
+    chunks, slack = [], []
+    state = {"fail_on": None}
+
+    def ingest(articles, existing_urls, index, budget, **kwargs):
+        if state["fail_on"] is not None and len(chunks) == state["fail_on"]:
+            state["fail_on"] = None
+            return IngestResult(0, 0, 0, len(articles), 0, 0)
+        chunks.append([a.url for a in articles])
+        return IngestResult(len(articles), 0, 0, 0, 0, 0)
+
+    monkeypatch.setattr(backfill, "ingest_articles", ingest)
+    monkeypatch.setattr(backfill, "open_existing_urls", lambda index: set())
+    monkeypatch.setattr(backfill, "notify_slack", slack.append)
+    return chunks, slack, state
+
+
+def test_backfill_streams_fixed_size_chunks(tmp_path, ingested):
+    chunks, slack, _ = ingested
+    cp = backfill.backfill(write_archive(tmp_path / "a.jsonl.gz", 5), chunk_size=2)
+    assert [len(c) for c in chunks] == [2, 2, 1]
+    assert chunks[0][0] == "https://example.com/0"  # 正規化済みURL
+    assert cp["done"] and cp["lines"] == 5 and cp["inserted"] == 5
+    assert "バックフィル完了" in slack[0] and "5 行" in slack[0]
+
+
+def test_broken_lines_are_skipped_but_counted(tmp_path, ingested):
+    chunks, _, _ = ingested
+    cp = backfill.backfill(write_archive(tmp_path / "a.jsonl", 4, broken_at=1), chunk_size=10)
+    assert chunks == [["https://example.com/0", "https://example.com/2", "https://example.com/3"]]
+    assert cp["lines"] == 4 and cp["inserted"] == 3
+
+
+def test_incomplete_chunk_stops_and_resumes_from_checkpoint(tmp_path, ingested):
+    chunks, _, state = ingested
+    archive = write_archive(tmp_path / "a.jsonl", 5)
+    state["fail_on"] = 1  # 2チャンク目で Notion 登録に失敗
+    with pytest.raises(RuntimeError, match="line 2 incomplete"):
+        backfill.backfill(archive, chunk_size=2)
+    cp = backfill.load_checkpoint(archive)
+    assert cp["lines"] == 2 and cp["inserted"] == 2 and not cp["done"]
+
+    # 同じコマンドで失敗したチャンクから再開する
+    cp = backfill.backfill(archive, chunk_size=2)
+    assert [c[0] for c in chunks] == ["https://example.com/0", "https://example.com/2", "https://example.com/4"]
+    assert cp["lines"] == 5 and cp["inserted"] == 5 and cp["done"]
+
+
+def test_checkpoint_is_ignored_for_another_archive_or_on_reset(tmp_path, ingested):
+    chunks, _, _ = ingested
+    first = write_archive(tmp_path / "a.jsonl", 3)
+    backfill.backfill(first, chunk_size=2)
+    assert backfill.load_checkpoint(str(tmp_path / "b.jsonl")) == {}
+
+    chunks.clear()
+    cp = backfill.backfill(first, chunk_size=2, reset=True)
+    assert sum(len(c) for c in chunks) == 3 and cp["lines"] == 3
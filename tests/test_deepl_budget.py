@@ -0,0 +1,75 @@
+import json
+import time
+
+import state_store
+from deepl_budget import (MAX_CONSECUTIVE_FAILURES, SUMMARY_MIN_CHARS, USAGE_CACHE, TranslationBudget,
+                          plain_summary, truncate_text)
+from records import Article
+
+
+def article(title, summary=""):
+    return Article(title=title, url=f"https://example.com/{title}", summary=summary)
+
+
+def test_unknown_budget_translates_everything_needed():
+    plans = TranslationBudget(None).plan([article("Hello", "<p>Some text</p>"), article("Skip")],
+                                         needs=lambda text: text != "Skip")
+    assert plans[0].translate_title and plans[0].translate_summary
+    assert plans[0].summary == "Some text"
+    assert not plans[1].translate_title
+
+
+def test_titles_come_before_summaries():
+    budget = TranslationBudget(12)
+    plans = budget.plan([article("Title one", "x" * 200), article("Two", "y" * 200)])
+    assert [p.translate_title for p in plans] == [True, True]
+    assert not any(p.translate_summary for p in plans)
+
+
+def test_summaries_share_the_rest_and_are_truncated():
+    summary = "Sentence one. " * 30
+    budget = TranslationBudget(2 * SUMMARY_MIN_CHARS + 10)
+    plans = budget.plan([article("", summary), article("", summary)])
+    assert all(p.translate_summary for p in plans)
+    assert sum(len(p.summary) for p in plans) <= 2 * SUMMARY_MIN_CHARS + 10
+    assert all(p.summary.endswith(".") for p in plans)
+
+
+def test_limit_caps_a_language_share():
+    plans = TranslationBudget(1000).plan([article("Title one"), article("Title two")], limit=10)
+    assert [p.translate_title for p in plans] == [True, False]
+
+
+def test_charge_exhausts_and_resets_failures():
+    budget = TranslationBudget(100)
+    budget.record_failure()
+    budget.charge(60)
+    assert budget.failures == 0
+    assert budget.left() == 40
+    assert not budget.exhausted
+    budget.charge(40)
+    assert budget.exhausted
+    assert budget.left() == 0
+
+
+def test_consecutive_failures_stop_translation():
+    budget = TranslationBudget(None)
+    for _ in range(MAX_CONSECUTIVE_FAILURES - 1):
+        budget.record_failure()
+    assert not budget.exhausted
+    budget.record_failure()
+    assert budget.exhausted
+
+
+def test_from_api_uses_cached_usage_and_reserve(state_dir):
+    with open(state_store.state_path(USAGE_CACHE), "w", encoding="utf-8") as f:
+        json.dump({"character_count": 400, "character_limit": 1000, "fetched_at": time.time()}, f)
+    budget = TranslationBudget.from_api("key:fx", reserve=100)
+    assert budget.left() == 500
+    assert budget.summary_line() == "翻訳 0 文字 / 残り 500 文字"
+
+
+def test_plain_summary_and_truncate():
+    assert plain_summary("<p>A &amp; B</p>\n<p>C</p>") == "A & B C"
+    assert truncate_text("First sentence. Second sentence.", 20) == "First sentence."
+    assert truncate_text("abcdefghij", 5) == "abcd…"
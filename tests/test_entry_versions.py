@@ -0,0 +1,67 @@
+import time
+
+from entry_versions import EntryVersions, PageVersion
+from records import Article
+
+
+def article(url, title="Title", summary="<p>Summary text</p>"):
+    return Article(title=title, url=url, summary=summary)
+
+
+def test_split_separates_untracked_and_changed():
+    v = EntryVersions.open()
+    v.record(article("https://example.com/a"), "ja", "page-a", "タイトル", "要約")
+    v.record(article("https://example.com/b"), "ja", "page-b", "タイトル", "要約")
+    rest, changes = v.split([
+        article("https://example.com/a"),
+        article("https://example.com/b", summary="<p>Summary text, corrected</p>"),
+        article("https://example.com/c"),
+    ])
+    assert [a.url for a in rest] == ["https://example.com/c"]
+    assert [(c.article.url, c.title, c.summary) for c in changes] == [("https://example.com/b", False, True)]
+
+
+def test_whitespace_and_markup_are_not_changes():
+    v = EntryVersions.open()
+    v.record_entry(article("https://example.com/a", title="Big  news"))
+    rest, changes = v.split([article("https://example.com/a", title="Big news", summary="Summary   text")])
+    assert (rest, changes) == ([], [])
+
+
+def test_duplicate_urls_report_one_change():
+    v = EntryVersions.open()
+    v.record_entry(article("https://example.com/a"))
+    _, changes = v.split([article("https://example.com/a", title="New")] * 2)
+    assert len(changes) == 1
+
+
+def test_record_entry_counts_revisions():
+    v = EntryVersions.open()
+    v.record_entry(article("https://example.com/a"))
+    v.record_entry(article("https://example.com/a"))
+    assert v.stats() == {"entries": 1, "revised": 0, "pages": 0}
+    v.record_entry(article("https://example.com/a", title="Fixed"))
+    assert v.stats()["revised"] == 1
+
+
+def test_pages_and_unfinished_entries():
+    v = EntryVersions.open()
+    url = "https://example.com/a"
+    v.record_page(url, "ja", "page-ja", "タイトル", "要約")
+    assert v.pages(url) == {"ja": PageVersion("page-ja", "タイトル", "要約")}
+    # 一部の言語だけの記事は追跡外（次回残りの言語を登録する）
+    assert v.unfinished([url, "https://example.com/other"]) == {url}
+    assert [a.url for a in v.split([article(url)])[0]] == [url]
+    v.record(article(url), "en", "page-en", "Title", "Summary")
+    assert v.unfinished([url]) == set()
+    assert set(v.pages(url)) == {"ja", "en"}
+
+
+def test_purge_drops_stale_entries_and_pages():
+    v = EntryVersions.open()
+    v.record(article("https://example.com/old"), "ja", "p1", "t", "s")
+    v.record(article("https://example.com/new"), "ja", "p2", "t", "s")
+    v.conn.execute("UPDATE entries SET updated_at = ? WHERE url = ?", (time.time() - 1000, "https://example.com/old"))
+    assert v.purge(older_than=500) == 1
+    assert v.pages("https://example.com/old") == {}
+    assert v.stats() == {"entries": 1, "revised": 0, "pages": 1}
@@ -0,0 +1,103 @@
+import gzip
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+import requests
+
+from feed_farm_mock import QUIRKS, FarmConfig, FarmHandler, latest_index, render_feed, run_load, traits
+from feed_parse import parse_feed_bytes
+from url_canon import Canonicalizer
+
+CFG = FarmConfig(feeds=200, entries=5, summary_words=20, update_sec=600, dup_ratio=0.2, quirk_ratio=0.5,
+                 slow_ratio=0, broken_ratio=0, atom_ratio=0.3, seed=7)
+NOW = 1_700_000_000.0
+
+
+def feed_with(predicate):
+    return next(n for n in range(CFG.feeds) if predicate(traits(CFG, n)))
+
+
+def test_feeds_are_deterministic_and_grow_one_item_per_update():
+    body, published, _ = render_feed(CFG, 3, NOW)
+    assert render_feed(CFG, 3, NOW)[0] == body
+    later, later_published, _ = render_feed(CFG, 3, NOW + CFG.update_sec)
+    assert later_published == published + CFG.update_sec
+    before = [e.link for e in parse_feed_bytes(body)]
+    after = [e.link for e in parse_feed_bytes(later)]
+    assert len(after) == CFG.entries and after[1:] == before[:-1]
+
+
+def test_updates_are_staggered_across_feeds():
+    steps = {latest_index(CFG, n, NOW) for n in range(CFG.feeds)}
+    assert len(steps) == 2  # 一斉に更新されない
+
+
+@pytest.mark.parametrize("quirk", QUIRKS)
+def test_quirky_encodings_still_parse(quirk):
+    n = feed_with(lambda t: t.quirk == quirk)
+    body, _, _ = render_feed(CFG, n, NOW)
+    entries = parse_feed_bytes(body)
+    assert len(entries) == CFG.entries
+    if quirk in ("latin1", "cp1252-as-utf8"):
+        assert any("Caf" in e.title for e in entries)
+
+
+def test_reposts_canonicalize_to_the_original_url():
+    canon = Canonicalizer()
+    links = [e.link for n in range(40) for e in parse_feed_bytes(render_feed(CFG, n, NOW)[0])]
+    assert any("utm_source" in link for link in links)  # 追跡パラメータ付きの再掲がある
+    urls = [canon.canonical(link) for link in links]
+    assert len(set(urls)) < len(urls)  # 正規化すると他フィードの記事と重なる
+
+
+def test_broken_feeds_are_broken():
+    cfg = CFG._replace(broken_ratio=1.0)
+    kinds = {}
+    for n in range(CFG.feeds):
+        t = traits(cfg, n)
+        kinds.setdefault(t.broken, render_feed(cfg, n, NOW)[0])
+    assert set(kinds) == {"truncated", "bare-amp"}
+    assert not kinds["truncated"].rstrip().endswith((b"</rss>", b"</feed>"))
+    assert b" & Co</title>" in kinds["bare-amp"]
+
+
+@pytest.fixture
+def farm(monkeypatch):
+    monkeypatch.setattr(FarmHandler, "config", CFG)
+    monkeypatch.setattr(FarmHandler, "stats", {"requests": 0, "ok": 0, "not_modified": 0, "bytes": 0, "slow": 0})
+    monkeypatch.setattr(FarmHandler, "cache", {})
+    server = ThreadingHTTPServer(("", 0), FarmHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server.server_address[1]
+    server.shutdown()
+    server.server_close()
+
+
+def test_farm_serves_conditional_and_gzip_responses(farm):
+    base = f"http://127.0.0.1:{farm}"
+    res = requests.get(f"{base}/feed/1", headers={"Accept-Encoding": "gzip"}, timeout=5)
+    assert res.status_code == 200 and res.headers["Content-Encoding"] == "gzip"
+    assert len(parse_feed_bytes(res.content)) == CFG.entries  # requests が展開済み
+    raw = requests.get(f"{base}/feed/1", headers={"Accept-Encoding": "gzip"}, timeout=5, stream=True).raw.read()
+    assert gzip.decompress(raw) == res.content
+
+    etag, last_modified = res.headers["ETag"], res.headers["Last-Modified"]
+    assert requests.get(f"{base}/feed/1", headers={"If-None-Match": etag}, timeout=5).status_code == 304
+    assert requests.get(f"{base}/feed/1", headers={"If-Modified-Since": last_modified}, timeout=5).status_code == 304
+    # 両方あれば ETag を優先する
+    both = {"If-None-Match": '"stale"', "If-Modified-Since": last_modified}
+    assert requests.get(f"{base}/feed/1", headers=both, timeout=5).status_code == 200
+
+    assert requests.get(f"{base}/feed/{CFG.feeds}", timeout=5).status_code == 404
+    stats = requests.get(f"{base}/stats", timeout=5).json()
+    assert stats["not_modified"] == 2 and stats["ok"] == 3
+
+
+def test_run_load_goes_through_the_whole_pipeline(farm):
+    result = run_load(20, farm)
+    assert result.fetched == 20 and result.errors == 0
+    assert result.entries == 20 * CFG.entries
+    assert 0 < result.inserted < result.entries  # 再掲・類似は重複として落ちる
+    assert FarmHandler.stats["ok"] == 20
@@ -0,0 +1,144 @@
+import asyncio
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+import feed_fetch
+from feed_fetch import DNSCache, cached_transport, fetch_all, fetch_conditional
+
+FEED = b"<?xml version='1.0'?><rss><channel><title>t</title></channel></rss>"
+
+
+@pytest.fixture
+def server():
+    seen = {"resolver": [], "paths": []}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            # 取得中もプロセス全体の名前解決は差し替えられていない
+            seen["resolver"].append(socket.getaddrinfo)
+            seen["paths"].append(self.path)
+            if self.path == "/slow":
+                time.sleep(1.5)
+            if self.path == "/big":
+                body = b"x" * 4096
+            else:
+                body = FEED
+            if self.headers.get("If-None-Match") == '"v1"':
+                self.send_response(304)
+                self.send_header("ETag", '"v1"')
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("ETag", '"v1"')
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            try:
+                self.wfile.write(body)
+            except OSError:
+                pass
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://localhost:{httpd.server_port}", seen
+    httpd.shutdown()
+
+
+def counting_resolver(calls):
+    def resolve(host, port, *args, **kwargs):
+        calls.append(host)
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, "", ("127.0.0.1", port))]
+    return resolve
+
+
+def test_dns_cache_resolves_each_host_once_within_ttl():
+    calls = []
+    dns = DNSCache(ttl=60, resolver=counting_resolver(calls))
+    assert dns.resolve("feeds.example", 443) == ["127.0.0.1"]
+    assert dns.resolve("feeds.example", 443) == ["127.0.0.1"]
+    dns.resolve("other.example", 443)
+    assert calls == ["feeds.example", "other.example"]
+
+
+def test_dns_cache_expires_after_ttl():
+    calls = []
+    dns = DNSCache(ttl=0, resolver=counting_resolver(calls))
+    dns.resolve("feeds.example", 443)
+    dns.resolve("feeds.example", 443)
+    assert calls == ["feeds.example", "feeds.example"]
+
+
+def test_transport_uses_the_cache_and_leaves_getaddrinfo_alone(server):
+    base, seen = server
+    calls = []
+    dns = DNSCache(resolver=counting_resolver(calls))
+    limits = httpx.Limits(max_connections=4, max_keepalive_connections=0)  # 毎回新しい接続にする
+
+    async def run():
+        async with httpx.AsyncClient(transport=cached_transport(limits, dns)) as client:
+            return [(await client.get(f"{base}/feed{i}")).status_code for i in range(3)]
+
+    assert asyncio.run(run()) == [200, 200, 200]
+    assert calls == ["localhost"]
+    assert all(f is socket.getaddrinfo for f in seen["resolver"])
+
+
+def test_unresolvable_host_is_reported_as_a_connect_error():
+    def fail(host, port, *args, **kwargs):
+        raise socket.gaierror("Name or service not known")
+
+    async def run():
+        transport = cached_transport(httpx.Limits(), DNSCache(resolver=fail))
+        async with httpx.AsyncClient(transport=transport) as client:
+            await client.get("http://nowhere.invalid/feed")
+
+    with pytest.raises(httpx.ConnectError):
+        asyncio.run(run())
+
+
+def test_fetch_all_returns_bodies_and_errors(server):
+    base, _ = server
+    blobs, errors = fetch_all([f"{base}/a", f"{base}/a", "http://127.0.0.1:1/closed"])
+    assert blobs == [(f"{base}/a", FEED)]  # 重複URLは1回だけ取得
+    assert list(errors) == ["http://127.0.0.1:1/closed"]
+    assert errors["http://127.0.0.1:1/closed"].startswith("ConnectError")
+
+
+def test_fetch_conditional_skips_unchanged_bodies(server):
+    base, _ = server
+    results, errors = fetch_conditional([f"{base}/a", f"{base}/b"], {f"{base}/a": ('"v1"', None)})
+    assert errors == {}
+    assert results[f"{base}/a"].body is None and results[f"{base}/a"].etag == '"v1"'
+    assert results[f"{base}/b"].body == FEED
+
+
+def test_oversized_feed_is_rejected(server):
+    base, _ = server
+    blobs, errors = fetch_all([f"{base}/big"], max_bytes=1024)
+    assert blobs == []
+    assert errors[f"{base}/big"].startswith("FeedTooLarge")
+
+
+def test_slow_feed_hits_the_per_feed_timeout(server, monkeypatch):
+    base, _ = server
+    monkeypatch.setattr(feed_fetch, "FETCH_TIMEOUT", 0.3)
+    blobs, errors = fetch_all([f"{base}/slow", f"{base}/fast"])
+    assert blobs == [(f"{base}/fast", FEED)]
+    assert errors == {f"{base}/slow": "TimeoutError"}
+
+
+def test_total_timeout_cancels_unfinished_feeds(server):
+    base, _ = server
+    start = time.monotonic()
+    blobs, errors = fetch_all([f"{base}/slow", f"{base}/fast"], total_timeout=0.5)
+    assert time.monotonic() - start < 1.5
+    assert blobs == [(f"{base}/fast", FEED)]
+    assert errors == {f"{base}/slow": "deadline"}
@@ -0,0 +1,50 @@
+from feed_parse import EntryRecord, feed_urls, fetch_feed_bytes, parse_feed_bytes, parse_many, synthetic_feed
+
+ATOM = b"""<?xml version="1.0" encoding="utf-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom"><title>a</title>
+<entry><title>Relative</title><link href="/news/1"/><id>tag:example.com,2025:1</id>
+<updated>2025-01-06T10:00:00Z</updated><summary>Body</summary></entry>
+</feed>"""
+
+
+def test_feed_urls_splits_on_spaces_and_commas():
+    assert feed_urls(" https://a/rss, https://b/rss\nhttps://c/rss ") == ["https://a/rss", "https://b/rss", "https://c/rss"]
+    assert feed_urls("") == []
+
+
+def test_parse_feed_bytes_returns_plain_records():
+    records = parse_feed_bytes(synthetic_feed(3, seed=7), "https://example.com/feed")
+    assert len(records) == 3
+    first = records[0]
+    assert isinstance(first, EntryRecord)
+    assert first.title == "Story 7-0 & more"
+    assert first.link == "https://example.com/7/0"
+    assert first.guid == "https://example.com/7/0"
+    assert first.published == 1736157600  # 2025-01-06 10:00:00 UTC
+    assert first.summary == "<p>Summary for story 0 with <b>markup</b> to sanitize.</p>"
+
+
+def test_parse_resolves_relative_links_against_the_feed_url():
+    [record] = parse_feed_bytes(ATOM, "https://example.com/feeds/atom.xml")
+    assert record.link == "https://example.com/news/1"
+    assert record.updated == 1736157600 and record.published is None
+
+
+def test_parse_tolerates_broken_input():
+    assert parse_feed_bytes(b"not a feed at all") == []
+
+
+def test_pool_and_inline_parsing_agree():
+    blobs = [(f"https://example.com/feed/{i}", synthetic_feed(5, i)) for i in range(6)]
+    inline = parse_many(blobs, workers=1)
+    pooled = parse_many(blobs, workers=2)
+    assert list(pooled) == [url for url, _ in blobs]  # フィードの順番を保つ
+    assert pooled == inline
+    assert pooled["https://example.com/feed/3"][0].title == "Story 3-0 & more"
+
+
+def test_fetch_feed_bytes_reads_local_files(tmp_path):
+    path = tmp_path / "feed.xml"
+    path.write_bytes(ATOM)
+    assert fetch_feed_bytes(str(path)) == ATOM
+    assert fetch_feed_bytes(path.as_uri()) == ATOM
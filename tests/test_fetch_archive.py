@@ -0,0 +1,104 @@
+import os
+import time
+
+import fetch_archive
+from feed_parse import parse_feed_bytes, synthetic_feed
+from fetch_archive import FetchArchive, replay
+
+HEADLINES = [
+    "Central bank raises interest rates to curb inflation",
+    "Heavy snow closes mountain roads across the north",
+    "Tech giant unveils foldable phone at annual event",
+    "National team wins the final after penalty shootout",
+    "Scientists map the genome of an ancient wheat variety",
+]
+
+
+def news_feed(headlines):
+    """類似判定に掛からない（互いに似ていない）見出しのフィード"""
+    items = "".join(f"<item><title>{t}</title><link>https://news.example/{i}</link><description>{t}.</description></item>"
+                    for i, t in enumerate(headlines))
+    return f"<rss version='2.0'><channel><title>n</title>{items}</channel></rss>".encode()
+
+
+def run(archive, feeds, fetched_at=None):
+    """1回分の取得結果を保存（フィードURL → 件数）"""
+    blobs = [(url, synthetic_feed(n, seed)) for seed, (url, n) in enumerate(feeds.items())]
+    parsed = {url: parse_feed_bytes(body, url) for url, body in blobs}
+    archive.append_run(blobs, parsed, fetched_at)
+    return blobs, parsed
+
+
+def test_records_round_trip_through_the_index():
+    archive = FetchArchive.open()
+    blobs, parsed = run(archive, {"https://a.example/rss": 3, "https://b.example/rss": 2})
+    [segment] = archive.segments()
+    assert segment.endswith(f".jsonl.{fetch_archive.CODEC}")
+    fetched = list(archive.read_segment(segment))
+    assert [(f.feed, f.body) for f in fetched] == blobs
+    assert fetched[1].entries == parsed["https://b.example/rss"]
+    stats = archive.stats()
+    assert stats["records"] == 2 and stats["ratio"] > 1
+
+
+def test_non_utf8_bodies_are_kept_byte_for_byte():
+    archive = FetchArchive.open()
+    body = "<rss>ニュース</rss>".encode("shift_jis")
+    archive.append("https://sjis.example/rss", body, [])
+    archive.seal()
+    [fetched] = archive.read_segment(archive.segments()[0])
+    assert fetched.body == body
+
+
+def test_each_run_is_its_own_segment_and_history_is_newest_first():
+    archive = FetchArchive.open()
+    run(archive, {"https://a.example/rss": 1}, fetched_at=1000.0)
+    time.sleep(0.002)  # セグメント名はミリ秒まで
+    run(archive, {"https://a.example/rss": 2}, fetched_at=2000.0)
+    assert len(archive.segments()) == 2
+    assert [len(f.entries) for f in archive.history("https://a.example/rss")] == [2, 1]
+    assert [f.fetched_at for f in archive.history("https://a.example/rss", limit=1)] == [2000.0]
+
+
+def test_open_segment_is_not_listed_until_sealed():
+    archive = FetchArchive.open()
+    archive.append("https://a.example/rss", synthetic_feed(1), [])
+    assert archive.segments() == []
+    archive.seal()
+    assert len(archive.segments()) == 1
+
+
+def test_retention_drops_old_and_oversized_segments(monkeypatch):
+    archive = FetchArchive.open()
+    now = time.time()
+    monkeypatch.setattr(fetch_archive.time, "time", lambda: now - 30 * 86400)
+    run(archive, {"https://old.example/rss": 5})
+    monkeypatch.undo()
+    run(archive, {"https://a.example/rss": 5})
+    time.sleep(0.002)
+    run(archive, {"https://b.example/rss": 5})
+    old, _, newest = archive.conn.execute("SELECT name FROM segments ORDER BY created_at").fetchall()
+
+    assert archive.enforce_retention(days=14) == 1
+    assert not os.path.exists(os.path.join(archive.root, old[0]))
+    assert list(archive.history("https://old.example/rss")) == []
+
+    size = archive.stats()["bytes"]
+    assert archive.enforce_retention(days=14, max_bytes=size - 1) == 1  # 古い方から容量内に収める
+    assert archive.segments() == [newest[0]]
+
+
+def test_replay_runs_the_pipeline_offline(tmp_path):
+    archive = FetchArchive.open()
+    for headlines in (HEADLINES[:3], HEADLINES):  # 2回目は最初の3件を再取得
+        body = news_feed(headlines)
+        archive.append_run([("https://news.example/rss", body)],
+                           {"https://news.example/rss": parse_feed_bytes(body, "https://news.example/rss")})
+        time.sleep(0.002)
+
+    totals = replay(archive, state_dir=str(tmp_path / "scratch"))
+    assert totals["segments"] == 2 and totals["feeds"] == 2 and totals["entries"] == 8
+    assert totals["inserted"] == 5 and totals["duplicates"] == 3
+
+    reparsed = replay(archive, reparse=True, state_dir=str(tmp_path / "scratch2"))
+    assert reparsed["inserted"] == 5
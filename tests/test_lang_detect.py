@@ -0,0 +1,49 @@
+import pytest
+
+from lang_detect import deepl_source_lang, detect, detect_language, needs_translation
+
+
+@pytest.mark.parametrize("text, lang", [
+    ("北海道で地震、数千人が避難", "ja"),
+    ("서울에서 대규모 집회 열려", "ko"),
+    ("Россия и Украина обменялись пленными", "ru"),
+    ("Earthquake hits the north of Japan after a week of storms", "en"),
+    ("Le gouvernement annonce une réforme des retraites pour les salariés", "fr"),
+    ("Die Bundesregierung plant neue Regeln für Mieter und die Städte", "de"),
+])
+def test_confident_detection(text, lang):
+    assert detect(text) == (lang, True)
+
+
+def test_han_only_text_is_not_confident():
+    # 仮名の無い漢字だけの見出しは中国語とも和文とも取れる
+    assert detect("中国经济增长放缓") == ("zh", False)
+
+
+def test_short_latin_headline_is_only_a_guess():
+    assert not detect("Apple unveils iPhone")[1]
+
+
+def test_empty_text():
+    assert detect("") == (None, False)
+    assert detect_language("") is None
+
+
+def test_needs_translation_skips_confident_target_language():
+    assert needs_translation("北海道で地震、数千人が避難", "ja") == (False, "ja")
+    assert needs_translation("Earthquake hits the north of Japan after a week of storms", "EN-US") == (False, "en")
+
+
+def test_needs_translation_translates_other_languages_with_source():
+    assert needs_translation("Earthquake hits the north of Japan after a week of storms", "ja") == (True, "en")
+
+
+def test_uncertain_text_is_translated_with_auto_source():
+    assert needs_translation("中国经济增长放缓", "ja") == (True, None)
+    assert needs_translation("Apple unveils iPhone", "en") == (True, None)
+
+
+def test_deepl_source_lang():
+    assert deepl_source_lang("en") == "EN"
+    assert deepl_source_lang("ko") is None
+    assert deepl_source_lang(None) is None
@@ -0,0 +1,75 @@
+import json
+import os
+import time
+
+from lineage import SpanLog, collect, new_trace_id, percentile, read_spans, report, span_files
+
+
+def test_record_appends_one_json_line_per_span(state_dir):
+    log = SpanLog.open()
+    log.record("t1", "fetched", ts=100.0, feed="https://feed.example/rss", published=90.0, empty="")
+    log.record("", "fetched")  # trace id のない記事は記録しない
+    log.close()
+    lines = (state_dir / "spans.jsonl").read_text(encoding="utf-8").splitlines()
+    assert [json.loads(line) for line in lines] == [
+        {"t": "t1", "s": "fetched", "ts": 100.0, "feed": "https://feed.example/rss", "published": 90.0}]
+
+
+def test_collect_joins_spans_across_files_and_keeps_the_earliest_time(state_dir):
+    ingest = SpanLog(str(state_dir / "spans.jsonl"))
+    os.makedirs(state_dir / "shards" / "0")
+    poster = SpanLog(str(state_dir / "shards" / "0" / "spans.jsonl"))
+    ingest.record("t1", "fetched", ts=100.0, feed="f", published=40.0)
+    ingest.record("t1", "fetched", ts=160.0)  # 再取得は最初の時刻を残す
+    ingest.record("t1", "inserted", ts=120.0)
+    poster.record("t1", "approved", ts=200.0)
+    poster.record("t1", "posted", ts=260.0)
+    ingest.close()
+    poster.close()
+
+    paths = span_files(str(state_dir))
+    assert len(paths) == 2
+    traces = collect(read_spans(paths))
+    assert traces["t1"].feed == "f"
+    assert traces["t1"].stages == {"published": 40.0, "fetched": 100.0, "inserted": 120.0,
+                                   "approved": 200.0, "posted": 260.0}
+
+
+def test_read_spans_skips_partial_lines(state_dir):
+    path = state_dir / "spans.jsonl"
+    path.write_text('{"t":"a","s":"fetched","ts":1}\n{"t":"b","s":', encoding="utf-8")
+    assert [s["t"] for s in read_spans([str(path)])] == ["a"]
+
+
+def test_prune_drops_old_spans_and_keeps_appending(state_dir):
+    log = SpanLog.open()
+    log.record("old", "fetched", ts=time.time() - 10 * 86400)
+    log.record("new", "fetched")
+    assert log.prune(7) == 1
+    log.record("later", "posted")
+    log.close()
+    assert [s["t"] for s in read_spans([log.path])] == ["new", "later"]
+
+
+def test_percentile_uses_nearest_rank():
+    assert percentile([], 50) is None
+    assert percentile([5.0], 95) == 5.0
+    values = [float(v) for v in range(1, 11)]
+    assert percentile(values, 50) == 5.0
+    assert percentile(values, 95) == 10.0
+
+
+def test_report_groups_by_feed_with_an_overall_row():
+    traces = collect([
+        {"t": "a", "s": "fetched", "ts": 600.0, "feed": "f1", "published": 0.0},
+        {"t": "a", "s": "posted", "ts": 3600.0},
+        {"t": "b", "s": "fetched", "ts": 600.0, "feed": "f2"},
+    ])
+    rows = report(traces)
+    assert rows[0].split()[:3] == ["feed", "items", "posted"]
+    assert [r.split()[:3] for r in rows[1:]] == [["f1", "1", "1"], ["f2", "1", "0"], ["ALL", "2", "1"]]
+    assert rows[1].split()[3:5] == ["1.0h", "1.0h"]  # 公開→投稿
+
+
+def test_trace_ids_are_unique():
+    assert len({new_trace_id() for _ in range(1000)}) == 1000
@@ -0,0 +1,131 @@
+import io
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from PIL import Image
+
+import media
+from media import ImagePrefetcher, MediaCache, shrink_image
+
+
+def png(width, height, color=(200, 30, 30)):
+    buf = io.BytesIO()
+    Image.new("RGB", (width, height), color).save(buf, "PNG")
+    return buf.getvalue()
+
+
+@pytest.fixture
+def server():
+    hits = []
+    routes = {
+        "/story": (b'<html><head><meta property="og:image" content="/img/hero.png"></head></html>', "text/html"),
+        "/plain": (b"<html><head><title>no image</title></head></html>", "text/html"),
+        "/img/hero.png": (png(3000, 1500), "image/png"),
+    }
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            hits.append(self.path)
+            body, ctype = routes.get(self.path, (b"", "text/plain"))
+            self.send_response(200 if body else 404)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_port}", hits
+    httpd.shutdown()
+
+
+def test_shrink_image_fits_the_upload_limits(tmp_path):
+    dst = str(tmp_path / "out.jpg")
+    shrink_image(io.BytesIO(png(4000, 1000)), dst)
+    with Image.open(dst) as img:
+        assert img.format == "JPEG"
+        assert img.size == (2048, 512)
+    assert os.path.getsize(dst) <= media.MAX_UPLOAD_BYTES
+
+
+def test_prefetch_resolves_og_image_and_caches_it(server):
+    base, hits = server
+    prefetcher = ImagePrefetcher()
+    first = prefetcher.submit(f"{base}/story")
+    assert prefetcher.submit(f"{base}/story") is first  # 同じ記事は1回だけ取得
+    path = prefetcher.result(f"{base}/story")
+    prefetcher.close()
+    assert path and os.path.exists(path)
+    with Image.open(path) as img:
+        assert max(img.size) == 2048
+    assert hits == ["/story", "/img/hero.png"]
+
+    # 次の実行は og:image も縮小済み画像もキャッシュから返す（ネットワークに出ない）
+    again = ImagePrefetcher()
+    assert again.result(f"{base}/story") == path
+    again.close()
+    assert hits == ["/story", "/img/hero.png"]
+
+
+def test_prefetch_without_image_or_on_error_returns_none(server):
+    base, hits = server
+    prefetcher = ImagePrefetcher()
+    assert prefetcher.result(f"{base}/plain") is None
+    assert prefetcher.result(f"{base}/missing") is None  # 404 は警告だけ
+    assert prefetcher.result("") is None
+    prefetcher.close()
+    assert MediaCache.open().get_og(f"{base}/plain")[0] is None  # 画像無しも覚える
+
+
+def write_image(cache, sha256, size, age=0.0):
+    path = cache.path_for(sha256)
+    with open(path, "wb") as f:
+        f.write(b"x" * size)
+    old = time.time() - age
+    os.utime(path, (old, old))
+    return path
+
+
+def test_purge_drops_expired_images(monkeypatch):
+    cache = MediaCache.open()
+    write_image(cache, "old", 10, age=2 * media.ORPHAN_GRACE_SEC)
+    write_image(cache, "new", 10, age=2 * media.ORPHAN_GRACE_SEC)
+    now = time.time()
+    cache.put_image("https://img.example/new.jpg", "new")
+    monkeypatch.setattr(media.time, "time", lambda: now - 30 * 86400)
+    cache.put_image("https://img.example/old.jpg", "old")
+    monkeypatch.undo()
+
+    assert cache.purge(older_than=14 * 86400) == 1
+    assert cache.get_image("https://img.example/old.jpg") is None
+    assert cache.get_image("https://img.example/new.jpg") == cache.path_for("new")
+
+
+def test_purge_keeps_newest_images_within_the_size_cap(monkeypatch):
+    cache = MediaCache.open()
+    now = time.time()
+    for i, sha in enumerate(("a", "b", "c")):
+        write_image(cache, sha, 100, age=2 * media.ORPHAN_GRACE_SEC)
+        monkeypatch.setattr(media.time, "time", lambda i=i: now - 300 + i * 100)
+        cache.put_image(f"https://img.example/{sha}.jpg", sha)
+    cache.put_image("https://img.example/c-alias.jpg", "c")  # 同じ画像は1つと数える
+    monkeypatch.undo()
+
+    assert cache.purge(max_bytes=250) == 1
+    assert cache.get_image("https://img.example/a.jpg") is None
+    assert cache.get_image("https://img.example/b.jpg")
+    assert cache.get_image("https://img.example/c-alias.jpg")
+
+
+def test_purge_removes_only_stale_orphans():
+    cache = MediaCache.open()
+    stale = write_image(cache, ".tmp-1", 10, age=2 * media.ORPHAN_GRACE_SEC)
+    fresh = write_image(cache, ".tmp-2", 10)  # 書き込み途中かもしれない
+    assert cache.purge() == 1
+    assert not os.path.exists(stale) and os.path.exists(fresh)
@@ -0,0 +1,61 @@
+from near_dup import EMPTY_SIG, NearDupIndex, drop_near_duplicates, minhash, similarity
+from records import Article
+
+TITLE = "Central bank raises interest rates for the third time this year"
+SUMMARY = "Policy makers lifted the benchmark rate by a quarter point citing persistent inflation pressures"
+
+
+def article(url, title=TITLE, summary=SUMMARY):
+    return Article(title=title, url=url, summary=summary)
+
+
+def test_reworded_copy_is_a_near_duplicate():
+    index = NearDupIndex.open()
+    (kept, sig), = drop_near_duplicates([article("https://a.example/1")], index)[0]
+    index.add(sig, kept.url)
+
+    copy = article("https://b.example/2", title=TITLE.replace("raises", "hikes"))
+    kept, dropped = drop_near_duplicates([copy], index)
+    assert kept == []
+    assert dropped == [(copy, "https://a.example/1")]
+
+
+def test_unrelated_article_is_kept():
+    index = NearDupIndex.open()
+    index.add(minhash(TITLE, SUMMARY), "https://a.example/1")
+    other = article("https://c.example/3", "Volcano erupts near the southern coast",
+                    "Residents were evacuated after ash fell over nearby towns")
+    kept, dropped = drop_near_duplicates([other], index)
+    assert [a.url for a, _ in kept] == ["https://c.example/3"] and dropped == []
+    assert similarity(minhash(TITLE, SUMMARY), kept[0][1]) < 0.3
+
+
+def test_duplicates_within_one_batch():
+    kept, dropped = drop_near_duplicates([article("https://a.example/1"), article("https://b.example/2")],
+                                         NearDupIndex.open())
+    assert [a.url for a, _ in kept] == ["https://a.example/1"]
+    assert [url for _, url in dropped] == ["https://a.example/1"]
+
+
+def test_articles_without_words_are_never_matched():
+    index = NearDupIndex.open()
+    blank = [article("https://a.example/1", "!!!", ""), article("https://b.example/2", "???", "")]
+    kept, dropped = drop_near_duplicates(blank, index)
+    assert len(kept) == 2 and dropped == []
+    assert kept[0][1] == EMPTY_SIG
+    for a, sig in kept:
+        index.add(sig, a.url)
+    assert index.conn.execute("SELECT COUNT(*) FROM lsh").fetchone()[0] == 0
+    assert index.has_url("https://a.example/1")
+    assert index.find(EMPTY_SIG) is None
+
+
+def test_purge_drops_old_signatures_and_buckets():
+    index = NearDupIndex.open()
+    index.add(minhash(TITLE, SUMMARY), "https://a.example/old")
+    index.conn.execute("UPDATE minhash SET created_at = created_at - 1000")
+    index.add(minhash("Volcano erupts near the southern coast"), "https://a.example/new")
+    assert index.purge(older_than=500) == 1
+    assert not index.has_url("https://a.example/old") and index.has_url("https://a.example/new")
+    assert index.find(minhash(TITLE, SUMMARY)) is None
+    assert index.conn.execute("SELECT COUNT(DISTINCT doc_id) FROM lsh").fetchone()[0] == 1
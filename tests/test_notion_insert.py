@@ -0,0 +1,109 @@
+import pytest
+
+import notion_insert
+from records import Article
+
+
+class Response:
+    status_code = 200
+
+    def __init__(self, data):
+        self._data = data
+
+    def json(self):
+        return self._data
+
+    def raise_for_status(self):
+        pass
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    """Notion へ送るはずだった payload"""
+    payloads = []
+
+    def post(url, json=None, **kwargs):
+        payloads.append(json)
+        return Response({"id": f"page-{len(payloads)}"})
+
+    monkeypatch.setattr(notion_insert.requests, "post", post)
+    return payloads
+
+
+def test_rules_property_is_opt_in(sent, monkeypatch):
+    article = Article(title="t", url="https://example.com/a", tags=("ai",))
+    notion_insert.add_to_notion(article)
+    assert "Rules" not in sent[-1]["properties"]
+    monkeypatch.setattr(notion_insert, "STORE_RULES", True)
+    assert notion_insert.add_to_notion(article) == "page-2"
+    assert sent[-1]["properties"]["Rules"] == {"multi_select": [{"name": "ai"}]}
+
+
+def test_lang_property_is_opt_in(sent, monkeypatch):
+    monkeypatch.setattr(notion_insert, "TGT_LANGS", ["ja", "de"])
+    article = Article(title="t", url="https://example.com/a")
+    notion_insert.add_to_notion(article, "de")
+    assert "Lang" not in sent[-1]["properties"]
+    monkeypatch.setattr(notion_insert, "STORE_LANG", True)
+    notion_insert.add_to_notion(article, "de")
+    assert sent[-1]["properties"]["Lang"] == {"select": {"name": "de"}}
+
+
+def articles():
+    return [
+        Article(title="Central bank raises interest rates again", url="https://example.com/rates",
+                summary="The central bank raised its policy rate by a quarter point on Tuesday."),
+        Article(title="Volcano erupts near the southern coast", url="https://example.com/volcano",
+                summary="Residents were evacuated after the eruption sent ash over nearby towns."),
+    ]
+
+
+def fake_translate(entries, plans, target, budget):
+    return [e.replace(title=f"[{target}] {e.title}") for e in entries]
+
+
+def ingest(insert, existing, **kwargs):
+    from deepl_budget import TranslationBudget
+    from entry_versions import EntryVersions
+    from near_dup import NearDupIndex
+    from resilience import Deadline
+    return notion_insert.ingest_articles(
+        articles(), existing, NearDupIndex.open(), TranslationBudget(None), deadline=Deadline(None), rules=None,
+        insert=insert, translate=fake_translate, enrich=False, versions=EntryVersions.open(), **kwargs)
+
+
+def test_fan_out_creates_one_draft_per_language(monkeypatch):
+    monkeypatch.setattr(notion_insert, "TGT_LANGS", ["ja", "de"])
+    created = []
+    existing = set()
+    result = ingest(lambda a, lang: created.append((lang, a.title)) or f"p{len(created)}", existing)
+    assert result.inserted == 2 and result.failed == 0
+    assert sorted(created) == sorted([
+        ("ja", "[ja] Central bank raises interest rates again"),
+        ("de", "[de] Central bank raises interest rates again"),
+        ("ja", "[ja] Volcano erupts near the southern coast"),
+        ("de", "[de] Volcano erupts near the southern coast"),
+    ])
+    assert existing == {"https://example.com/rates", "https://example.com/volcano"}
+
+
+def test_partial_fan_out_resumes_only_missing_languages(monkeypatch):
+    monkeypatch.setattr(notion_insert, "TGT_LANGS", ["ja", "de"])
+    created = []
+
+    def flaky(article, lang):
+        if lang == "de" and "volcano" in article.url:
+            raise RuntimeError("400")
+        created.append((lang, article.url))
+        return f"p{len(created)}"
+
+    existing = set()
+    result = ingest(flaky, existing)
+    assert (result.inserted, result.failed) == (1, 1)
+    assert "https://example.com/volcano" not in existing
+
+    created.clear()
+    result = ingest(lambda a, lang: created.append((lang, a.url)) or "p-de", existing)
+    # 登録済みの ja は作り直さず、残りの de だけ
+    assert created == [("de", "https://example.com/volcano")]
+    assert result.inserted == 1
@@ -0,0 +1,102 @@
+from typing import NamedTuple, Optional
+
+from poll_schedule import (BACKOFF_GRACE, DEFAULT_INTERVAL, JITTER, MAX_BACKOFF, POLL_ACTIVE_INTERVAL,
+                           POLL_FRACTION, POLL_MAX_INTERVAL, POLL_MIN_INTERVAL, QUIET_FACTOR, PollSchedule,
+                           poll_interval)
+
+NOW = 1_800_000_000.0
+HOUR = 3600.0
+
+
+class Fetched(NamedTuple):
+    body: Optional[bytes]
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+
+def open_schedule(**kwargs):
+    return PollSchedule.open(seed=1, **kwargs)
+
+
+def test_active_feeds_are_polled_every_run():
+    assert poll_interval(POLL_ACTIVE_INTERVAL, NOW - 60, 0, NOW) == POLL_MIN_INTERVAL
+
+
+def test_slow_feeds_are_polled_at_a_fraction_of_their_interval():
+    interval = 12 * HOUR
+    assert poll_interval(interval, NOW - HOUR, 0, NOW) == interval * POLL_FRACTION
+
+
+def test_quiet_feeds_stretch_with_their_silence():
+    interval = 4 * HOUR
+    silent = interval * QUIET_FACTOR + HOUR
+    assert poll_interval(interval, NOW - silent, 0, NOW) == min(silent / 2 * POLL_FRACTION, POLL_MAX_INTERVAL)
+    # 推定間隔の QUIET_FACTOR 倍までは伸ばさない
+    assert poll_interval(interval, NOW - interval * 2, 0, NOW) == interval * POLL_FRACTION
+
+
+def test_streak_backoff_only_without_publish_times():
+    interval = 12 * HOUR
+    base = interval * POLL_FRACTION
+    assert poll_interval(interval, None, BACKOFF_GRACE, NOW) == base
+    assert poll_interval(interval, None, BACKOFF_GRACE + 100, NOW) == min(base * MAX_BACKOFF, POLL_MAX_INTERVAL)
+    assert poll_interval(interval, NOW - HOUR, BACKOFF_GRACE + 100, NOW) == base
+
+
+def test_new_feeds_are_due_and_then_scheduled():
+    schedule = open_schedule()
+    assert schedule.due(["a", "b"], now=NOW) == ["a", "b"]
+    schedule.observe("a", b"<rss/>", [NOW - 2 * HOUR, NOW - HOUR], etag='"e1"', now=NOW)
+    assert schedule.due(["a", "b"], now=NOW + 60) == ["b"]
+    assert schedule.validators(["a", "b"]) == {"a": ('"e1"', None)}
+
+
+def test_interval_is_learned_from_entry_gaps():
+    schedule = open_schedule()
+    times = [NOW - 30 * HOUR, NOW - 20 * HOUR, NOW - 10 * HOUR]
+    schedule.observe("a", b"<rss/>", times, now=NOW)
+    (row,) = schedule.report(now=NOW)
+    assert DEFAULT_INTERVAL < row["interval_min"] * 60 < 10 * HOUR
+    assert row["due_in_min"] * 60 >= poll_interval(row["interval_min"] * 60, times[-1], 0, NOW) * (1 - JITTER) - 60
+
+
+def test_not_modified_counts_a_streak_and_keeps_validators():
+    schedule = open_schedule()
+    schedule.observe("a", b"<rss/>", [NOW - HOUR], etag='"e1"', now=NOW)
+    schedule.observe("a", None, now=NOW + HOUR)
+    (row,) = schedule.report(now=NOW + HOUR)
+    assert (row["streak"], row["not_modified"], row["polls"]) == (1, 1, 2)
+    assert schedule.validators(["a"]) == {"a": ('"e1"', None)}
+
+
+def test_errors_back_off_exponentially():
+    schedule = open_schedule()
+    first = schedule.observe_error("a", now=NOW)
+    second = schedule.observe_error("a", now=NOW)
+    assert first == NOW + POLL_MIN_INTERVAL
+    assert second == NOW + 2 * POLL_MIN_INTERVAL
+
+
+def test_observe_run_does_not_advance_feeds_that_were_not_ingested():
+    schedule = open_schedule()
+    schedule.observe_run({"a": Fetched(b"<rss/>", etag='"e1"'), "b": Fetched(None)}, {"a": [NOW - HOUR]},
+                         {"c": "timeout", "d": "deadline"}, now=NOW, ingested=False)
+    assert schedule.validators(["a"]) == {}
+    assert sorted(r["url"] for r in schedule.report(now=NOW)) == ["b", "c"]
+    assert schedule.due(["a", "d"], now=NOW) == ["a", "d"]
+
+
+def test_budget_prefers_feeds_with_most_expected_entries():
+    schedule = open_schedule(budget_per_hour=1)
+    schedule.observe("slow", b"<rss/>", [NOW - 48 * HOUR, NOW - 24 * HOUR], now=NOW - 2 * HOUR)
+    schedule.observe("fast", b"<rss/>", [NOW - 3 * HOUR, NOW - 2.5 * HOUR], now=NOW - 2 * HOUR)
+    assert schedule.due(["slow", "fast"], now=NOW) == ["fast"]
+    assert schedule.due(["slow", "fast"], now=NOW) == []
+
+
+def test_forget_drops_removed_feeds():
+    schedule = open_schedule()
+    schedule.observe("a", b"<rss/>", now=NOW)
+    schedule.observe("b", b"<rss/>", now=NOW)
+    assert schedule.forget(["a"]) == 1
+    assert [r["url"] for r in schedule.report(now=NOW)] == ["a"]
@@ -0,0 +1,84 @@
+from post_ledger import PostLedger, content_hash
+
+
+def test_begin_records_posting_once_per_page():
+    ledger = PostLedger.open()
+    assert ledger.begin("p1", content_hash("hello")) is None
+    existing = ledger.begin("p1", content_hash("other text"))
+    assert existing.page_id == "p1"
+    assert existing.status == "posting"
+
+
+def test_same_text_on_another_page_is_not_posted_twice():
+    ledger = PostLedger.open()
+    assert ledger.begin("p1", content_hash("hello")) is None
+    # p1 が結果不明のうちは、同じ本文の p2 も（保留させるため）posting の記録を返す
+    existing = ledger.begin("p2", content_hash("hello"))
+    assert (existing.page_id, existing.status) == ("p1", "posting")
+    ledger.record_posted("p1", "1001")
+    existing = ledger.begin("p2", content_hash("hello"))
+    assert (existing.page_id, existing.status) == ("p1", "posted")
+
+
+def test_posted_text_wins_over_in_doubt_duplicate():
+    ledger = PostLedger.open()
+    ledger.begin("p1", content_hash("hello"))
+    ledger.record_posted("p1", "1001")
+    ledger.conn.execute("INSERT INTO ledger (page_id, content_hash, status, updated_at) VALUES ('p2', ?, 'posting', 0)",
+                        (content_hash("hello"),))
+    assert ledger.begin("p3", content_hash("hello")).status == "posted"
+
+
+def test_item_waiting_on_in_doubt_page_is_held_not_dropped():
+    from post_to_x import process_item
+    from tweet_compose import compose_tweet
+    from work_queue import WorkQueue
+
+    ledger, queue = PostLedger.open(), WorkQueue.open()
+    page = {"id": "p2", "title": "Title", "summary": "", "url": "https://example.com/a"}
+    ledger.begin("p1", compose_tweet("Title", "", "https://example.com/a").content_hash)
+    queue.enqueue("post", "p2", page)
+    (item,) = queue.lease("post")
+    previews = []
+    assert not process_item(None, queue, ledger, item, previews)
+    assert queue.status("post", "p2") == "held"
+    assert "same text as p1" in previews[0]
+
+
+def test_posted_then_synced():
+    ledger = PostLedger.open()
+    ledger.begin("p1", content_hash("hello"))
+    assert [e.page_id for e in ledger.in_doubt()] == ["p1"]
+
+    ledger.record_posted("p1", "1001")
+    assert ledger.in_doubt() == []
+    (pending,) = ledger.pending_writebacks()
+    assert (pending.page_id, pending.tweet_id) == ("p1", "1001")
+
+    ledger.record_synced("p1")
+    assert ledger.pending_writebacks() == []
+    assert ledger.begin("p1", content_hash("hello")).status == "synced"
+
+
+def test_abort_only_clears_posting_entries():
+    ledger = PostLedger.open()
+    ledger.begin("p1", content_hash("a"))
+    ledger.abort("p1")
+    assert ledger.begin("p1", content_hash("a")) is None
+
+    ledger.record_posted("p1", "1001")
+    ledger.abort("p1")
+    assert ledger.begin("p1", content_hash("a")).status == "posted"
+
+
+def test_release_clears_in_doubt_entry():
+    ledger = PostLedger.open()
+    ledger.begin("p1", content_hash("a"))
+    ledger.release("p1")
+    assert ledger.in_doubt() == []
+    assert ledger.begin("p1", content_hash("a")) is None
+
+
+def test_ledger_survives_reopen():
+    PostLedger.open().begin("p1", content_hash("a"))
+    assert PostLedger.open().begin("p1", content_hash("a")).status == "posting"
@@ -0,0 +1,115 @@
+import random
+import sqlite3
+
+import pytest
+
+from post_scheduler import HALF_LIFE_SEC, PostScheduler, priority_weight
+
+NOW = 1_700_000_000.0
+HOUR = 3600.0
+
+
+def scheduler(**kwargs):
+    kwargs.setdefault("limit", 0)
+    kwargs.setdefault("spacing", 0)
+    return PostScheduler(sqlite3.connect(":memory:", check_same_thread=False), **kwargs)
+
+
+def drain(s, now=NOW):
+    keys = []
+    while (key := s.next_due(now)) is not None:
+        s.record_posted(key, now)
+        keys.append(key)
+    return keys
+
+
+def test_priority_weight_accepts_names_and_numbers():
+    assert priority_weight("High") == 2.0
+    assert priority_weight(" urgent ") == 4.0
+    assert priority_weight(None) == priority_weight("") == priority_weight("unknown") == 1.0
+    assert priority_weight(3) == 3.0
+    assert priority_weight(0) == 0.01
+
+
+def test_fresher_and_higher_priority_entries_go_first():
+    s = scheduler()
+    s.upsert("old", NOW - 12 * HOUR)
+    s.upsert("new", NOW - HOUR)
+    s.upsert("old-high", NOW - 2 * HOUR - HALF_LIFE_SEC, priority=2.0)
+    # 優先度2倍は半減期1つ分の鮮度と釣り合う（new より1時間古い分だけ負ける）
+    assert s.score("old-high", NOW) == pytest.approx(s.score("new", NOW) / 2 ** (HOUR / HALF_LIFE_SEC))
+    assert drain(s) == ["new", "old-high", "old"]
+
+
+def test_order_matches_scores_for_random_entries():
+    rnd = random.Random(1)
+    s = scheduler()
+    for i in range(300):
+        s.upsert(f"k{i}", NOW - rnd.random() * 72 * HOUR, rnd.choice([0.5, 1.0, 2.0, 4.0]))
+    scores = {f"k{i}": s.score(f"k{i}", NOW) for i in range(300)}
+    assert drain(s) == sorted(scores, key=scores.get, reverse=True)
+
+
+def test_rescoring_moves_an_entry_without_duplicates():
+    s = scheduler()
+    s.upsert("a", NOW - HOUR)
+    s.upsert("b", NOW - 2 * HOUR)
+    assert s.upsert("b", NOW - 2 * HOUR) is False  # 変化なし
+    assert s.upsert("b", NOW - 2 * HOUR, priority=4.0) is True
+    assert drain(s) == ["b", "a"]
+    assert len(s) == 0
+
+
+def test_topic_spacing_interleaves_topics():
+    s = scheduler(spacing=HOUR)
+    s.upsert("sport-1", NOW - 1 * 60, topic="sport")
+    s.upsert("sport-2", NOW - 2 * 60, topic="sport")
+    s.upsert("world-1", NOW - 30 * 60, topic="world")
+    assert drain(s) == ["sport-1", "world-1", "sport-2"]
+
+
+def test_post_limit_spreads_slots_over_the_window():
+    s = scheduler(limit=24, window=24 * HOUR, lookahead=HOUR)
+    for i in range(5):
+        s.upsert(f"k{i}", NOW - i * 60)
+    # 1時間に1枠。先読み1時間なら今と1時間後の2枠
+    assert [at for at, _ in s.plan(NOW)] == [NOW, NOW + HOUR]
+    assert s.next_due(NOW) == "k0"
+    s.record_posted("k0", NOW)
+    assert s.next_due(NOW) == "k1"  # 次の枠（前倒し）
+    s.record_posted("k1", NOW)
+    assert s.next_due(NOW) is None  # 今回の枠は使い切った
+    assert s.slots(NOW + HOUR) == [NOW + 2 * HOUR]
+
+
+def test_plan_does_not_consume_the_heap():
+    s = scheduler()
+    s.upsert("a", NOW - HOUR)
+    s.upsert("b", NOW - 2 * HOUR)
+    assert [key for _, key in s.plan(NOW)] == ["a", "b"]
+    assert drain(s) == ["a", "b"]
+
+
+def test_removed_and_released_entries():
+    s = scheduler()
+    s.upsert("a", NOW - HOUR)
+    s.upsert("b", NOW - 2 * HOUR)
+    s.remove("a")
+    assert s.next_due(NOW) == "b"
+    s.release("b")  # 今回は投稿しなかった → 同じ実行中は再度返さない
+    assert s.next_due(NOW) is None
+
+
+def test_restart_rebuilds_the_queue_and_topic_history(state_dir):
+    s = PostScheduler.open(limit=0, spacing=HOUR)
+    s.upsert("sport-1", NOW - 60, topic="sport")
+    s.upsert("sport-2", NOW - 120, topic="sport")
+    s.upsert("world-1", NOW - 30 * 60, topic="world")
+    s.upsert("released", NOW - 24 * HOUR)
+    assert s.next_due(NOW) == "sport-1"
+    s.record_posted("sport-1", NOW)
+    s.conn.close()
+
+    again = PostScheduler.open(limit=0, spacing=HOUR)
+    assert len(again) == 3
+    assert drain(again, NOW + 60) == ["world-1", "sport-2", "released"]
@@ -0,0 +1,72 @@
+import json
+import os
+
+import pytest
+
+import post_shards
+from resilience import Deadline
+
+X = {"X_API_KEY": "A_KEY", "X_API_SECRET": "A_SECRET", "X_ACCESS_TOKEN": "A_TOKEN", "X_ACCESS_SECRET": "A_ASECRET"}
+SHARDS = [
+    {"name": "brand-a", "database_id_env": "A_DB", "lang": "ja", "x": X},
+    {"name": "brand-b", "database_id": "db-b", "workers": 2,
+     "x": {k: v.replace("A_", "B_") for k, v in X.items()}},
+]
+
+
+@pytest.fixture
+def secrets(monkeypatch):
+    for name in ("A_DB", *X.values(), *(v.replace("A_", "B_") for v in X.values())):
+        monkeypatch.setenv(name, f"value-of-{name}")
+    monkeypatch.setenv("X_API_KEY", "top-level-key")
+
+
+def test_load_shards_requires_unique_names(tmp_path):
+    path = tmp_path / "shards.json"
+    path.write_text(json.dumps(SHARDS))
+    assert [s["name"] for s in post_shards.load_shards(str(path))] == ["brand-a", "brand-b"]
+    path.write_text(json.dumps([{"name": "a"}, {"name": "a"}]))
+    with pytest.raises(ValueError):
+        post_shards.load_shards(str(path))
+
+
+def test_shard_env_only_carries_its_own_secrets(secrets, state_dir):
+    hidden = post_shards._referenced(SHARDS)
+    env = post_shards.shard_env(SHARDS[0], hidden)
+    assert env["NOTION_DATABASE_ID"] == "value-of-A_DB"
+    assert env["X_API_KEY"] == "value-of-A_KEY"
+    assert (env["POST_LANG"], env["SHARD_NAME"]) == ("ja", "brand-a")
+    assert env["STATE_DIR"] == os.path.join(str(state_dir), "shards", "brand-a")
+    assert not hidden & set(env)  # 他シャード（自分の分も名前のまま）は渡さない
+
+    env = post_shards.shard_env(SHARDS[1], hidden)
+    assert (env["NOTION_DATABASE_ID"], env["POST_WORKERS"]) == ("db-b", "2")
+    assert env["X_ACCESS_SECRET"] == "value-of-B_ASECRET"
+
+
+def test_shard_env_rejects_missing_credentials(secrets, monkeypatch):
+    monkeypatch.delenv("A_TOKEN")
+    with pytest.raises(ValueError, match="X_ACCESS_TOKEN"):
+        post_shards.shard_env(SHARDS[0])
+    result = post_shards.run_shard(SHARDS[0])
+    assert (result.returncode, result.timed_out) == (2, False)
+
+
+def test_hung_shard_is_killed_at_the_deadline(secrets, monkeypatch, tmp_path):
+    script = tmp_path / "hang.py"
+    script.write_text("import os, sys, time\nprint(os.environ['RUN_DEADLINE_SEC'], flush=True)\ntime.sleep(60)\n")
+    monkeypatch.setattr(post_shards, "POST_SCRIPT", str(script))
+    monkeypatch.setattr(post_shards, "SHARD_KILL_GRACE_SEC", 0.5)
+    result = post_shards.run_shard(SHARDS[0], deadline=Deadline(1, margin=0))
+    assert result.timed_out and result.returncode == post_shards.TIMEOUT_RETURNCODE
+    assert result.elapsed < 10
+    assert result.output.startswith("1")
+
+
+def test_finished_shard_reports_its_exit_code(secrets, monkeypatch, tmp_path):
+    script = tmp_path / "ok.py"
+    script.write_text("import os\nprint(os.environ['SHARD_NAME'])\n")
+    monkeypatch.setattr(post_shards, "POST_SCRIPT", str(script))
+    (a, b) = post_shards.run_all(SHARDS)
+    assert (a.name, a.returncode, a.output.strip()) == ("brand-a", 0, "brand-a")
+    assert (b.name, b.returncode, b.timed_out) == ("brand-b", 0, False)
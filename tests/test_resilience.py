@@ -0,0 +1,95 @@
+import time
+
+import pytest
+import requests
+
+from resilience import CircuitBreaker, CircuitOpenError, Deadline, DeadlineExceeded
+
+
+class Response:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(str(self.status_code))
+
+
+def failing():
+    raise RuntimeError("boom")
+
+
+def test_breaker_opens_after_consecutive_failures_and_probes_once():
+    b = CircuitBreaker("svc", failure_threshold=3, reset_timeout=60)
+    for _ in range(3):
+        with pytest.raises(RuntimeError):
+            b.call(failing)
+    assert b.state == "open"
+    with pytest.raises(CircuitOpenError):
+        b.call(lambda: "ok")
+
+    b.opened_at -= 60
+    assert b.state == "half-open"
+    with pytest.raises(RuntimeError):
+        b.call(failing)
+    # half-open の試行が失敗すれば閾値未満でもすぐ open に戻る
+    assert b.state == "open"
+
+    b.opened_at -= 60
+    assert b.call(lambda: "ok") == "ok"
+    assert (b.state, b.failures) == ("closed", 0)
+
+
+def test_success_resets_the_failure_count():
+    b = CircuitBreaker("svc", failure_threshold=2)
+    with pytest.raises(RuntimeError):
+        b.call(failing)
+    b.call(lambda: None)
+    with pytest.raises(RuntimeError):
+        b.call(failing)
+    assert b.state == "closed"
+
+
+def test_slow_calls_count_as_failures():
+    b = CircuitBreaker("svc", failure_threshold=1, slow_call_sec=0)
+    assert b.call(lambda: "late") == "late"
+    assert b.state == "open"
+
+
+def test_consecutive_5xx_responses_open_the_breaker():
+    b = CircuitBreaker("notion", failure_threshold=3)
+    for status in (500, 503, 429):
+        with pytest.raises(requests.HTTPError):
+            b.request(lambda url, **kw: Response(status), "https://api.example/")
+    assert b.state == "open"
+    with pytest.raises(CircuitOpenError):
+        b.request(lambda url, **kw: Response(200), "https://api.example/")
+
+
+def test_client_errors_raise_without_tripping_the_breaker():
+    b = CircuitBreaker("notion", failure_threshold=1)
+    with pytest.raises(requests.HTTPError):
+        b.request(lambda url, **kw: Response(400), "https://api.example/")
+    assert b.state == "closed"
+    assert b.request(lambda url, **kw: Response(200), "https://api.example/").status_code == 200
+
+
+def test_deadline_caps_timeouts_and_stops_new_work():
+    d = Deadline(100, margin=10)
+    assert d.timeout(30) == 30
+    assert d.can_start(50)
+    assert not d.can_start(95)
+    d.end = time.monotonic() + 5
+    assert d.timeout(30) <= 5
+    assert not d.can_start()
+    d.end = time.monotonic() - 1
+    with pytest.raises(DeadlineExceeded):
+        d.timeout(30)
+
+
+def test_unlimited_deadline_and_stages():
+    d = Deadline(None)
+    assert d.limit() is None and d.can_start(10 ** 6)
+    assert d.stage(0.5).limit() is None
+    d = Deadline(110, margin=10)
+    assert 45 < d.stage(0.5).limit() <= 50
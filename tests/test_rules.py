@@ -0,0 +1,79 @@
+import json
+
+import pytest
+
+from records import Article
+from rules import Automaton, RuleEngine, apply_rules
+
+CONFIG = {
+    "rules": [
+        {"name": "ai", "action": "include", "keywords": ["OpenAI", "生成AI"], "regex": [r"\bgpt-\d"]},
+        {"name": "ads", "action": "exclude", "keywords": ["sponsored"]},
+        {"name": "jp-politics", "action": "tag", "keywords": ["首相"], "feeds": ["https://example.com/rss"]},
+        {"name": "title-only", "action": "tag", "keywords": ["breaking"], "fields": ["title"]},
+    ]
+}
+
+
+@pytest.fixture
+def engine():
+    return RuleEngine(CONFIG)
+
+
+def test_automaton_finds_all_patterns_in_one_pass():
+    automaton = Automaton(["東京", "京都", "東京都", "大阪"])
+    assert sorted(automaton.iter_matches("東京都庁")) == [0, 1, 2]
+
+
+def test_ascii_keywords_match_whole_words_only():
+    automaton = Automaton(["ai"])
+    assert list(automaton.iter_matches("he said")) == []
+    assert list(automaton.iter_matches("new ai model")) == [0]
+
+
+def test_include_keeps_only_matching_entries(engine):
+    assert engine.evaluate("OpenAI ships a model").keep
+    assert engine.evaluate("New GPT-5 benchmark").tags == ("ai",)
+    verdict = engine.evaluate("Football results")
+    assert (verdict.keep, verdict.reason) == (False, "no-include")
+
+
+def test_exclude_wins_over_include(engine):
+    verdict = engine.evaluate("OpenAI event", "Sponsored content")
+    assert (verdict.keep, verdict.reason) == (False, "ads")
+
+
+def test_keywords_are_normalized(engine):
+    # NFKC（全角英字）・大文字小文字を吸収する
+    assert engine.evaluate("ＯｐｅｎＡＩ が発表").keep
+    assert engine.evaluate("生成ＡＩの規制").keep
+
+
+def test_feed_scoped_rules_apply_only_to_their_feed(engine):
+    assert engine.evaluate("首相が生成AIに言及", feed="https://example.com/rss").tags == ("ai", "jp-politics")
+    assert engine.evaluate("首相が生成AIに言及", feed="https://other.example/rss").tags == ("ai",)
+
+
+def test_fields_limit_where_keywords_match(engine):
+    assert "title-only" in engine.evaluate("Breaking: OpenAI").tags
+    assert "title-only" not in engine.evaluate("OpenAI", "breaking news").tags
+
+
+def test_apply_rules_tags_and_drops(engine):
+    articles = [Article(title="OpenAI news", url="u1"), Article(title="Weather", url="u2")]
+    kept, dropped = apply_rules(articles, engine)
+    assert [(a.url, a.tags) for a in kept] == [("u1", ("ai",))]
+    assert [(a.url, reason) for a, reason in dropped] == [("u2", "no-include")]
+
+
+def test_without_rules_everything_is_kept(tmp_path):
+    assert RuleEngine.load(str(tmp_path / "missing.json")) is None
+    articles = [Article(title="Weather", url="u1")]
+    assert apply_rules(articles, None) == (articles, [])
+
+
+def test_load_rejects_unknown_action(tmp_path):
+    path = tmp_path / "rules.json"
+    path.write_text(json.dumps({"rules": [{"name": "x", "action": "drop"}]}), encoding="utf-8")
+    with pytest.raises(ValueError):
+        RuleEngine.load(str(path))
@@ -0,0 +1,74 @@
+import os
+
+import state_store
+from seen_filter import SEEN_FILTER_FILE, BloomFilter, SeenUrls
+
+
+def test_bloom_has_no_false_negatives(tmp_path):
+    bloom = BloomFilter.create(str(tmp_path / "f.bloom"), capacity=1000, fp_rate=0.01)
+    urls = [f"https://example.com/{i}" for i in range(1000)]
+    added = sum(bloom.add(url) for url in urls)
+    assert added > 990  # 新規でも誤検知なら False になる
+    assert all(url in bloom for url in urls)
+    assert not bloom.add(urls[0])
+    misses = sum(f"https://other.example/{i}" in bloom for i in range(2000))
+    assert misses < 2000 * 0.03
+    bloom.close()
+
+
+def test_bloom_persists_through_the_file(tmp_path):
+    path = str(tmp_path / "f.bloom")
+    bloom = BloomFilter.create(path, capacity=100)
+    bloom.add("https://example.com/a")
+    bloom.flush(synced_at=123.0)
+    bloom.close()
+    bloom = BloomFilter.load(path)
+    assert "https://example.com/a" in bloom
+    assert (bloom.count, bloom.synced_at) == (1, 123.0)
+    bloom.close()
+
+
+def test_sizing_matches_the_requested_rate():
+    m, k = BloomFilter.sizing(2_000_000, 0.01)
+    assert 2_300_000 < m // 8 < 2_500_000
+    assert k == 7
+
+
+def test_seen_urls_builds_then_syncs_incrementally():
+    scans, syncs = [], []
+    seen = SeenUrls.open(lambda url: True, lambda: scans.append(1) or ["https://example.com/a"],
+                         lambda since: syncs.append(since) or [])
+    assert "https://example.com/a" in seen
+    seen.close()
+
+    seen = SeenUrls.open(lambda url: True, lambda: scans.append(1) or [],
+                         lambda since: syncs.append(since) or ["https://example.com/b"])
+    assert (len(scans), len(syncs)) == (1, 1)
+    assert syncs[0] > 0
+    assert "https://example.com/a" in seen and "https://example.com/b" in seen
+    seen.close()
+
+
+def test_exact_check_only_on_filter_hits():
+    checked = []
+
+    def exact(url):
+        checked.append(url)
+        return False
+
+    seen = SeenUrls.open(exact, lambda: ["https://example.com/a"], lambda since: [])
+    assert "https://example.com/new" not in seen
+    assert "https://example.com/a" not in seen  # フィルタはヒットしたが厳密確認で未登録
+    assert checked == ["https://example.com/a"]
+    assert (seen.checked, seen.false_positives) == (1, 1)
+    seen.add("https://example.com/new")
+    seen.close()
+
+
+def test_broken_file_is_rebuilt():
+    with open(state_store.state_path(SEEN_FILTER_FILE), "wb") as f:
+        f.write(b"garbage")
+    seen = SeenUrls.open(lambda url: True, lambda: ["https://example.com/a"], lambda since: [])
+    assert "https://example.com/a" in seen
+    seen.close()
+    assert os.path.getsize(state_store.state_path(SEEN_FILTER_FILE)) > 64
@@ -0,0 +1,97 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import notion_insert
+import translate_router
+from deepl_budget import TranslationBudget
+from records import Article
+from translate_router import Provider, TranslateRouter
+
+
+@pytest.fixture(autouse=True)
+def short_hedge_delay(monkeypatch):
+    monkeypatch.setattr(translate_router, "HEDGE_DEFAULT_DELAY", 0.05)
+
+
+def provider(name, delay=0.0, error=None, release=None):
+    def translate(texts, target, source, timeout):
+        if release is not None:
+            release.wait(5)
+        time.sleep(delay)
+        if error:
+            raise error
+        return [f"{name}:{t}" for t in texts]
+    return Provider(name, translate)
+
+
+def router(primary, secondary, **kwargs):
+    return TranslateRouter(primary, secondary, sqlite3.connect(":memory:", check_same_thread=False), **kwargs)
+
+
+def test_fast_primary_is_not_hedged():
+    reports = []
+    r = router(provider("deepl"), provider("google"))
+    routed = r.translate(["a"], "JA", on_primary=reports.append)
+    assert (routed.texts, routed.provider, routed.hedged) == (["deepl:a"], "deepl", False)
+    assert reports == [True]  # 戻る前に報告済み
+
+
+def test_slow_primary_is_hedged_and_reported_when_it_finishes():
+    release, reports = threading.Event(), []
+    r = router(provider("deepl", release=release), provider("google"))
+    routed = r.translate(["a"], "JA", on_primary=reports.append)
+    assert (routed.provider, routed.hedged, routed.primary_ok) == ("google", True, None)
+    assert reports == []
+    release.set()
+    for _ in range(100):
+        if reports:
+            break
+        time.sleep(0.01)
+    assert reports == [True]
+
+
+def test_failed_primary_falls_back_without_using_the_hedge_quota():
+    reports = []
+    r = router(provider("deepl", error=RuntimeError("456 quota")), provider("google"), max_hedge_rate=0)
+    routed = r.translate(["a"], "JA", on_primary=reports.append)
+    assert (routed.provider, routed.hedged, routed.primary_ok) == ("google", False, False)
+    assert reports == [False]
+    assert r.hedges == 0
+
+
+def test_hedges_are_capped_by_rate():
+    r = router(provider("deepl", delay=0.15), provider("google"), max_hedge_rate=0.2)
+    results = [r.translate(["a"], "JA") for _ in range(5)]
+    # 最初の1回は許し、以降は呼び出し数 × 0.2 まで
+    assert r.hedges == 1
+    assert [x.hedged for x in results].count(True) == 1
+    assert r.calls == 5
+
+
+def test_late_primary_is_charged_to_the_budget(monkeypatch):
+    release = threading.Event()
+    monkeypatch.setattr(notion_insert, "DEEPL_API_KEY", "test")
+    monkeypatch.setattr(notion_insert, "ROUTER", router(provider("deepl", release=release), provider("google")))
+    budget = TranslationBudget(1000)
+    entry = Article(title="Markets rally after the announcement", url="https://example.com/a")
+    plans = budget.plan([entry])
+    (out,) = notion_insert.translate_articles([entry], plans, "ja", budget)
+    assert out.translated_by == "google"
+    assert budget.spent == 0
+    release.set()
+    for _ in range(100):
+        if budget.spent:
+            break
+        time.sleep(0.01)
+    assert budget.spent == len(entry.title)
+
+
+def test_purge_drops_old_calls():
+    r = router(provider("deepl"), None)
+    r.translate(["a"], "JA")
+    r.conn.execute("UPDATE calls SET at = at - 100")
+    assert r.purge(older_than=50) == 1
+    assert r.stats() == []
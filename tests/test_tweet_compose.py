@@ -0,0 +1,66 @@
+import pytest
+
+from post_to_x import tweet_for
+from records import Page
+from tweet_compose import (MAX_TWEET_LENGTH, TCO_URL_LENGTH, build_tweet, compose_tweet, text_length,
+                           truncate_weighted, twitter_length)
+
+URL = "https://example.com/articles/2024/very-long-path?id=12345"
+
+
+def test_weighted_length_counts_urls_and_cjk():
+    assert twitter_length("hello") == 5
+    assert twitter_length("日本語") == 6
+    assert twitter_length(f"a {URL}") == 2 + TCO_URL_LENGTH
+    assert twitter_length("café") == twitter_length("café")  # NFC で数える
+
+
+def test_truncate_weighted_keeps_within_limit():
+    assert truncate_weighted("short", 10) == "short"
+    cut = truncate_weighted("日本語の長い文章です", 9)
+    assert cut.endswith("…")
+    assert text_length(cut) <= 9
+    assert truncate_weighted("abc", 0) == ""
+
+
+def test_build_tweet_fits_and_keeps_the_url():
+    text = build_tweet("見出し", "要約" * 300, URL)
+    assert twitter_length(text) <= MAX_TWEET_LENGTH
+    assert text.startswith("見出し\n") and text.endswith(URL)
+    assert "…" in text
+    assert build_tweet("Title", "Summary", URL) == f"Title\nSummary\n{URL}"
+    long_title = build_tweet("長" * 400, "", URL)
+    assert twitter_length(long_title) <= MAX_TWEET_LENGTH and long_title.endswith(URL)
+
+
+def draft(title="Title", summary="Summary", url=URL, **changes):
+    composed = compose_tweet(title, summary, url)
+    page = Page(id="p1", title=title, summary=summary, url=url, tweet=composed.text,
+                tweet_length=composed.length, content_hash=composed.draft_hash)
+    return Page.from_dict(dict(page.to_dict(), **changes))
+
+
+def test_tweet_for_uses_the_stored_draft():
+    p = draft()
+    assert tweet_for(p) == (p.tweet, compose_tweet("Title", "Summary", URL).content_hash)
+
+
+def test_tweet_for_recomposes_after_title_fix():
+    p = draft(title="Fixed title")
+    text, text_hash = tweet_for(p)
+    assert text == build_tweet("Fixed title", "Summary", URL)
+    assert text_hash == compose_tweet("Fixed title", "Summary", URL).content_hash
+
+
+def test_tweet_for_keeps_hand_edited_text():
+    p = draft(title="Fixed title", tweet=f"Hand written\n{URL}")
+    assert tweet_for(p)[0] == f"Hand written\n{URL}"
+    with pytest.raises(ValueError):
+        tweet_for(draft(tweet="x" * 300))
+
+
+def test_tweet_for_old_hash_format_and_missing_draft():
+    composed = compose_tweet("Title", "Summary", URL)
+    old = draft(content_hash=composed.content_hash)  # 組み立て元ハッシュの無い旧形式
+    assert tweet_for(old)[0] == composed.text
+    assert tweet_for(draft(tweet="", content_hash=""))[0] == composed.text
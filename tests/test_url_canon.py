@@ -0,0 +1,51 @@
+import url_canon
+from resilience import Deadline
+from url_canon import Canonicalizer, RedirectCache, canonicalize_url
+
+
+def test_canonical_key_folds_scheme_host_port_and_slash():
+    assert canonicalize_url("http://Example.COM:80/news/a/") == "https://example.com/news/a"
+    assert canonicalize_url("https://example.com") == "https://example.com/"
+    assert canonicalize_url("https://example.com:8443/a") == "https://example.com:8443/a"
+
+
+def test_known_tracking_params_are_dropped_and_query_sorted():
+    url = "https://example.com/a?utm_source=rss&b=2&fbclid=x&a=1&gclid=y&mc_cid=z#top"
+    assert canonicalize_url(url) == "https://example.com/a?a=1&b=2"
+
+
+def test_content_selecting_params_are_kept():
+    url = "https://example.com/show?feed=world&rss=1&cmp=3&spm=4&ref_url=x&id=9"
+    assert canonicalize_url(url) == "https://example.com/show?cmp=3&feed=world&id=9&ref_url=x&rss=1&spm=4"
+
+
+def test_non_http_urls_are_left_alone():
+    assert canonicalize_url("mailto:someone@example.com") == "mailto:someone@example.com"
+    assert canonicalize_url("  ") == ""
+
+
+def test_canonicalizer_without_resolution_only_normalizes():
+    assert Canonicalizer(resolve=False).canonical("http://example.com/a/?utm_medium=x") == "https://example.com/a"
+
+
+def test_redirects_are_followed_and_cached(monkeypatch):
+    hops = {"http://t.co/x": "https://example.com/a?utm_source=tw", "https://example.com/a": "https://example.com/a"}
+    calls = []
+
+    def next_hop(session, url, timeout=url_canon.HOP_TIMEOUT):
+        calls.append(url)
+        return hops.get(url, url)
+
+    monkeypatch.setattr(url_canon, "_next_hop", next_hop)
+    canon = Canonicalizer(resolve=True, cache=RedirectCache.open())
+    assert canon.canonical("http://t.co/x") == "https://example.com/a"
+    resolved = len(calls)
+    assert canon.canonical("http://t.co/x") == "https://example.com/a"
+    assert len(calls) == resolved
+
+
+def test_resolution_stops_at_the_deadline(monkeypatch):
+    monkeypatch.setattr(url_canon, "_next_hop", lambda *a, **k: "https://example.com/elsewhere")
+    canon = Canonicalizer(resolve=True, cache=RedirectCache.open(), deadline=Deadline(0.01, margin=1))
+    assert canon.canonical("http://t.co/x") == "https://t.co/x"
+    assert canon.skipped == 1
@@ -0,0 +1,112 @@
+import hashlib
+import hmac
+import threading
+
+import pytest
+import requests
+
+from websub import SubscriberServer, SubscriptionStore, discover_hub, signature_valid
+
+TOPIC = "https://example.com/feed.xml"
+BODY = b"<rss><channel><item><title>t</title><link>https://example.com/1</link></item></channel></rss>"
+
+
+def sign(secret, body, algo="sha256"):
+    return f"{algo}=" + hmac.new(secret.encode(), body, algo).hexdigest()
+
+
+def test_signature_valid_accepts_supported_algorithms():
+    for algo in ("sha1", "sha256", "sha512"):
+        assert signature_valid("s3cret", BODY, sign("s3cret", BODY, algo))
+    digest = hmac.new(b"s3cret", BODY, "sha256").hexdigest()
+    assert signature_valid("s3cret", BODY, f"sha256={digest.upper()}")  # 16進の大文字小文字は問わない
+
+
+def test_signature_valid_rejects_forgeries():
+    assert not signature_valid("s3cret", BODY, sign("other", BODY))
+    assert not signature_valid("s3cret", BODY + b" ", sign("s3cret", BODY))
+    assert not signature_valid("s3cret", BODY, "md5=" + hashlib.md5(BODY).hexdigest())
+    assert not signature_valid("s3cret", BODY, "")
+
+
+def test_discover_hub_reads_hub_and_self_links():
+    feed = b"""<?xml version="1.0"?><feed xmlns="http://www.w3.org/2005/Atom"><title>a</title>
+    <link rel="hub" href="https://hub.example/"/><link rel="self" href="https://example.com/atom"/></feed>"""
+    assert discover_hub(feed, "https://example.com/feed?format=atom") == ("https://hub.example/", "https://example.com/atom")
+    assert discover_hub(BODY, TOPIC) == (None, TOPIC)
+
+
+@pytest.fixture
+def callback():
+    store = SubscriptionStore.open()
+    server = SubscriberServer(("127.0.0.1", 0), store)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield store, server, f"http://127.0.0.1:{server.server_port}/websub"
+    server.shutdown()
+    server.server_close()
+
+
+def verify(url, sub, mode="subscribe", topic=None, **extra):
+    params = {"hub.mode": mode, "hub.topic": topic or sub.topic, "hub.challenge": "c-123", **extra}
+    return requests.get(f"{url}/{sub.id}", params=params, timeout=5)
+
+
+def test_challenge_is_echoed_only_for_our_topic(callback):
+    store, _, url = callback
+    sub = store.pending(TOPIC, "https://hub.example/", TOPIC)
+
+    res = verify(url, sub, topic="https://evil.example/feed")
+    assert res.status_code == 404 and store.get(sub.id).state == "pending"
+    assert requests.get(f"{url}/unknown", params={"hub.mode": "subscribe"}, timeout=5).status_code == 404
+
+    res = verify(url, sub, **{"hub.lease_seconds": "3600"})
+    assert res.status_code == 200 and res.text == "c-123"
+    verified = store.get(sub.id)
+    assert verified.state == "verified"
+    assert TOPIC in store.active_feeds()
+
+
+def test_unsubscribe_is_confirmed_only_when_we_asked(callback):
+    store, _, url = callback
+    sub = store.pending(TOPIC, "https://hub.example/", TOPIC)
+    verify(url, sub)
+    assert verify(url, sub, mode="unsubscribe").status_code == 404  # 解除を要求していない
+    store.set_state(sub.id, "unsubscribing")
+    res = verify(url, sub, mode="unsubscribe")
+    assert res.status_code == 200 and res.text == "c-123"
+    assert store.get(sub.id) is None
+
+
+def test_denied_marks_the_subscription(callback):
+    store, _, url = callback
+    sub = store.pending(TOPIC, "https://hub.example/", TOPIC)
+    assert verify(url, sub, mode="denied").status_code == 200
+    assert store.get(sub.id).state == "denied"
+
+
+def test_only_signed_pushes_for_verified_subscriptions_are_queued(callback):
+    store, server, url = callback
+    sub = store.pending(TOPIC, "https://hub.example/", "https://example.com/rss")
+    signed = {"X-Hub-Signature": sign(sub.secret, BODY)}
+
+    # 確認前のプッシュは 410（ハブに配信停止を促す）
+    assert requests.post(f"{url}/{sub.id}", data=BODY, headers=signed, timeout=5).status_code == 410
+    verify(url, sub)
+
+    forged = {"X-Hub-Signature": sign("wrong", BODY)}
+    assert requests.post(f"{url}/{sub.id}", data=BODY, headers=forged, timeout=5).status_code == 202
+    assert server.pushes.empty()  # 署名違いは 2xx を返しつつ捨てる
+
+    assert requests.post(f"{url}/{sub.id}", data=BODY, headers=signed, timeout=5).status_code == 202
+    assert server.pushes.get_nowait() == ("https://example.com/rss", BODY)
+    assert store.get(sub.id).last_push_at is not None
+
+    assert requests.post(f"{url}/unknown", data=BODY, headers=signed, timeout=5).status_code == 410
+
+
+def test_resubscribe_keeps_the_secret_and_verified_state(callback):
+    store, _, url = callback
+    sub = store.pending(TOPIC, "https://hub.example/", TOPIC)
+    verify(url, sub)
+    again = store.pending(TOPIC, "https://hub2.example/", TOPIC)
+    assert again.secret == sub.secret and again.state == "verified" and again.hub == "https://hub2.example/"
@@ -0,0 +1,117 @@
+import time
+
+from work_queue import WorkQueue
+
+
+def open_queue(**kwargs):
+    return WorkQueue.open(**kwargs)
+
+
+def test_enqueue_is_idempotent_per_key():
+    q = open_queue()
+    assert q.enqueue("post", "p1", {"title": "a"})
+    assert not q.enqueue("post", "p1", {"title": "b"})
+    items = q.lease("post", limit=10)
+    assert [(i.key, i.payload) for i in items] == [("p1", {"title": "b"})]
+
+
+def test_lease_hides_item_until_visibility_timeout():
+    q = open_queue()
+    q.enqueue("post", "p1", {})
+    (item,) = q.lease("post", visibility_timeout=60)
+    assert item.attempts == 1
+    assert q.lease("post") == []
+    q.conn.execute("UPDATE items SET lease_until = ?", (time.time() - 1,))
+    (again,) = q.lease("post")
+    assert again.attempts == 2
+    # 失効した貸出の ack は受け付けない
+    assert not q.ack(item)
+    assert q.ack(again)
+    assert q.stats("post")["done"] == 1
+
+
+def test_retry_backs_off_and_goes_dead_after_max_attempts():
+    q = open_queue(max_attempts=2)
+    q.enqueue("post", "p1", {})
+    (item,) = q.lease("post")
+    q.retry(item, "boom", backoff=0)
+    (item,) = q.lease("post")
+    q.retry(item, "boom", backoff=0)
+    assert q.status("post", "p1") == "dead"
+    assert q.lease("post") == []
+
+
+def test_retry_delays_next_lease():
+    q = open_queue()
+    q.enqueue("post", "p1", {})
+    (item,) = q.lease("post")
+    q.retry(item, "boom", backoff=60)
+    assert q.lease("post") == []
+    assert q.stats("post")["ready"] == 1
+
+
+def test_enqueue_updates_ready_payload_only():
+    q = open_queue()
+    q.enqueue("post", "p1", {"v": 1})
+    (item,) = q.lease("post")
+    q.enqueue("post", "p1", {"v": 2})
+    q.ack(item)
+    assert q.status("post", "p1") == "done"
+    assert not q.enqueue("post", "p1", {"v": 3})
+    assert q.status("post", "p1") == "done"
+
+
+def test_enqueue_revives_dead_item_when_payload_changes():
+    q = open_queue(max_attempts=1)
+    q.enqueue("post", "p1", {"v": 1})
+    (item,) = q.lease("post")
+    q.retry(item, "boom", backoff=0)
+    assert q.status("post", "p1") == "dead"
+
+    q.enqueue("post", "p1", {"v": 1})
+    assert q.status("post", "p1") == "dead"
+
+    q.enqueue("post", "p1", {"v": 2})
+    (item,) = q.lease("post")
+    assert item.payload == {"v": 2}
+    assert item.attempts == 1
+
+
+def test_release_does_not_count_an_attempt():
+    q = open_queue()
+    q.enqueue("post", "p1", {})
+    (item,) = q.lease("post")
+    q.release(item)
+    (item,) = q.lease("post")
+    assert item.attempts == 1
+
+
+def test_hold_until_released():
+    q = open_queue()
+    q.enqueue("post", "p1", {})
+    (item,) = q.lease("post")
+    q.hold(item, "in doubt")
+    assert q.lease("post") == []
+    assert q.stats("post")["held"] == 1
+    assert q.release_held("post", "p1")
+    assert not q.release_held("post", "p1")
+    (item,) = q.lease("post")
+    assert item.attempts == 1
+
+
+def test_lease_key_takes_only_that_item():
+    q = open_queue()
+    q.enqueue("post", "p1", {})
+    q.enqueue("post", "p2", {})
+    item = q.lease_key("post", "p2")
+    assert item.key == "p2"
+    assert q.lease_key("post", "p2") is None
+    assert [i.key for i in q.lease("post", limit=10)] == ["p1"]
+
+
+def test_queues_are_separate():
+    q = open_queue()
+    q.enqueue("other", "p1", {})
+    assert q.lease("post") == []
+    q.complete("other", "p1")
+    assert q.stats("other")["done"] == 1